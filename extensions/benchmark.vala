@@ -28,6 +28,9 @@ namespace Zeitgeist
             [DBus (signature = "a(asaasay)")] Variant event_templates,
             uint storage_state, uint num_events, uint result_type)
             throws Error;
+
+        public abstract async HashTable<string, Variant> get_cache_statistics ()
+            throws Error;
     }
 
     public class Benchmarker: Extension, RemoteBenchmarker
@@ -91,6 +94,39 @@ namespace Zeitgeist
             return data;
         }
 
+        public async HashTable<string, Variant> get_cache_statistics ()
+            throws Error
+        {
+            var data = new HashTable<string, Variant> (str_hash, str_equal);
+
+            // Queries run on the connections of the reader pool, the
+            // engine's own statements are used by the rest
+            uint statement_hits = engine.statement_cache.hits;
+            uint statement_misses = engine.statement_cache.misses;
+            if (engine.reader_pool != null)
+            {
+                statement_hits += engine.reader_pool.statement_cache_hits;
+                statement_misses += engine.reader_pool.statement_cache_misses;
+            }
+            data.insert ("statement_cache_hits",
+                new Variant.uint32 (statement_hits));
+            data.insert ("statement_cache_misses",
+                new Variant.uint32 (statement_misses));
+
+            var query_cache = engine.query_cache;
+            uint lookups = query_cache.hits + query_cache.misses;
+            data.insert ("query_cache_hits",
+                new Variant.uint32 (query_cache.hits));
+            data.insert ("query_cache_misses",
+                new Variant.uint32 (query_cache.misses));
+            data.insert ("query_cache_invalidations",
+                new Variant.uint32 (query_cache.invalidations));
+            data.insert ("query_cache_hit_rate", new Variant.double (
+                (lookups > 0) ? (double) query_cache.hits / lookups : 0.0));
+
+            return data;
+        }
+
         public override void unload ()
         {
             try
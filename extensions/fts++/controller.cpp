@@ -20,76 +20,110 @@
 
 namespace ZeitgeistFTS {
 
+// How often the controller checks for documents generated by the
+// rebuild workers, in milliseconds
+const guint REBUILD_POLL_INTERVAL = 10;
+
 void Controller::Initialize (GError **error)
 {
   indexer->Initialize (error);
 }
 
+static std::string GetCreationDateString (Indexer *indexer)
+{
+  gint64 zg_creation_date = indexer->GetZeitgeistCreationDate ();
+  gchar *creation = g_strdup_printf ("%" G_GINT64_FORMAT, zg_creation_date);
+  std::string zg_creation_date_str (creation);
+  g_free (creation);
+  return zg_creation_date_str;
+}
+
 void Controller::Run ()
 {
   if (!indexer->CheckIndex ())
     {
-      indexer->DropIndex ();
-      RebuildIndex ();
+      guint32 last_indexed_id = 0;
+      if (CanResumeRebuild (&last_indexed_id))
+        {
+          g_message ("Resuming index rebuild after event %u", last_indexed_id);
+          // Documents past the checkpoint may have been committed anyway
+          indexer->DeleteEventsAfter (last_indexed_id);
+        }
+      else
+        {
+          indexer->DropIndex ();
+        }
+      RebuildIndex (last_indexed_id);
     }
 }
 
-void Controller::RebuildIndex ()
+/**
+ * Returns true if the index contains an interrupted rebuild of the
+ * current Zeitgeist database.
+ */
+bool Controller::CanResumeRebuild (guint32 *last_indexed_id)
 {
-  GError *error = NULL;
-  guint32 *event_ids;
-  gint event_ids_size;
-  GPtrArray *templates = g_ptr_array_new_with_free_func (g_object_unref);
-  ZeitgeistEvent *event;
-  ZeitgeistTimeRange *time_range = zeitgeist_time_range_new_anytime ();
-
-  if (g_getenv ("ZEITGEIST_FTS_DISABLE_EVENT_BLACKLIST") == NULL)
-  {
-    // Blacklist Ubuntu One events...
+  std::string checkpoint (indexer->GetDbMetadata (REBUILD_CHECKPOINT_KEY));
+  if (checkpoint.empty ())
+    return false;
 
-    event = zeitgeist_event_new ();
-    zeitgeist_event_set_actor (event, "!dbus://com.ubuntuone.SyncDaemon.service");
-    g_ptr_array_add (templates, event);
+  if (indexer->GetDbMetadata (REBUILD_VERSION_KEY) != INDEX_VERSION ||
+      indexer->GetDbMetadata (REBUILD_CREATION_DATE_KEY) !=
+        GetCreationDateString (indexer))
+    return false;
 
-    event = zeitgeist_event_new ();
-    zeitgeist_event_set_actor (event, "!dbus://org.desktopcouch.CouchDB.service");
-    g_ptr_array_add (templates, event);
-  }
+  *last_indexed_id = g_ascii_strtoull (checkpoint.c_str (), NULL, 10);
+  return true;
+}
 
-  g_debug ("asking reader for all events");
-  event_ids = zeitgeist_db_reader_find_event_ids (zg_reader,
-                                                  time_range,
-                                                  templates,
-                                                  ZEITGEIST_STORAGE_STATE_ANY,
-                                                  0,
-                                                  ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS,
-                                                  NULL,
-                                                  &event_ids_size,
-                                                  &error);
-
-  if (error)
+void Controller::RebuildIndex (guint32 last_indexed_id)
+{
+  if (rebuilder != NULL)
+    return;
+
+  if (last_indexed_id == 0)
   {
-    g_warning ("%s", error->message);
-    g_error_free (error);
+    // Remember what is being rebuilt, so the rebuild can be resumed
+    indexer->SetDbMetadata (REBUILD_VERSION_KEY, INDEX_VERSION);
+    indexer->SetDbMetadata (REBUILD_CREATION_DATE_KEY,
+                            GetCreationDateString (indexer));
+    indexer->SetDbMetadata (REBUILD_CHECKPOINT_KEY, "0");
+    indexer->Commit ();
   }
-  else
+
+  rebuilder = new IndexRebuilder (zg_reader, indexer, last_indexed_id);
+  rebuild_source_id = g_timeout_add (REBUILD_POLL_INTERVAL,
+      (GSourceFunc) &Controller::ProcessRebuild, this);
+}
+
+gboolean Controller::ProcessRebuild ()
+{
+  if (!rebuilder->Process (false))
+    return TRUE;
+
+  rebuild_source_id = 0;
+  FinishRebuild ();
+  return FALSE;
+}
+
+void Controller::FinishRebuild ()
+{
+  delete rebuilder;
+  rebuilder = NULL;
+
+  if (rebuild_source_id != 0)
   {
-    g_debug ("reader returned %d events", event_ids_size);
-
-    IndexEvents (event_ids, event_ids_size);
-    g_free (event_ids);
-
-    // Set the db metadata key only once we're done
-    PushTask (new MetadataTask ("fts_index_version", INDEX_VERSION));
-    gint64 zg_creation_date = indexer->GetZeitgeistCreationDate ();
-    gchar *creation = g_strdup_printf ("%" G_GINT64_FORMAT, zg_creation_date);
-    std::string zg_creation_date_str (creation);
-    PushTask (new MetadataTask ("zg_db_creation_date", zg_creation_date_str));
-    g_free (creation);
+    g_source_remove (rebuild_source_id);
+    rebuild_source_id = 0;
   }
 
-  g_object_unref (time_range);
-  g_ptr_array_unref (templates);
+  // Set the db metadata key only once we're done
+  PushTask (new MetadataTask ("fts_index_version", INDEX_VERSION));
+  PushTask (new MetadataTask ("zg_db_creation_date",
+                              GetCreationDateString (indexer)));
+  PushTask (new MetadataTask (REBUILD_VERSION_KEY, ""));
+  PushTask (new MetadataTask (REBUILD_CREATION_DATE_KEY, ""));
+  PushTask (new MetadataTask (REBUILD_CHECKPOINT_KEY, ""));
 }
 
 void Controller::IndexEvents (GPtrArray *events)
@@ -117,7 +151,11 @@ void Controller::IndexEvents (guint *event_ids, int event_ids_size)
 
 void Controller::DeleteEvents (guint *event_ids, int event_ids_size)
 {
-  // FIXME: Should we break the task here as well?
+  if (rebuilder != NULL)
+    rebuilder->EventsDeleted (event_ids, event_ids_size);
+
+  // Unlike index tasks, deletions aren't broken down into chunks: the
+  // indexer looks up the documents of all ids in a single pass
   PushTask (new DeleteEventsTask (event_ids, event_ids_size));
 }
 
@@ -143,6 +181,25 @@ gboolean Controller::ProcessTask ()
 
     task->Process (indexer);
     delete task;
+
+    // Don't let changes pile up while the queue is busy
+    if (indexer->NeedsCommit ())
+      indexer->Commit ();
+  }
+  else if (rebuilder != NULL)
+  {
+    // Called directly while the index is being rebuilt, so advance the
+    // rebuild rather than waiting for it to be polled
+    if (rebuilder->Process (true))
+      FinishRebuild ();
+
+    // The rebuild commits its changes on its own
+    if (queued_tasks.empty () && processing_source_id != 0)
+    {
+      g_source_remove (processing_source_id);
+      processing_source_id = 0;
+    }
+    return queued_tasks.empty () ? FALSE : TRUE;
   }
 
   bool all_done = queued_tasks.empty ();
@@ -160,9 +217,23 @@ gboolean Controller::ProcessTask ()
   return TRUE;
 }
 
+GVariant* Controller::GetStatistics ()
+{
+  GVariantBuilder builder;
+  g_variant_builder_init (&builder, G_VARIANT_TYPE ("a{sv}"));
+
+  g_variant_builder_add (&builder, "{sv}", "queue_depth",
+                         g_variant_new_uint32 (queued_tasks.size ()));
+  g_variant_builder_add (&builder, "{sv}", "rebuilding",
+                         g_variant_new_boolean (rebuilder != NULL));
+  indexer->AddStatistics (&builder);
+
+  return g_variant_ref_sink (g_variant_builder_end (&builder));
+}
+
 bool Controller::HasPendingTasks ()
 {
-  return !queued_tasks.empty ();
+  return !queued_tasks.empty () || rebuilder != NULL;
 }
 
 }
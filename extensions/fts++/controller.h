@@ -24,6 +24,7 @@
 #include <vector>
 
 #include "indexer.h"
+#include "rebuilder.h"
 #include "task.h"
 #include "zeitgeist-internal.h"
 
@@ -34,6 +35,8 @@ public:
   Controller (ZeitgeistDbReader *reader)
     : zg_reader (reader)
     , processing_source_id (0)
+    , rebuilder (NULL)
+    , rebuild_source_id (0)
     , indexer (new Indexer (reader)) {};
 
   ~Controller ()
@@ -42,11 +45,16 @@ public:
       {
         g_source_remove (processing_source_id);
       }
+    if (rebuild_source_id != 0)
+      {
+        g_source_remove (rebuild_source_id);
+      }
+    if (rebuilder) delete rebuilder;
   }
 
   void Initialize (GError **error);
   void Run ();
-  void RebuildIndex ();
+  void RebuildIndex (guint32 last_indexed_id = 0);
 
   void IndexEvents (GPtrArray *events);
   void IndexEvents (guint *event_ids, int event_ids_size);
@@ -55,15 +63,23 @@ public:
   void PushTask (Task* task);
   bool HasPendingTasks ();
   gboolean ProcessTask ();
+  GVariant* GetStatistics ();
 
   Indexer                 *indexer;
 
 private:
+  bool CanResumeRebuild (guint32 *last_indexed_id);
+  gboolean ProcessRebuild ();
+  void FinishRebuild ();
+
   ZeitgeistDbReader       *zg_reader;
 
   typedef std::queue<Task*> TaskQueue;
   TaskQueue                queued_tasks;
   guint                    processing_source_id;
+
+  IndexRebuilder          *rebuilder;
+  guint                    rebuild_source_id;
 };
 
 }
@@ -164,3 +164,13 @@ void zeitgeist_indexer_process_task (ZeitgeistIndexer *indexer)
   _indexer->ProcessTask ();
 }
 
+GVariant* zeitgeist_indexer_get_statistics (ZeitgeistIndexer *indexer)
+{
+  ZeitgeistFTS::Controller *_indexer;
+
+  g_return_val_if_fail (indexer != NULL, NULL);
+
+  _indexer = (ZeitgeistFTS::Controller*) indexer;
+
+  return _indexer->GetStatistics ();
+}
@@ -67,6 +67,8 @@ gboolean           zeitgeist_indexer_has_pending_tasks (ZeitgeistIndexer *indexe
 
 void               zeitgeist_indexer_process_task  (ZeitgeistIndexer *indexer);
 
+GVariant*          zeitgeist_indexer_get_statistics (ZeitgeistIndexer *indexer);
+
 G_END_DECLS
 
 #endif /* _ZGFTS_H_ */
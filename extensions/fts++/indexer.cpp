@@ -21,11 +21,14 @@
 #include "indexer.h"
 #include "stringutils.h"
 #include <xapian.h>
+#include <algorithm>
+#include <cstdio>
 #include <queue>
 #include <vector>
 
 #include <gio/gio.h>
 #include <gio/gdesktopappinfo.h>
+#include <glib/gstdio.h>
 
 namespace ZeitgeistFTS {
 
@@ -44,6 +47,20 @@ const Xapian::valueno VALUE_EVENT_ID = 0;
 const Xapian::valueno VALUE_TIMESTAMP = 1;
 const Xapian::valueno VALUE_URI_HASH = 2;
 const Xapian::valueno VALUE_ORIGIN_HASH = 3;
+// Hashes of the properties events are grouped by for the other result
+// types, so they can be collapsed on (see FindGroupedHits)
+const Xapian::valueno VALUE_CURRENT_URI_HASH = 4;
+const Xapian::valueno VALUE_CURRENT_ORIGIN_HASH = 5;
+const Xapian::valueno VALUE_ACTOR_HASH = 6;
+const Xapian::valueno VALUE_EVENT_ORIGIN_HASH = 7;
+const Xapian::valueno VALUE_INTERPRETATION_HASH = 8;
+const Xapian::valueno VALUE_MIMETYPE_HASH = 9;
+
+// Popularity result types order the most recent groups by the number of
+// documents collapsed into them, looking at this many groups and at
+// least this many documents (see FindGroupedHits)
+const Xapian::doccount POPULARITY_MAX_GROUPS = 1000;
+const Xapian::doccount POPULARITY_CHECK_AT_LEAST = 10000;
 
 #define QUERY_PARSER_FLAGS \
   Xapian::QueryParser::FLAG_PHRASE | Xapian::QueryParser::FLAG_BOOLEAN | \
@@ -51,8 +68,122 @@ const Xapian::valueno VALUE_ORIGIN_HASH = 3;
   Xapian::QueryParser::FLAG_WILDCARD
 
 const std::string FTS_MAIN_DIR = "fts.index";
+const std::string FTS_SHARDS_DIR = "fts.shards";
+// shard keys are computed for timestamps up to the end of year 9999
+const gint64 MAX_SHARD_TIMESTAMP = G_GINT64_CONSTANT (253402300799999);
+
+// Thresholds after which buffered changes are committed, even if there
+// are more tasks waiting
+const guint MAX_UNCOMMITTED_CHANGES = 5000;
+const gsize MAX_UNCOMMITTED_BYTES = 32 * 1024 * 1024;
+const gint64 MAX_COMMIT_INTERVAL = 30 * G_TIME_SPAN_SECOND;
 const int RELEVANCY_RESULT_TYPE = 100;
 const int HASH_LENGTH = 16;
+// Searches matching more documents don't start a search session
+const Xapian::doccount MAX_SESSION_CANDIDATES = 2000;
+const guint MAX_SEARCH_SESSIONS = 4;
+
+/**
+ * Opens the database at `path', creating it if it doesn't exist yet, or
+ * replacing it with an empty one if it can't be opened.
+ */
+static Xapian::WritableDatabase*
+open_writable_database (const gchar *path, bool *overwritten)
+{
+  *overwritten = false;
+  try
+  {
+    return new Xapian::WritableDatabase (path, Xapian::DB_CREATE_OR_OPEN);
+  }
+  catch (const Xapian::DatabaseCorruptError &xp_error)
+  {
+    g_message ("Database is corrupt (%s). Overwriting...",
+        xp_error.get_msg ().c_str ());
+  }
+  catch (const Xapian::DatabaseOpeningError &xp_error)
+  {
+    g_message ("Database is corrupt (%s). Overwriting...",
+        xp_error.get_msg ().c_str ());
+  }
+
+  *overwritten = true;
+  return new Xapian::WritableDatabase (path, Xapian::DB_CREATE_OR_OVERWRITE);
+}
+
+static void
+remove_directory (const gchar *path)
+{
+  GDir *dir = g_dir_open (path, 0, NULL);
+  if (dir == NULL) return;
+
+  const gchar *name;
+  while ((name = g_dir_read_name (dir)) != NULL)
+  {
+    gchar *child = g_build_filename (path, name, NULL);
+    if (g_file_test (child, G_FILE_TEST_IS_DIR))
+      remove_directory (child);
+    else
+      g_unlink (child);
+    g_free (child);
+  }
+
+  g_dir_close (dir);
+  g_rmdir (path);
+}
+
+/**
+ * Returns the key of the shard for events with the given timestamp: the
+ * number of quarters since the start of year 0.
+ */
+static gint
+get_shard_key (gint64 timestamp)
+{
+  timestamp = CLAMP (timestamp, 0, MAX_SHARD_TIMESTAMP);
+  GDateTime *date = g_date_time_new_from_unix_utc (timestamp / 1000);
+  gint key = g_date_time_get_year (date) * 4 +
+    (g_date_time_get_month (date) - 1) / 3;
+  g_date_time_unref (date);
+  return key;
+}
+
+/**
+ * Shards are stored in directories named after their quarter, like
+ * "2012q3".
+ */
+static gchar*
+get_shard_path (gint key)
+{
+  gchar *name = g_strdup_printf ("%dq%d", key / 4, key % 4 + 1);
+  gchar *path = g_build_filename (zeitgeist_utils_get_data_path (),
+                                  FTS_SHARDS_DIR.c_str (), name, NULL);
+  g_free (name);
+  return path;
+}
+
+/**
+ * Returns the key of the metadata holding the range of event ids of
+ * the shard with the given key, stored as "<first>-<last>".
+ */
+static std::string
+get_shard_event_ids_key (gint key)
+{
+  gchar *name = g_strdup_printf ("fts_shard_event_ids_%d", key);
+  std::string metadata_key (name);
+  g_free (name);
+  return metadata_key;
+}
+
+static bool
+parse_shard_name (const gchar *name, gint *key)
+{
+  gint year, quarter;
+  gchar rest;
+  if (sscanf (name, "%dq%d%c", &year, &quarter, &rest) != 2) return false;
+  if (year < 0 || quarter < 1 || quarter > 4) return false;
+
+  *key = year * 4 + quarter - 1;
+  return true;
+}
 
 void Indexer::Initialize (GError **error)
 {
@@ -62,34 +193,24 @@ void Indexer::Initialize (GError **error)
     {
       this->db = new Xapian::WritableDatabase;
       this->db->add_database (Xapian::InMemory::open ());
+      this->app_info_cache = zeitgeist_app_info_cache_new (NULL);
     }
     else
     {
+      gchar *cache_path = g_build_filename (zeitgeist_utils_get_data_path (),
+          ZEITGEIST_APP_INFO_CACHE_BASENAME, NULL);
+      this->app_info_cache = zeitgeist_app_info_cache_new (cache_path);
+      g_free (cache_path);
+
       gchar *path = g_build_filename (zeitgeist_utils_get_data_path (),
                                       FTS_MAIN_DIR.c_str (), NULL);
-      try
-      {
-        this->db = new Xapian::WritableDatabase (path,
-                                                 Xapian::DB_CREATE_OR_OPEN);
-      }
-      catch (const Xapian::DatabaseCorruptError &xp_error)
-      {
-        g_message ("Database is corrupt (%s). Overwriting...",
-            xp_error.get_msg ().c_str ());
-        this->db = new Xapian::WritableDatabase (path,
-                                                 Xapian::DB_CREATE_OR_OVERWRITE);
-      }
-      catch (const Xapian::DatabaseOpeningError &xp_error)
-      {
-        g_message ("Database is corrupt (%s). Overwriting...",
-            xp_error.get_msg ().c_str ());
-        this->db = new Xapian::WritableDatabase (path,
-                                                 Xapian::DB_CREATE_OR_OVERWRITE);
-      }
+      bool overwritten;
+      this->db = open_writable_database (path, &overwritten);
       g_free (path);
+
+      FindShards ();
     }
 
-    this->tokenizer = new Xapian::TermGenerator ();
     this->query_parser = new Xapian::QueryParser ();
     this->query_parser->add_prefix ("name", "N");
     this->query_parser->add_prefix ("title", "N");
@@ -118,13 +239,8 @@ void Indexer::Initialize (GError **error)
         new Xapian::NumberValueRangeProcessor (VALUE_TIMESTAMP, "ms", false));
 
     this->query_parser->set_default_op (Xapian::Query::OP_AND);
-    this->query_parser->set_database (*this->db);
 
-    this->enquire = new Xapian::Enquire (*this->db);
-    
     g_assert (g_checksum_type_get_length (G_CHECKSUM_MD5) == HASH_LENGTH);
-    this->checksum = g_checksum_new (G_CHECKSUM_MD5);
-    if (!this->checksum) g_critical ("GChecksum initialization failed.");
 
     GError *error = NULL;
     /* we need to be careful with what we log, for example ubuntuone logs its
@@ -166,7 +282,7 @@ bool Indexer::CheckIndex ()
     g_message ("Index must be upgraded. Doing full rebuild");
     return false;
   }
-  else if (db->get_doccount () == 0)
+  else if (shards.empty ())
   {
     g_message ("Empty index detected. Doing full rebuild");
     return false;
@@ -198,8 +314,12 @@ bool Indexer::CheckIndex ()
  */
 void Indexer::DropIndex ()
 {
+  InvalidateSearchSessions ();
+
   try
   {
+    CloseShards ();
+
     if (this->db != NULL)
     {
       this->db->close ();
@@ -207,12 +327,6 @@ void Indexer::DropIndex ()
       this->db = NULL;
     }
 
-    if (this->enquire != NULL)
-    {
-      delete this->enquire;
-      this->enquire = NULL;
-    }
-
     if (zeitgeist_utils_using_in_memory_database ())
     {
       this->db = new Xapian::WritableDatabase;
@@ -221,15 +335,20 @@ void Indexer::DropIndex ()
     else
     {
       gchar *path = g_build_filename (zeitgeist_utils_get_data_path (),
-                                      FTS_MAIN_DIR.c_str (), NULL);
+                                      FTS_SHARDS_DIR.c_str (), NULL);
+      remove_directory (path);
+      g_free (path);
+
+      path = g_build_filename (zeitgeist_utils_get_data_path (),
+                               FTS_MAIN_DIR.c_str (), NULL);
       this->db = new Xapian::WritableDatabase (path,
                                                Xapian::DB_CREATE_OR_OVERWRITE);
       // FIXME: leaks on error
       g_free (path);
     }
 
-    this->query_parser->set_database (*this->db);
-    this->enquire = new Xapian::Enquire (*this->db);
+    uncommitted_changes = 0;
+    uncommitted_bytes = 0;
   }
   catch (const Xapian::Error &xp_error)
   {
@@ -240,14 +359,334 @@ void Indexer::DropIndex ()
 
 void Indexer::Commit ()
 {
+  // desktop files read since the last commit are most likely needed
+  // again after a restart
+  SaveAppInfoCache ();
+
+  if (uncommitted_changes == 0) return;
+
+  gint64 start_time = g_get_monotonic_time ();
   try
   {
+    // the documents go first, so the metadata never refers to documents
+    // which weren't committed (see IndexRebuilder::Checkpoint)
+    for (std::set<gint>::iterator it = uncommitted_shards.begin ();
+         it != uncommitted_shards.end (); ++it)
+    {
+      GetShard (*it, false)->commit ();
+    }
+    uncommitted_shards.clear ();
+
+    SaveShardEventIds ();
     db->commit ();
   }
   catch (Xapian::Error const& e)
   {
     g_warning ("Failed to commit changes: %s", e.get_msg ().c_str ());
   }
+
+  last_commit_time = g_get_monotonic_time ();
+  last_commit_latency = last_commit_time - start_time;
+  max_commit_latency = MAX (max_commit_latency, last_commit_latency);
+  num_commits++;
+
+  g_debug ("Committed %u changes (~%" G_GSIZE_FORMAT " bytes) in %f seconds",
+           uncommitted_changes, uncommitted_bytes,
+           (double) last_commit_latency / G_TIME_SPAN_SECOND);
+  uncommitted_changes = 0;
+  uncommitted_bytes = 0;
+}
+
+/**
+ * Returns true if the buffered changes should be committed now, because
+ * there are too many of them or they have been waiting for too long.
+ */
+bool Indexer::NeedsCommit ()
+{
+  if (uncommitted_changes == 0) return false;
+
+  return uncommitted_changes >= MAX_UNCOMMITTED_CHANGES ||
+    uncommitted_bytes >= MAX_UNCOMMITTED_BYTES ||
+    g_get_monotonic_time () - last_commit_time >= MAX_COMMIT_INTERVAL;
+}
+
+/**
+ * Looks for the shards in the data directory. They are only opened once
+ * they are needed.
+ */
+void Indexer::FindShards ()
+{
+  gchar *path = g_build_filename (zeitgeist_utils_get_data_path (),
+                                  FTS_SHARDS_DIR.c_str (), NULL);
+  GDir *dir = g_dir_open (path, 0, NULL);
+  g_free (path);
+  if (dir == NULL) return;
+
+  const gchar *name;
+  gint key;
+  while ((name = g_dir_read_name (dir)) != NULL)
+  {
+    if (!parse_shard_name (name, &key)) continue;
+    shards[key] = NULL;
+
+    guint32 first, last;
+    std::string ids (db->get_metadata (get_shard_event_ids_key (key)));
+    if (sscanf (ids.c_str (), "%u-%u", &first, &last) == 2)
+      shard_event_ids[key] = EventIdRange (first, last);
+  }
+  g_dir_close (dir);
+}
+
+/**
+ * Returns the shard with the given key, opening it if needed. If there's
+ * no such shard, it is created if `create' is true, otherwise NULL is
+ * returned.
+ */
+Xapian::WritableDatabase* Indexer::GetShard (gint key, bool create)
+{
+  ShardMap::iterator it = shards.find (key);
+  if (it != shards.end () && it->second != NULL) return it->second;
+  if (it == shards.end () && !create) return NULL;
+
+  Xapian::WritableDatabase *shard;
+  if (zeitgeist_utils_using_in_memory_database ())
+  {
+    shard = new Xapian::WritableDatabase;
+    shard->add_database (Xapian::InMemory::open ());
+  }
+  else
+  {
+    gchar *path = g_build_filename (zeitgeist_utils_get_data_path (),
+                                    FTS_SHARDS_DIR.c_str (), NULL);
+    g_mkdir_with_parents (path, 0755);
+    g_free (path);
+
+    bool overwritten;
+    path = get_shard_path (key);
+    try
+    {
+      shard = open_writable_database (path, &overwritten);
+    }
+    catch (Xapian::Error const& e)
+    {
+      g_free (path);
+      throw;
+    }
+    g_free (path);
+
+    if (overwritten)
+    {
+      // the index is missing the events of the shard, rebuild it
+      // on the next start
+      g_warning ("Lost the documents of shard %d", key);
+      SetDbMetadata ("fts_index_version", "");
+    }
+  }
+
+  shards[key] = shard;
+
+  // indexes created before the ranges of ids were recorded
+  if (shard_event_ids.find (key) == shard_event_ids.end () &&
+      shard->get_doccount () > 0)
+  {
+    UpdateShardEventIds (key,
+        static_cast<guint32> (Xapian::sortable_unserialise (
+            shard->get_value_lower_bound (VALUE_EVENT_ID))),
+        static_cast<guint32> (Xapian::sortable_unserialise (
+            shard->get_value_upper_bound (VALUE_EVENT_ID))));
+  }
+
+  return shard;
+}
+
+/**
+ * Returns a database combining the shards which may hold events from
+ * between `start_time' and `end_time'.
+ */
+Xapian::Database Indexer::GetShards (gint64 start_time, gint64 end_time)
+{
+  Xapian::Database database;
+  ShardMap::iterator it = shards.lower_bound (get_shard_key (start_time));
+  ShardMap::iterator end = shards.upper_bound (get_shard_key (end_time));
+  for (; it != end; ++it)
+  {
+    database.add_database (*GetShard (it->first, false));
+  }
+
+  return database;
+}
+
+/**
+ * Adds the document to the shard for the timestamp of its event. Unless
+ * old events are being indexed, that's the one for the current quarter.
+ */
+void Indexer::WriteDocument (Xapian::Document const& doc)
+{
+  gint64 timestamp = static_cast<gint64> (
+      Xapian::sortable_unserialise (doc.get_value (VALUE_TIMESTAMP)));
+  gint key = get_shard_key (timestamp);
+
+  guint32 event_id = static_cast<guint32> (
+      Xapian::sortable_unserialise (doc.get_value (VALUE_EVENT_ID)));
+
+  InvalidateSearchSessions ();
+  GetShard (key, true)->add_document (doc);
+  UpdateShardEventIds (key, event_id, event_id);
+  uncommitted_shards.insert (key);
+  uncommitted_changes++;
+  uncommitted_bytes += EstimateDocumentSize (doc);
+}
+
+/**
+ * Removes the shard with the given key, along with all of its documents.
+ */
+void Indexer::DropShard (gint key)
+{
+  ShardMap::iterator it = shards.find (key);
+  if (it == shards.end ()) return;
+
+  if (it->second != NULL)
+  {
+    it->second->close ();
+    delete it->second;
+  }
+  shards.erase (it);
+  uncommitted_shards.erase (key);
+  shard_event_ids.erase (key);
+  unsaved_shard_event_ids.erase (key);
+  db->set_metadata (get_shard_event_ids_key (key), "");
+
+  if (!zeitgeist_utils_using_in_memory_database ())
+  {
+    gchar *path = get_shard_path (key);
+    remove_directory (path);
+    g_free (path);
+  }
+
+  g_debug ("Dropped shard %d", key);
+}
+
+/**
+ * Closes the shard with the given key, committing its changes, until it
+ * is needed again.
+ */
+void Indexer::CloseShard (gint key)
+{
+  ShardMap::iterator it = shards.find (key);
+  if (it == shards.end () || it->second == NULL) return;
+  // there would be nothing to open again
+  if (zeitgeist_utils_using_in_memory_database ()) return;
+
+  if (uncommitted_shards.erase (key) > 0)
+    it->second->commit ();
+  it->second->close ();
+  delete it->second;
+  it->second = NULL;
+}
+
+void Indexer::CloseShards ()
+{
+  for (ShardMap::iterator it = shards.begin (); it != shards.end (); ++it)
+  {
+    if (it->second != NULL) delete it->second;
+  }
+  shards.clear ();
+  uncommitted_shards.clear ();
+  shard_event_ids.clear ();
+  unsaved_shard_event_ids.clear ();
+}
+
+/**
+ * Extends the range of event ids of the shard with the given key to
+ * include those between `min_id' and `max_id'.
+ */
+void Indexer::UpdateShardEventIds (gint key, guint32 min_id, guint32 max_id)
+{
+  std::map<gint, EventIdRange>::iterator it = shard_event_ids.find (key);
+  if (it == shard_event_ids.end ())
+  {
+    shard_event_ids[key] = EventIdRange (min_id, max_id);
+  }
+  else
+  {
+    if (min_id >= it->second.first && max_id <= it->second.second) return;
+    it->second.first = MIN (it->second.first, min_id);
+    it->second.second = MAX (it->second.second, max_id);
+  }
+  unsaved_shard_event_ids.insert (key);
+}
+
+/**
+ * Returns false if none of the event ids in `ranges', which have to be
+ * sorted and must not overlap, can be in the shard with the given key.
+ */
+bool Indexer::ShardMayContainEventIds (gint key, EventIdRanges const& ranges)
+{
+  std::map<gint, EventIdRange>::iterator it = shard_event_ids.find (key);
+  // the shard wasn't opened since the ranges started to be recorded
+  if (it == shard_event_ids.end ()) return true;
+
+  // the ranges are sorted by both ends, so the last one starting at or
+  // before the last id of the shard is the only one which may overlap
+  EventIdRanges::const_iterator range = std::upper_bound (
+      ranges.begin (), ranges.end (),
+      EventIdRange (it->second.second, G_MAXUINT32));
+  if (range == ranges.begin ()) return false;
+  --range;
+
+  return range->second >= it->second.first;
+}
+
+void Indexer::SaveShardEventIds ()
+{
+  for (std::set<gint>::iterator it = unsaved_shard_event_ids.begin ();
+       it != unsaved_shard_event_ids.end (); ++it)
+  {
+    EventIdRange const& ids = shard_event_ids[*it];
+    gchar *value = g_strdup_printf ("%u-%u", ids.first, ids.second);
+    db->set_metadata (get_shard_event_ids_key (*it), value);
+    g_free (value);
+  }
+  unsaved_shard_event_ids.clear ();
+}
+
+void Indexer::AddStatistics (GVariantBuilder *builder)
+{
+  g_variant_builder_add (builder, "{sv}", "uncommitted_changes",
+                         g_variant_new_uint32 (uncommitted_changes));
+  g_variant_builder_add (builder, "{sv}", "uncommitted_bytes",
+                         g_variant_new_uint64 (uncommitted_bytes));
+  g_variant_builder_add (builder, "{sv}", "commits",
+                         g_variant_new_uint32 (num_commits));
+  g_variant_builder_add (builder, "{sv}", "shards",
+                         g_variant_new_uint32 (shards.size ()));
+  g_variant_builder_add (builder, "{sv}", "last_commit_latency",
+                         g_variant_new_double (
+                           (double) last_commit_latency / G_TIME_SPAN_SECOND));
+  g_variant_builder_add (builder, "{sv}", "max_commit_latency",
+                         g_variant_new_double (
+                           (double) max_commit_latency / G_TIME_SPAN_SECOND));
+  g_variant_builder_add (builder, "{sv}", "seconds_since_last_commit",
+                         g_variant_new_double (
+                           (double) (g_get_monotonic_time () - last_commit_time)
+                           / G_TIME_SPAN_SECOND));
+}
+
+/**
+ * Rough estimate of the memory used by a document until it's committed
+ */
+static gsize
+EstimateDocumentSize (Xapian::Document const& doc)
+{
+  gsize size = 0;
+  for (Xapian::TermIterator it = doc.termlist_begin ();
+       it != doc.termlist_end (); ++it)
+  {
+    size += (*it).size () + sizeof (Xapian::termcount) * 2 +
+      it.positionlist_count () * sizeof (Xapian::termpos);
+  }
+  size += doc.values_count () * (HASH_LENGTH + sizeof (Xapian::valueno));
+  return size;
 }
 
 std::string Indexer::ExpandType (std::string const& prefix,
@@ -446,15 +885,17 @@ std::string Indexer::PreprocessString (std::string const& input)
   return result;
 }
 
-void Indexer::IndexText (std::string const& text)
+void Indexer::IndexText (Xapian::TermGenerator &tokenizer,
+                         std::string const& text)
 {
-  tokenizer->index_text (text, 5);
+  tokenizer.index_text (text, 5);
   // this is by definition already a human readable display string,
   // so it shouldn't need removal of underscores and uncamelcase
-  tokenizer->index_text (StringUtils::AsciiFold (text), 5);
+  tokenizer.index_text (StringUtils::AsciiFold (text), 5);
 }
 
-bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
+bool Indexer::IndexUri (Xapian::TermGenerator &tokenizer,
+                        std::string const& uri, std::string const& origin)
 {
   GFile *f = g_file_new_for_uri (uri.c_str ());
 
@@ -506,8 +947,8 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
 
     // remove unscores, CamelCase and process digits
     std::string processed (PreprocessString (basename));
-    tokenizer->index_text (processed, 5);
-    tokenizer->index_text (processed, 5, "N");
+    tokenizer.index_text (processed, 5);
+    tokenizer.index_text (processed, 5, "N");
 
     g_free (basename);
     // limit the directory indexing to just a few levels
@@ -532,7 +973,7 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
 
       // un-underscore, uncamelcase, ascii fold
       processed = PreprocessString (name);
-      tokenizer->index_text (processed, path_weights[weight_index++]);
+      tokenizer.index_text (processed, path_weights[weight_index++]);
 
       dir = g_path_get_dirname (path_component.c_str ());
       path_component = dir;
@@ -547,8 +988,8 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
     size_t at_pos = uri.find ('@', scheme_len);
     if (at_pos != std::string::npos)
     {
-      tokenizer->index_text (uri.substr (scheme_len, at_pos - scheme_len), 5);
-      tokenizer->index_text (uri.substr (at_pos + 1), 1);
+      tokenizer.index_text (uri.substr (scheme_len, at_pos - scheme_len), 5);
+      tokenizer.index_text (uri.substr (at_pos + 1), 1);
     }
   }
   else if (scheme_str.compare (0, 4, "http") == 0)
@@ -577,8 +1018,8 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
     {
       // remove unscores, CamelCase and process digits
       std::string processed (PreprocessString (unescaped_basename));
-      tokenizer->index_text (processed, 5);
-      tokenizer->index_text (processed, 5, "N");
+      tokenizer.index_text (processed, 5);
+      tokenizer.index_text (processed, 5, "N");
     }
 
     // and also index hostname (taken from origin field if possible)
@@ -598,9 +1039,9 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
         g_free (printable_hostname);
       }
 
-      tokenizer->index_text (hostname, 2);
-      tokenizer->index_text (hostname, 2, "N");
-      tokenizer->index_text (hostname, 2, "S");
+      tokenizer.index_text (hostname, 2);
+      tokenizer.index_text (hostname, 2, "N");
+      tokenizer.index_text (hostname, 2, "S");
     }
 
     g_free (unescaped_basename);
@@ -624,8 +1065,8 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
       if (g_utf8_validate (unescaped_basename, -1, NULL))
       {
         std::string capped (StringUtils::Truncate (unescaped_basename, 30));
-        tokenizer->index_text (capped, 5);
-        tokenizer->index_text (capped, 5, "N");
+        tokenizer.index_text (capped, 5);
+        tokenizer.index_text (capped, 5, "N");
       }
 
       // FIXME: rest of the path?
@@ -637,9 +1078,9 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
     {
       std::string capped (StringUtils::Truncate (authority, 30));
 
-      tokenizer->index_text (capped, 2);
-      tokenizer->index_text (capped, 2, "N");
-      tokenizer->index_text (capped, 2, "S");
+      tokenizer.index_text (capped, 2);
+      tokenizer.index_text (capped, 2, "N");
+      tokenizer.index_text (capped, 2, "S");
     }
   }
 
@@ -648,50 +1089,37 @@ bool Indexer::IndexUri (std::string const& uri, std::string const& origin)
   return true;
 }
 
-bool Indexer::IndexActor (std::string const& actor, bool is_subject)
+bool Indexer::IndexActor (Xapian::TermGenerator &tokenizer,
+                          std::string const& actor, bool is_subject)
 {
-  GDesktopAppInfo *dai = NULL;
-  // check the cache first
-  GAppInfo *ai = app_info_cache[actor];
-
-  if (ai == NULL)
+  ZeitgeistAppInfoCacheEntry *info = NULL;
+  // the caches are shared by the threads generating documents
+  // during index rebuilds
+  g_mutex_lock (&app_info_lock);
+  // check the failed cache first
+  if (failed_lookups.count (actor) != 0)
   {
-    // check also the failed cache
-    if (failed_lookups.count (actor) != 0) return false;
-
-    // and now try to load from the disk
-    if (g_path_is_absolute (actor.c_str ()))
-    {
-      dai = g_desktop_app_info_new_from_filename (actor.c_str ());
-    }
-    else if (g_str_has_prefix (actor.c_str (), "application://"))
-    {
-      dai = g_desktop_app_info_new (actor.substr (14).c_str ());
-    }
+    g_mutex_unlock (&app_info_lock);
+    return false;
+  }
 
-    if (dai != NULL)
-    {
-      ai = G_APP_INFO (dai);
-      app_info_cache[actor] = ai;
-    }
-    else
+  // the persistent cache only reads the desktop file if it isn't
+  // cached yet or if it changed since
+  info = zeitgeist_app_info_cache_lookup (app_info_cache, actor.c_str ());
+  if (info == NULL)
+  {
+    // cache failed lookup
+    failed_lookups.insert (actor);
+    if (clear_failed_id == 0)
     {
-      // cache failed lookup
-      failed_lookups.insert (actor);
-      if (clear_failed_id == 0)
-      {
-        // but clear the failed cache in 30 seconds
-        clear_failed_id = g_timeout_add_seconds (30,
-            (GSourceFunc) &Indexer::ClearFailedLookupsCb, this);
-      }
+      // but clear the failed cache in 30 seconds
+      clear_failed_id = g_timeout_add_seconds (30,
+          (GSourceFunc) &Indexer::ClearFailedLookupsCb, this);
     }
   }
-  else
-  {
-    dai = G_DESKTOP_APP_INFO (ai);
-  }
+  g_mutex_unlock (&app_info_lock);
 
-  if (dai == NULL)
+  if (info == NULL)
   {
     g_warning ("Unable to get info on %s", actor.c_str ());
     return false;
@@ -701,46 +1129,48 @@ bool Indexer::IndexActor (std::string const& actor, bool is_subject)
   unsigned name_weight = is_subject ? 5 : 2;
   unsigned comment_weight = 2;
 
-  val = g_app_info_get_display_name (ai);
+  val = info->display_name;
   if (val && val[0] != '\0')
   {
     std::string display_name (PreprocessString (val));
 
-    tokenizer->index_text (display_name, name_weight);
-    tokenizer->index_text (display_name, name_weight, "A");
+    tokenizer.index_text (display_name, name_weight);
+    tokenizer.index_text (display_name, name_weight, "A");
   }
 
-  val = g_desktop_app_info_get_generic_name (dai);
+  val = info->generic_name;
   if (val && val[0] != '\0')
   {
     // this shouldn't need uncamelcasing
     std::string generic_name (val);
     std::string generic_name_folded (StringUtils::AsciiFold (generic_name));
 
-    tokenizer->index_text (generic_name, name_weight);
-    tokenizer->index_text (generic_name, name_weight, "A");
-    tokenizer->index_text (generic_name_folded, name_weight);
-    tokenizer->index_text (generic_name_folded, name_weight, "A");
+    tokenizer.index_text (generic_name, name_weight);
+    tokenizer.index_text (generic_name, name_weight, "A");
+    tokenizer.index_text (generic_name_folded, name_weight);
+    tokenizer.index_text (generic_name_folded, name_weight, "A");
   }
 
-  if (!is_subject) return true;
+  if (!is_subject)
+  {
+    g_object_unref (info);
+    return true;
+  }
   // the rest of the code only applies to events with application subject uris:
   // index the comment field, add category terms, index keywords
 
-  val = g_app_info_get_description (ai);
+  val = info->description;
   if (val && val[0] != '\0')
   {
     std::string comment (val);
-    tokenizer->index_text (comment, comment_weight);
-    tokenizer->index_text (comment, comment_weight, "A");
+    tokenizer.index_text (comment, comment_weight);
+    tokenizer.index_text (comment, comment_weight, "A");
   }
 
-  val = g_desktop_app_info_get_categories (dai);
-  if (val && val[0] != '\0')
+  if (info->categories[0] != NULL)
   {
-    gchar **categories = g_strsplit (val, ";", 0);
-    Xapian::Document doc(tokenizer->get_document ());
-    for (gchar **iter = categories; *iter != NULL; ++iter)
+    Xapian::Document doc(tokenizer.get_document ());
+    for (gchar **iter = info->categories; *iter != NULL; ++iter)
     {
       // FIXME: what if this isn't ascii? but it should, that's what
       // the fdo menu spec says
@@ -748,9 +1178,15 @@ bool Indexer::IndexActor (std::string const& actor, bool is_subject)
       doc.add_boolean_term (FILTER_PREFIX_XDG_CATEGORY + category);
       g_free (category);
     }
-    g_strfreev (categories);
   }
 
+  for (gchar **iter = info->keywords; *iter != NULL; ++iter)
+  {
+    tokenizer.index_text (*iter, comment_weight);
+    tokenizer.index_text (*iter, comment_weight, "A");
+  }
+
+  g_object_unref (info);
   return true;
 }
 
@@ -782,348 +1218,538 @@ std::string Indexer::CompileQueryString (const gchar *search_string,
   return query_string;
 }
 
-// FIXME: this is missing the Storage State parameter
-GPtrArray* Indexer::Search (const gchar *search,
-                            ZeitgeistTimeRange *time_range,
-                            GPtrArray *templates,
-                            guint offset,
-                            guint count,
-                            ZeitgeistResultType result_type,
-                            guint *matches,
-                            GError **error)
+/**
+ * Returns the value slot holding the property events are grouped by for
+ * the given result type, or Xapian::BAD_VALUENO if it isn't supported.
+ */
+static Xapian::valueno
+get_collapse_key_for_result_type (ZeitgeistResultType result_type)
 {
-  GPtrArray *results = NULL;
-  try
+  switch (result_type)
   {
-    std::string query_string (CompileQueryString (search, time_range, templates));
-
-    // When sorting by some result types, we need to fetch some extra events
-    // from the Xapian index because the final result set will be coalesced
-    // on some property of the event
-    guint maxhits;
-    if (result_type == RELEVANCY_RESULT_TYPE ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN)
-    {
-      maxhits = count;
-    }
-    else
-    {
-      maxhits = count * 3;
-    }
-
-    if (result_type == RELEVANCY_RESULT_TYPE)
-    {
-      enquire->set_sort_by_relevance ();
-    }
-    else
-    {
-      bool reversed_sort = not
-          zeitgeist_result_type_is_sort_order_asc (result_type);
-      enquire->set_sort_by_value (VALUE_TIMESTAMP, reversed_sort);
-    }
-
-    if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS)
-    {
-      enquire->set_collapse_key (VALUE_URI_HASH);
-    }
-    else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN)
-    {
-      enquire->set_collapse_key (VALUE_ORIGIN_HASH);
-    }
-    else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENTS)
-    {
-      enquire->set_collapse_key (VALUE_EVENT_ID);
-    }
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENTS:
+      return VALUE_EVENT_ID;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECTS:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECTS:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS:
+      return VALUE_URI_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_CURRENT_URI:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_CURRENT_URI:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_CURRENT_URI:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_CURRENT_URI:
+      return VALUE_CURRENT_URI_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_OLDEST_ACTOR:
+      return VALUE_ACTOR_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN:
+      return VALUE_ORIGIN_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_CURRENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_CURRENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_CURRENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_CURRENT_ORIGIN:
+      return VALUE_CURRENT_ORIGIN_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_EVENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_EVENT_ORIGIN:
+      return VALUE_EVENT_ORIGIN_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECT_INTERPRETATION:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECT_INTERPRETATION:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECT_INTERPRETATION:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECT_INTERPRETATION:
+      return VALUE_INTERPRETATION_HASH;
+    case ZEITGEIST_RESULT_TYPE_MOST_RECENT_MIMETYPE:
+    case ZEITGEIST_RESULT_TYPE_LEAST_RECENT_MIMETYPE:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_MIMETYPE:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_MIMETYPE:
+      return VALUE_MIMETYPE_HASH;
+    default:
+      return Xapian::BAD_VALUENO;
+  }
+}
 
-    Xapian::Query q(query_parser->parse_query (query_string, QUERY_PARSER_FLAGS));
-    enquire->set_query (q);
-    Xapian::MSet hits (enquire->get_mset (offset, maxhits));
-    Xapian::doccount hitcount = hits.get_matches_estimated ();
+static bool
+is_popularity_result_type (ZeitgeistResultType result_type)
+{
+  switch (result_type)
+  {
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_CURRENT_URI:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_CURRENT_URI:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ACTOR:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_CURRENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_CURRENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_EVENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_EVENT_ORIGIN:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECT_INTERPRETATION:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECT_INTERPRETATION:
+    case ZEITGEIST_RESULT_TYPE_MOST_POPULAR_MIMETYPE:
+    case ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_MIMETYPE:
+      return true;
+    default:
+      return false;
+  }
+}
 
-    if (result_type == RELEVANCY_RESULT_TYPE)
-    {
-      std::vector<unsigned> event_ids;
-      for (Xapian::MSetIterator iter = hits.begin (); iter != hits.end (); ++iter)
-      {
-        Xapian::Document doc(iter.get_document ());
-        double unserialized =
-          Xapian::sortable_unserialise(doc.get_value (VALUE_EVENT_ID));
-        event_ids.push_back (static_cast<unsigned>(unserialized));
-      }
+static bool
+compare_hits_by_size_asc (Indexer::SearchHit const& a,
+                          Indexer::SearchHit const& b)
+{
+  return a.group_size < b.group_size;
+}
 
-      results = zeitgeist_db_reader_get_events (zg_reader,
-                                                &event_ids[0],
-                                                event_ids.size (),
-                                                NULL,
-                                                error);
-    }
-    else
-    {
-      GPtrArray *event_templates;
-      event_templates = g_ptr_array_new_with_free_func (g_object_unref);
-      for (Xapian::MSetIterator iter = hits.begin (); iter != hits.end (); ++iter)
-      {
-        Xapian::Document doc(iter.get_document ());
-        double unserialized =
-          Xapian::sortable_unserialise(doc.get_value (VALUE_EVENT_ID));
-        // this doesn't need ref sinking, does it?
-        ZeitgeistEvent *event = zeitgeist_event_new ();
-        zeitgeist_event_set_id (event, static_cast<unsigned>(unserialized));
-        g_ptr_array_add (event_templates, event);
-      }
+static bool
+compare_hits_by_size_desc (Indexer::SearchHit const& a,
+                           Indexer::SearchHit const& b)
+{
+  return a.group_size > b.group_size;
+}
 
-      if (event_templates->len > 0)
-      {
-        results = zeitgeist_db_reader_find_events (zg_reader,
-                                                   time_range,
-                                                   event_templates,
-                                                   ZEITGEIST_STORAGE_STATE_ANY,
-                                                   0,
-                                                   result_type,
-                                                   NULL,
-                                                   error);
-      }
-      else
-      {
-        results = g_ptr_array_new ();
-      }
+static void
+collect_hits (Xapian::MSet const& mset, std::vector<Indexer::SearchHit> &hits)
+{
+  for (Xapian::MSetIterator iter = mset.begin (); iter != mset.end (); ++iter)
+  {
+    Xapian::Document doc(iter.get_document ());
+    Indexer::SearchHit hit;
+    hit.event_id = static_cast<guint32>(
+        Xapian::sortable_unserialise (doc.get_value (VALUE_EVENT_ID)));
+    hit.relevancy = iter.get_percent () / 100.;
+    // get_collapse_count () doesn't include the document itself
+    hit.group_size = iter.get_collapse_count () + 1;
+    hits.push_back (hit);
+  }
+}
 
-      g_ptr_array_unref (event_templates);
-    }
+/**
+ * Runs the query collapsing the matching documents on the property the
+ * result type groups events by, and stores the groups between `offset'
+ * and `offset + count' in `hits', in the order given by the result type.
+ * Events without the property aren't part of any group.
+ *
+ * Recency result types are sorted by timestamp in the requested direction
+ * and paged by Xapian, so each group is represented by its first event in
+ * that order: unlike in ZeitgeistDbReader, the "least recent" types return
+ * the oldest event of each group, like OLDEST_ACTOR.
+ *
+ * Popularity result types are ordered by the collapse counts of the
+ * POPULARITY_MAX_GROUPS most recent groups, and Xapian only has to check
+ * POPULARITY_CHECK_AT_LEAST documents, so the counts are exact only for
+ * queries matching fewer documents than that.
+ *
+ * Returns the estimated number of groups.
+ */
+Xapian::doccount Indexer::FindGroupedHits (Xapian::Enquire &enq,
+                                           Xapian::doccount doccount,
+                                           Xapian::Query const& query,
+                                           ZeitgeistResultType result_type,
+                                           guint offset,
+                                           guint count,
+                                           std::vector<SearchHit> &hits)
+{
+  Xapian::valueno collapse_key =
+    get_collapse_key_for_result_type (result_type);
+  bool ascending = zeitgeist_result_type_is_sort_order_asc (result_type);
+  bool popularity = is_popularity_result_type (result_type);
 
-    if (matches)
-    {
-      *matches = hitcount;
-    }
+  if (collapse_key == VALUE_EVENT_ID)
+  {
+    enq.set_query (query);
   }
-  catch (Xapian::Error const& e)
+  else
   {
-    g_warning ("Failed to search index: %s", e.get_msg ().c_str ());
-    g_set_error_literal (error,
-                         ZEITGEIST_ENGINE_ERROR,
-                         ZEITGEIST_ENGINE_ERROR_DATABASE_ERROR,
-                         e.get_msg ().c_str ());
+    // documents without a value in the slot aren't collapsed at all
+    enq.set_query (Xapian::Query (Xapian::Query::OP_FILTER, query,
+        Xapian::Query (Xapian::Query::OP_VALUE_GE, collapse_key, "")));
   }
 
-  return results;
-}
+  // events with the same timestamp are ordered by id
+  bool newest_first = popularity || !ascending;
+  enq.set_sort_by_value (VALUE_TIMESTAMP, newest_first);
+  enq.set_docid_order (newest_first ? Xapian::Enquire::DESCENDING
+                                    : Xapian::Enquire::ASCENDING);
+  enq.set_collapse_key (collapse_key);
 
-static guint32*
-find_event_ids_for_combined_template (ZeitgeistDbReader *zg_reader,
-                                      ZeitgeistWhereClause *query_clause, // steals
-                                      GPtrArray *event_templates, // steals
-                                      guint count,
-                                      ZeitgeistResultType result_type,
-                                      gint *event_ids_length,
-                                      GError **error)
-{
-  g_return_val_if_fail (error == NULL || (error && *error == NULL), NULL);
+  if (!popularity)
+  {
+    // the groups come out in the right order, let Xapian do the paging
+    Xapian::MSet mset (enq.get_mset (offset, count));
+    collect_hits (mset, hits);
+    return mset.get_matches_estimated ();
+  }
 
-  ZeitgeistWhereClause *uri_where;
-  uri_where = zeitgeist_db_reader_get_where_clause_from_event_templates (
-      zg_reader, event_templates, error);
-  g_ptr_array_unref (event_templates);
+  Xapian::MSet mset (enq.get_mset (0,
+      std::min (doccount, POPULARITY_MAX_GROUPS),
+      std::min (doccount, POPULARITY_CHECK_AT_LEAST)));
+  std::vector<SearchHit> groups;
+  collect_hits (mset, groups);
 
-  zeitgeist_where_clause_extend (query_clause, uri_where);
-  g_object_unref (G_OBJECT (uri_where));
+  // ties keep their order by timestamp, in the requested direction
+  if (ascending)
+    std::reverse (groups.begin (), groups.end ());
+  std::stable_sort (groups.begin (), groups.end (),
+                    ascending ? compare_hits_by_size_asc
+                              : compare_hits_by_size_desc);
 
-  guint32 *event_ids;
-  event_ids = zeitgeist_db_reader_find_event_ids_for_clause (zg_reader,
-      query_clause, count, result_type, event_ids_length, error);
+  if (offset < groups.size ())
+  {
+    std::vector<SearchHit>::iterator end = groups.end ();
+    if (count < groups.size () - offset)
+      end = groups.begin () + offset + count;
+    hits.insert (hits.end (), groups.begin () + offset, end);
+  }
 
-  g_object_unref (query_clause);
+  return mset.get_matches_estimated ();
+}
 
-  return event_ids;
+static bool
+is_query_operator (std::string const& word)
+{
+  return word == "AND" || word == "OR" || word == "NOT" || word == "XOR" ||
+         word == "NEAR" || word == "ADJ";
 }
 
-static GPtrArray*
-find_events_for_result_type_and_ids (ZeitgeistDbReader *zg_reader,
-                                     ZeitgeistTimeRange *time_range,
-                                     GPtrArray *templates,
-                                     ZeitgeistStorageState storage_state,
-                                     unsigned count,
-                                     ZeitgeistResultType result_type,
-                                     std::vector<unsigned> const& event_ids,
-                                     std::map<unsigned, gdouble> &relevancy_map,
-                                     GError **error)
+/**
+ * Returns true for words which only match documents containing them, or
+ * containing a word they're a prefix of when followed by a wildcard.
+ */
+static bool
+is_plain_word (std::string const& word)
 {
-  GPtrArray *results = NULL;
-  results = zeitgeist_db_reader_get_events (zg_reader,
-                                            const_cast<unsigned*>(&event_ids[0]),
-                                            event_ids.size (),
-                                            NULL,
-                                            error);
+  size_t length = word.length ();
+  if (length > 0 && word[length - 1] == '*')
+    length--;
+  if (length == 0)
+    return false;
 
-  if (error && *error) return NULL;
+  for (unsigned i = 0; i < length; i++)
+  {
+    // non-ASCII characters are part of words
+    if (!g_ascii_isalnum (word[i]) && !(word[i] & 0x80))
+      return false;
+  }
 
-  if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS ||
-      result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENTS)
-    return results;
+  return !is_query_operator (word);
+}
 
-  if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECTS ||
-      result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECTS ||
-      result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS ||
-      result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS)
-  {
-    // need to get the uris from the events and do another find_events call
-    GPtrArray *event_templates;
-    event_templates = g_ptr_array_new_with_free_func (g_object_unref);
-    std::map<std::string, unsigned> remapper;
+static bool
+has_only_plain_words (std::string const& search)
+{
+  if (search.find ('"') != std::string::npos)
+    return false;
 
-    for (unsigned i = 0; i < results->len; i++)
+  gchar **words = g_strsplit (search.c_str (), " ", -1);
+  bool plain = true;
+  for (unsigned i = 0; words[i] != NULL; i++)
+  {
+    if (words[i][0] != '\0' && !is_plain_word (words[i]))
     {
-      ZeitgeistEvent* original_event = (ZeitgeistEvent*) results->pdata[i];
-      unsigned event_id = zeitgeist_event_get_id (original_event);
-      GPtrArray *subjects = zeitgeist_event_get_subjects (original_event);
-      if (subjects == NULL) continue;
-      for (unsigned j = 0; j < subjects->len; j++)
-      {
-        const gchar *subj_uri = zeitgeist_subject_get_current_uri (
-                (ZeitgeistSubject*) subjects->pdata[j]);
-        if (subj_uri == NULL) continue;
-        remapper[subj_uri] = event_id;
-        ZeitgeistEvent *event = zeitgeist_event_new ();
-        ZeitgeistSubject *subject = zeitgeist_subject_new ();
-        zeitgeist_subject_set_current_uri (subject, subj_uri);
-        zeitgeist_event_take_subject (event, subject);
-        g_ptr_array_add (event_templates, event);
-      }
+      plain = false;
+      break;
     }
+  }
+  g_strfreev (words);
 
-    g_ptr_array_unref (results);
+  return plain;
+}
 
-    // construct custom where clause which combines the original template
-    // with the uris we found
-    ZeitgeistWhereClause *where;
-    where = zeitgeist_db_reader_get_where_clause_for_query (zg_reader,
-        time_range, templates, storage_state, error);
+/**
+ * Returns true if every event matching `search' also matches `base'. As
+ * plain words are ANDed together, this is the case when `search' only adds
+ * words to `base', or makes a prefix search at the end of `base' (like
+ * "fo*") more specific (like "foo*").
+ */
+static bool
+is_refinement_of (std::string const& search, std::string const& base)
+{
+  if (base.empty ())
+    return false;
 
-    guint32 *real_event_ids;
-    gint real_event_ids_length;
+  std::string prefix (base);
+  if (base[base.length () - 1] == '*')
+    prefix.erase (prefix.length () - 1);
+  else if (search.length () > base.length () &&
+           search[base.length ()] != ' ' && base[base.length () - 1] != ' ')
+    return false;
 
-    real_event_ids = find_event_ids_for_combined_template (zg_reader,
-        where, event_templates, count, result_type, &real_event_ids_length,
-        error);
+  // operators could make the new words match more documents
+  return search.compare (0, prefix.length (), prefix) == 0 &&
+         has_only_plain_words (search);
+}
 
-    if (error && *error) return NULL;
+/**
+ * Returns the search session whose candidates contain all events matching
+ * `search' with the given filters, or NULL if there is none.
+ */
+Indexer::SearchSession* Indexer::FindSearchSession (std::string const& search,
+                                                    std::string const& filters)
+{
+  for (SearchSessionList::iterator it = search_sessions.begin ();
+       it != search_sessions.end (); ++it)
+  {
+    SearchSession *session = *it;
+    if (session->filters != filters) continue;
+    if (search != session->search &&
+        !is_refinement_of (search, session->search)) continue;
+
+    // keep the list ordered by last use
+    search_sessions.erase (it);
+    search_sessions.push_front (session);
+    return session;
+  }
 
-    results = zeitgeist_db_reader_get_events (zg_reader,
-                                              real_event_ids,
-                                              real_event_ids_length,
-                                              NULL,
-                                              error);
+  return NULL;
+}
 
-    g_free (real_event_ids);
-    real_event_ids = NULL;
+/**
+ * Starts a search session for `search' if it doesn't match too many
+ * documents. The documents it matches are copied to an in-memory database
+ * so the searches refining it, like the ones sent while the user is
+ * typing, only need to look at those.
+ *
+ * Sessions are only started for searches refining the previous one (see
+ * FindHits), so one-off searches and broad first keystrokes don't pay for
+ * copying their candidates.
+ */
+void Indexer::StartSearchSession (std::string const& search,
+                                  std::string const& filters,
+                                  GPtrArray *templates)
+{
+  if (search.empty () || !has_only_plain_words (search))
+    return;
 
-    if (error && *error) return NULL;
+  SearchSession *session = NULL;
+  Xapian::doccount num_candidates;
+  try
+  {
+    std::string query_string (CompileQueryString (search.c_str (), NULL,
+                                                  templates));
+    Xapian::Database database (GetShards (G_MININT64, G_MAXINT64));
+    query_parser->set_database (database);
+    Xapian::Query q(query_parser->parse_query (query_string,
+                                               QUERY_PARSER_FLAGS));
+
+    // with boolean weighting the match stops after enough documents
+    Xapian::Enquire candidate_enquire (database);
+    candidate_enquire.set_query (q);
+    candidate_enquire.set_weighting_scheme (Xapian::BoolWeight ());
+    Xapian::MSet mset (candidate_enquire.get_mset (
+          0, MAX_SESSION_CANDIDATES + 1));
+    num_candidates = mset.size ();
+    if (num_candidates == 0 || num_candidates > MAX_SESSION_CANDIDATES)
+      return;
 
-    // the event ids might have changed, we need to update the relevancy_map
-    for (unsigned i = 0; i < results->len; i++)
+    session = new SearchSession ();
+    session->search = search;
+    session->filters = filters;
+    session->candidates = Xapian::InMemory::open ();
+    for (Xapian::MSetIterator iter = mset.begin (); iter != mset.end (); ++iter)
     {
-      ZeitgeistEvent* original_event = (ZeitgeistEvent*) results->pdata[i];
-      unsigned event_id = zeitgeist_event_get_id (original_event);
-      GPtrArray *subjects = zeitgeist_event_get_subjects (original_event);
-      if (subjects == NULL) continue;
-      for (unsigned j = 0; j < subjects->len; j++)
-      {
-        const gchar *subj_uri = zeitgeist_subject_get_current_uri (
-                (ZeitgeistSubject*) subjects->pdata[j]);
-        if (subj_uri == NULL) continue;
-        relevancy_map[event_id] = relevancy_map[remapper[subj_uri]];
-      }
+      session->candidates.add_document (iter.get_document ());
     }
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to start search session: %s", e.get_msg ().c_str ());
+    if (session) delete session;
+    return;
+  }
+
+  g_debug ("started search session for '%s' with %u candidates",
+           search.c_str (), num_candidates);
+
+  search_sessions.push_front (session);
+  while (search_sessions.size () > MAX_SEARCH_SESSIONS)
+  {
+    delete search_sessions.back ();
+    search_sessions.pop_back ();
+  }
+}
 
+/**
+ * Drops the search sessions, their candidates are out of date once events
+ * are added to or deleted from the index.
+ */
+void Indexer::InvalidateSearchSessions ()
+{
+  for (SearchSessionList::iterator it = search_sessions.begin ();
+       it != search_sessions.end (); ++it)
+  {
+    delete *it;
   }
-  else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_ORIGIN ||
-      result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ORIGIN ||
-      result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN ||
-      result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN)
+  search_sessions.clear ();
+}
+
+/**
+ * Runs the search and stores the hits for the requested page in `hits'.
+ * Events are sorted by relevance first for RELEVANCY_RESULT_TYPE, and for
+ * the event result types if `relevance_first' is set.
+ *
+ * Returns false if the result type isn't supported.
+ */
+bool Indexer::FindHits (const gchar *search,
+                        ZeitgeistTimeRange *time_range,
+                        GPtrArray *templates,
+                        guint offset,
+                        guint count,
+                        ZeitgeistResultType result_type,
+                        bool relevance_first,
+                        std::vector<SearchHit> &hits,
+                        Xapian::doccount *matches)
+{
+  Xapian::valueno collapse_key =
+    get_collapse_key_for_result_type (result_type);
+  if (result_type != RELEVANCY_RESULT_TYPE &&
+      collapse_key == Xapian::BAD_VALUENO)
+    return false;
+
+  std::string query_string (CompileQueryString (search, time_range, templates));
+  std::string filters;
+  if (templates && templates->len > 0)
+    filters = CompileEventFilterQuery (templates);
+
+  SearchSession *session = FindSearchSession (search, filters);
+  Xapian::Database database;
+  if (session != NULL)
+  {
+    database = session->candidates;
+  }
+  else
   {
-    // need to get the origins from the events and do another find_events call
-    GPtrArray *event_templates;
-    event_templates = g_ptr_array_new_with_free_func (g_object_unref);
-    std::map<std::string, unsigned> remapper;
+    // only the shards overlapping the time range are searched
+    database = GetShards (
+        time_range ? zeitgeist_time_range_get_start (time_range) : G_MININT64,
+        time_range ? zeitgeist_time_range_get_end (time_range) : G_MAXINT64);
+  }
 
-    for (unsigned i = 0; i < results->len; i++)
-    {
-      ZeitgeistEvent* original_event = (ZeitgeistEvent*) results->pdata[i];
-      unsigned event_id = zeitgeist_event_get_id (original_event);
-      GPtrArray *subjects = zeitgeist_event_get_subjects (original_event);
-      if (subjects == NULL) continue;
-      for (unsigned j = 0; j < subjects->len; j++)
-      {
-        const gchar *subj_origin = zeitgeist_subject_get_origin ((ZeitgeistSubject*) subjects->pdata[j]);
-        if (subj_origin == NULL) continue;
-        remapper[subj_origin] = event_id;
-        ZeitgeistEvent *event = zeitgeist_event_new ();
-        ZeitgeistSubject *subject = zeitgeist_subject_new ();
-        zeitgeist_subject_set_origin (subject, subj_origin);
-        zeitgeist_event_take_subject (event, subject);
-        g_ptr_array_add (event_templates, event);
-      }
-    }
+  // expand the wildcards with the terms of the searched documents only
+  query_parser->set_database (database);
+  Xapian::Query q (query_parser->parse_query (query_string,
+                                              QUERY_PARSER_FLAGS));
 
-    g_ptr_array_set_free_func (results, g_object_unref);
-    g_ptr_array_unref (results);
+  Xapian::Enquire enq (database);
+  if (result_type == RELEVANCY_RESULT_TYPE)
+  {
+    enq.set_query (q);
+    enq.set_sort_by_relevance ();
+    Xapian::MSet mset (enq.get_mset (offset, count));
+    collect_hits (mset, hits);
+    *matches = mset.get_matches_estimated ();
+  }
+  else if (collapse_key == VALUE_EVENT_ID && relevance_first)
+  {
+    bool reversed_sort = not
+        zeitgeist_result_type_is_sort_order_asc (result_type);
+    enq.set_query (q);
+    enq.set_sort_by_relevance_then_value (VALUE_TIMESTAMP, reversed_sort);
+    Xapian::MSet mset (enq.get_mset (offset, count));
+    collect_hits (mset, hits);
+    *matches = mset.get_matches_estimated ();
+  }
+  else
+  {
+    *matches = FindGroupedHits (enq, database.get_doccount (), q,
+                                result_type, offset, count, hits);
+  }
 
-    // construct custom where clause which combines the original template
-    // with the origins we found
-    ZeitgeistWhereClause *where;
-    where = zeitgeist_db_reader_get_where_clause_for_query (zg_reader,
-        time_range, templates, storage_state, error);
+  if (session == NULL)
+  {
+    if (filters == unrefined_filters &&
+        is_refinement_of (search, unrefined_search))
+      StartSearchSession (search, filters, templates);
+    unrefined_search = search;
+    unrefined_filters = filters;
+  }
 
-    guint32 *real_event_ids;
-    gint real_event_ids_length;
+  return true;
+}
 
-    real_event_ids = find_event_ids_for_combined_template (zg_reader,
-        where, event_templates, count, result_type, &real_event_ids_length,
-        error);
+/**
+ * Fetches the events for `hits' from the Zeitgeist database, keeping their
+ * order. Hits for events which are no longer in the database are dropped.
+ */
+GPtrArray* Indexer::GetEventsForHits (std::vector<SearchHit> &hits,
+                                      GError **error)
+{
+  if (hits.empty ())
+    return g_ptr_array_new ();
 
-    if (error && *error) return NULL;
+  std::vector<guint32> event_ids;
+  for (unsigned i = 0; i < hits.size (); i++)
+    event_ids.push_back (hits[i].event_id);
 
-    results = zeitgeist_db_reader_get_events (zg_reader,
-                                              real_event_ids,
-                                              real_event_ids_length,
-                                              NULL,
-                                              error);
+  GPtrArray *results = zeitgeist_db_reader_get_events (zg_reader,
+                                                       &event_ids[0],
+                                                       event_ids.size (),
+                                                       NULL,
+                                                       error);
 
-    if (error && *error) return NULL;
+  if (error && *error) return NULL;
+
+  for (guint i = results->len; i > 0; i--)
+  {
+    if (g_ptr_array_index (results, i - 1) != NULL) continue;
 
-    g_free (real_event_ids);
-    real_event_ids = NULL;
+    g_ptr_array_remove_index (results, i - 1);
+    hits.erase (hits.begin () + (i - 1));
+  }
+
+  return results;
+}
+
+// FIXME: this is missing the Storage State parameter
+GPtrArray* Indexer::Search (const gchar *search,
+                            ZeitgeistTimeRange *time_range,
+                            GPtrArray *templates,
+                            guint offset,
+                            guint count,
+                            ZeitgeistResultType result_type,
+                            guint *matches,
+                            GError **error)
+{
+  GPtrArray *results = NULL;
+  try
+  {
+    std::vector<SearchHit> hits;
+    Xapian::doccount hitcount;
 
-    // the event ids might have changed, we need to update the relevancy_map
-    for (unsigned i = 0; i < results->len; i++)
+    if (!FindHits (search, time_range, templates, offset, count, result_type,
+                   false, hits, &hitcount))
     {
-      ZeitgeistEvent* original_event = (ZeitgeistEvent*) results->pdata[i];
-      unsigned event_id = zeitgeist_event_get_id (original_event);
-      GPtrArray *subjects = zeitgeist_event_get_subjects (original_event);
-      if (subjects == NULL) continue;
-      for (unsigned j = 0; j < subjects->len; j++)
-      {
-        const gchar *subj_origin = zeitgeist_subject_get_origin ((ZeitgeistSubject*) subjects->pdata[j]);
-        if (subj_origin == NULL) continue;
-        relevancy_map[event_id] = relevancy_map[remapper[subj_origin]];
-      }
+      g_set_error_literal (error,
+                           ZEITGEIST_ENGINE_ERROR,
+                           ZEITGEIST_ENGINE_ERROR_INVALID_ARGUMENT,
+                           "Requested result type is not supported");
+      return NULL;
     }
 
+    // only the events of the requested page are read from the database
+    results = GetEventsForHits (hits, error);
+
+    if (matches)
+    {
+      *matches = hitcount;
+    }
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to search index: %s", e.get_msg ().c_str ());
+    g_set_error_literal (error,
+                         ZEITGEIST_ENGINE_ERROR,
+                         ZEITGEIST_ENGINE_ERROR_DATABASE_ERROR,
+                         e.get_msg ().c_str ());
   }
 
   return results;
@@ -1144,10 +1770,6 @@ GPtrArray* Indexer::SearchWithRelevancies (const gchar *search,
   GPtrArray *results = NULL;
   try
   {
-    std::string query_string (CompileQueryString (search, time_range, templates));
-
-    guint maxhits = count;
-
     if (storage_state != ZEITGEIST_STORAGE_STATE_ANY)
     {
       // FIXME: add support for this by grabing (un)available storages
@@ -1159,36 +1781,11 @@ GPtrArray* Indexer::SearchWithRelevancies (const gchar *search,
       return NULL;
     }
 
-    bool reversed_sort = not
-        zeitgeist_result_type_is_sort_order_asc (result_type);
+    std::vector<SearchHit> hits;
+    Xapian::doccount hitcount;
 
-    if (result_type == RELEVANCY_RESULT_TYPE)
-    {
-      enquire->set_sort_by_relevance ();
-    }
-    else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_EVENTS)
-    {
-      enquire->set_sort_by_relevance_then_value (VALUE_TIMESTAMP, reversed_sort);
-      enquire->set_collapse_key (VALUE_EVENT_ID);
-    }
-    else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_SUBJECTS)
-    {
-      enquire->set_sort_by_relevance_then_value (VALUE_TIMESTAMP, reversed_sort);
-      enquire->set_collapse_key (VALUE_URI_HASH);
-    }
-    else if (result_type == ZEITGEIST_RESULT_TYPE_MOST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_RECENT_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ORIGIN ||
-        result_type == ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_ORIGIN)
-    {
-      enquire->set_sort_by_relevance_then_value (VALUE_TIMESTAMP, reversed_sort);
-      enquire->set_collapse_key (VALUE_ORIGIN_HASH);
-    }
-    else
+    if (!FindHits (search, time_range, templates, offset, count, result_type,
+                   true, hits, &hitcount))
     {
       g_set_error_literal (error,
                            ZEITGEIST_ENGINE_ERROR,
@@ -1197,110 +1794,23 @@ GPtrArray* Indexer::SearchWithRelevancies (const gchar *search,
       return NULL;
     }
 
-    Xapian::Query q(query_parser->parse_query (query_string, QUERY_PARSER_FLAGS));
-    enquire->set_query (q);
-    Xapian::MSet hits (enquire->get_mset (offset, maxhits));
-    Xapian::doccount hitcount = hits.get_matches_estimated ();
-
-    if (result_type == RELEVANCY_RESULT_TYPE)
-    {
-      std::vector<unsigned> event_ids;
-      std::vector<gdouble> relevancy_arr;
-      Xapian::MSetIterator iter, end;
-      for (iter = hits.begin (), end = hits.end (); iter != end; ++iter)
-      {
-        Xapian::Document doc(iter.get_document ());
-        double unserialized =
-          Xapian::sortable_unserialise (doc.get_value (VALUE_EVENT_ID));
-        unsigned event_id = static_cast<unsigned>(unserialized);
-        event_ids.push_back (event_id);
-
-        double rank = iter.get_percent () / 100.;
-        relevancy_arr.push_back (rank);
-      }
-
-      results = zeitgeist_db_reader_get_events (zg_reader,
-                                                &event_ids[0],
-                                                event_ids.size (),
-                                                NULL,
-                                                error);
-
-      if (error && *error) return NULL;
+    results = GetEventsForHits (hits, error);
 
-      if (results->len != relevancy_arr.size ())
-      {
-        g_warning ("Results don't match relevancies!");
-        g_set_error_literal (error,
-                             ZEITGEIST_ENGINE_ERROR,
-                             ZEITGEIST_ENGINE_ERROR_DATABASE_ERROR,
-                             "Internal database error");
-        g_ptr_array_set_free_func (results, g_object_unref);
-        g_ptr_array_unref (results);
-        return NULL;
-      }
+    if (error && *error) return NULL;
 
-      if (relevancies)
-      {
-        *relevancies = (gdouble*) g_memdup (&relevancy_arr[0],
-                                            sizeof (gdouble) * results->len);
-      }
-      if (relevancies_size)
+    if (relevancies)
+    {
+      *relevancies = NULL;
+      if (!hits.empty ())
       {
-        *relevancies_size = relevancy_arr.size ();
+        *relevancies = g_new (gdouble, hits.size ());
+        for (unsigned i = 0; i < hits.size (); i++)
+          (*relevancies)[i] = hits[i].relevancy;
       }
     }
-    else
+    if (relevancies_size)
     {
-      std::vector<unsigned> event_ids;
-      std::map<unsigned, gdouble> relevancy_map;
-      Xapian::MSetIterator iter, end;
-      for (iter = hits.begin (), end = hits.end (); iter != end; ++iter)
-      {
-        Xapian::Document doc(iter.get_document ());
-        double unserialized =
-          Xapian::sortable_unserialise (doc.get_value (VALUE_EVENT_ID));
-        unsigned event_id = static_cast<unsigned>(unserialized);
-
-        event_ids.push_back (event_id);
-
-        double rank = iter.get_percent () / 100.;
-        if (rank > relevancy_map[event_id])
-        {
-          relevancy_map[event_id] = rank;
-        }
-      }
-
-      results = find_events_for_result_type_and_ids (zg_reader, time_range,
-                                                     templates, storage_state,
-                                                     count, result_type,
-                                                     event_ids,
-                                                     relevancy_map, error);
-
-      if (error && *error) return NULL;
-
-      if (results == NULL)
-      {
-        results = g_ptr_array_new ();
-        if (relevancies) *relevancies = NULL;
-        if (relevancies_size) *relevancies_size = 0;
-      }
-      else
-      {
-        if (relevancies)
-        {
-          *relevancies = g_new (gdouble, results->len);
-          for (unsigned i = 0; i < results->len; i++)
-          {
-            ZeitgeistEvent *event = (ZeitgeistEvent*) g_ptr_array_index (results, i);
-            (*relevancies)[i] = relevancy_map[zeitgeist_event_get_id (event)];
-          }
-        }
-
-        if (relevancies_size)
-        {
-          *relevancies_size = results->len;
-        }
-      }
+      *relevancies_size = hits.size ();
     }
 
     if (matches)
@@ -1330,6 +1840,18 @@ get_digest_for_uri (GChecksum *checksum, const gchar *uri,
   g_assert (digest_size == NULL || *digest_size == HASH_LENGTH);
 }
 
+static void
+add_hash_value (Xapian::Document &doc, Xapian::valueno slot,
+                GChecksum *checksum, const gchar *value)
+{
+  if (value == NULL || value[0] == '\0') return;
+
+  guint8 hash[HASH_LENGTH + 1];
+  gsize hash_size = HASH_LENGTH;
+  get_digest_for_uri (checksum, value, hash, &hash_size);
+  doc.add_value (slot, std::string ((char *) hash, hash_size));
+}
+
 static bool
 CheckEventBlacklisted (ZeitgeistEvent *event)
 {
@@ -1344,146 +1866,288 @@ CheckEventBlacklisted (ZeitgeistEvent *event)
   return false;
 }
 
-void Indexer::IndexEvent (ZeitgeistEvent *event)
+/**
+ * Generates the document for the given event, returns false if the event
+ * shouldn't be indexed.
+ *
+ * This doesn't touch the index, so it can be called from multiple threads
+ * at once.
+ */
+bool Indexer::PrepareDocument (ZeitgeistEvent *event, Xapian::Document &doc)
 {
   if (blacklisting_enabled and CheckEventBlacklisted (event))
-    return;
+    return false;
 
-  try
+  const gchar *val;
+  guint event_id = zeitgeist_event_get_id (event);
+  g_return_val_if_fail (event_id > 0, false);
+
+  g_debug ("Indexing event with ID: %u", event_id);
+
+  doc.add_value (VALUE_EVENT_ID,
+                 Xapian::sortable_serialise (static_cast<double>(event_id)));
+  doc.add_value (VALUE_TIMESTAMP,
+                 Xapian::sortable_serialise (static_cast<double>(zeitgeist_event_get_timestamp (event))));
+
+  Xapian::TermGenerator tokenizer;
+  tokenizer.set_document (doc);
+
+  GChecksum *checksum = g_checksum_new (G_CHECKSUM_MD5);
+
+  val = zeitgeist_event_get_actor (event);
+  if (val && val[0] != '\0')
   {
-    const gchar *val;
-    guint event_id = zeitgeist_event_get_id (event);
-    g_return_if_fail (event_id > 0);
+    // it's nice that searching for "gedit" will find all files you worked
+    // with in gedit, but the relevancy has to be low
+    IndexActor (tokenizer, val, false);
+    add_hash_value (doc, VALUE_ACTOR_HASH, checksum, val);
+  }
 
-    g_debug ("Indexing event with ID: %u", event_id);
+  add_hash_value (doc, VALUE_EVENT_ORIGIN_HASH, checksum,
+                  zeitgeist_event_get_origin (event));
 
-    Xapian::Document doc;
-    doc.add_value (VALUE_EVENT_ID,
-                   Xapian::sortable_serialise (static_cast<double>(event_id)));
-    doc.add_value (VALUE_TIMESTAMP,
-                   Xapian::sortable_serialise (static_cast<double>(zeitgeist_event_get_timestamp (event))));
+  bool index_event = true;
+
+  GPtrArray *subjects = zeitgeist_event_get_subjects (event);
+  for (unsigned i = 0; i < subjects->len; i++)
+  {
+    ZeitgeistSubject *subject;
+    subject = (ZeitgeistSubject*) g_ptr_array_index (subjects, i);
+
+    // We use current_uri (vs. uri) where since we care about real stuff,
+    // not whatever happened some time ago.
+    //
+    // This will most likely still be the same as URI (unless something
+    // triggers a reindexation of the DB), but at least MOVE_EVENTS
+    // will have the updated URI.
+    val = zeitgeist_subject_get_current_uri (subject);
+    if (val == NULL || val[0] == '\0') continue;
 
-    tokenizer->set_document (doc);
+    std::string uri(val);
 
-    val = zeitgeist_event_get_actor (event);
-    if (val && val[0] != '\0')
+    if (uri.length () > 512)
     {
-      // it's nice that searching for "gedit" will find all files you worked
-      // with in gedit, but the relevancy has to be low
-      IndexActor (val, false);
+      g_warning ("URI too long (%lu). Discarding:\n%s",
+                 uri.length (), uri.substr (0, 32).c_str ());
+      index_event = false; // ignore this event completely...
+      break;
     }
 
-    GPtrArray *subjects = zeitgeist_event_get_subjects (event);
-    for (unsigned i = 0; i < subjects->len; i++)
+    // We need hashes of the subject properties so we can use Xapian's
+    // collapse key feature for the grouping result types. Using their ids
+    // would take less space, but for that we'd need SQL queries that'd be
+    // subject to races.
+    // FIXME(?): This doesn't work for events with multiple subjects.
+    add_hash_value (doc, VALUE_URI_HASH, checksum,
+                    zeitgeist_subject_get_uri (subject));
+    add_hash_value (doc, VALUE_CURRENT_URI_HASH, checksum, uri.c_str ());
+    add_hash_value (doc, VALUE_ORIGIN_HASH, checksum,
+                    zeitgeist_subject_get_origin (subject));
+    add_hash_value (doc, VALUE_CURRENT_ORIGIN_HASH, checksum,
+                    zeitgeist_subject_get_current_origin (subject));
+    add_hash_value (doc, VALUE_INTERPRETATION_HASH, checksum,
+                    zeitgeist_subject_get_interpretation (subject));
+    add_hash_value (doc, VALUE_MIMETYPE_HASH, checksum,
+                    zeitgeist_subject_get_mimetype (subject));
+
+    val = zeitgeist_subject_get_text (subject);
+    if (val && val[0] != '\0')
     {
-      ZeitgeistSubject *subject;
-      subject = (ZeitgeistSubject*) g_ptr_array_index (subjects, i);
+      IndexText (tokenizer, val);
+    }
 
-      // We use current_uri (vs. uri) where since we care about real stuff,
-      // not whatever happened some time ago.
-      //
-      // This will most likely still be the same as URI (unless something
-      // triggers a reindexation of the DB), but at least MOVE_EVENTS
-      // will have the updated URI.
-      val = zeitgeist_subject_get_current_uri (subject);
-      if (val == NULL || val[0] == '\0') continue;
+    val = zeitgeist_subject_get_origin (subject);
+    std::string origin (val != NULL ? val : "");
 
-      std::string uri(val);
+    if (uri.compare (0, 14, "application://") == 0)
+    {
+      if (!IndexActor (tokenizer, uri, true))
+        IndexUri (tokenizer, uri, origin);
+    }
+    else if (!IndexUri (tokenizer, uri, origin))
+    {
+      // unsupported uri scheme
+      index_event = false;
+      break;
+    }
+  }
 
-      if (uri.length () > 512)
-      {
-        g_warning ("URI too long (%lu). Discarding:\n%s",
-                   uri.length (), uri.substr (0, 32).c_str ());
-        return; // ignore this event completely...
-      }
+  g_checksum_free (checksum);
 
-      guint8 uri_hash[HASH_LENGTH + 1];
-      gsize hash_size = HASH_LENGTH;
+  if (!index_event)
+    return false;
 
-      // We need the subject URI so we can use Xapian's collapse key feature
-      // for *_SUBJECT grouping. However, to save space, we'll just save a hash.
-      // A better option would be using URI's id, but for that we'd need a SQL
-      // query that'd be subject to races.
-      // FIXME(?): This doesn't work for events with multiple subjects.
-      get_digest_for_uri (checksum, uri.c_str (), uri_hash, &hash_size);
-      doc.add_value (VALUE_URI_HASH, std::string((char *) uri_hash, hash_size));
+  AddDocFilters (event, doc);
+  return true;
+}
 
-      size_t colon_pos = uri.find (':');
-      // FIXME: current_origin once we have that
-      val = zeitgeist_subject_get_origin (subject);
-      // make sure the schemas of the URI and origin are the same
-      if (val && colon_pos != std::string::npos && strncmp (uri.c_str (), val, colon_pos+1) == 0)
-      {
-        hash_size = HASH_LENGTH;
-        get_digest_for_uri (checksum, val, uri_hash, &hash_size);
-        doc.add_value (VALUE_ORIGIN_HASH, std::string((char *) uri_hash, hash_size));
-      }
+void Indexer::IndexEvent (ZeitgeistEvent *event)
+{
+  try
+  {
+    Xapian::Document doc;
+    if (PrepareDocument (event, doc))
+    {
+      WriteDocument (doc);
+    }
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to index event: %s", e.get_msg ().c_str ());
+  }
+}
 
-      val = zeitgeist_subject_get_text (subject);
-      if (val && val[0] != '\0')
-      {
-        IndexText (val);
-      }
+void Indexer::AddDocument (Xapian::Document const& doc)
+{
+  try
+  {
+    WriteDocument (doc);
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to index event: %s", e.get_msg ().c_str ());
+  }
+}
 
-      val = zeitgeist_subject_get_origin (subject);
-      std::string origin (val != NULL ? val : "");
+/**
+ * Delete the documents of the given events. The ids are turned into
+ * ranges of contiguous ids, and the documents are looked up with a single
+ * pass over the event id value slot of each shard, however many ids are
+ * given.
+ */
+void Indexer::DeleteEvents (std::vector<guint32> const& event_ids)
+{
+  if (event_ids.empty ()) return;
 
-      if (uri.compare (0, 14, "application://") == 0)
-      {
-        if (!IndexActor (uri, true))
-          IndexUri (uri, origin);
-      }
-      else if (!IndexUri (uri, origin))
-      {
-        // unsupported uri scheme
-        return;
-      }
-    }
+  std::vector<guint32> ids (event_ids);
+  std::sort (ids.begin (), ids.end ());
+  ids.erase (std::unique (ids.begin (), ids.end ()), ids.end ());
 
-    AddDocFilters (event, doc);
+  EventIdRanges ranges;
+  for (unsigned i = 0; i < ids.size (); i++)
+  {
+    if (!ranges.empty () && ranges.back ().second + 1 == ids[i])
+      ranges.back ().second = ids[i];
+    else
+      ranges.push_back (EventIdRange (ids[i], ids[i]));
+  }
 
-    this->db->add_document (doc);
+  g_debug ("Deleting %u events in %u ranges",
+           (guint) ids.size (), (guint) ranges.size ());
+
+  guint deleted = DeleteEventRanges (ranges);
+  if (deleted > ids.size ())
+  {
+    g_warning ("Found %u documents for %u deleted events",
+               deleted, (guint) ids.size ());
   }
-  catch (Xapian::Error const& e)
+  else if (deleted < ids.size ())
   {
-    g_warning ("Failed to index event: %s", e.get_msg ().c_str ());
+    g_warning ("No documents for %u of %u deleted events",
+               (guint) ids.size () - deleted, (guint) ids.size ());
   }
 }
 
-void Indexer::DeleteEvent (guint32 event_id)
+/**
+ * Delete the documents of all events newer than event_id
+ */
+void Indexer::DeleteEventsAfter (guint32 event_id)
+{
+  g_debug ("Deleting events after ID: %u", event_id);
+
+  if (event_id == G_MAXUINT32) return;
+
+  EventIdRanges ranges;
+  ranges.push_back (EventIdRange (event_id + 1, G_MAXUINT32));
+  DeleteEventRanges (ranges);
+}
+
+/**
+ * Delete the documents whose event ids fall in any of the given ranges,
+ * which have to be sorted and must not overlap. Shards left empty are
+ * dropped. Returns the number of deleted documents.
+ */
+guint Indexer::DeleteEventRanges (EventIdRanges const& ranges)
 {
-  g_debug ("Deleting event with ID: %u", event_id);
+  std::vector<gint> empty_shards;
+  std::vector<gint> cold_shards;
+  gint current_shard = get_shard_key (g_get_real_time () / 1000);
+  guint deleted = 0;
 
   try
   {
-    std::string id(Xapian::sortable_serialise (static_cast<double>(event_id)));
-    Xapian::Query query (Xapian::Query::OP_VALUE_RANGE, VALUE_EVENT_ID, id, id);
+    for (ShardMap::iterator shard_it = shards.begin ();
+         shard_it != shards.end (); ++shard_it)
+    {
+      if (!ShardMayContainEventIds (shard_it->first, ranges)) continue;
 
-    enquire->set_query(query);
-    Xapian::MSet mset = enquire->get_mset(0, 10);
+      // old data stays cold, shards opened here are closed again
+      if (shard_it->second == NULL)
+        cold_shards.push_back (shard_it->first);
 
-    Xapian::doccount total = mset.get_matches_estimated();
-    if (total > 1)
-    {
-      g_warning ("More than one event found with id '%s", id.c_str ());
-    }
-    else if (total == 0)
-    {
-      g_warning ("No event for id '%s'", id.c_str ());
-      return;
+      Xapian::WritableDatabase *shard = GetShard (shard_it->first, false);
+      std::vector<Xapian::docid> docids;
+
+      Xapian::ValueIterator it = shard->valuestream_begin (VALUE_EVENT_ID);
+      Xapian::ValueIterator end = shard->valuestream_end (VALUE_EVENT_ID);
+      for (; it != end; ++it)
+      {
+        guint32 event_id = static_cast<guint32> (
+            Xapian::sortable_unserialise (*it));
+
+        // find the last range starting at or before event_id
+        EventIdRanges::const_iterator range = std::upper_bound (
+            ranges.begin (), ranges.end (),
+            EventIdRange (event_id, G_MAXUINT32));
+        if (range == ranges.begin ()) continue;
+        --range;
+
+        if (event_id <= range->second)
+          docids.push_back (it.get_docid ());
+      }
+
+      if (docids.empty ()) continue;
+
+      // documents are deleted only after the pass over the value
+      // stream, so the iterator isn't invalidated
+      InvalidateSearchSessions ();
+      for (unsigned i = 0; i < docids.size (); i++)
+      {
+        shard->delete_document (docids[i]);
+        uncommitted_changes++;
+        deleted++;
+      }
+      uncommitted_shards.insert (shard_it->first);
+
+      // old history which was deleted completely takes its shard with it
+      if (shard->get_doccount () == 0 && shard_it->first != current_shard)
+        empty_shards.push_back (shard_it->first);
     }
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to delete events: %s", e.get_msg ().c_str ());
+  }
+
+  for (unsigned i = 0; i < empty_shards.size (); i++)
+  {
+    DropShard (empty_shards[i]);
+  }
 
-    Xapian::MSetIterator i, end;
-    for (i= mset.begin(), end = mset.end(); i != end; i++)
+  try
+  {
+    // dropped shards aren't in the map anymore
+    for (unsigned i = 0; i < cold_shards.size (); i++)
     {
-      db->delete_document (*i);
+      CloseShard (cold_shards[i]);
     }
   }
   catch (Xapian::Error const& e)
   {
-    g_warning ("Failed to delete event '%u': %s",
-               event_id, e.get_msg().c_str ());
+    g_warning ("Failed to close shards: %s", e.get_msg ().c_str ());
   }
+
+  return deleted;
 }
 
 void Indexer::SetDbMetadata (std::string const& key, std::string const& value)
@@ -1491,6 +2155,7 @@ void Indexer::SetDbMetadata (std::string const& key, std::string const& value)
   try
   {
     db->set_metadata (key, value);
+    uncommitted_changes++;
   }
   catch (Xapian::Error const& e)
   {
@@ -1498,11 +2163,41 @@ void Indexer::SetDbMetadata (std::string const& key, std::string const& value)
   }
 }
 
+std::string Indexer::GetDbMetadata (std::string const& key)
+{
+  try
+  {
+    return db->get_metadata (key);
+  }
+  catch (Xapian::Error const& e)
+  {
+    g_warning ("Failed to get metadata: %s", e.get_msg ().c_str ());
+    return "";
+  }
+}
+
+void Indexer::SaveAppInfoCache ()
+{
+  GError *error = NULL;
+
+  g_mutex_lock (&app_info_lock);
+  zeitgeist_app_info_cache_save (app_info_cache, &error);
+  g_mutex_unlock (&app_info_lock);
+
+  if (error)
+  {
+    g_warning ("Unable to save desktop file cache: %s", error->message);
+    g_error_free (error);
+  }
+}
+
 gboolean Indexer::ClearFailedLookupsCb ()
 {
+  g_mutex_lock (&app_info_lock);
   failed_lookups.clear ();
 
   clear_failed_id = 0;
+  g_mutex_unlock (&app_info_lock);
   return FALSE;
 }
 
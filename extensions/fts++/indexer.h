@@ -24,28 +24,41 @@
 #include <glib-object.h>
 #include <gio/gio.h>
 #include <xapian.h>
+#include <list>
 
 #include "zeitgeist-internal.h"
 
 namespace ZeitgeistFTS {
 
-const std::string INDEX_VERSION = "4";
+const std::string INDEX_VERSION = "6";
 
 class Indexer
 {
 public:
-  typedef std::map<std::string, GAppInfo*> AppInfoMap;
   typedef std::set<std::string> ApplicationSet;
 
+  struct SearchHit
+  {
+    guint32          event_id;
+    gdouble          relevancy;
+    // number of matching events grouped with this one
+    Xapian::doccount group_size;
+  };
+
   Indexer (ZeitgeistDbReader *reader)
     : zg_reader (reader)
     , db (NULL)
     , query_parser (NULL)
-    , enquire (NULL)
-    , tokenizer (NULL)
-    , checksum (NULL)
+    , app_info_cache (NULL)
     , clear_failed_id (0)
+    , uncommitted_changes (0)
+    , uncommitted_bytes (0)
+    , num_commits (0)
+    , last_commit_time (g_get_monotonic_time ())
+    , last_commit_latency (0)
+    , max_commit_latency (0)
   {
+    g_mutex_init (&app_info_lock);
     const gchar *home_dir = g_get_home_dir ();
     home_dir_path = home_dir != NULL ? home_dir : "/home";
     blacklisting_enabled = g_getenv ("ZEITGEIST_FTS_DISABLE_EVENT_BLACKLIST") == NULL;
@@ -53,33 +66,41 @@ public:
 
   ~Indexer ()
   {
-    if (tokenizer) delete tokenizer;
-    if (enquire) delete enquire;
     if (query_parser) delete query_parser;
+    CloseShards ();
     if (db) delete db;
-    if (checksum) g_checksum_free (checksum);
     if (uri_schemes_regex) g_regex_unref (uri_schemes_regex);
 
-    for (AppInfoMap::iterator it = app_info_cache.begin ();
-         it != app_info_cache.end (); ++it)
+    if (app_info_cache)
     {
-      g_object_unref (it->second);
+      SaveAppInfoCache ();
+      g_object_unref (app_info_cache);
     }
 
     if (clear_failed_id != 0)
     {
       g_source_remove (clear_failed_id);
     }
+
+    InvalidateSearchSessions ();
+
+    g_mutex_clear (&app_info_lock);
   }
 
   void Initialize (GError **error);
   bool CheckIndex ();
   void DropIndex ();
   void Commit ();
+  bool NeedsCommit ();
+  void AddStatistics (GVariantBuilder *builder);
 
+  bool PrepareDocument (ZeitgeistEvent *event, Xapian::Document &doc);
+  void AddDocument (Xapian::Document const& doc);
   void IndexEvent (ZeitgeistEvent *event);
-  void DeleteEvent (guint32 event_id);
+  void DeleteEvents (std::vector<guint32> const& event_ids);
+  void DeleteEventsAfter (guint32 event_id);
   void SetDbMetadata (std::string const& key, std::string const& value);
+  std::string GetDbMetadata (std::string const& key);
   gint64 GetZeitgeistCreationDate ();
 
   GPtrArray* Search (const gchar *search,
@@ -112,26 +133,102 @@ private:
 
   std::string PreprocessString (std::string const& input);
 
+  // The documents are split into one database per quarter, by the
+  // timestamp of their event. The keys of the shards number the quarters.
+  typedef std::map<gint, Xapian::WritableDatabase*> ShardMap;
+
+  void FindShards ();
+  Xapian::WritableDatabase* GetShard (gint key, bool create);
+  Xapian::Database GetShards (gint64 start_time, gint64 end_time);
+  void WriteDocument (Xapian::Document const& doc);
+  void DropShard (gint key);
+  void CloseShard (gint key);
+  void CloseShards ();
+
+  // A search whose matching documents are kept around, so searches which
+  // can only match a subset of them can be run on those alone
+  struct SearchSession
+  {
+    std::string              search;
+    std::string              filters;
+    Xapian::WritableDatabase candidates;
+  };
+  typedef std::list<SearchSession*> SearchSessionList;
+
+  SearchSession* FindSearchSession (std::string const& search,
+                                    std::string const& filters);
+  void StartSearchSession (std::string const& search,
+                           std::string const& filters,
+                           GPtrArray *templates);
+  void InvalidateSearchSessions ();
+
+  bool FindHits (const gchar *search,
+                 ZeitgeistTimeRange *time_range,
+                 GPtrArray *templates,
+                 guint offset,
+                 guint count,
+                 ZeitgeistResultType result_type,
+                 bool relevance_first,
+                 std::vector<SearchHit> &hits,
+                 Xapian::doccount *matches);
+  Xapian::doccount FindGroupedHits (Xapian::Enquire &enq,
+                                    Xapian::doccount doccount,
+                                    Xapian::Query const& query,
+                                    ZeitgeistResultType result_type,
+                                    guint offset,
+                                    guint count,
+                                    std::vector<SearchHit> &hits);
+  GPtrArray* GetEventsForHits (std::vector<SearchHit> &hits, GError **error);
+
+  // inclusive ranges of event ids
+  typedef std::pair<guint32, guint32> EventIdRange;
+  typedef std::vector<EventIdRange> EventIdRanges;
+
+  guint DeleteEventRanges (EventIdRanges const& ranges);
+  void UpdateShardEventIds (gint key, guint32 min_id, guint32 max_id);
+  bool ShardMayContainEventIds (gint key, EventIdRanges const& ranges);
+  void SaveShardEventIds ();
+
   void AddDocFilters (ZeitgeistEvent *event, Xapian::Document &doc);
-  void IndexText (std::string const& text);
-  bool IndexUri (std::string const& uri, std::string const& origin);
-  bool IndexActor (std::string const& actor, bool is_subject);
+  void IndexText (Xapian::TermGenerator &tokenizer, std::string const& text);
+  bool IndexUri (Xapian::TermGenerator &tokenizer,
+                 std::string const& uri, std::string const& origin);
+  bool IndexActor (Xapian::TermGenerator &tokenizer,
+                   std::string const& actor, bool is_subject);
 
+  void SaveAppInfoCache ();
   gboolean ClearFailedLookupsCb ();
 
   ZeitgeistDbReader        *zg_reader;
+  // holds the metadata, the documents are in the shards
   Xapian::WritableDatabase *db;
+  ShardMap                  shards;
+  std::set<gint>            uncommitted_shards;
+  // ids of the events in each shard, which stay as they are after
+  // deletions, so shards can be skipped without opening them
+  std::map<gint, EventIdRange> shard_event_ids;
+  std::set<gint>            unsaved_shard_event_ids;
   Xapian::QueryParser      *query_parser;
-  Xapian::Enquire          *enquire;
-  Xapian::TermGenerator    *tokenizer;
-  AppInfoMap                app_info_cache;
+  GMutex                    app_info_lock;
+  ZeitgeistAppInfoCache    *app_info_cache;
   ApplicationSet            failed_lookups;
-  GChecksum                *checksum;
   GRegex                   *uri_schemes_regex; 
+  SearchSessionList         search_sessions;
+  // the last search without a session, which gets one once it's refined
+  std::string               unrefined_search;
+  std::string               unrefined_filters;
 
   guint                     clear_failed_id;
   std::string               home_dir_path;
   bool                      blacklisting_enabled;
+
+  // changes buffered by the WritableDatabase, see NeedsCommit ()
+  guint                     uncommitted_changes;
+  gsize                     uncommitted_bytes;
+  guint                     num_commits;
+  gint64                    last_commit_time;
+  gint64                    last_commit_latency;
+  gint64                    max_commit_latency;
 };
 
 }
@@ -0,0 +1,262 @@
+/*
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+#include "rebuilder.h"
+#include <sqlite3.h>
+
+namespace ZeitgeistFTS {
+
+const guint BATCH_SIZE = 256;
+const guint MAX_WORKER_THREADS = 4;
+const gint64 WAIT_TIMEOUT = 100 * G_TIME_SPAN_MILLISECOND;
+
+IndexRebuilder::IndexRebuilder (ZeitgeistDbReader *reader, Indexer *idx,
+                                guint32 last_indexed_id)
+  : zg_reader (reader)
+  , indexer (idx)
+  , batches_in_flight (0)
+  , next_seq (0)
+  , next_write_seq (0)
+  , last_read_id (last_indexed_id)
+  , last_written_id (last_indexed_id)
+  , max_id (0)
+  , all_read (false)
+{
+  GError *error = NULL;
+  ZeitgeistSQLiteDatabase *database = zeitgeist_db_reader_get_database (
+      zg_reader);
+
+  // Events inserted after this point are indexed by the controller as
+  // it is notified about them
+  max_id = zeitgeist_sq_lite_database_get_last_id (database, &error);
+  if (error)
+  {
+    g_warning ("Unable to get last event id: %s", error->message);
+    g_error_free (error);
+    all_read = true;
+  }
+
+  guint num_threads = CLAMP (g_get_num_processors () - 1, 1,
+                             MAX_WORKER_THREADS);
+  max_batches_in_flight = num_threads * 2;
+
+  completed_batches = g_async_queue_new ();
+  pool = g_thread_pool_new ((GFunc) &IndexRebuilder::GenerateDocuments,
+                            this, num_threads, FALSE, NULL);
+
+  g_debug ("rebuilding index after event %u, up to event %u, using %u threads",
+           last_indexed_id, max_id, num_threads);
+}
+
+IndexRebuilder::~IndexRebuilder ()
+{
+  // Drop the queued batches, but wait for the ones being processed
+  g_thread_pool_free (pool, TRUE, TRUE);
+  g_async_queue_unref (completed_batches);
+
+  for (std::set<Batch*>::iterator it = batches.begin ();
+       it != batches.end (); ++it)
+  {
+    g_ptr_array_unref ((*it)->events);
+    delete *it;
+  }
+}
+
+/**
+ * Adds the documents generated by the workers to the index and hands out
+ * more events to them. If `wait' is true, blocks for a while until the
+ * next batch is ready.
+ */
+bool IndexRebuilder::Process (bool wait)
+{
+  Batch *batch;
+
+  if (wait && batches_in_flight > 0 &&
+      pending_writes.count (next_write_seq) == 0)
+  {
+    batch = (Batch*) g_async_queue_timeout_pop (completed_batches,
+                                                WAIT_TIMEOUT);
+    if (batch) pending_writes[batch->seq] = batch;
+  }
+
+  while ((batch = (Batch*) g_async_queue_try_pop (completed_batches)) != NULL)
+  {
+    pending_writes[batch->seq] = batch;
+  }
+
+  // Batches are written in the order in which they were read, so the
+  // checkpoint never skips events which aren't indexed yet
+  std::map<guint, Batch*>::iterator it;
+  while ((it = pending_writes.find (next_write_seq)) != pending_writes.end ())
+  {
+    batch = it->second;
+    pending_writes.erase (it);
+    WriteBatch (batch);
+    next_write_seq++;
+    batches_in_flight--;
+  }
+
+  if (indexer->NeedsCommit ())
+    Checkpoint ();
+
+  while (!all_read && batches_in_flight < max_batches_in_flight)
+  {
+    if (!DispatchBatch ())
+      all_read = true;
+  }
+
+  if (all_read && batches_in_flight == 0)
+  {
+    Checkpoint ();
+    return true;
+  }
+
+  return false;
+}
+
+/**
+ * Makes sure events which were deleted after being read aren't added to
+ * the index.
+ */
+void IndexRebuilder::EventsDeleted (guint *event_ids, int event_ids_size)
+{
+  for (int i = 0; i < event_ids_size; i++)
+  {
+    if (event_ids[i] > last_written_id && event_ids[i] <= last_read_id)
+      deleted_ids.insert (event_ids[i]);
+  }
+}
+
+/**
+ * Reads the next batch of events and queues it for the workers. Returns
+ * false if there are no more events to index.
+ */
+bool IndexRebuilder::DispatchBatch ()
+{
+  GError *error = NULL;
+  ZeitgeistSQLiteDatabase *database = zeitgeist_db_reader_get_database (
+      zg_reader);
+  sqlite3_stmt *stmt;
+  std::vector<guint32> event_ids;
+
+  int rc = sqlite3_prepare_v2 (database->database,
+      "SELECT DISTINCT id FROM event WHERE id > ? AND id <= ? "
+      "ORDER BY id LIMIT ?", -1, &stmt, NULL);
+  if (rc == SQLITE_OK)
+  {
+    sqlite3_bind_int64 (stmt, 1, last_read_id);
+    sqlite3_bind_int64 (stmt, 2, max_id);
+    sqlite3_bind_int (stmt, 3, BATCH_SIZE);
+    while ((rc = sqlite3_step (stmt)) == SQLITE_ROW)
+    {
+      event_ids.push_back ((guint32) sqlite3_column_int64 (stmt, 0));
+    }
+  }
+  sqlite3_finalize (stmt);
+
+  if (rc != SQLITE_DONE)
+  {
+    g_warning ("Unable to read event ids: %s",
+               sqlite3_errmsg (database->database));
+    return false;
+  }
+  if (event_ids.empty ())
+    return false;
+
+  GPtrArray *events = zeitgeist_db_reader_get_events (zg_reader,
+                                                      &event_ids[0],
+                                                      event_ids.size (),
+                                                      NULL,
+                                                      &error);
+  if (error)
+  {
+    g_warning ("Unable to get events: %s", error->message);
+    g_error_free (error);
+    return false;
+  }
+
+  Batch *batch = new Batch ();
+  batch->seq = next_seq++;
+  batch->last_id = event_ids.back ();
+  batch->events = events;
+  batches.insert (batch);
+
+  last_read_id = batch->last_id;
+  batches_in_flight++;
+  g_thread_pool_push (pool, batch, NULL);
+
+  return event_ids.size () == BATCH_SIZE;
+}
+
+/**
+ * Runs on the worker threads.
+ */
+void IndexRebuilder::GenerateDocuments (Batch *batch, IndexRebuilder *self)
+{
+  for (unsigned i = 0; i < batch->events->len; i++)
+  {
+    ZeitgeistEvent *event;
+    event = (ZeitgeistEvent*) g_ptr_array_index (batch->events, i);
+    if (event == NULL) continue;
+
+    try
+    {
+      Xapian::Document doc;
+      if (self->indexer->PrepareDocument (event, doc))
+      {
+        batch->doc_ids.push_back (zeitgeist_event_get_id (event));
+        batch->docs.push_back (doc);
+      }
+    }
+    catch (Xapian::Error const& e)
+    {
+      g_warning ("Failed to index event: %s", e.get_msg ().c_str ());
+    }
+  }
+
+  g_async_queue_push (self->completed_batches, batch);
+}
+
+void IndexRebuilder::WriteBatch (Batch *batch)
+{
+  for (unsigned i = 0; i < batch->docs.size (); i++)
+  {
+    if (deleted_ids.count (batch->doc_ids[i]) != 0) continue;
+
+    indexer->AddDocument (batch->docs[i]);
+  }
+
+  last_written_id = batch->last_id;
+  deleted_ids.erase (deleted_ids.begin (),
+                     deleted_ids.upper_bound (last_written_id));
+
+  batches.erase (batch);
+  g_ptr_array_unref (batch->events);
+  delete batch;
+}
+
+void IndexRebuilder::Checkpoint ()
+{
+  gchar *last_id = g_strdup_printf ("%u", last_written_id);
+  indexer->SetDbMetadata (REBUILD_CHECKPOINT_KEY, last_id);
+  g_free (last_id);
+
+  indexer->Commit ();
+}
+
+}
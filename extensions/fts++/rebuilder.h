@@ -0,0 +1,96 @@
+/*
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+#ifndef _ZGFTS_REBUILDER_H_
+#define _ZGFTS_REBUILDER_H_
+
+#include <glib.h>
+#include <map>
+#include <set>
+#include <vector>
+
+#include "indexer.h"
+#include "zeitgeist-internal.h"
+
+namespace ZeitgeistFTS {
+
+// Index metadata describing an unfinished rebuild
+const std::string REBUILD_VERSION_KEY = "fts_rebuild_version";
+const std::string REBUILD_CREATION_DATE_KEY = "fts_rebuild_zg_db_creation_date";
+const std::string REBUILD_CHECKPOINT_KEY = "fts_rebuild_last_id";
+
+/**
+ * Rebuilds the index from the events in the Zeitgeist database.
+ *
+ * Events are read in batches, in order of their ids, and their documents
+ * are generated on a pool of worker threads. The documents are added to
+ * the index from the thread calling Process (), which is the only one
+ * touching the index and the database, in the order in which the batches
+ * were read. Whenever the indexer's commit thresholds are reached, the
+ * id of the last indexed event is stored in the index metadata along with
+ * the changes, so an interrupted rebuild can continue from there.
+ */
+class IndexRebuilder
+{
+public:
+  IndexRebuilder (ZeitgeistDbReader *reader, Indexer *indexer,
+                  guint32 last_indexed_id);
+  ~IndexRebuilder ();
+
+  // Returns true once all events have been indexed
+  bool Process (bool wait);
+  void EventsDeleted (guint *event_ids, int event_ids_size);
+
+private:
+  struct Batch
+  {
+    guint                  seq;
+    guint32                last_id;
+    GPtrArray             *events;
+    std::vector<guint32>   doc_ids;
+    std::vector<Xapian::Document> docs;
+  };
+
+  static void GenerateDocuments (Batch *batch, IndexRebuilder *self);
+
+  bool DispatchBatch ();
+  void WriteBatch (Batch *batch);
+  void Checkpoint ();
+
+  ZeitgeistDbReader       *zg_reader;
+  Indexer                 *indexer;
+
+  GThreadPool             *pool;
+  GAsyncQueue             *completed_batches;
+  std::set<Batch*>         batches;
+  std::map<guint, Batch*>  pending_writes;
+  std::set<guint32>        deleted_ids;
+  guint                    max_batches_in_flight;
+  guint                    batches_in_flight;
+  guint                    next_seq;
+  guint                    next_write_seq;
+
+  guint32                  last_read_id;
+  guint32                  last_written_id;
+  guint32                  max_id;
+  bool                     all_read;
+};
+
+}
+
+#endif /* _ZGFTS_REBUILDER_H_ */
@@ -58,10 +58,7 @@ void IndexEventsTask::Process (Indexer *indexer)
 
 void DeleteEventsTask::Process (Indexer *indexer)
 {
-  for (unsigned i = 0; i < event_ids.size (); i++)
-  {
-    indexer->DeleteEvent (event_ids[i]);
-  }
+  indexer->DeleteEvents (event_ids);
 }
 
 void MetadataTask::Process (Indexer *indexer)
@@ -79,7 +79,7 @@ public:
   }
 
 private:
-  std::vector<unsigned> event_ids;
+  std::vector<guint32> event_ids;
 };
 
 class MetadataTask : public Task
@@ -1063,8 +1063,6 @@ test_query_with_duplicates (Fixture *fix, gconstpointer data)
   assert_nth_result_has_id (results, 0, event_id4);
   assert_nth_result_has_id (results, 1, event_id3);
 
-  // FIXME: these fail
-/*
   // Search for MostPopularSubjects
   results = search_simple (fix, "test", NULL,
           ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS, &matches);
@@ -1081,8 +1079,7 @@ test_query_with_duplicates (Fixture *fix, gconstpointer data)
   g_assert_cmpuint (matches, >, 0);
   g_assert_cmpuint (results->len, ==, 2);
   assert_nth_result_has_id (results, 0, event_id3);
-  assert_nth_result_has_id (results, 1, event_id4); // or event_id1 until stuff gets fixed
-*/
+  assert_nth_result_has_id (results, 1, event_id4);
 }
 
 static void
@@ -1119,6 +1116,251 @@ test_query_most_popular_subjects (Fixture *fix, gconstpointer data)
   assert_nth_result_has_id (results, 2, event_id6);
 }
 
+static ZeitgeistEvent*
+create_test_event_with_actor (const char *uri, const char *actor,
+                              const char *mimetype)
+{
+  ZeitgeistEvent *event = create_test_event_simple (uri, "test");
+  ZeitgeistSubject *subject;
+
+  subject = (ZeitgeistSubject*) g_ptr_array_index (
+      zeitgeist_event_get_subjects (event), 0);
+  zeitgeist_subject_set_mimetype (subject, mimetype);
+  zeitgeist_event_set_actor (event, actor);
+
+  return event;
+}
+
+static void
+test_query_grouped_by_actor_and_mimetype (Fixture *fix, gconstpointer data)
+{
+  guint matches;
+  guint event_id1, event_id2, event_id3, event_id4, event_id5, event_id6;
+  GPtrArray* results;
+
+  const char gedit[] = "application://gedit.desktop";
+  const char eog[] = "application://eog.desktop";
+  const char vim[] = "application://vim.desktop";
+  event_id1 = index_event (fix, create_test_event_with_actor (
+        "file:///file1.txt", gedit, "text/plain"));
+  event_id2 = index_event (fix, create_test_event_with_actor (
+        "file:///file2.png", eog, "image/png"));
+  event_id3 = index_event (fix, create_test_event_with_actor (
+        "file:///file3.txt", gedit, "text/plain"));
+  event_id4 = index_event (fix, create_test_event_with_actor (
+        "file:///file4.py", vim, "text/x-python"));
+  event_id5 = index_event (fix, create_test_event_with_actor (
+        "file:///file5.txt", gedit, "text/plain"));
+  event_id6 = index_event (fix, create_test_event_with_actor (
+        "file:///file6.png", eog, "image/png"));
+
+  // Search for MostPopularActor
+  results = search_simple (fix, "test", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_POPULAR_ACTOR, &matches);
+
+  g_assert_cmpuint (matches, >, 0);
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_id5);
+  assert_nth_result_has_id (results, 1, event_id6);
+  assert_nth_result_has_id (results, 2, event_id4);
+
+  // Search for OldestActor
+  results = search_simple (fix, "test", NULL,
+          ZEITGEIST_RESULT_TYPE_OLDEST_ACTOR, &matches);
+
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_id1);
+  assert_nth_result_has_id (results, 1, event_id2);
+  assert_nth_result_has_id (results, 2, event_id4);
+
+  // Search for LeastRecentMimetype, whose groups are represented by
+  // their oldest event
+  results = search_simple (fix, "test", NULL,
+          ZEITGEIST_RESULT_TYPE_LEAST_RECENT_MIMETYPE, &matches);
+
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_id1);
+  assert_nth_result_has_id (results, 1, event_id2);
+  assert_nth_result_has_id (results, 2, event_id4);
+
+  // Get the second least popular mimetype only
+  results = search_with_count (fix, "test", NULL,
+          ZEITGEIST_RESULT_TYPE_LEAST_POPULAR_MIMETYPE, 1, 1, &matches);
+
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id6);
+}
+
+static void
+test_search_session (Fixture *fix, gconstpointer data)
+{
+  guint matches;
+  guint event_id1, event_id2, event_id3, event_id4;
+  GPtrArray* results;
+
+  event_id1 = index_event (fix, create_test_event_simple ("file:///foo.txt",
+                                                          "foobar"));
+  event_id2 = index_event (fix, create_test_event_simple ("file:///fox.txt",
+                                                          "foxtrot"));
+  event_id3 = index_event (fix, create_test_event_simple ("file:///zoo.txt",
+                                                          "zebra"));
+
+  // the searches sent while typing
+  results = search_simple (fix, "fo*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 2);
+  assert_nth_result_has_id (results, 0, event_id2);
+  assert_nth_result_has_id (results, 1, event_id1);
+
+  results = search_simple (fix, "foo*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id1);
+
+  results = search_simple (fix, "foob*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_POPULAR_SUBJECTS, &matches);
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id1);
+
+  results = search_simple (fix, "fo*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 2);
+
+  // searches which aren't refinements of the previous ones
+  results = search_simple (fix, "fo* OR zebra", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_id3);
+
+  results = search_simple (fix, "zebra", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id3);
+
+  // changes to the index invalidate the sessions
+  event_id4 = index_event (fix, create_test_event_simple (
+        "file:///foolish.txt", "foolish"));
+
+  results = search_simple (fix, "foo*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 2);
+  assert_nth_result_has_id (results, 0, event_id4);
+  assert_nth_result_has_id (results, 1, event_id1);
+
+  zeitgeist_indexer_delete_events (fix->indexer, &event_id1, 1);
+  process_pending (fix);
+
+  results = search_simple (fix, "foo*", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id4);
+}
+
+static void
+test_delete_events (Fixture *fix, gconstpointer data)
+{
+  guint matches;
+  guint event_ids[8];
+  GPtrArray *results;
+
+  for (int i = 0; i < 8; i++)
+  {
+    gchar *uri = g_strdup_printf ("file:///delete-%d.txt", i);
+    ZeitgeistEvent *event = create_test_event_simple (uri, "delete");
+    zeitgeist_event_set_timestamp (event, 1000 + i);
+    event_ids[i] = index_event (fix, event);
+    g_free (uri);
+  }
+
+  // a contiguous range, a single id and an id which isn't indexed
+  guint deleted_ids[] = { event_ids[1], event_ids[3], event_ids[2],
+                          event_ids[6], event_ids[4], 9999 };
+  zeitgeist_indexer_delete_events (fix->indexer, deleted_ids,
+                                   G_N_ELEMENTS (deleted_ids));
+  process_pending (fix);
+
+  results = search_simple (fix, "delete", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_ids[7]);
+  assert_nth_result_has_id (results, 1, event_ids[5]);
+  assert_nth_result_has_id (results, 2, event_ids[0]);
+}
+
+static guint32
+get_num_shards (Fixture *fix)
+{
+  guint32 num_shards;
+  GVariant *stats = zeitgeist_indexer_get_statistics (fix->indexer);
+  g_assert (g_variant_lookup (stats, "shards", "u", &num_shards));
+  g_variant_unref (stats);
+  return num_shards;
+}
+
+static void
+test_shards (Fixture *fix, gconstpointer data)
+{
+  guint matches;
+  guint event_id1, event_id2, event_id3;
+  ZeitgeistEvent *event;
+  GPtrArray *results;
+
+  // 2012-01-15, 2012-02-15 and 2012-07-15
+  event = create_test_event_simple ("file:///shard1.txt", "shard");
+  zeitgeist_event_set_timestamp (event, G_GINT64_CONSTANT (1326585600000));
+  event_id1 = index_event (fix, event);
+  event = create_test_event_simple ("file:///shard2.txt", "shard");
+  zeitgeist_event_set_timestamp (event, G_GINT64_CONSTANT (1329264000000));
+  event_id2 = index_event (fix, event);
+  event = create_test_event_simple ("file:///shard3.txt", "shard");
+  zeitgeist_event_set_timestamp (event, G_GINT64_CONSTANT (1342310400000));
+  event_id3 = index_event (fix, event);
+
+  g_assert_cmpuint (get_num_shards (fix), ==, 2);
+
+  results = search_simple (fix, "shard", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 3);
+  assert_nth_result_has_id (results, 0, event_id3);
+  assert_nth_result_has_id (results, 1, event_id2);
+  assert_nth_result_has_id (results, 2, event_id1);
+
+  // only the shard for the first quarter overlaps the time range
+  results = zeitgeist_indexer_search (fix->indexer,
+                                      "shard",
+                                      zeitgeist_time_range_new (
+                                        G_GINT64_CONSTANT (1325376000000),
+                                        G_GINT64_CONSTANT (1333238399999)),
+                                      g_ptr_array_new (),
+                                      0,
+                                      10,
+                                      ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS,
+                                      &matches,
+                                      NULL);
+  g_assert_cmpuint (results->len, ==, 2);
+  assert_nth_result_has_id (results, 0, event_id2);
+  assert_nth_result_has_id (results, 1, event_id1);
+
+  // ids outside of the ranges of the shards don't touch them
+  guint unknown_ids[] = { event_id3 + 100 };
+  zeitgeist_indexer_delete_events (fix->indexer, unknown_ids,
+                                   G_N_ELEMENTS (unknown_ids));
+  process_pending (fix);
+  g_assert_cmpuint (get_num_shards (fix), ==, 2);
+
+  // deleting all events of a quarter drops its shard
+  guint deleted_ids[] = { event_id1, event_id2 };
+  zeitgeist_indexer_delete_events (fix->indexer, deleted_ids,
+                                   G_N_ELEMENTS (deleted_ids));
+  process_pending (fix);
+
+  g_assert_cmpuint (get_num_shards (fix), ==, 1);
+  results = search_simple (fix, "shard", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+  g_assert_cmpuint (results->len, ==, 1);
+  assert_nth_result_has_id (results, 0, event_id3);
+}
+
 static void
 test_index_ignore_ubuntu_one (Fixture *fix, gconstpointer data)
 {
@@ -1155,6 +1397,75 @@ test_index_ignore_ubuntu_one (Fixture *fix, gconstpointer data)
   g_assert_cmpuint (results->len, ==, 1); // we still don't want ubuntuone:uuid
 }
 
+static void
+test_rebuild_index (Fixture *fix, gconstpointer data)
+{
+  guint matches;
+  GPtrArray *events;
+  GPtrArray *results;
+  guint *event_ids;
+  int num_events_inserted;
+  const int NUM_EVENTS = 600; // more than fit in a single rebuild batch
+
+  // add test events only to the Zeitgeist DB
+  events = g_ptr_array_new_with_free_func (g_object_unref);
+  for (int i = 0; i < NUM_EVENTS; i++)
+  {
+    gchar *uri = g_strdup_printf ("file:///home/user/file%d.txt", i);
+    ZeitgeistEvent *event = create_test_event_simple (uri, "rebuildme");
+    zeitgeist_event_set_timestamp (event, zeitgeist_timestamp_from_now ());
+    g_ptr_array_add (events, event);
+    g_free (uri);
+  }
+  event_ids = zeitgeist_engine_insert_events (ZEITGEIST_ENGINE (fix->db),
+                                              events, NULL,
+                                              &num_events_inserted, NULL);
+  g_assert_cmpint (NUM_EVENTS, ==, num_events_inserted);
+  g_free (event_ids);
+  g_ptr_array_unref (events);
+
+  // create a new FTS instance, which will rebuild the index
+  zeitgeist_indexer_free (fix->indexer);
+  GError *error = NULL;
+  fix->indexer = zeitgeist_indexer_new (fix->db, &error);
+  g_assert (error == NULL);
+  g_assert (zeitgeist_indexer_has_pending_tasks (fix->indexer));
+
+  process_pending (fix);
+
+  results = search_simple (fix, "rebuildme", NULL,
+          ZEITGEIST_RESULT_TYPE_MOST_RECENT_EVENTS, &matches);
+
+  g_assert_cmpuint (matches, ==, NUM_EVENTS);
+  g_assert_cmpuint (results->len, ==, 10);
+}
+
+static void
+test_statistics (Fixture *fix, gconstpointer data)
+{
+  GVariant *stats;
+  guint32 queue_depth, uncommitted_changes, commits;
+
+  index_event (fix, create_test_event1 ());
+
+  stats = zeitgeist_indexer_get_statistics (fix->indexer);
+  g_assert (g_variant_lookup (stats, "queue_depth", "u", &queue_depth));
+  g_assert (g_variant_lookup (stats, "uncommitted_changes", "u",
+                              &uncommitted_changes));
+  g_assert (g_variant_lookup (stats, "commits", "u", &commits));
+  GVariant *latency = g_variant_lookup_value (stats, "last_commit_latency",
+                                             G_VARIANT_TYPE_DOUBLE);
+  g_assert (latency != NULL);
+  g_variant_unref (latency);
+
+  // everything got committed once the queue was empty
+  g_assert_cmpuint (queue_depth, ==, 0);
+  g_assert_cmpuint (uncommitted_changes, ==, 0);
+  g_assert_cmpuint (commits, >=, 1);
+
+  g_variant_unref (stats);
+}
+
 G_BEGIN_DECLS
 
 static void discard_message (const gchar *domain,
@@ -1216,13 +1527,23 @@ void test_indexer_create_suite (void)
               setup, test_query_sort_order, teardown);
   g_test_add ("/Zeitgeist/FTS/Indexer/Query/Duplicates", Fixture, 0,
               setup, test_query_with_duplicates, teardown);
-  // FIXME: this one doesn't work atm
-  /*
   g_test_add ("/Zeitgeist/FTS/Indexer/Query/MostPopularSubjects", Fixture, 0,
               setup, test_query_most_popular_subjects, teardown);
-  */
+  g_test_add ("/Zeitgeist/FTS/Indexer/Query/GroupedByActorAndMimetype",
+              Fixture, 0, setup, test_query_grouped_by_actor_and_mimetype,
+              teardown);
+  g_test_add ("/Zeitgeist/FTS/Indexer/Query/SearchSession", Fixture, 0,
+              setup, test_search_session, teardown);
+  g_test_add ("/Zeitgeist/FTS/Indexer/Index/DeleteEvents", Fixture, 0,
+              setup, test_delete_events, teardown);
+  g_test_add ("/Zeitgeist/FTS/Indexer/Index/Shards", Fixture, 0,
+              setup, test_shards, teardown);
   g_test_add ("/Zeitgeist/FTS/Indexer/Index/IgnoreUbuntuOne", Fixture, 0,
               setup, test_index_ignore_ubuntu_one, teardown);
+  g_test_add ("/Zeitgeist/FTS/Indexer/Index/Rebuild", Fixture, 0,
+              setup, test_rebuild_index, teardown);
+  g_test_add ("/Zeitgeist/FTS/Indexer/Index/Statistics", Fixture, 0,
+              setup, test_statistics, teardown);
 
   // get rid of the "rebuilding index..." messages
   g_log_set_handler (NULL, G_LOG_LEVEL_MESSAGE, discard_message, NULL);
@@ -155,6 +155,21 @@ namespace Zeitgeist
             events = Events.to_variant (results);
         }
 
+        public async HashTable<string, Variant> get_statistics (
+                                  Cancellable? cancellable=null)
+            throws Error
+        {
+            var data = new HashTable<string, Variant> (str_hash, str_equal);
+
+            string key;
+            Variant val;
+            var iter = instance.indexer.get_statistics ().iterator ();
+            while (iter.next ("{sv}", out key, out val))
+                data.insert (key, val);
+
+            return data;
+        }
+
         private static void name_acquired_callback (DBusConnection conn)
         {
             name_acquired = true;
@@ -62,14 +62,19 @@ namespace Zeitgeist
 
             // FIXME: check dbus and see if fts is installed?
 
-            // installing a monitor from the daemon will ensure that we don't
-            // miss any notifications that would be emitted in between
-            // zeitgeist start and fts daemon start
-            notifier = MonitorManager.get_default ();
-            notifier.install_monitor (new BusName (INDEXER_NAME),
-                                      "/org/gnome/zeitgeist/monitor/special",
-                                      new TimeRange.anytime (),
-                                      new GenericArray<Event> ());
+            // with the SQLite backend the engine keeps the index itself,
+            // see SearchIndex
+            if (engine.search_index == null)
+            {
+                // installing a monitor from the daemon will ensure that we
+                // don't miss any notifications that would be emitted in
+                // between zeitgeist start and fts daemon start
+                notifier = MonitorManager.get_default ();
+                notifier.install_monitor (new BusName (INDEXER_NAME),
+                                          "/org/gnome/zeitgeist/monitor/special",
+                                          new TimeRange.anytime (),
+                                          new GenericArray<Event> ());
+            }
 
             try
             {
@@ -77,6 +82,9 @@ namespace Zeitgeist
                 registration_id = connection.register_object<RemoteSearchEngine> (
                     "/org/gnome/zeitgeist/index/activity", this);
 
+                if (engine.search_index != null)
+                    return;
+
                 try
                 {
                     // make sure FTS uses the same environment as us
@@ -179,6 +187,15 @@ namespace Zeitgeist
             Variant filter_templates, uint offset, uint count, uint result_type,
             out Variant events, out uint matches) throws Error
         {
+            if (engine.search_index != null)
+            {
+                double[] relevancies;
+                events = search_locally (query_string, time_range,
+                    filter_templates, StorageState.ANY, offset, count,
+                    result_type, false, out relevancies, out matches);
+                return;
+            }
+
             if (siin == null) yield wait_for_proxy ();
 
             var timer = new Timer ();
@@ -196,6 +213,14 @@ namespace Zeitgeist
             out Variant events, out double[] relevancies, out uint matches)
             throws Error
         {
+            if (engine.search_index != null)
+            {
+                events = search_locally (query_string, time_range,
+                    filter_templates, storage_state, offset, count,
+                    result_type, true, out relevancies, out matches);
+                return;
+            }
+
             if (siin == null) yield wait_for_proxy ();
 
             var timer = new Timer ();
@@ -208,6 +233,23 @@ namespace Zeitgeist
                 (uint) events.n_children (), matches, timer.elapsed ());
         }
 
+        private Variant search_locally (string query_string,
+            Variant time_range, Variant filter_templates, uint storage_state,
+            uint offset, uint count, uint result_type, bool relevance_first,
+            out double[] relevancies, out uint matches) throws Error
+        {
+            var timer = new Timer ();
+            var results = engine.search_index.search (query_string,
+                new TimeRange.from_variant (time_range),
+                Events.from_variant (filter_templates), storage_state,
+                offset, count, result_type, relevance_first,
+                out relevancies, out matches);
+            debug ("Got %u[/%u] results from search index (in %f seconds)",
+                results.length, matches, timer.elapsed ());
+
+            return Events.to_variant_with_limit (results);
+        }
+
     }
 
     [ModuleInit]
@@ -28,15 +28,83 @@ namespace Zeitgeist
     {
         [DBus (signature = "a(xu)")]
         public abstract Variant get_histogram_data () throws Error;
+
+        [DBus (signature = "a(xu)")]
+        public abstract Variant get_hourly_histogram_data () throws Error;
+
+        [DBus (signature = "a(xsu)")]
+        public abstract Variant get_interpretation_histogram_data ()
+            throws Error;
+
+        [DBus (signature = "a(xu)")]
+        public abstract Variant get_histogram_data_for_range (
+            [DBus (signature = "(xx)")] Variant time_range,
+            uint bucket_size,
+            [DBus (signature = "a(asaasay)")] Variant event_templates)
+            throws Error;
     }
 
+    /*
+     * Bucket sizes for GetHistogramDataForRange. Buckets start at local
+     * midnight; weeks start on Monday.
+     */
+    public enum HistogramBucketSize
+    {
+        HOUR = 0,
+        DAY = 1,
+        WEEK = 2,
+        MONTH = 3
+    }
+
+    /*
+     * Counts of events per local hour and event interpretation are kept in
+     * the histogram table, so histograms can be built without scanning the
+     * event table. The counts are updated after every insertion and
+     * deletion, and caught up with events inserted while the extension
+     * wasn't running when it is loaded.
+     *
+     * Like the event table, the counts have one row per subject.
+     */
     public class Histogram: Extension, RemoteHistogram
     {
 
+        private const string EXTENSION_NAME = "histogram";
+        private const string STATE_KEY = "state";
+        private const string STATE_SIGNATURE = "(su)";
+
+        // Local time of the event, truncated to the hour, as a Unix
+        // timestamp (as if the local time was UTC)
+        private const string HOURSTAMP_SQL = """
+            CAST(strftime('%s', strftime('%Y-%m-%d %H:00:00',
+                timestamp/1000, 'unixepoch', 'localtime')) AS INTEGER)
+            """;
+
+        private const int64 HOUR = 3600;
+        private const int64 DAY = 24 * HOUR;
+
         private uint registration_id = 0;
+        private string time_zone;
+        private bool prepared = false;
+
+        private unowned Zeitgeist.SQLite.Database database;
+        private unowned Sqlite.Database db;
+        private Sqlite.Statement decrement_stmt;
+
+        // Buckets of the events about to be deleted, see pre_delete_events
+        private HashTable<uint32, GenericArray<Variant>>? pending_deletion;
 
         construct
         {
+            try
+            {
+                prepare_histogram ();
+                prepared = true;
+            }
+            catch (EngineError err)
+            {
+                warning ("Failed to prepare histogram: %s", err.message);
+            }
+
             // This will be called after bus is acquired, so it shouldn't block
             try
             {
@@ -69,35 +137,444 @@ namespace Zeitgeist
             debug ("%s, this.ref_count = %u", GLib.Log.METHOD, this.ref_count);
         }
 
+        private void prepare_histogram () throws EngineError
+        {
+            database = engine.database;
+            db = database.database;
+
+            int rc = db.exec ("""
+                CREATE TABLE IF NOT EXISTS histogram (
+                    hourstamp INTEGER NOT NULL,
+                    interpretation INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (hourstamp, interpretation)
+                )
+                """);
+            database.assert_query_success (rc, "Can't create histogram table");
+
+            rc = db.prepare_v2 ("""
+                UPDATE histogram SET count = count - ?
+                WHERE hourstamp = ? AND interpretation = ?
+                """, -1, out decrement_stmt);
+            database.assert_query_success (rc, "Histogram update query error");
+
+            // The counts depend on the time zone, so they are rebuilt
+            // if it changes
+            time_zone = get_time_zone_fingerprint ();
+            uint32 counted_id = 0;
+            Variant? state = engine.extension_store.retrieve (
+                EXTENSION_NAME, STATE_KEY, new VariantType (STATE_SIGNATURE));
+            if (state != null && state.get_child_value (0).get_string () ==
+                time_zone)
+            {
+                counted_id = state.get_child_value (1).get_uint32 ();
+            }
+
+            uint32 last_id = database.get_last_id ();
+            if (counted_id == last_id && state != null)
+                return;
+
+            var timer = new Timer ();
+            database.begin_transaction ();
+            try
+            {
+                if (counted_id == 0)
+                    exec_histogram_query ("DELETE FROM histogram");
+                add_events_to_histogram ("id > %u".printf (counted_id));
+                store_state (last_id);
+                database.end_transaction ();
+            }
+            catch (EngineError err)
+            {
+                database.abort_transaction ();
+                throw err;
+            }
+            debug ("Updated histogram for events after %u in %f seconds",
+                counted_id, timer.elapsed ());
+        }
+
+        private string get_time_zone_fingerprint () throws EngineError
+        {
+            string? fingerprint = null;
+            int rc = db.exec ("""
+                SELECT strftime('%s', '2000-01-01 00:00:00', 'utc') || ':' ||
+                    strftime('%s', '2000-07-01 00:00:00', 'utc')
+                """,
+                (n_columns, values, column_names) =>
+                {
+                    fingerprint = values[0];
+                    return 0;
+                }, null);
+            database.assert_query_success (rc, "Can't get time zone");
+            return fingerprint ?? "";
+        }
+
+        private void store_state (uint32 last_id)
+        {
+            engine.extension_store.store (EXTENSION_NAME, STATE_KEY,
+                new Variant (STATE_SIGNATURE, time_zone, last_id));
+        }
+
+        private void exec_histogram_query (string sql) throws EngineError
+        {
+            int rc = db.exec (sql);
+            database.assert_query_success (rc, "Error updating histogram");
+        }
+
+        private void add_events_to_histogram (string condition)
+            throws EngineError
+        {
+            exec_histogram_query ("""
+                INSERT OR REPLACE INTO histogram (hourstamp, interpretation, count)
+                SELECT new.hourstamp, new.interpretation,
+                    new.count + COALESCE(histogram.count, 0)
+                FROM (
+                    SELECT %s AS hourstamp, interpretation, COUNT(*) AS count
+                    FROM event
+                    WHERE %s
+                    GROUP BY hourstamp, interpretation
+                ) AS new
+                LEFT JOIN histogram
+                    ON histogram.hourstamp = new.hourstamp
+                    AND histogram.interpretation = new.interpretation
+                """.printf (HOURSTAMP_SQL, condition));
+        }
+
+        public override void post_insert_events (GenericArray<Event?> events,
+            BusName? sender)
+        {
+            // IDs of events which were already in the log may be reused
+            // by other events in the batch, so only count each ID once
+            if (!prepared)
+                return;
+
+            var ids = new HashTable<uint32, bool> (direct_hash, direct_equal);
+            for (int i = 0; i < events.length; ++i)
+            {
+                if (events[i] != null && events[i].id != 0)
+                    ids.insert (events[i].id, true);
+            }
+            if (ids.size () == 0)
+                return;
+
+            uint32[] event_ids = {};
+            foreach (uint32 id in ids.get_keys ())
+                event_ids += id;
+
+            try
+            {
+                database.begin_transaction ();
+                try
+                {
+                    add_events_to_histogram ("id IN (%s)".printf (
+                        database.get_sql_string_from_event_ids (event_ids)));
+                    store_state (database.get_last_id ());
+                    database.end_transaction ();
+                }
+                catch (EngineError err)
+                {
+                    database.abort_transaction ();
+                    throw err;
+                }
+            }
+            catch (EngineError err)
+            {
+                warning ("Failed to update histogram: %s", err.message);
+            }
+        }
+
+        public override uint32[]? pre_delete_events (uint32[] ids,
+            BusName? sender)
+        {
+            if (!prepared)
+                return null;
+
+            // The events are gone by the time post_delete_events is called,
+            // so remember which buckets they are in
+            pending_deletion = new HashTable<uint32, GenericArray<Variant>> (
+                direct_hash, direct_equal);
+
+            string sql = """
+                SELECT id, %s AS hourstamp, interpretation, COUNT(*)
+                FROM event
+                WHERE id IN (%s)
+                GROUP BY id, hourstamp, interpretation
+                """.printf (HOURSTAMP_SQL,
+                    database.get_sql_string_from_event_ids (ids));
+
+            int rc = db.exec (sql, (n_columns, values, column_names) =>
+            {
+                uint32 id = (uint32) uint64.parse (values[0]);
+                if (pending_deletion.lookup (id) == null)
+                    pending_deletion.insert (id, new GenericArray<Variant> ());
+                pending_deletion.lookup (id).add (new Variant ("(xxx)",
+                    int64.parse (values[1]), int64.parse (values[2]),
+                    int64.parse (values[3])));
+                return 0;
+            }, null);
+            if (rc != Sqlite.OK)
+            {
+                warning ("Failed to look up deleted events for histogram: " +
+                    "%d, %s", rc, db.errmsg ());
+                pending_deletion = null;
+            }
+
+            return null;
+        }
+
+        public override void post_delete_events (uint32[] ids,
+            BusName? sender)
+        {
+            if (pending_deletion == null)
+                return;
+
+            try
+            {
+                database.begin_transaction ();
+                try
+                {
+                    foreach (uint32 id in ids)
+                    {
+                        var buckets = pending_deletion.lookup (id);
+                        if (buckets == null)
+                            continue;
+                        for (int i = 0; i < buckets.length; ++i)
+                        {
+                            int64 hourstamp, interpretation, count;
+                            buckets[i].get ("(xxx)", out hourstamp,
+                                out interpretation, out count);
+
+                            decrement_stmt.reset ();
+                            decrement_stmt.bind_int64 (1, count);
+                            decrement_stmt.bind_int64 (2, hourstamp);
+                            decrement_stmt.bind_int64 (3, interpretation);
+                            int rc = decrement_stmt.step ();
+                            database.assert_query_success (rc,
+                                "Error updating histogram", Sqlite.DONE);
+                        }
+                    }
+                    exec_histogram_query (
+                        "DELETE FROM histogram WHERE count <= 0");
+                    database.end_transaction ();
+                }
+                catch (EngineError err)
+                {
+                    database.abort_transaction ();
+                    throw err;
+                }
+            }
+            catch (EngineError err)
+            {
+                warning ("Failed to update histogram: %s", err.message);
+            }
+
+            pending_deletion = null;
+        }
+
         public Variant get_histogram_data () throws Error
+        {
+            return get_buckets ("""
+                SELECT %s AS bucket, SUM(count)
+                FROM histogram
+                GROUP BY bucket
+                ORDER BY bucket DESC
+                """.printf (get_bucket_sql (HistogramBucketSize.DAY,
+                    "hourstamp")));
+        }
+
+        public Variant get_hourly_histogram_data () throws Error
+        {
+            return get_buckets ("""
+                SELECT hourstamp, SUM(count)
+                FROM histogram
+                GROUP BY hourstamp
+                ORDER BY hourstamp DESC
+                """);
+        }
+
+        public Variant get_histogram_data_for_range (Variant time_range,
+            uint bucket_size, Variant event_templates) throws Error
+        {
+            var range = new TimeRange.from_variant (time_range);
+            var templates = Events.from_variant (event_templates);
+            string bucket_sql;
+
+            // Templates which only filter on the event interpretation can
+            // be answered from the histogram table, at the cost of
+            // including whole hours at the ends of the time range
+            bool only_interpretation = true;
+            for (int i = 0; i < templates.length; ++i)
+            {
+                if (!is_interpretation_template (templates[i]))
+                    only_interpretation = false;
+            }
+
+            if (only_interpretation)
+            {
+                bucket_sql = get_bucket_sql (bucket_size, "hourstamp");
+
+                var where = new WhereClause (WhereClause.Type.AND);
+                where.extend (engine.get_where_clause_from_event_templates (
+                    templates));
+                if (range.start > 0)
+                {
+                    where.add ("""
+                        hourstamp >= CAST(strftime('%s', ?/1000, 'unixepoch',
+                            'localtime') AS INTEGER) / 3600 * 3600
+                        """, range.start.to_string ());
+                }
+                if (range.end < int64.MAX)
+                {
+                    where.add ("""
+                        hourstamp <= CAST(strftime('%s', ?/1000, 'unixepoch',
+                            'localtime') AS INTEGER)
+                        """, range.end.to_string ());
+                }
+
+                string sql = "SELECT %s AS bucket, SUM(count) FROM histogram "
+                    .printf (bucket_sql);
+                if (!where.is_empty ())
+                    sql += "WHERE " + where.get_sql_conditions ();
+                sql += " GROUP BY bucket ORDER BY bucket DESC";
+
+                return get_buckets (sql, where.get_bind_arguments ());
+            }
+            else
+            {
+                bucket_sql = get_bucket_sql (bucket_size, HOURSTAMP_SQL);
+
+                var where = engine.get_where_clause_for_query (range,
+                    templates, StorageState.ANY);
+                string sql = "SELECT %s AS bucket, COUNT(*) FROM event_view "
+                    .printf (bucket_sql);
+                if (!where.is_empty ())
+                    sql += "WHERE " + where.get_sql_conditions ();
+                sql += " GROUP BY bucket ORDER BY bucket DESC";
+                if (where.get_is_simple ())
+                    sql = sql.replace ("FROM event_view", "FROM event");
+
+                return get_buckets (sql, where.get_bind_arguments ());
+            }
+        }
+
+        private static bool is_interpretation_template (Event template)
+        {
+            if (template.id != 0
+                || !Utils.is_empty_string (template.manifestation)
+                || !Utils.is_empty_string (template.actor)
+                || !Utils.is_empty_string (template.origin)
+                || template.payload != null)
+            {
+                return false;
+            }
+
+            for (int i = 0; i < template.num_subjects (); ++i)
+            {
+                Subject subject = template.subjects[i];
+                if (!Utils.is_empty_string (subject.uri)
+                    || !Utils.is_empty_string (subject.current_uri)
+                    || !Utils.is_empty_string (subject.origin)
+                    || !Utils.is_empty_string (subject.current_origin)
+                    || !Utils.is_empty_string (subject.interpretation)
+                    || !Utils.is_empty_string (subject.manifestation)
+                    || !Utils.is_empty_string (subject.mimetype)
+                    || !Utils.is_empty_string (subject.text)
+                    || !Utils.is_empty_string (subject.storage))
+                {
+                    return false;
+                }
+            }
+
+            return true;
+        }
+
+        /*
+         * Returns an SQL expression giving the start of the bucket which
+         * contains `hourstamp', which is a local time as returned by
+         * HOURSTAMP_SQL. Weeks start on Monday.
+         */
+        private static string get_bucket_sql (uint bucket_size,
+            string hourstamp) throws EngineError
+        {
+            switch (bucket_size)
+            {
+                case HistogramBucketSize.HOUR:
+                    return "(%s)".printf (hourstamp);
+                case HistogramBucketSize.DAY:
+                    return "((%s) / %s * %s)".printf (hourstamp,
+                        DAY.to_string (), DAY.to_string ());
+                case HistogramBucketSize.WEEK:
+                    return """
+                        CAST(strftime('%%s', %s, 'unixepoch', '-6 days',
+                            'weekday 1', 'start of day') AS INTEGER)
+                        """.printf (hourstamp);
+                case HistogramBucketSize.MONTH:
+                    return """
+                        CAST(strftime('%%s', %s, 'unixepoch',
+                            'start of month') AS INTEGER)
+                        """.printf (hourstamp);
+                default:
+                    throw new EngineError.INVALID_ARGUMENT (
+                        "Unknown bucket size '%u'".printf (bucket_size));
+            }
+        }
+
+        private Variant get_buckets (string sql,
+            GenericArray<string>? arguments=null) throws EngineError
         {
             var builder = new VariantBuilder (new VariantType ("a(xu)"));
 
+            int rc;
+            unowned Sqlite.Statement stmt =
+                engine.statement_cache.get_statement (sql);
+            if (arguments != null)
+            {
+                for (int i = 0; i < arguments.length; ++i)
+                    stmt.bind_text (i + 1, arguments[i]);
+            }
+
+            while ((rc = stmt.step ()) == Sqlite.ROW)
+            {
+                int64 t = stmt.column_int64 (0);
+                uint32 count = stmt.column_int (1);
+
+                builder.add ("(xu)", t, count);
+            }
+            stmt.reset ();
+            database.assert_query_success (rc, "Error in histogram query",
+                Sqlite.DONE);
+
+            return builder.end ();
+        }
+
+        public Variant get_interpretation_histogram_data () throws Error
+        {
+            var builder = new VariantBuilder (new VariantType ("a(xsu)"));
+
             string sql = """
-                SELECT strftime('%s', datetime(timestamp/1000, 'unixepoch',
-                'localtime'), 'start of day') AS daystamp,
-                COUNT(*)
-                FROM event
-                GROUP BY daystamp
+                SELECT hourstamp / %s * %s AS daystamp,
+                    COALESCE(interpretation.value, ''), SUM(count)
+                FROM histogram
+                LEFT JOIN interpretation
+                    ON interpretation.id = histogram.interpretation
+                GROUP BY daystamp, histogram.interpretation
                 ORDER BY daystamp DESC
-                """;
+                """.printf (DAY.to_string (), DAY.to_string ());
 
             Sqlite.Statement stmt;
-            var database = engine.database;
-            unowned Sqlite.Database db = database.database;
-
             int rc = db.prepare_v2 (sql, -1, out stmt);
             database.assert_query_success (rc, "SQL error");
 
             while ((rc = stmt.step ()) == Sqlite.ROW)
             {
                 int64 t = stmt.column_int64 (0);
-                uint32 count = stmt.column_int (1);
+                string interpretation = stmt.column_text (1);
+                uint32 count = stmt.column_int (2);
 
-                builder.add ("(xu)", t, count);
+                builder.add ("(xsu)", t, interpretation, count);
             }
-            database.assert_query_success (rc, "Error in get_histogram_data",
-                Sqlite.DONE);
+            database.assert_query_success (rc,
+                "Error in get_interpretation_histogram_data", Sqlite.DONE);
 
             return builder.end ();
         }
@@ -390,6 +390,7 @@ namespace Zeitgeist
                     warning ("Could not add storage medium: %s", e.message);
                 }
             }
+            engine.query_cache.invalidate_storage_state ();
             storage_available (medium_name, StorageMedia.to_variant (
                 medium_name, true, icon, display_name));
         }
@@ -416,6 +417,7 @@ namespace Zeitgeist
                     warning ("Could not remove storage medium: %s", e.message);
                 }
             }
+            engine.query_cache.invalidate_storage_state ();
             storage_unavailable (medium_name);
         }
 
@@ -0,0 +1,252 @@
+/* app-info-cache.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * The metadata of a desktop file, as stored by AppInfoCache.
+     *
+     * Entries are never modified once they are handed out, so they can be
+     * used after the lock protecting the cache has been released.
+     */
+    public class AppInfoCacheEntry : Object
+    {
+        public string filename;
+        public int64 mtime;
+        public string? display_name;
+        public string? generic_name;
+        public string? description;
+        [CCode (array_length = false, array_null_terminated = true)]
+        public string[] categories;
+        [CCode (array_length = false, array_null_terminated = true)]
+        public string[] keywords;
+
+        // Whether the desktop file was checked since the cache was loaded
+        internal bool validated;
+
+        internal AppInfoCacheEntry.from_app_info (DesktopAppInfo app_info,
+            int64 mtime)
+        {
+            filename = app_info.get_filename ();
+            this.mtime = mtime;
+            display_name = app_info.get_display_name ();
+            generic_name = app_info.get_generic_name ();
+            description = app_info.get_description ();
+            keywords = app_info.get_keywords ();
+            if (keywords == null)
+                keywords = new string[0];
+
+            categories = new string[0];
+            unowned string? val = app_info.get_categories ();
+            if (val != null)
+            {
+                foreach (unowned string category in val.split (";"))
+                {
+                    if (category != "")
+                        categories += category;
+                }
+            }
+
+            validated = true;
+        }
+
+        internal AppInfoCacheEntry.from_variant (Variant entry)
+        {
+            filename = entry.get_child_value (0).get_string ();
+            mtime = entry.get_child_value (1).get_int64 ();
+            display_name = get_optional_string (entry, 2);
+            generic_name = get_optional_string (entry, 3);
+            description = get_optional_string (entry, 4);
+            categories = entry.get_child_value (5).dup_strv ();
+            keywords = entry.get_child_value (6).dup_strv ();
+            validated = false;
+        }
+
+        private static string? get_optional_string (Variant entry, int index)
+        {
+            string val = entry.get_child_value (index).get_string ();
+            return val != "" ? val : null;
+        }
+
+        internal Variant to_variant ()
+        {
+            return new Variant.tuple ({
+                new Variant.string (filename),
+                new Variant.int64 (mtime),
+                new Variant.string (display_name ?? ""),
+                new Variant.string (generic_name ?? ""),
+                new Variant.string (description ?? ""),
+                new Variant.strv (categories),
+                new Variant.strv (keywords)
+            });
+        }
+    }
+
+    /**
+     * Cache for the metadata of the desktop files of actors.
+     *
+     * Reading desktop files is slow compared to the rest of the work done
+     * when indexing an event, so the names, categories and keywords of each
+     * application are kept in a file in the data directory, which survives
+     * restarts. Entries are keyed by actor (an application:// URI or the
+     * path of a desktop file) and are checked against the modification time
+     * of their desktop file the first time they are used after being loaded.
+     * Caches created without a path are only kept in memory.
+     *
+     * The cache isn't thread safe; callers sharing it between threads have
+     * to do their own locking.
+     */
+    public class AppInfoCache : Object
+    {
+        public const string BASENAME = "app-info.cache";
+
+        private const uint32 FORMAT_VERSION = 1;
+        private const string SIG_CACHE = "(ua{s(sxsssasas)})";
+
+        private string? path;
+        private HashTable<string, AppInfoCacheEntry> entries;
+        private bool dirty = false;
+
+        public AppInfoCache (string? path)
+        {
+            this.path = path;
+            entries = new HashTable<string, AppInfoCacheEntry> (str_hash,
+                str_equal);
+            load ();
+        }
+
+        /**
+         * Returns the metadata of the desktop file of `actor', reading it
+         * from disk if it isn't cached or if the file has changed since.
+         * Returns null if there is no such desktop file.
+         */
+        public AppInfoCacheEntry? lookup (string actor)
+        {
+            unowned AppInfoCacheEntry? entry = entries.lookup (actor);
+            if (entry != null)
+            {
+                if (entry.validated)
+                    return entry;
+                if (get_mtime (entry.filename) == entry.mtime)
+                {
+                    entry.validated = true;
+                    return entry;
+                }
+            }
+
+            DesktopAppInfo? app_info = null;
+            if (Path.is_absolute (actor))
+                app_info = new DesktopAppInfo.from_filename (actor);
+            else if (actor.has_prefix ("application://"))
+                app_info = new DesktopAppInfo (actor.substring (14));
+
+            if (app_info == null || app_info.get_filename () == null)
+            {
+                if (entry != null)
+                {
+                    entries.remove (actor);
+                    dirty = true;
+                }
+                return null;
+            }
+
+            var new_entry = new AppInfoCacheEntry.from_app_info (app_info,
+                get_mtime (app_info.get_filename ()));
+            entries.insert (actor, new_entry);
+            dirty = true;
+            return new_entry;
+        }
+
+        /**
+         * Writes the cache to disk, if it changed since it was loaded.
+         */
+        public void save () throws Error
+        {
+            if (!dirty || path == null)
+                return;
+
+            var vb = new VariantBuilder (new VariantType ("a{s(sxsssasas)}"));
+            var iter = HashTableIter<string, AppInfoCacheEntry> (entries);
+            unowned string actor;
+            unowned AppInfoCacheEntry entry;
+            while (iter.next (out actor, out entry))
+                vb.add ("{s@(sxsssasas)}", actor, entry.to_variant ());
+
+            var cache = new Variant ("(u@a{s(sxsssasas)})", FORMAT_VERSION,
+                vb.end ());
+            FileUtils.set_data (path, cache.get_data_as_bytes ().get_data ());
+            dirty = false;
+        }
+
+        private void load ()
+        {
+            if (path == null || !FileUtils.test (path, FileTest.EXISTS))
+                return;
+
+            Variant cache;
+            try
+            {
+                var file = new MappedFile (path, false);
+                cache = new Variant.from_bytes (new VariantType (SIG_CACHE),
+                    file.get_bytes (), false);
+            }
+            catch (Error err)
+            {
+                warning ("Unable to read %s: %s", path, err.message);
+                return;
+            }
+
+            if (cache.get_child_value (0).get_uint32 () != FORMAT_VERSION)
+            {
+                debug ("Ignoring %s, it has an unknown format", path);
+                return;
+            }
+
+            var iter = cache.get_child_value (1).iterator ();
+            string actor;
+            Variant entry;
+            while (iter.next ("{s@(sxsssasas)}", out actor, out entry))
+                entries.insert (actor, new AppInfoCacheEntry.from_variant (entry));
+        }
+
+        private static int64 get_mtime (string filename)
+        {
+            try
+            {
+                var info = File.new_for_path (filename).query_info (
+                    FileAttribute.TIME_MODIFIED + "," +
+                    FileAttribute.TIME_MODIFIED_USEC,
+                    FileQueryInfoFlags.NONE);
+                return (int64) info.get_attribute_uint64 (
+                    FileAttribute.TIME_MODIFIED) * TimeSpan.SECOND
+                    + info.get_attribute_uint32 (
+                    FileAttribute.TIME_MODIFIED_USEC);
+            }
+            catch (Error err)
+            {
+                return -1;
+            }
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -45,6 +45,17 @@ public class DbReader : Object
     protected TableLookup mimetypes_table;
     protected TableLookup actors_table;
 
+    // Maximum number of uri, text and storage values kept in memory;
+    // enough for the subjects of a whole chunk of events in get_events
+    private const uint VALUE_CACHE_SIZE = 8192;
+    public ValueCache uris_cache;
+    public ValueCache texts_cache;
+    public ValueCache storages_cache;
+
+    // Maximum number of find_event_ids_for_clause queries kept prepared
+    private const uint STATEMENT_CACHE_SIZE = 32;
+    public StatementCache statement_cache;
+
     public DbReader () throws EngineError
     {
         Object (database: new Zeitgeist.SQLite.Database.read_only ());
@@ -61,6 +72,11 @@ public class DbReader : Object
             manifestations_table = new TableLookup (database, "manifestation");
             mimetypes_table = new TableLookup (database, "mimetype");
             actors_table = new TableLookup (database, "actor");
+            uris_cache = new ValueCache (database, "uri", VALUE_CACHE_SIZE);
+            texts_cache = new ValueCache (database, "text",
+                VALUE_CACHE_SIZE);
+            storages_cache = new ValueCache (database, "storage",
+                VALUE_CACHE_SIZE);
         }
         catch (EngineError err)
         {
@@ -69,6 +85,23 @@ public class DbReader : Object
         }
 
         database.set_cache_size (128);
+        statement_cache = new StatementCache (database, STATEMENT_CACHE_SIZE);
+    }
+
+    // A row of event_retrieval_stmt, whose uri, text and storage IDs
+    // are yet to be resolved (see resolve_values)
+    private struct EventRow
+    {
+        // Only set for the first row of each event
+        public Event? event;
+        public Subject subject;
+        public int origin;
+        public int subj_uri;
+        public int subj_origin;
+        public int subj_current_uri;
+        public int subj_current_origin;
+        public int subj_text;
+        public int subj_storage;
     }
 
     protected Event get_event_from_row (Sqlite.Statement stmt, uint32 event_id)
@@ -76,20 +109,18 @@ public class DbReader : Object
     {
         Event event = new Event ();
         event.id = event_id;
-        event.timestamp = stmt.column_int64 (EventViewRows.TIMESTAMP);
+        event.timestamp = stmt.column_int64 (EventRows.TIMESTAMP);
         event.interpretation = interpretations_table.get_value (
-            stmt.column_int (EventViewRows.INTERPRETATION));
+            stmt.column_int (EventRows.INTERPRETATION));
         event.manifestation = manifestations_table.get_value (
-            stmt.column_int (EventViewRows.MANIFESTATION));
+            stmt.column_int (EventRows.MANIFESTATION));
         event.actor = actors_table.get_value (
-            stmt.column_int (EventViewRows.ACTOR));
-        event.origin = stmt.column_text (
-            EventViewRows.EVENT_ORIGIN_URI);
+            stmt.column_int (EventRows.ACTOR));
 
         // Load payload
         unowned uint8[] data = (uint8[]) stmt.column_blob(
-            EventViewRows.PAYLOAD);
-        data.length = stmt.column_bytes(EventViewRows.PAYLOAD);
+            EventRows.PAYLOAD);
+        data.length = stmt.column_bytes(EventRows.PAYLOAD);
         if (data != null)
         {
             event.payload = new ByteArray();
@@ -102,61 +133,114 @@ public class DbReader : Object
         throws EngineError
     {
         Subject subject = new Subject ();
-        subject.uri = stmt.column_text (EventViewRows.SUBJECT_URI);
-        subject.text = stmt.column_text (EventViewRows.SUBJECT_TEXT);
-        subject.storage = stmt.column_text (EventViewRows.SUBJECT_STORAGE);
-        subject.origin = stmt.column_text (EventViewRows.SUBJECT_ORIGIN_URI);
-        subject.current_uri = stmt.column_text (
-            EventViewRows.SUBJECT_CURRENT_URI);
-        subject.current_origin = stmt.column_text (
-            EventViewRows.SUBJECT_CURRENT_ORIGIN_URI);
         subject.interpretation = interpretations_table.get_value (
-            stmt.column_int (EventViewRows.SUBJECT_INTERPRETATION));
+            stmt.column_int (EventRows.SUBJECT_INTERPRETATION));
         subject.manifestation = manifestations_table.get_value (
-            stmt.column_int (EventViewRows.SUBJECT_MANIFESTATION));
+            stmt.column_int (EventRows.SUBJECT_MANIFESTATION));
         subject.mimetype = mimetypes_table.get_value (
-            stmt.column_int (EventViewRows.SUBJECT_MIMETYPE));
+            stmt.column_int (EventRows.SUBJECT_MIMETYPE));
         return subject;
     }
 
+    /**
+     * Fills in the uri, text and storage values of the events and
+     * subjects of `rows', reading those which aren't cached with one
+     * query per table.
+     */
+    private void resolve_values (EventRow[] rows) throws EngineError
+    {
+        int[] uri_ids = {};
+        int[] text_ids = {};
+        int[] storage_ids = {};
+        foreach (var row in rows)
+        {
+            uri_ids += row.origin;
+            uri_ids += row.subj_uri;
+            uri_ids += row.subj_origin;
+            uri_ids += row.subj_current_uri;
+            uri_ids += row.subj_current_origin;
+            text_ids += row.subj_text;
+            storage_ids += row.subj_storage;
+        }
+        uris_cache.prefetch (uri_ids);
+        texts_cache.prefetch (text_ids);
+        storages_cache.prefetch (storage_ids);
+
+        foreach (var row in rows)
+        {
+            if (row.event != null)
+                row.event.origin = uris_cache.get_value (row.origin);
+            Subject subject = row.subject;
+            subject.uri = uris_cache.get_value (row.subj_uri);
+            subject.origin = uris_cache.get_value (row.subj_origin);
+            subject.current_uri = uris_cache.get_value (
+                row.subj_current_uri);
+            subject.current_origin = uris_cache.get_value (
+                row.subj_current_origin);
+            subject.text = texts_cache.get_value (row.subj_text);
+            subject.storage = storages_cache.get_value (row.subj_storage);
+        }
+    }
+
     public GenericArray<Event?> get_events(uint32[] event_ids,
             BusName? sender=null) throws EngineError
     {
-        // TODO: Consider if we still want the cache. This should be done
-        //  once everything is working, since it adds unneeded complexity.
-        //  It'd also benchmark it again first, we may have better options
-        //  to enhance the performance of SQLite now, and event processing
-        //  will be faster now being C.
-
         if (event_ids.length == 0)
             return new GenericArray<Event?> ();
 
-        var sql_event_ids = database.get_sql_string_from_event_ids (event_ids);
-        string sql = """
-            SELECT * FROM event_view
-            WHERE id IN (%s)
-            """.printf (sql_event_ids);
-
-        Sqlite.Statement stmt;
-        int rc = db.prepare_v2 (sql, -1, out stmt);
-        database.assert_query_success (rc, "SQL error");
-
+        // Skip repeated IDs, so that no event is fetched twice if they
+        // end up in different chunks
         var events = new HashTable<uint32, Event?> (direct_hash, direct_equal);
+        uint32[] unique_ids = {};
+        foreach (var id in event_ids)
+        {
+            if (!events.contains (id))
+            {
+                events.insert (id, null);
+                unique_ids += id;
+            }
+        }
 
-        // Create Events and Subjects from rows
-        while ((rc = stmt.step ()) == Sqlite.ROW)
+        unowned Sqlite.Statement stmt = database.event_retrieval_stmt;
+        for (int start = 0; start < unique_ids.length;
+            start += Database.EVENT_ID_CHUNK_SIZE)
         {
-            uint32 event_id = (uint32) stmt.column_int64 (EventViewRows.ID);
-            Event? event = events.lookup (event_id);
-            if (event == null)
+            database.bind_event_ids_chunk (stmt, unique_ids, start);
+
+            // Create Events and Subjects from rows, leaving the uri, text
+            // and storage values for resolve_values
+            EventRow[] rows = {};
+            int rc;
+            while ((rc = stmt.step ()) == Sqlite.ROW)
             {
-                event = get_event_from_row(stmt, event_id);
-                events.insert (event_id, event);
+                var row = EventRow ();
+                uint32 event_id = (uint32) stmt.column_int64 (EventRows.ID);
+                Event? event = events.lookup (event_id);
+                if (event == null)
+                {
+                    event = get_event_from_row(stmt, event_id);
+                    events.insert (event_id, event);
+                    row.event = event;
+                    row.origin = stmt.column_int (EventRows.EVENT_ORIGIN);
+                }
+                row.subject = get_subject_from_row(stmt);
+                row.subj_uri = stmt.column_int (EventRows.SUBJECT_ID);
+                row.subj_origin = stmt.column_int (EventRows.SUBJECT_ORIGIN);
+                row.subj_current_uri = stmt.column_int (
+                    EventRows.SUBJECT_ID_CURRENT);
+                row.subj_current_origin = stmt.column_int (
+                    EventRows.SUBJECT_CURRENT_ORIGIN);
+                row.subj_text = stmt.column_int (EventRows.SUBJECT_TEXT_ID);
+                row.subj_storage = stmt.column_int (
+                    EventRows.SUBJECT_STORAGE_ID);
+                event.add_subject(row.subject);
+                rows += row;
             }
-            Subject subject = get_subject_from_row(stmt);
-            event.add_subject(subject);
+            database.assert_query_success (rc, "Error", Sqlite.DONE);
+            stmt.reset ();
+
+            resolve_values (rows);
         }
-        database.assert_query_success (rc, "Error", Sqlite.DONE);
 
         // Sort events according to the sequence of event_ids
         var results = new GenericArray<Event?> ();
@@ -301,10 +385,7 @@ public class DbReader : Object
             sql = sql.replace ("FROM event_view", "FROM event");
 
         int rc;
-        Sqlite.Statement stmt;
-
-        rc = db.prepare_v2 (sql, -1, out stmt);
-        database.assert_query_success(rc, "SQL error");
+        unowned Sqlite.Statement stmt = statement_cache.get_statement (sql);
 
         var arguments = where.get_bind_arguments ();
         for (int i = 0; i < arguments.length; ++i)
@@ -326,6 +407,7 @@ public class DbReader : Object
                 if (event_ids.length == max_events) break;
             }
         }
+        stmt.reset ();
         if (rc != Sqlite.DONE && rc != Sqlite.ROW)
         {
             string error_message = "Error in find_event_ids: %d, %s".printf (
@@ -338,7 +420,7 @@ public class DbReader : Object
         return event_ids;
     }
 
-    public uint32[] find_event_ids (TimeRange time_range,
+    public virtual uint32[] find_event_ids (TimeRange time_range,
         GenericArray<Event> event_templates,
         uint storage_state, uint max_events, uint result_type,
         BusName? sender=null) throws EngineError
@@ -366,12 +448,12 @@ public class DbReader : Object
     {
         WhereClause where = new WhereClause (WhereClause.Type.AND);
 
+        // The time range is passed as arguments, so that queries which
+        // only differ in it share the same SQL (see statement_cache)
         if (time_range.start != 0)
-            where.add (("timestamp >= %" + int64.FORMAT).printf(
-                time_range.start));
+            where.add ("timestamp >= ?", time_range.start.to_string ());
         if (time_range.end != 0)
-            where.add (("timestamp <= %" + int64.FORMAT).printf(
-                time_range.end));
+            where.add ("timestamp <= ?", time_range.end.to_string ());
 
         if (storage_state == StorageState.AVAILABLE ||
             storage_state == StorageState.NOT_AVAILABLE)
@@ -439,45 +521,66 @@ public class DbReader : Object
             // From here we create several graphs with the maximum depth of 2
             // and push all the nodes and vertices (events) in one pot together
 
-            uint32[] pot = new uint32[ids.length + result_ids.length];
+            // Skip IDs present in both lists, so that each event is
+            // only fetched once
+            var pot_ids = new HashTable<uint32, bool> (direct_hash,
+                direct_equal);
+            uint32[] pot = {};
 
-            for (uint32 i=0; i < ids.length; i++)
-                pot[i] = ids[i];
-            for (uint32 i=0; i < result_ids.length; i++)
-                pot[ids.length + i] = result_ids[ids.length + i];
+            foreach (var id in ids)
+            {
+                pot_ids.insert (id, true);
+                pot += id;
+            }
+            foreach (var id in result_ids)
+            {
+                if (!pot_ids.contains (id))
+                    pot += id;
+            }
 
-            Sqlite.Statement stmt;
+            unowned Sqlite.Statement stmt =
+                database.related_uris_retrieval_stmt;
 
-            var sql_event_ids = database.get_sql_string_from_event_ids (pot);
-            string sql = """
-               SELECT id, timestamp, subj_uri FROM event_view 
-               WHERE id IN (%s) ORDER BY timestamp ASC
-               """.printf (sql_event_ids);
+            var rows = new List<RelatedUri?> ();
 
-            int rc = db.prepare_v2 (sql, -1, out stmt);
+            for (int start = 0; start < pot.length;
+                start += Database.EVENT_ID_CHUNK_SIZE)
+            {
+                database.bind_event_ids_chunk (stmt, pot, start);
 
-            database.assert_query_success(rc, "SQL error");
+                int rc;
+                while ((rc = stmt.step()) == Sqlite.ROW)
+                {
+                    RelatedUri ruri = RelatedUri(){
+                        id = (uint32) stmt.column_int64 (0),
+                        timestamp = stmt.column_int64 (1),
+                        uri = stmt.column_text (2),
+                        counter = 0
+                    };
+                    rows.append (ruri);
+                }
+
+                database.assert_query_success (rc,
+                    "Error in find_related_uris", Sqlite.DONE);
+            }
+            stmt.reset ();
+
+            // The rows are fetched in chunks, so sort them by timestamp,
+            // and by ID for events with the same timestamp. The sort is
+            // stable, so the subjects of an event keep their order.
+            rows.sort ((a, b) => {
+                int64 delta = a.timestamp - b.timestamp;
+                if (delta < 0) return -1;
+                else if (delta > 0) return 1;
+                else if (a.id < b.id) return -1;
+                else if (a.id > b.id) return 1;
+                else return 0;
+            });
 
             // FIXME: fix this ugly code
             var temp_related_uris = new GenericArray<RelatedUri?>();
-
-            while ((rc = stmt.step()) == Sqlite.ROW)
-            {
-                RelatedUri ruri = RelatedUri(){
-                    id = (uint32) uint64.parse(stmt.column_text (0)),
-                    timestamp = stmt.column_int64 (1),
-                    uri = stmt.column_text (2),
-                    counter = 0
-                };
+            foreach (var ruri in rows)
                 temp_related_uris.add (ruri);
-            }
-
-            // RelatedUri[] related_uris = new RelatedUri[temp_related_uris.length];
-            // for (int i=0; i<related_uris.length; i++)
-            //    related_uris[i] = temp_related_uris[i];
-
-            database.assert_query_success (rc, "Error in find_related_uris",
-                Sqlite.DONE);
 
             var uri_counter = new HashTable<string, RelatedUri?>(
                 str_hash, str_equal);
@@ -590,6 +693,7 @@ public class DbReader : Object
      */
     public virtual void close ()
     {
+        statement_cache.clear ();
         database.close ();
     }
 
@@ -935,6 +1039,22 @@ public class DbReader : Object
     private void delete_from_cache (string table, int64 rowid)
     {
         TableLookup table_lookup;
+        ValueCache? value_cache;
+
+        if (table == "uri")
+            value_cache = uris_cache;
+        else if (table == "text")
+            value_cache = texts_cache;
+        else if (table == "storage")
+            value_cache = storages_cache;
+        else
+            value_cache = null;
+
+        if (value_cache != null)
+        {
+            value_cache.remove ((int) rowid);
+            return;
+        }
 
         if (table == "interpretation")
             table_lookup = interpretations_table;
@@ -116,32 +116,80 @@ public class Event : Object
 
     private static StringChunk url_store;
 
-    public uint32  id { get; set; }
-    public int64   timestamp { get; set; }
-    public string? origin { get; set; }
+    // The setters drop the serialized form of the event (see to_variant).
+    // This isn't done from a notify handler, since overriding notify ()
+    // makes GObject emit the signal for every property set.
+    public uint32 id
+    {
+        get { return _id; }
+        set { _id = value; variant_cache = null; }
+    }
+    public int64 timestamp
+    {
+        get { return _timestamp; }
+        set { _timestamp = value; variant_cache = null; }
+    }
+    public string? origin
+    {
+        get { return _origin; }
+        set { _origin = value; variant_cache = null; }
+    }
 
     public string? actor
     {
         get { return _actor; }
-        set { _actor = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _actor = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
     public string? interpretation
     {
         get { return _interpretation; }
-        set { _interpretation = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _interpretation = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
     public string? manifestation
     {
         get { return _manifestation; }
-        set { _manifestation = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _manifestation = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
 
+    private uint32 _id;
+    private int64 _timestamp;
+    private string? _origin;
     private unowned string? _actor;
     private unowned string? _interpretation;
     private unowned string? _manifestation;
 
-    public GenericArray<Subject> subjects { get; set; }
-    public ByteArray? payload { get; set; }
+    public GenericArray<Subject> subjects
+    {
+        get { return _subjects; }
+        set { _subjects = value; variant_cache = null; }
+    }
+    public ByteArray? payload
+    {
+        get { return _payload; }
+        set { _payload = value; variant_cache = null; }
+    }
+
+    private GenericArray<Subject> _subjects;
+    private ByteArray? _payload;
+
+    // Serialized form of the event, built by to_variant () and dropped
+    // by the property setters. The subject variants and payload size it
+    // was built from are kept to detect changes to those.
+    private Variant? variant_cache = null;
+    private Variant[] variant_cache_subjects;
+    private uint variant_cache_payload_len;
 
     static construct
     {
@@ -260,8 +308,37 @@ public class Event : Object
         }
     }
 
+    private bool is_variant_cache_valid ()
+    {
+        if (variant_cache == null
+            || variant_cache_subjects.length != subjects.length
+            || variant_cache_payload_len != (payload != null ? payload.len : 0))
+        {
+            return false;
+        }
+
+        // Subjects hand out the same variant until they are modified
+        for (int i = 0; i < subjects.length; ++i)
+        {
+            if (subjects[i].to_variant () != variant_cache_subjects[i])
+                return false;
+        }
+        return true;
+    }
+
+    /**
+     * Serializes the event. The result is cached and shared by all
+     * callers (eg. every monitor notified about the event) until the
+     * event or one of its subjects is modified.
+     *
+     * The payload is only checked for changes in size, so replace it
+     * instead of modifying its contents in place.
+     */
     public Variant to_variant ()
     {
+        if (is_variant_cache_valid ())
+            return variant_cache;
+
         var vb = new VariantBuilder (new VariantType ("("+Utils.SIG_EVENT+")"));
 
         vb.open (new VariantType ("as"));
@@ -273,9 +350,11 @@ public class Event : Object
         vb.add ("s", origin != null ? origin : "");
         vb.close ();
 
+        var subject_variants = new Variant[subjects.length];
         vb.open (new VariantType ("aas"));
         for (int i = 0; i < subjects.length; ++i) {
-            vb.add_value (subjects[i].to_variant ());
+            subject_variants[i] = subjects[i].to_variant ();
+            vb.add_value (subject_variants[i]);
         }
         vb.close ();
 
@@ -293,6 +372,10 @@ public class Event : Object
 
         Variant event_variant = vb.end ().get_normal_form ();
         //Variant ret = optimize_variant_allocation (event_variant);
+
+        variant_cache = event_variant;
+        variant_cache_subjects = (owned) subject_variants;
+        variant_cache_payload_len = (payload != null) ? payload.len : 0;
         return event_variant;
     }
 
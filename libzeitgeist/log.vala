@@ -59,18 +59,51 @@ namespace Zeitgeist
  */
 public class Log : QueuedProxyWrapper
 {
+    delegate void ReadFunc (DbReader reader) throws EngineError;
+
     class DbWorker
     {
-        private unowned ThreadFunc<void*> func;
+        private AsyncQueue<DbReader> readers;
+        private ReadFunc func;
+        private SourceFunc callback;
+        public EngineError? error = null;
 
-        public DbWorker (ThreadFunc<void*> func)
+        public DbWorker (AsyncQueue<DbReader> readers, owned ReadFunc func,
+            owned SourceFunc callback)
         {
-            this.func = func;
+            this.readers = readers;
+            this.func = (owned) func;
+            this.callback = (owned) callback;
         }
 
         public void run ()
         {
-            this.func ();
+            // There are as many readers as threads, so this never blocks
+            DbReader reader = readers.pop ();
+
+            // Run everything in a single read transaction, so that all
+            // statements see the same snapshot of the database
+            try
+            {
+                reader.database.begin_transaction ();
+                this.func (reader);
+                reader.database.end_transaction ();
+            }
+            catch (EngineError err)
+            {
+                error = err;
+                try
+                {
+                    reader.database.abort_transaction ();
+                }
+                catch (EngineError err2)
+                {
+                    // There was no transaction to roll back
+                }
+            }
+
+            readers.push (reader);
+            Idle.add ((owned) callback);
         }
     }
 
@@ -79,7 +112,7 @@ public class Log : QueuedProxyWrapper
     private RemoteLog proxy;
     private Variant? engine_version;
     private HashTable<Monitor, uint> monitors;
-    private DbReader dbreader;
+    private AsyncQueue<DbReader>? readers;
     private ThreadPool<DbWorker> threads;
     private bool allow_direct_read;
 
@@ -139,30 +172,32 @@ public class Log : QueuedProxyWrapper
         engine_version = proxy.version;
         warn_if_fail (engine_version.get_type_string () == "(iii)");
 
+        uint num_readers = Utils.get_log_direct_read_connections ();
         try {
             threads = new ThreadPool<DbWorker>.with_owned_data ((worker) => {
                 worker.run ();
-            }, (int) get_num_processors (), true);
+            }, (int) num_readers, true);
         } catch (ThreadError err) {
             warning ("%s", err.message);
             threads = null;
         }
 
+        readers = null;
         if (allow_direct_read && threads != null &&
             proxy.datapath != ":memory:" &&
             FileUtils.test (proxy.datapath, GLib.FileTest.EXISTS)) {
             Utils.set_database_file_path (proxy.datapath);
             try {
-                dbreader = new DbReader ();
+                var pool = new AsyncQueue<DbReader> ();
+                for (uint i = 0; i < num_readers; i++)
+                    pool.push (new DbReader ());
+                readers = pool;
             } catch (EngineError err){
+                // Like when the schema version doesn't match ours; the
+                // queries go through D-Bus then
                 warning ("%s", err.message);
-                dbreader = null;
             }
         }
-        else
-        {
-            dbreader = null;
-        }
     }
 
     protected override void on_connection_lost ()
@@ -173,7 +208,24 @@ public class Log : QueuedProxyWrapper
             monitors.replace (monitor, 0);
         }
 
-        dbreader = null;
+        readers = null;
+    }
+
+    /**
+     * Runs `func' on one of the readers, in a worker thread.
+     *
+     * Up to get_log_direct_read_connections() queries run concurrently,
+     * each on its own connection.
+     */
+    private async void read_directly (owned ReadFunc func) throws EngineError
+    {
+        var worker = new DbWorker (readers, (owned) func,
+            read_directly.callback);
+        threads.add (worker);
+        yield;
+
+        if (worker.error != null)
+            throw worker.error;
     }
 
     /**
@@ -285,28 +337,13 @@ public class Log : QueuedProxyWrapper
         for (int i = 0; i < event_templates.length; i++)
             event_templates_cp.add (event_templates.get (i));
     
-        if (dbreader != null) {
-            SimpleResultSet result_set = null;
-            EngineError error = null;
-            ThreadFunc<void*> run = () => {
-                try {
-                    var result = dbreader.find_events (time_range, event_templates_cp,
-                        storage_state, num_events, result_type);
-                    result_set = new SimpleResultSet (result);
-                } catch (EngineError err) {
-                    error = err;
-                } finally {
-                    Idle.add (find_events.callback);
-                }
-                return null;
-            };
-
-            threads.add (new DbWorker (run));
-            yield;
-
-            if (error != null)
-                throw error;
-            return result_set;
+        if (readers != null) {
+            GenericArray<Event?> result = null;
+            yield read_directly ((reader) => {
+                result = reader.find_events (time_range, event_templates_cp,
+                    storage_state, num_events, result_type);
+            });
+            return new SimpleResultSet (result);
         }
 
         yield wait_for_proxy ();
@@ -316,6 +353,50 @@ public class Log : QueuedProxyWrapper
         return new SimpleResultSet (Events.from_variant (result));
     }
 
+    /**
+    * Send a query matching a collection of {@link Event} templates to the {@link Log},
+    * fetching the resulting events in pages.
+    *
+    * Unlike {@link find_events}, the result isn't limited by the maximum size
+    * of a DBus message: only the first page of events is returned, and the
+    * following ones are fetched on demand with {@link PagedResultSet.next_page}.
+    * Pages may hold fewer than page_size events if they would otherwise exceed
+    * the DBus size limit. Events deleted after the query was run are skipped.
+    *
+    * In order to use this method there needs to be a mainloop runnning.
+    *
+    * @param time_range {@link TimeRange} A time range in which the events should be considered in
+    * @param storage_state {@link StorageState} storage state
+    * @param event_templates An {@link GLib.GenericArray} of {@link Event}
+    * @param num_events int representing the total number of events that should be returned, or 0 for all of them
+    * @param result_type {@link ResultType} how the events should be grouped and sorted
+    * @param page_size the maximum number of events in each page, or 0 for the default
+    * @param cancellable a {@link GLib.Cancellable} to cancel the operation or %NULL
+    */
+    public async PagedResultSet find_events_paged (
+        TimeRange time_range,
+        GenericArray<Event> event_templates,
+        StorageState storage_state,
+        uint32 num_events,
+        ResultType result_type,
+        uint page_size=0,
+        Cancellable? cancellable=null) throws Error
+    {
+        var event_templates_cp = new GenericArray<Event> ();
+        for (int i = 0; i < event_templates.length; i++)
+            event_templates_cp.add (event_templates.get (i));
+
+        yield wait_for_proxy ();
+        string continuation_token;
+        uint num_matches;
+        var result = yield proxy.find_events_paged (time_range.to_variant (),
+            Events.to_variant (event_templates_cp), storage_state,
+            num_events, result_type, page_size, out continuation_token,
+            out num_matches, cancellable);
+        return new PagedResultSet (proxy, Events.from_variant (result),
+            continuation_token, num_matches, page_size);
+    }
+
     /**
     * Send a query matching a collection of {@link Event} templates to the {@link Log}.
     * The query will match if an event matches any of the templates. If an event
@@ -349,26 +430,12 @@ public class Log : QueuedProxyWrapper
         for (int i = 0; i < event_templates.length; i++)
             event_templates_cp.add(event_templates.get (i));
 
-        if (dbreader != null) {
+        if (readers != null) {
             uint32[] ids = null;
-            EngineError error = null;
-            ThreadFunc<void*> run = () => {
-                try {
-                    ids = dbreader.find_event_ids (time_range, event_templates_cp,
-                        storage_state, num_events, result_type);
-                } catch (EngineError err) {
-                    error = err;
-                } finally {
-                    Idle.add (find_event_ids.callback);
-                }
-                return null;
-            };
-
-            threads.add (new DbWorker (run));
-            yield;
-
-            if (error != null)
-                throw error;
+            yield read_directly ((reader) => {
+                ids = reader.find_event_ids (time_range, event_templates_cp,
+                    storage_state, num_events, result_type);
+            });
             return ids;
         }
 
@@ -402,28 +469,13 @@ public class Log : QueuedProxyWrapper
         for (int i = 0; i < event_ids.length; i++)
             simple_event_ids[i] = event_ids.index (i);
 
-        if (dbreader != null)
+        if (readers != null)
         {
-            SimpleResultSet result_set = null;
-            EngineError error = null;
-            ThreadFunc<void*> run = () => {
-                try {
-                    var result = dbreader.get_events (simple_event_ids);
-                    result_set = new SimpleResultSet (result);
-                } catch (EngineError err) {
-                    error = err;
-                } finally {
-                    Idle.add (get_events.callback);
-                }
-                return null;
-            };
-
-            threads.add (new DbWorker (run));
-            yield;
-
-            if (error != null)
-                throw error;
-            return result_set;
+            GenericArray<Event?> result = null;
+            yield read_directly ((reader) => {
+                result = reader.get_events (simple_event_ids);
+            });
+            return new SimpleResultSet (result);
         }
 
         yield wait_for_proxy ();
@@ -461,26 +513,12 @@ public class Log : QueuedProxyWrapper
         for (int i = 0; i < result_event_templates.length; i++)
             results_cp.add (result_event_templates.get (i));
 
-        if (dbreader != null) {
+        if (readers != null) {
             string[] uris = null;
-            EngineError error = null;
-            ThreadFunc<void*> run = () => {
-                try {
-                    uris = dbreader.find_related_uris (time_range, events_cp,
+            yield read_directly ((reader) => {
+                uris = reader.find_related_uris (time_range, events_cp,
                     results_cp, storage_state, num_events, result_type);
-                } catch (EngineError err) {
-                    error = err;
-                } finally {
-                    Idle.add (find_related_uris.callback);
-                }
-                return null;
-            };
-
-            threads.add (new DbWorker (run));
-            yield;
-            
-            if (error != null)
-                throw error;
+            });
             return uris;
         }
 
@@ -562,10 +600,21 @@ public class Log : QueuedProxyWrapper
             }
         }
 
-        proxy.install_monitor.begin (
-            monitor.get_path (),
-            monitor.time_range.to_variant (),
-            Events.to_variant (monitor.get_templates ()));
+        if (monitor.max_latency > 0)
+        {
+            proxy.install_monitor_with_latency.begin (
+                monitor.get_path (),
+                monitor.time_range.to_variant (),
+                Events.to_variant (monitor.get_templates ()),
+                monitor.max_latency);
+        }
+        else
+        {
+            proxy.install_monitor.begin (
+                monitor.get_path (),
+                monitor.time_range.to_variant (),
+                Events.to_variant (monitor.get_templates ()));
+        }
     }
 
     /**
@@ -42,6 +42,19 @@ public class Monitor : Object, RemoteMonitor
     public TimeRange time_range {get; construct set;}
     public GenericArray<Event> event_templates {get; construct set;}
 
+    /**
+     * Maximum time, in milliseconds, the daemon may hold back notifications
+     * for this monitor in order to merge them.
+     *
+     * With the default of 0 every insertion and deletion is notified
+     * separately and immediately. Otherwise, consecutive insertions (or
+     * deletions) within this window are delivered in a single
+     * ::events-inserted (or ::events-deleted) emission covering the merged
+     * time range. This saves wakeups during bursts of activity, like
+     * imports. Set it before installing the monitor.
+     */
+    public uint max_latency {get; set; default = 0;}
+
     // Client side D-Bus path the monitor lives under
     private ObjectPath monitor_path;
 
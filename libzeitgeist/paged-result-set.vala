@@ -0,0 +1,149 @@
+/* paged-result-set.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+/**
+ * Result set for queries whose events are fetched in pages
+ *
+ * include: zeitgeist.h
+ *
+ * Returned by zeitgeist_log_find_events_paged(). Only one page of events
+ * is held at a time; the #ZeitgeistResultSet methods iterate over the
+ * events of the current page, and zeitgeist_paged_result_set_next_page()
+ * replaces it with the following one.
+ *
+ * Result sets which are dropped before all pages have been fetched should
+ * be closed with zeitgeist_paged_result_set_close(), so the daemon can free
+ * the query early.
+ */
+public class PagedResultSet : Object, ResultSet
+{
+
+    private RemoteLog proxy;
+    private GenericArray<Event> events;
+    private string continuation_token;
+    private uint page_size;
+    private uint num_matches;
+    private uint cursor;
+
+    internal PagedResultSet (RemoteLog proxy, GenericArray<Event> events,
+        string continuation_token, uint num_matches, uint page_size)
+    {
+        this.proxy = proxy;
+        this.events = events;
+        this.continuation_token = continuation_token;
+        this.num_matches = num_matches;
+        this.page_size = page_size;
+        cursor = 0;
+    }
+
+    /**
+     * Get the number of events in the current page.
+     */
+    public uint size ()
+    {
+        return events.length;
+    }
+
+    /**
+     * Get the total number of events matched by the query, across all
+     * pages.
+     */
+    public uint estimated_matches ()
+    {
+        return num_matches;
+    }
+
+    public uint tell ()
+    {
+        return cursor;
+    }
+
+    public bool has_next ()
+    {
+        return cursor < events.length;
+    }
+
+    public Event? next_value ()
+    {
+        if (!has_next ())
+            return null;
+        return events.get (cursor++);
+    }
+
+    public void reset ()
+    {
+        cursor = 0;
+    }
+
+    /**
+     * Check if there are more pages to fetch with
+     * zeitgeist_paged_result_set_next_page().
+     *
+     * @return TRUE if the current page isn't the last one
+     */
+    public bool has_next_page ()
+    {
+        return continuation_token != "";
+    }
+
+    /**
+     * Fetch the next page of events, replacing the current one and
+     * resetting the cursor.
+     *
+     * @param cancellable a {@link GLib.Cancellable} to cancel the operation or %NULL
+     * @return FALSE if there were no more pages
+     */
+    public async bool next_page (Cancellable? cancellable=null) throws Error
+    {
+        if (!has_next_page ())
+            return false;
+
+        string next_token;
+        var result = yield proxy.get_events_page (continuation_token,
+            page_size, out next_token, cancellable);
+        events = Events.from_variant (result);
+        continuation_token = next_token;
+        cursor = 0;
+        return true;
+    }
+
+    /**
+     * Release the query on the daemon side without fetching the remaining
+     * pages. The result set can't fetch further pages afterwards.
+     *
+     * @param cancellable a {@link GLib.Cancellable} to cancel the operation or %NULL
+     */
+    public async void close (Cancellable? cancellable=null) throws Error
+    {
+        if (!has_next_page ())
+            return;
+
+        var token = continuation_token;
+        continuation_token = "";
+        yield proxy.close_events_page (token, cancellable);
+    }
+
+}
+
+}
+
+// vim:expandtab:ts=4:sw=4
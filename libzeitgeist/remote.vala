@@ -69,6 +69,28 @@ namespace Zeitgeist
             Cancellable? cancellable=null, BusName? sender=null
         ) throws Error;
 
+        [DBus (signature = "a(asaasay)")]
+        public async abstract Variant find_events_paged (
+            [DBus (signature = "(xx)")] Variant time_range,
+            [DBus (signature = "a(asaasay)")] Variant event_templates,
+            uint storage_state, uint num_events, uint result_type,
+            uint page_size, out string continuation_token,
+            out uint num_matches,
+            Cancellable? cancellable=null, BusName? sender=null
+        ) throws Error;
+
+        [DBus (signature = "a(asaasay)")]
+        public async abstract Variant get_events_page (
+            string continuation_token, uint page_size,
+            out string next_token,
+            Cancellable? cancellable=null, BusName? sender=null
+        ) throws Error;
+
+        public async abstract void close_events_page (
+            string continuation_token,
+            Cancellable? cancellable=null, BusName? sender=null
+        ) throws Error;
+
         public async abstract string[] find_related_uris (
             [DBus (signature = "(xx)")] Variant time_range,
             [DBus (signature = "a(asaasay)")] Variant event_templates,
@@ -90,6 +112,31 @@ namespace Zeitgeist
             BusName? sender=null
         ) throws Error;
 
+        /**
+         * Starts a bulk import, which drops the secondary indices of the
+         * event table until EndImport (or until the importer has been idle
+         * for five minutes), slowing down the queries of all clients.
+         *
+         * Only processes running as the same user as the daemon may call
+         * it. On a private session bus that is every client, which is
+         * deliberate: imports are done by the user's own tools.
+         */
+        public async abstract void begin_import (
+            Cancellable? cancellable=null,
+            BusName? sender=null
+        ) throws Error;
+
+        public async abstract uint32[] import_events (
+            [DBus (signature = "a(asaasay)")] Variant events,
+            Cancellable? cancellable=null,
+            BusName? sender=null
+        ) throws Error;
+
+        public async abstract uint end_import (
+            Cancellable? cancellable=null,
+            BusName? sender=null
+        ) throws Error;
+
         public async abstract void install_monitor (
             ObjectPath monitor_path,
             [DBus (signature = "(xx)")] Variant time_range,
@@ -97,6 +144,14 @@ namespace Zeitgeist
             BusName? owner=null
         ) throws Error;
 
+        public async abstract void install_monitor_with_latency (
+            ObjectPath monitor_path,
+            [DBus (signature = "(xx)")] Variant time_range,
+            [DBus (signature = "a(asaasay)")] Variant event_templates,
+            uint max_latency,
+            BusName? owner=null
+        ) throws Error;
+
         public async abstract void remove_monitor (
             ObjectPath monitor_path,
             BusName? owner=null
@@ -151,6 +206,8 @@ namespace Zeitgeist
             [DBus (signature = "a(asaasay)")] out Variant events,
             out double[] relevancies, out uint matches,
             Cancellable? cancellable=null) throws Error;
+        public abstract async HashTable<string, Variant> get_statistics (
+            Cancellable? cancellable=null) throws Error;
     }
 
     /* FIXME: Remove this! Only here because of a bug
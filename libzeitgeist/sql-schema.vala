@@ -37,7 +37,7 @@ namespace Zeitgeist.SQLite
     {
 
         public const string CORE_SCHEMA = "core";
-        public const int CORE_SCHEMA_VERSION = 10;
+        public const int CORE_SCHEMA_VERSION = 11;
 
         private const string DATABASE_CREATION = "database_creation";
 
@@ -176,6 +176,23 @@ namespace Zeitgeist.SQLite
                 message ("Upgraded database to schema version %d.",
                     CORE_SCHEMA_VERSION);
             }
+            else if (schema_version == 10)
+            {
+                // Version 11 added subj_id to the actor and mimetype
+                // indices, so grouping their events by subject doesn't
+                // need to read the table (see
+                // tools/development/query_plans/)
+                exec_query (database, "BEGIN");
+                exec_query (database, "DROP INDEX IF EXISTS event_actor");
+                exec_query (database,
+                    "DROP INDEX IF EXISTS event_subj_mimetype");
+                create_event_indices (database);
+                set_schema_version (database, CORE_SCHEMA_VERSION);
+                exec_query (database, "COMMIT");
+                exec_query (database, "ANALYZE");
+                message ("Upgraded database to schema version %d.",
+                    CORE_SCHEMA_VERSION);
+            }
             else if (schema_version < CORE_SCHEMA_VERSION)
             {
                 throw new EngineError.DATABASE_ERROR (
@@ -565,7 +582,7 @@ namespace Zeitgeist.SQLite
                 """);
             exec_query (database, """
                 CREATE INDEX IF NOT EXISTS event_actor
-                    ON event(actor, timestamp, id)
+                    ON event(actor, timestamp, subj_id, id)
                 """);
             exec_query (database, """
                 CREATE INDEX IF NOT EXISTS event_origin
@@ -597,7 +614,7 @@ namespace Zeitgeist.SQLite
                 """);
             exec_query (database, """
                 CREATE INDEX IF NOT EXISTS event_subj_mimetype
-                    ON event(subj_mimetype, timestamp, id)
+                    ON event(subj_mimetype, timestamp, subj_id, id)
                 """);
             exec_query (database, """
                 CREATE INDEX IF NOT EXISTS event_subj_text
@@ -639,7 +656,7 @@ namespace Zeitgeist.SQLite
             exec_query (database, "DROP INDEX IF EXISTS event_subj_interpretation");
             exec_query (database, "DROP INDEX IF EXISTS event_subj_manifestation");
             exec_query (database, "DROP INDEX IF EXISTS event_subj_origin");
-            exec_query (database, "DROP INDEX IF EXISTS event_subj_current");
+            exec_query (database, "DROP INDEX IF EXISTS event_subj_origin_current");
             exec_query (database, "DROP INDEX IF EXISTS event_subj_mimetype");
             exec_query (database, "DROP INDEX IF EXISTS event_subj_text");
             exec_query (database, "DROP INDEX IF EXISTS event_subj_storage");
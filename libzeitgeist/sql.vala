@@ -56,6 +56,29 @@ namespace Zeitgeist.SQLite
         SUBJECT_CURRENT_ORIGIN_URI
     }
 
+    /**
+     * Columns of Database.event_retrieval_stmt.
+     */
+    public enum EventRows
+    {
+        ID,
+        TIMESTAMP,
+        INTERPRETATION,
+        MANIFESTATION,
+        ACTOR,
+        PAYLOAD,
+        SUBJECT_ID,
+        SUBJECT_INTERPRETATION,
+        SUBJECT_MANIFESTATION,
+        SUBJECT_ORIGIN,
+        SUBJECT_MIMETYPE,
+        SUBJECT_TEXT_ID,
+        SUBJECT_STORAGE_ID,
+        EVENT_ORIGIN,
+        SUBJECT_ID_CURRENT,
+        SUBJECT_CURRENT_ORIGIN
+    }
+
     public delegate void DeletionCallback (string table, int64 rowid);
 
     public class Database : Object
@@ -65,9 +88,22 @@ namespace Zeitgeist.SQLite
 
         public Sqlite.Statement event_insertion_stmt;
         public Sqlite.Statement id_retrieval_stmt;
+        public Sqlite.Statement event_retrieval_stmt;
+        public Sqlite.Statement related_uris_retrieval_stmt;
         public Sqlite.Statement move_handling_stmt;
         public Sqlite.Statement payload_insertion_stmt;
 
+        // Number of parameters bound for each row of event_insertion_stmt
+        public const int EVENT_INSERTION_COLUMNS = 16;
+        // SQLite refuses statements with more than 999 parameters
+        public const int EVENT_BATCH_MAX_ROWS = 999 / EVENT_INSERTION_COLUMNS;
+
+        private Sqlite.Statement?[] event_batch_insertion_stmts;
+
+        // Number of event IDs looked up at once by the statements
+        // taking a list of IDs (see bind_event_ids_chunk)
+        public const int EVENT_ID_CHUNK_SIZE = 256;
+
         // The DB should be accessible from engine for statement preperations
         //  as well as allowing extensions to add tables to it.
         public Sqlite.Database database;
@@ -117,11 +153,15 @@ namespace Zeitgeist.SQLite
                     // until we try to operate on the database.
                     if (is_read_only)
                     {
+                        // Readers can't upgrade the schema, nor know
+                        // about newer ones
                         int ver = DatabaseSchema.get_schema_version (database);
-                        if (ver < DatabaseSchema.CORE_SCHEMA_VERSION)
+                        if (ver != DatabaseSchema.CORE_SCHEMA_VERSION)
                         {
                             throw new EngineError.DATABASE_CANTOPEN (
-                                "Unable to open database: old schema version");
+                                "Unable to open database: schema version " +
+                                "%d, expected %d".printf (ver,
+                                    DatabaseSchema.CORE_SCHEMA_VERSION));
                         }
                     }
                     else
@@ -226,6 +266,41 @@ namespace Zeitgeist.SQLite
             return sql_condition.str;
         }
 
+        /**
+         * Returns a comma-separated list of EVENT_ID_CHUNK_SIZE
+         * placeholders, suitable for preparing a query like
+         * "WHERE id IN (...)" which is then run using bind_event_ids_chunk.
+         */
+        public static string get_event_id_placeholders ()
+        {
+            var placeholders = new StringBuilder ("?");
+            for (int i = 1; i < EVENT_ID_CHUNK_SIZE; ++i)
+                placeholders.append (", ?");
+            return placeholders.str;
+        }
+
+        /**
+         * Resets `stmt' and binds to it the event IDs starting at position
+         * `start' of `event_ids', up to EVENT_ID_CHUNK_SIZE of them. If
+         * there are fewer IDs left, the remaining placeholders are set to
+         * NULL, which doesn't match any event.
+         *
+         * This way a single prepared statement can be reused for any
+         * number of IDs, by stepping it once for each chunk.
+         */
+        public void bind_event_ids_chunk (Sqlite.Statement stmt,
+            uint32[] event_ids, int start)
+            requires (start >= 0 && start < event_ids.length)
+        {
+            stmt.reset ();
+            int end = int.min (start + EVENT_ID_CHUNK_SIZE, event_ids.length);
+            int position = 1;
+            for (int i = start; i < end; ++i)
+                stmt.bind_int64 (position++, event_ids[i]);
+            while (position <= EVENT_ID_CHUNK_SIZE)
+                stmt.bind_null (position++);
+        }
+
         public TimeRange? get_time_range_for_event_ids (uint32[] event_ids)
             throws EngineError
         {
@@ -299,8 +374,27 @@ namespace Zeitgeist.SQLite
             assert_query_success (rc, "Can't rollback transaction");
         }
 
+        public void set_savepoint (string name) throws EngineError
+        {
+            int rc = database.exec ("SAVEPOINT " + name);
+            assert_query_success (rc, "Can't set savepoint");
+        }
+
+        public void release_savepoint (string name) throws EngineError
+        {
+            int rc = database.exec ("RELEASE " + name);
+            assert_query_success (rc, "Can't release savepoint");
+        }
+
+        public void rollback_to_savepoint (string name) throws EngineError
+        {
+            int rc = database.exec ("ROLLBACK TO " + name);
+            assert_query_success (rc, "Can't rollback to savepoint");
+        }
+
         public void close ()
         {
+            event_batch_insertion_stmts = null;
             // SQLite connection is implicitly closed upon destruction
             database = null;
         }
@@ -395,6 +489,32 @@ namespace Zeitgeist.SQLite
                 """;
             rc = database.prepare_v2 (sql, -1, out id_retrieval_stmt);
             assert_query_success (rc, "Event ID retrieval query error");
+
+            // Event retrieval statement. Unlike event_view, this doesn't
+            // look up the uri, text and storage values, DbReader resolves
+            // those from its caches (see EventRows)
+            sql = """
+                SELECT id, timestamp, interpretation, manifestation, actor,
+                    (SELECT value FROM payload
+                        WHERE payload.id=event.payload)
+                        AS payload,
+                    subj_id, subj_interpretation, subj_manifestation,
+                    subj_origin, subj_mimetype, subj_text, subj_storage,
+                    origin, subj_id_current, subj_origin_current
+                FROM event
+                WHERE id IN (%s)
+                """.printf (get_event_id_placeholders ());
+            rc = database.prepare_v2 (sql, -1, out event_retrieval_stmt);
+            assert_query_success (rc, "Event retrieval query error");
+
+            // Related URIs retrieval statement
+            sql = """
+                SELECT id, timestamp, subj_uri FROM event_view
+                WHERE id IN (%s)
+                """.printf (get_event_id_placeholders ());
+            rc = database.prepare_v2 (sql, -1,
+                out related_uris_retrieval_stmt);
+            assert_query_success (rc, "Related URIs retrieval query error");
         }
 
         private void prepare_modification_queries () throws EngineError
@@ -403,29 +523,14 @@ namespace Zeitgeist.SQLite
             string sql;
 
             // Event insertion statement
-            sql = """
-                INSERT INTO event (
-                    id, timestamp, interpretation, manifestation, actor,
-                    origin, payload, subj_id, subj_id_current,
-                    subj_interpretation, subj_manifestation, subj_origin,
-                    subj_origin_current, subj_mimetype, subj_text, subj_storage
-                ) VALUES (
-                    ?, ?, ?, ?, ?,
-                    (SELECT id FROM uri WHERE value=?),
-                    ?,
-                    (SELECT id FROM uri WHERE value=?),
-                    (SELECT id FROM uri WHERE value=?),
-                    ?, ?,
-                    (SELECT id FROM uri WHERE value=?),
-                    (SELECT id FROM uri WHERE value=?),
-                    ?,
-                    (SELECT id FROM text WHERE value=?),
-                    (SELECT id FROM storage WHERE value=?)
-                )""";
-
+            sql = get_event_insertion_sql (1);
             rc = database.prepare_v2 (sql, -1, out event_insertion_stmt);
             assert_query_success (rc, "Insertion query error");
 
+            // Multi-row event insertion statements are prepared on demand
+            event_batch_insertion_stmts =
+                new Sqlite.Statement?[EVENT_BATCH_MAX_ROWS + 1];
+
             // Move handling statment
             sql = """
             UPDATE event
@@ -445,6 +550,62 @@ namespace Zeitgeist.SQLite
             assert_query_success (rc, "Payload insertion query error");
         }
 
+        private static string get_event_insertion_sql (int num_rows)
+            requires (num_rows > 0)
+        {
+            const string ROW_SQL = """(
+                    ?, ?, ?, ?, ?,
+                    (SELECT id FROM uri WHERE value=?),
+                    ?,
+                    (SELECT id FROM uri WHERE value=?),
+                    (SELECT id FROM uri WHERE value=?),
+                    ?, ?,
+                    (SELECT id FROM uri WHERE value=?),
+                    (SELECT id FROM uri WHERE value=?),
+                    ?,
+                    (SELECT id FROM text WHERE value=?),
+                    (SELECT id FROM storage WHERE value=?)
+                )""";
+
+            var sql = new StringBuilder ("""
+                INSERT INTO event (
+                    id, timestamp, interpretation, manifestation, actor,
+                    origin, payload, subj_id, subj_id_current,
+                    subj_interpretation, subj_manifestation, subj_origin,
+                    subj_origin_current, subj_mimetype, subj_text, subj_storage
+                ) VALUES """);
+            sql.append (ROW_SQL);
+            for (int i = 1; i < num_rows; ++i)
+            {
+                sql.append (", ");
+                sql.append (ROW_SQL);
+            }
+            return sql.str;
+        }
+
+        /**
+         * Returns a statement inserting `num_rows' rows into the event
+         * table at once. Each row takes EVENT_INSERTION_COLUMNS parameters,
+         * in the same order as event_insertion_stmt.
+         *
+         * Statements are prepared the first time they are requested and
+         * reused afterwards, so the caller must reset them before binding.
+         */
+        public unowned Sqlite.Statement get_event_batch_insertion_stmt (
+            int num_rows) throws EngineError
+            requires (num_rows > 0 && num_rows <= EVENT_BATCH_MAX_ROWS)
+        {
+            if (event_batch_insertion_stmts[num_rows] == null)
+            {
+                Sqlite.Statement stmt;
+                int rc = database.prepare_v2 (
+                    get_event_insertion_sql (num_rows), -1, out stmt);
+                assert_query_success (rc, "Batch insertion query error");
+                event_batch_insertion_stmts[num_rows] = (owned) stmt;
+            }
+            return event_batch_insertion_stmts[num_rows];
+        }
+
         public bool analyze() throws EngineError
         {
             int rc = database.exec("ANALYZE");
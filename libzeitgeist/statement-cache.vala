@@ -0,0 +1,125 @@
+/* statement-cache.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist.SQLite
+{
+
+    /**
+     * Bounded cache of prepared statements, keyed by their SQL text.
+     *
+     * Statements are reset and their bindings cleared when they are handed
+     * out again, so the SQL only needs to be compiled once. When the cache
+     * is full, the least recently used statement is finalized to make room
+     * for the new one.
+     */
+    public class StatementCache : Object
+    {
+        unowned Zeitgeist.SQLite.Database database;
+
+        [Compact]
+        private class CachedStatement
+        {
+            public Sqlite.Statement stmt;
+            public uint64 last_used;
+        }
+
+        private uint max_size;
+        private HashTable<string, CachedStatement> statements;
+        private uint64 clock = 0;
+
+        public uint hits { get; private set; default = 0; }
+        public uint misses { get; private set; default = 0; }
+
+        public StatementCache (Database database, uint max_size)
+            requires (max_size > 0)
+        {
+            this.database = database;
+            this.max_size = max_size;
+            statements = new HashTable<string, CachedStatement> (
+                str_hash, str_equal);
+        }
+
+        /**
+         * Returns a prepared statement for `sql', ready to be bound.
+         *
+         * The statement is owned by the cache, and may be finalized by
+         * the next call to this method. Reset it once you are done with
+         * it, so it doesn't hold the read transaction open.
+         */
+        public unowned Sqlite.Statement get_statement (string sql)
+            throws EngineError
+        {
+            unowned CachedStatement? cached = statements.lookup (sql);
+            if (cached != null)
+            {
+                hits++;
+                cached.last_used = ++clock;
+                cached.stmt.reset ();
+                cached.stmt.clear_bindings ();
+                return cached.stmt;
+            }
+
+            misses++;
+            if (statements.size () >= max_size)
+                remove_least_recently_used ();
+
+            var entry = new CachedStatement ();
+            int rc = database.database.prepare_v2 (sql, -1, out entry.stmt);
+            database.assert_query_success (rc, "SQL error");
+            entry.last_used = ++clock;
+
+            unowned CachedStatement new_entry = entry;
+            statements.insert (sql, (owned) entry);
+            return new_entry.stmt;
+        }
+
+        private void remove_least_recently_used ()
+        {
+            string? oldest = null;
+            uint64 oldest_used = uint64.MAX;
+
+            var iter = HashTableIter<string, CachedStatement> (statements);
+            unowned string sql;
+            unowned CachedStatement entry;
+            while (iter.next (out sql, out entry))
+            {
+                if (entry.last_used < oldest_used)
+                {
+                    oldest = sql;
+                    oldest_used = entry.last_used;
+                }
+            }
+
+            if (oldest != null)
+                statements.remove (oldest);
+        }
+
+        /**
+         * Finalizes all cached statements.
+         */
+        public void clear ()
+        {
+            statements.remove_all ();
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
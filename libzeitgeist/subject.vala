@@ -39,35 +39,83 @@ public class Subject : Object
 {
     private static StringChunk url_store;
 
-    public string? uri { get; set; }
-    public string? origin { get; set; }
-    public string? text { get; set; }
-    public string? storage { get; set; }
+    // The setters drop the serialized form of the subject, like those
+    // of Event
+    public string? uri
+    {
+        get { return _uri; }
+        set { _uri = value; variant_cache = null; }
+    }
+    public string? origin
+    {
+        get { return _origin; }
+        set { _origin = value; variant_cache = null; }
+    }
+    public string? text
+    {
+        get { return _text; }
+        set { _text = value; variant_cache = null; }
+    }
+    public string? storage
+    {
+        get { return _storage; }
+        set { _storage = value; variant_cache = null; }
+    }
     // FIXME: current_{uri,origin} are often the same as uri, we don't
     // need to waste memory for them
-    public string? current_uri { get; set; }
-    public string? current_origin { get; set; }
+    public string? current_uri
+    {
+        get { return _current_uri; }
+        set { _current_uri = value; variant_cache = null; }
+    }
+    public string? current_origin
+    {
+        get { return _current_origin; }
+        set { _current_origin = value; variant_cache = null; }
+    }
 
     public string? mimetype
     {
         get { return _mimetype; }
-        set { _mimetype = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _mimetype = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
     public string? interpretation
     {
         get { return _interpretation; }
-        set { _interpretation = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _interpretation = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
     public string? manifestation
     {
         get { return _manifestation; }
-        set { _manifestation = (value != null) ? url_store.insert_const (value) : null; }
+        set
+        {
+            _manifestation = (value != null) ? url_store.insert_const (value) : null;
+            variant_cache = null;
+        }
     }
 
+    private string? _uri;
+    private string? _origin;
+    private string? _text;
+    private string? _storage;
+    private string? _current_uri;
+    private string? _current_origin;
     private unowned string? _mimetype;
     private unowned string? _interpretation;
     private unowned string? _manifestation;
 
+    // Serialized form of the subject, built by to_variant () and dropped
+    // by the property setters
+    private Variant? variant_cache = null;
+
     static construct
     {
         url_store = new StringChunk (4096);
@@ -169,7 +217,18 @@ public class Subject : Object
             current_origin = next_string_or_null (iter);
     }
 
+    /**
+     * Serializes the subject. The result is cached, so repeated calls
+     * return the same instance until the subject is modified.
+     */
     public Variant to_variant ()
+    {
+        if (variant_cache == null)
+            variant_cache = build_variant ();
+        return variant_cache;
+    }
+
+    private Variant build_variant ()
     {
         /* The FAST version */
         char* ptr_arr[9];
@@ -34,6 +34,7 @@ namespace Zeitgeist.SQLite
         private HashTable<string, int> value_to_id;
         private Sqlite.Statement insertion_stmt;
         private Sqlite.Statement retrieval_stmt;
+        private Sqlite.Statement id_retrieval_stmt;
 
         public TableLookup (Database database, string table_name)
             throws EngineError
@@ -64,6 +65,11 @@ namespace Zeitgeist.SQLite
             sql = "SELECT value FROM " + table + " WHERE id=?";
             rc = db.prepare_v2 (sql, -1, out retrieval_stmt);
             database.assert_query_success (rc, "Error creating retrieval_stmt");
+
+            sql = "SELECT id FROM " + table + " WHERE value=?";
+            rc = db.prepare_v2 (sql, -1, out id_retrieval_stmt);
+            database.assert_query_success (rc,
+                "Error creating id_retrieval_stmt");
         }
 
         /**
@@ -71,12 +77,31 @@ namespace Zeitgeist.SQLite
          *
          * @see id_for_string
          */
-        public int id_try_string (string name)
+        public int id_try_string (string name) throws EngineError
         {
             int id = value_to_id.lookup (name);
-            if (id == 0)
-                return -1;
-            return id;
+            if (id != 0)
+                return id;
+
+            // Values inserted by the Engine after this table was loaded
+            // are only in memory if this is the Engine's own lookup, so
+            // readers on a separate connection need to check the DB.
+            // Misses aren't cached, the value may be inserted later on.
+            int rc;
+
+            id_retrieval_stmt.reset ();
+            id_retrieval_stmt.bind_text (1, name);
+            if ((rc = id_retrieval_stmt.step ()) == Sqlite.ROW)
+            {
+                id = id_retrieval_stmt.column_int (0);
+                id_to_value.insert (id, name);
+                value_to_id.insert (name, id);
+                rc = id_retrieval_stmt.step ();
+            }
+            database.assert_query_success (rc, "Error in id_try_string",
+                Sqlite.DONE);
+
+            return (id != 0) ? id : -1;
         }
 
         /**
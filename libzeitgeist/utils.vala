@@ -227,6 +227,20 @@ namespace Zeitgeist
                 return true;
             return (int.parse (env_var) != 0);
         }
+
+        /**
+         * @return The number of database connections Log uses for direct
+         * reads, which is the number of queries it runs concurrently.
+         * Defaults to the number of processors, up to 4.
+         */
+        public uint get_log_direct_read_connections ()
+        {
+            var env_var = Environment.get_variable (
+                "ZEITGEIST_LOG_DIRECT_READ_CONNECTIONS");
+            if (env_var != null && int.parse (env_var) > 0)
+                return int.parse (env_var);
+            return uint.min (get_num_processors (), 4);
+        }
     }
 }
 
@@ -0,0 +1,221 @@
+/* value-cache.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist.SQLite
+{
+
+    /**
+     * Bounded cache of the values of a table like uri or text, keyed by
+     * their ID.
+     *
+     * Unlike the tables of a TableLookup, which are small and kept in
+     * memory entirely, these tables grow with the number of events, so
+     * only the most recently used values are kept. Call prefetch() with
+     * all IDs you are going to need, so that the missing values are read
+     * with a single query (per EVENT_ID_CHUNK_SIZE of them), before
+     * getting them one by one with get_value().
+     *
+     * Values are never modified once inserted, so the cache only has to
+     * forget about the rows which are deleted (see DbReader's deletion
+     * callback).
+     */
+    public class ValueCache : Object
+    {
+        unowned Zeitgeist.SQLite.Database database;
+
+        [Compact]
+        private class Entry
+        {
+            public int id;
+            public string value;
+            // Neighbours in the recency list, from most to least
+            // recently used
+            public unowned Entry? prev;
+            public unowned Entry? next;
+        }
+
+        private string table;
+        private uint max_size;
+        private HashTable<int, Entry> entries;
+        private unowned Entry? head = null;
+        private unowned Entry? tail = null;
+        private Sqlite.Statement retrieval_stmt;
+
+        public uint hits { get; private set; default = 0; }
+        public uint misses { get; private set; default = 0; }
+
+        public ValueCache (Database database, string table_name,
+            uint max_size) throws EngineError
+            requires (max_size > 0)
+        {
+            this.database = database;
+            this.max_size = max_size;
+            table = table_name;
+            entries = new HashTable<int, Entry> (direct_hash, direct_equal);
+
+            string sql = "SELECT id, value FROM %s WHERE id IN (%s)".printf (
+                table, Database.get_event_id_placeholders ());
+            int rc = database.database.prepare_v2 (sql, -1,
+                out retrieval_stmt);
+            database.assert_query_success (rc,
+                "Error creating retrieval_stmt for %s".printf (table));
+        }
+
+        public uint size
+        {
+            get { return entries.size (); }
+        }
+
+        /**
+         * Makes sure the values of `ids' are cached, reading the missing
+         * ones from the database. IDs of 0 (NULL columns) are ignored.
+         *
+         * If there are more IDs than the cache can hold, the first ones
+         * are evicted again before this returns.
+         */
+        public void prefetch (int[] ids) throws EngineError
+        {
+            var missing_set = new GenericSet<int> (direct_hash, direct_equal);
+            uint32[] missing = {};
+            foreach (int id in ids)
+            {
+                if (id == 0 || id in missing_set)
+                    continue;
+                unowned Entry? entry = entries.lookup (id);
+                if (entry != null)
+                {
+                    hits++;
+                    move_to_front (entry);
+                    continue;
+                }
+                misses++;
+                missing_set.add (id);
+                missing += (uint32) id;
+            }
+
+            for (int start = 0; start < missing.length;
+                start += Database.EVENT_ID_CHUNK_SIZE)
+            {
+                database.bind_event_ids_chunk (retrieval_stmt, missing, start);
+                int rc;
+                while ((rc = retrieval_stmt.step ()) == Sqlite.ROW)
+                {
+                    insert (retrieval_stmt.column_int (0),
+                        retrieval_stmt.column_text (1));
+                }
+                database.assert_query_success (rc, "Error in prefetch",
+                    Sqlite.DONE);
+            }
+            retrieval_stmt.reset ();
+        }
+
+        /**
+         * Returns the value with the given ID, or null if the ID is 0.
+         *
+         * Values which weren't prefetched are read from the database.
+         */
+        public unowned string? get_value (int id) throws EngineError
+        {
+            if (id == 0)
+                return null;
+            unowned Entry? entry = entries.lookup (id);
+            if (entry == null)
+            {
+                prefetch ({ id });
+                entry = entries.lookup (id);
+                if (entry == null)
+                {
+                    critical ("Error getting data from table %s: no id %d",
+                        table, id);
+                    return null;
+                }
+            }
+            move_to_front (entry);
+            return entry.value;
+        }
+
+        public void remove (int id)
+        {
+            unowned Entry? entry = entries.lookup (id);
+            if (entry == null)
+                return;
+            unlink (entry);
+            entries.remove (id);
+        }
+
+        public void clear ()
+        {
+            head = null;
+            tail = null;
+            entries.remove_all ();
+        }
+
+        private void insert (int id, string value)
+        {
+            if (entries.contains (id))
+                return;
+            if (entries.size () >= max_size)
+                remove (tail.id);
+
+            var entry = new Entry ();
+            entry.id = id;
+            entry.value = value;
+            unowned Entry new_entry = entry;
+            entries.insert (id, (owned) entry);
+            push_front (new_entry);
+        }
+
+        private void move_to_front (Entry entry)
+        {
+            if (entry == head)
+                return;
+            unlink (entry);
+            push_front (entry);
+        }
+
+        private void push_front (Entry entry)
+        {
+            entry.prev = null;
+            entry.next = head;
+            if (head != null)
+                head.prev = entry;
+            head = entry;
+            if (tail == null)
+                tail = entry;
+        }
+
+        private void unlink (Entry entry)
+        {
+            if (entry.prev != null)
+                entry.prev.next = entry.next;
+            else
+                head = entry.next;
+            if (entry.next != null)
+                entry.next.prev = entry.prev;
+            else
+                tail = entry.prev;
+            entry.prev = null;
+            entry.next = null;
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -178,7 +178,7 @@ namespace Zeitgeist
                 return;
             string sql = clause.get_sql_conditions ();
             add_with_array (sql, clause.arguments);
-            is_simple = clause.get_is_simple ();
+            is_simple = is_simple && clause.get_is_simple ();
             /*if not where.may_have_results():
             if self._relation == self.AND:
                 self.clear()
@@ -28,13 +28,15 @@ import logging
 import os.path
 import sys
 import inspect
+import sqlite3
 
 from xml.etree import ElementTree
 
 dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
 
-from zeitgeist.datamodel import (Event, Subject, TimeRange, StorageState,
-	ResultType)
+from zeitgeist.datamodel import (Event, Subject, CompactEvent,
+	CompactSubject, TimeRange, StorageState, ResultType)
+from zeitgeist.dbreader import DbReader, SchemaVersionError
 
 SIG_EVENT = "asaasay"
 
@@ -230,6 +232,11 @@ class ZeitgeistDBusInterface(object):
 		dbus_interface = self.__shared_state["dbus_interface"]
 		return dbus_interface.get_property("extensions")
 	
+	def datapath(self):
+		"""Returns the path of the database used by the engine"""
+		dbus_interface = self.__shared_state["dbus_interface"]
+		return dbus_interface.get_property("datapath")
+	
 	def get_extension(cls, name, path, busname=None):
 		""" Returns an interface to the given extension.
 		
@@ -288,14 +295,14 @@ class Monitor(dbus.service.Object):
 	_event_type = Event
 
 	def __init__ (self, time_range, event_templates, insert_callback,
-		delete_callback, monitor_path=None, event_type=None):
+		delete_callback, monitor_path=None, event_type=None, max_latency=0):
 		if not monitor_path:
 			monitor_path = Monitor._next_path()
 		elif isinstance(monitor_path, (str, unicode)):
 			monitor_path = dbus.ObjectPath(monitor_path)
 		
 		if event_type:
-			if not issubclass(event_type, Event):
+			if not issubclass(event_type, (Event, CompactEvent)):
 				raise TypeError("Event subclass expected.")
 			self._event_type = event_type
 		
@@ -304,6 +311,7 @@ class Monitor(dbus.service.Object):
 		self._path = monitor_path
 		self._insert_callback = insert_callback
 		self._delete_callback = delete_callback
+		self._max_latency = max_latency
 		dbus.service.Object.__init__(self, get_bus(), monitor_path)
 	
 	def get_path (self): return self._path
@@ -318,6 +326,10 @@ class Monitor(dbus.service.Object):
 	templates = property(get_templates,
 		doc="Read only property with installed templates")
 	
+	def get_max_latency (self): return self._max_latency
+	max_latency = property(get_max_latency,
+		doc="Read only property with the time in milliseconds the engine may delay notifications to merge them")
+	
 	@dbus.service.method("org.gnome.zeitgeist.Monitor",
 	                     in_signature="(xx)a("+SIG_EVENT+")")
 	def NotifyInsert(self, time_range, events):
@@ -380,6 +392,16 @@ class ZeitgeistClient:
 	Note that this class only does asynchronous DBus calls. This is almost
 	always the right thing to do. If you really want to do synchronous
 	DBus calls use the raw DBus API found in the ZeitgeistDBusInterface class.
+	
+	If *direct_read* is set, :meth:`find_event_ids_for_templates`,
+	:meth:`find_events_for_templates` and :meth:`get_events` (and their
+	aliases) read the engine's database directly instead, using a
+	:class:`DbReader <zeitgeist.dbreader.DbReader>`. This avoids
+	marshalling the events over DBus, and the size limit of DBus replies,
+	which makes a difference for queries returning many events. In this
+	mode the reply handlers are called before those methods return. If
+	the database can't be read, for example because it was created by a
+	different version of Zeitgeist, the queries go through DBus as usual.
 	"""
 	
 	_installed_monitors = []
@@ -399,19 +421,17 @@ class ZeitgeistClient:
 		ev = Event.new_for_values(**arguments)
 		return ev, kwargs
 	
-	def __init__ (self):
+	def __init__ (self, direct_read=False):
 		self._iface = ZeitgeistDBusInterface()
 		self._registry = self._iface.get_extension("DataSourceRegistry",
 			"data_source_registry")
+		self._reader = self._open_reader() if direct_read else None
 		
 		# Reconnect all active monitors if the connection is reset.
 		def reconnect_monitors():
 			log.info("Reconnected to Zeitgeist engine...")
 			for monitor in self._installed_monitors:
-				self._iface.InstallMonitor(monitor.path,
-					monitor.time_range,
-					monitor.templates,
-					reply_handler=self._void_reply_handler,
+				self._install_monitor_in_engine(monitor,
 					error_handler=lambda err: log.warn(
 						"Error reinstalling monitor: %s" % err))
 		self._iface.connect_join(reconnect_monitors)
@@ -421,8 +441,12 @@ class ZeitgeistClient:
 		Register a subclass of Event with this ZeiteistClient instance. When
 		data received over D-Bus is instantiated into an Event object, the
 		provided subclass will be used.
+		
+		:class:`CompactEvent <zeitgeist.datamodel.CompactEvent>` (or a
+		subclass of it) may be registered instead, to save memory and time
+		when reading many events.
 		"""
-		if not issubclass(event_type, Event):
+		if not issubclass(event_type, (Event, CompactEvent)):
 			raise TypeError("Event subclass expected.")
 		self._event_type = event_type
 	
@@ -439,9 +463,10 @@ class ZeitgeistClient:
 		Even better, if you also have a custom Event subclass, you may directly
 		override the Subject type by changing its _subject_type class variable.
 		"""
-		if not issubclass(subject_type, Subject):
+		if not issubclass(subject_type, (Subject, CompactSubject)):
 			raise TypeError("Subject subclass expected.")
 		class EventWithCustomSubject(self._event_type):
+			__slots__ = ()
 			_subject_type = subject_type
 		self._event_type = EventWithCustomSubject
 	
@@ -453,6 +478,48 @@ class ZeitgeistClient:
 				"Error handler not callable, found %s" % error_handler)
 		return lambda raw: self._stderr_error_handler(raw, *args)
 	
+	def _open_reader(self):
+		# Like libzeitgeist's Log, read the database the engine is using
+		try:
+			path = unicode(self._iface.datapath())
+		except dbus.exceptions.DBusException, e:
+			log.warning("Unable to get the database path, using DBus: %s" % e)
+			return None
+		if path == ":memory:":
+			return None
+		try:
+			return DbReader(path)
+		except sqlite3.Error, e:
+			log.warning("Unable to read the database directly, using DBus: "
+				"%s" % e)
+			return None
+	
+	def _read_directly(self, query, reply_handler, error_handler):
+		"""
+		Passes the result of calling `query` with the DbReader to
+		`reply_handler`. Returns False, without calling any handler, if the
+		query needs to be done over DBus instead.
+		"""
+		if self._reader is None:
+			return False
+		try:
+			result = query(self._reader)
+		except SchemaVersionError, e:
+			# The engine upgraded the database
+			log.warning("Stopped reading the database directly: %s" % e)
+			self._reader.close()
+			self._reader = None
+			return False
+		except sqlite3.Error, e:
+			log.warning("Error reading the database, using DBus: %s" % e)
+			return False
+		except ValueError, e:
+			# The engine would have rejected the query as well
+			error_handler(e)
+			return True
+		reply_handler(result)
+		return True
+	
 	def _safe_reply_handler(self, reply_handler):
 		if reply_handler is not None:
 			if callable(reply_handler):
@@ -625,6 +692,13 @@ class ZeitgeistClient:
 		if timerange is None:
 			timerange = TimeRange.until_now()
 		
+		if self._read_directly(
+			lambda reader: reader.find_event_ids(timerange, event_templates,
+				storage_state, num_events, result_type),
+			ids_reply_handler,
+			self._safe_error_handler(error_handler, ids_reply_handler, [])):
+			return
+		
 		self._iface.FindEventIds(timerange,
 					event_templates,
 					storage_state,
@@ -721,13 +795,21 @@ class ZeitgeistClient:
 		if timerange is None:
 			timerange = TimeRange.until_now()
 		
+		if self._read_directly(
+			lambda reader: self._event_type.new_for_structs(
+				reader.find_events(timerange, event_templates, storage_state,
+					num_events, result_type)),
+			events_reply_handler,
+			self._safe_error_handler(error_handler, events_reply_handler, [])):
+			return
+		
 		self._iface.FindEvents(timerange,
 					event_templates,
 					storage_state,
 					num_events,
 					result_type,
 					reply_handler=lambda raw: events_reply_handler(
-						map(self._event_type.new_for_struct, raw)),
+						self._event_type.new_for_structs(raw)),
 					error_handler=self._safe_error_handler(error_handler,
 						events_reply_handler, []))
 	
@@ -784,11 +866,18 @@ class ZeitgeistClient:
 			raise TypeError(
 				"Reply handler not callable, found %s" % events_reply_handler)
 		
+		if self._read_directly(
+			lambda reader: self._event_type.new_for_structs(
+				reader.get_events(event_ids)),
+			events_reply_handler,
+			self._safe_error_handler(error_handler, events_reply_handler, [])):
+			return
+		
 		# Generate a wrapper callback that does automagic conversion of
 		# the raw DBus reply into a list of Event instances
 		self._iface.GetEvents(event_ids,
 				reply_handler=lambda raw: events_reply_handler(
-					map(self._event_type.new_for_struct, raw)),
+					self._event_type.new_for_structs(raw)),
 				error_handler=self._safe_error_handler(error_handler,
 						events_reply_handler, []))
 	
@@ -888,7 +977,8 @@ class ZeitgeistClient:
 		                                  error_handler=error_handler)
 	
 	def install_monitor (self, time_range, event_templates,
-		notify_insert_handler, notify_delete_handler, monitor_path=None):
+		notify_insert_handler, notify_delete_handler, monitor_path=None,
+		max_latency=0):
 		"""
 		Install a monitor in the Zeitgeist engine that calls back
 		when events matching *event_templates* are logged. The matching
@@ -925,6 +1015,10 @@ class ZeitgeistClient:
 		    to install the client side monitor object on. If none is provided
 		    the client will provide one for you namespaced under
 		    /org/gnome/zeitgeist/monitor/*
+		:param max_latency: Optional time in milliseconds the engine may
+		    hold back notifications for, merging consecutive insertions
+		    (or deletions) into a single callback. Defaults to 0, which
+		    notifies about every change immediately.
 		:returns: a :class:`Monitor`
 		"""
 		self._check_list_or_tuple(event_templates)
@@ -940,16 +1034,28 @@ class ZeitgeistClient:
 		
 		mon = Monitor(time_range, event_templates, notify_insert_handler,
 			notify_delete_handler, monitor_path=monitor_path,
-			event_type=self._event_type)
-		self._iface.InstallMonitor(mon.path,
-		                           mon.time_range,
-		                           mon.templates,
-		                           reply_handler=self._void_reply_handler,
-		                           error_handler=lambda err: log.warn(
-									"Error installing monitor: %s" % err))
+			event_type=self._event_type, max_latency=max_latency)
+		self._install_monitor_in_engine(mon,
+			error_handler=lambda err: log.warn(
+				"Error installing monitor: %s" % err))
 		self._installed_monitors.append(mon)
 		return mon
 	
+	def _install_monitor_in_engine(self, monitor, error_handler):
+		if monitor.max_latency:
+			self._iface.InstallMonitorWithLatency(monitor.path,
+				monitor.time_range,
+				monitor.templates,
+				monitor.max_latency,
+				reply_handler=self._void_reply_handler,
+				error_handler=error_handler)
+		else:
+			self._iface.InstallMonitor(monitor.path,
+				monitor.time_range,
+				monitor.templates,
+				reply_handler=self._void_reply_handler,
+				error_handler=error_handler)
+	
 	def remove_monitor (self, monitor, monitor_removed_handler=None):
 		"""
 		Remove a :class:`Monitor` installed with :meth:`install_monitor`
@@ -38,6 +38,8 @@ __all__ = [
 	'DataSource',
 	'Event',
 	'Subject',
+	'CompactEvent',
+	'CompactSubject',
 	'NULL_EVENT',
 	'NEGATION_OPERATOR',
 ]
@@ -658,6 +660,15 @@ class Event(list):
 			return None
 		return cls(struct)
 	
+	@classmethod
+	def new_for_structs(cls, structs):
+		"""
+		Returns a list with a new Event instance for each of `structs`,
+		like a reply of FindEvents or GetEvents, or None for those which
+		are a `NULL_EVENT`.
+		"""
+		return map(cls.new_for_struct, structs)
+	
 	@classmethod
 	def new_for_values(cls, **values):
 		"""
@@ -886,6 +897,167 @@ class Event(list):
 		t = int(self.timestamp) # The timestamp may be stored as a string
 		return (t >= time_range.begin) and (t <= time_range.end)
 
+# Shared copies of the values of CompactEvent and CompactSubject fields
+# which only take a few different values, like mimetypes and actors
+_INTERNED_VALUES = {}
+
+def _intern_value(value):
+	"""
+	Returns a shared copy of `value`, the Symbol instance for ontology URIs.
+	"""
+	try:
+		return _INTERNED_VALUES[value]
+	except KeyError:
+		interned = _SYMBOLS_BY_URI.get(value) or unicode(value)
+		_INTERNED_VALUES[value] = interned
+		return interned
+
+class CompactSubject(object):
+	"""
+	Memory efficient counterpart of :class:`Subject`, for the subjects
+	of :class:`CompactEvent`.
+	
+	It has the same properties and getters as :class:`Subject`, but it
+	isn't a list and it can't be sent over DBus.
+	"""
+	__slots__ = ("uri", "interpretation", "manifestation", "origin",
+		"mimetype", "text", "storage", "current_uri", "current_origin")
+	
+	def __init__(self, data):
+		if len(data) < len(Subject.Fields):
+			# current_uri and current_origin were added in Zeitgeist 0.8.0
+			# and 1.0 Beta 1
+			data = list(data) + [""] * (len(Subject.Fields) - len(data))
+		(uri, interpretation, manifestation, origin, mimetype, text, storage,
+			current_uri, current_origin) = data
+		interned = _INTERNED_VALUES
+		self.uri = unicode(uri)
+		self.interpretation = interned.get(interpretation) or \
+			_intern_value(interpretation)
+		self.manifestation = interned.get(manifestation) or \
+			_intern_value(manifestation)
+		self.origin = unicode(origin)
+		self.mimetype = interned.get(mimetype) or _intern_value(mimetype)
+		self.text = unicode(text)
+		self.storage = interned.get(storage) or _intern_value(storage)
+		# Subjects which weren't moved have the same current URI and
+		# origin, so don't keep a second copy of them
+		self.current_uri = self.uri if current_uri == uri else \
+			unicode(current_uri)
+		self.current_origin = self.origin if current_origin == origin else \
+			unicode(current_origin)
+	
+	def __repr__(self):
+		return "%s(%r)" % (self.__class__.__name__, self.to_subject())
+	
+	def to_subject(self):
+		"""Returns a regular :class:`Subject` with the same values"""
+		return Subject([self.uri, self.interpretation, self.manifestation,
+			self.origin, self.mimetype, self.text, self.storage,
+			self.current_uri, self.current_origin])
+	
+	def get_uri(self): return self.uri
+	def get_current_uri(self): return self.current_uri
+	def get_interpretation(self): return self.interpretation
+	def get_manifestation(self): return self.manifestation
+	def get_origin(self): return self.origin
+	def get_current_origin(self): return self.current_origin
+	def get_mimetype(self): return self.mimetype
+	def get_text(self): return self.text
+	def get_storage(self): return self.storage
+
+class CompactEvent(object):
+	"""
+	Memory efficient counterpart of :class:`Event`, for applications
+	reading many events.
+	
+	It has the same properties and getters as :class:`Event`, and can be
+	created with :meth:`new_for_struct` and :meth:`new_for_structs`, so it
+	can be registered as the event type of a
+	:class:`ZeitgeistClient <zeitgeist.client.ZeitgeistClient>`. Its
+	fields are kept in slots instead of nested lists, values which repeat
+	between events (like interpretations, actors and mimetypes) are
+	shared, and the payload is kept as a byte string. Use
+	:meth:`to_event` to get an :class:`Event` which can be modified or sent
+	over DBus.
+	"""
+	__slots__ = ("id", "timestamp", "interpretation", "manifestation",
+		"actor", "origin", "subjects", "payload")
+	
+	_subject_type = CompactSubject
+	
+	def __init__(self, struct):
+		event_data = struct[0]
+		interned = _INTERNED_VALUES
+		self.id = int(event_data[Event.Id] or 0)
+		self.timestamp = str(event_data[Event.Timestamp])
+		self.interpretation = interned.get(event_data[Event.Interpretation]) \
+			or _intern_value(event_data[Event.Interpretation])
+		self.manifestation = interned.get(event_data[Event.Manifestation]) \
+			or _intern_value(event_data[Event.Manifestation])
+		self.actor = interned.get(event_data[Event.Actor]) or \
+			_intern_value(event_data[Event.Actor])
+		self.origin = unicode(event_data[Event.Origin]
+			if len(event_data) > Event.Origin else "")
+		subject_type = self._subject_type
+		self.subjects = tuple([subject_type(subject)
+			for subject in struct[1]]) if len(struct) > 1 else ()
+		# DBus replies have the payload as an array of bytes
+		payload = struct[2] if len(struct) > 2 else ""
+		if not payload:
+			self.payload = ""
+		elif isinstance(payload, str):
+			self.payload = payload
+		else:
+			self.payload = "".join(map(chr, payload))
+	
+	@classmethod
+	def new_for_struct(cls, struct):
+		"""Returns a new CompactEvent or None if `struct` is a `NULL_EVENT`"""
+		if struct == NULL_EVENT:
+			return None
+		return cls(struct)
+	
+	@classmethod
+	def new_for_structs(cls, structs):
+		"""
+		Returns a list with a new CompactEvent for each of `structs`,
+		like a reply of FindEvents or GetEvents, or None for those which
+		are a `NULL_EVENT`.
+		"""
+		null_event = NULL_EVENT
+		return [cls(struct) if struct != null_event else None
+			for struct in structs]
+	
+	def __repr__(self):
+		return "%s(%r)" % (self.__class__.__name__, self.to_event())
+	
+	def to_event(self):
+		"""Returns a regular :class:`Event` with the same values"""
+		return Event([
+			[str(self.id) if self.id else "", self.timestamp,
+				self.interpretation, self.manifestation, self.actor,
+				self.origin],
+			[subject.to_subject() for subject in self.subjects],
+			# Like in DBus replies, the payload is an array of bytes
+			map(ord, self.payload)])
+	
+	def get_id(self): return self.id
+	def get_timestamp(self): return self.timestamp
+	def get_interpretation(self): return self.interpretation
+	def get_manifestation(self): return self.manifestation
+	def get_actor(self): return self.actor
+	def get_origin(self): return self.origin
+	def get_subjects(self): return self.subjects
+	def get_payload(self): return self.payload
+	
+	def in_time_range (self, time_range):
+		"""
+		Check if the event timestamp lies within a :class:`TimeRange`
+		"""
+		t = int(self.timestamp)
+		return (t >= time_range.begin) and (t <= time_range.end)
+
 class DataSource(list):
 	""" Optimized and convenient data structure representing a datasource.
 	
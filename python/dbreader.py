@@ -0,0 +1,636 @@
+# -.- coding: utf-8 -.-
+
+# Zeitgeist
+#
+# Copyright © 2026 Zeitgeist contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Read-only access to the activity database, without going through the
+Zeitgeist engine.
+
+:class:`DbReader` builds the same queries as the engine's DbReader
+(libzeitgeist/db-reader.vala), so it returns the same events, as raw
+structs which can be passed to :meth:`Event.new_for_struct
+<zeitgeist.datamodel.Event.new_for_struct>`. It is meant for scripts
+reading large numbers of events, for which marshalling them over D-Bus
+is the bottleneck; see the *direct_read* argument of
+:class:`ZeitgeistClient <zeitgeist.client.ZeitgeistClient>`.
+
+The engine keeps the database in WAL mode, so reading it doesn't block
+the engine, and each query sees the events committed before it started.
+"""
+
+import os
+import sys
+import sqlite3
+
+from zeitgeist.datamodel import (Symbol, StorageState, ResultType,
+	NULL_EVENT, NEGATION_OPERATOR, WILDCARD)
+
+__all__ = [
+	'DbReader',
+	'SchemaVersionError',
+	'get_database_path',
+]
+
+# Must be the same as DatabaseSchema.CORE_SCHEMA_VERSION in
+# libzeitgeist/sql-schema.vala
+CORE_SCHEMA_VERSION = 11
+
+# Number of event IDs looked up at once (SQLite refuses statements with
+# more than 999 parameters)
+EVENT_ID_CHUNK_SIZE = 256
+
+NOEXPAND_OPERATOR = "+"
+
+class SchemaVersionError(sqlite3.DatabaseError):
+	"""
+	Raised when the database was created by a version of Zeitgeist with
+	a different schema, which this module doesn't know how to read.
+	"""
+
+def get_database_path():
+	"""
+	Returns the path of the activity database, looked up like the engine
+	does: $ZEITGEIST_DATABASE_PATH, or activity.sqlite in
+	$ZEITGEIST_DATA_PATH or else in the zeitgeist folder of the user's
+	data directory.
+	"""
+	if "ZEITGEIST_DATABASE_PATH" in os.environ:
+		return os.environ["ZEITGEIST_DATABASE_PATH"]
+	data_path = os.environ.get("ZEITGEIST_DATA_PATH")
+	if data_path is None:
+		data_path = os.path.join(os.environ.get("XDG_DATA_HOME",
+			os.path.expanduser("~/.local/share")), "zeitgeist")
+	return os.path.join(data_path, "activity.sqlite")
+
+def _get_right_boundary(text):
+	"""
+	Returns the smallest string which is greater than the given `text`.
+	"""
+	if not text:
+		return unichr(sys.maxunicode)
+	charpoint = ord(text[-1])
+	if charpoint == sys.maxunicode:
+		# If the last char is the biggest possible char we need to
+		# look at the second last.
+		return _get_right_boundary(text[:-1])
+	return text[:-1] + unichr(charpoint + 1)
+
+class WhereClause(object):
+	"""
+	A SQL `WHERE' clause, composed of a set of conditions joined together
+	with either AND or OR. This is a port of the WhereClause class of
+	libzeitgeist, which see.
+	"""
+
+	AND = " AND "
+	OR = " OR "
+
+	# Table holding the values of the columns used in
+	# add_text_condition_subquery and add_wildcard_condition
+	_SEARCH_TABLES = {
+		"origin": "uri",
+		"subj_origin": "uri",
+		"subj_origin_current": "uri",
+		"subj_id": "uri",
+		"subj_id_current": "uri",
+		"subj_mimetype": "mimetype",
+		"subj_text_id": "text",
+		"subj_storage_id": "storage",
+	}
+
+	def __init__(self, relation, negation=False):
+		self._relation = relation
+		self._negation = negation
+		self.conditions = []
+		self.arguments = []
+		# Whether the conditions only use columns of the event table,
+		# in which case the query doesn't need event_view
+		self.is_simple = True
+
+	def __len__(self):
+		return len(self.conditions)
+
+	def add(self, condition, *arguments):
+		self.conditions.append(condition)
+		self.arguments.extend(arguments)
+
+	def add_match_condition(self, column, value_id, negation=False):
+		self.add("%s %s= %d" % (column, "!" if negation else "", value_id))
+
+	def add_text_condition_subquery(self, column, value, negation=False):
+		table = self._SEARCH_TABLES.get(column, column)
+		self.add("%s %s= (SELECT id FROM %s WHERE value = ?)" % (column,
+			"!" if negation else "", table), value)
+		self.is_simple = False
+
+	def add_wildcard_condition(self, column, prefix, negation=False):
+		table = self._SEARCH_TABLES.get(column, column)
+		if prefix:
+			if isinstance(prefix, str):
+				prefix = prefix.decode("utf-8")
+			subquery = "SELECT id FROM %s WHERE (value >= ? AND value < ?)" \
+				% table
+			arguments = (prefix, _get_right_boundary(prefix))
+		else:
+			subquery = "SELECT id FROM %s" % table
+			arguments = ()
+		if not negation:
+			sql = "%s IN (%s)" % (column, subquery)
+		else:
+			sql = "(%s NOT IN (%s) OR %s is NULL)" % (column, subquery, column)
+		self.add(sql, *arguments)
+		self.is_simple = False
+
+	def extend(self, clause):
+		if not clause:
+			return
+		self.add(clause.sql, *clause.arguments)
+		self.is_simple = self.is_simple and clause.is_simple
+
+	def has_non_timestamp_condition(self):
+		for condition in self.conditions:
+			if not condition.startswith("timestamp"):
+				return True
+		return False
+
+	@property
+	def sql(self):
+		negation = "NOT " if self._negation else ""
+		if len(self.conditions) == 1:
+			return negation + self.conditions[0]
+		return "%s(%s)" % (negation, self._relation.join(self.conditions))
+
+class _TableLookup(object):
+	"""
+	In-memory copy of one of the small tables (like interpretation or
+	actor) mapping values to their ID.
+	"""
+
+	def __init__(self, connection, table):
+		self._connection = connection
+		self._table = table
+		self._reload()
+
+	def _reload(self):
+		self._id_to_value = dict(self._connection.execute(
+			"SELECT id, value FROM %s" % self._table))
+		self._value_to_id = dict((value, value_id)
+			for (value_id, value) in self._id_to_value.iteritems())
+
+	def get_id(self, value):
+		"""Returns the ID of `value`, or -1 if it isn't in the table."""
+		if isinstance(value, str):
+			value = value.decode("utf-8")
+		if value not in self._value_to_id:
+			# The engine may have inserted it since we last looked
+			self._reload()
+		return self._value_to_id.get(value, -1)
+
+	def get_value(self, value_id):
+		if value_id is None:
+			return u""
+		if value_id not in self._id_to_value:
+			self._reload()
+		return self._id_to_value[value_id]
+
+def _parse_negation(value):
+	if value.startswith(NEGATION_OPERATOR):
+		return value[len(NEGATION_OPERATOR):], True
+	return value, False
+
+def _parse_noexpand(value):
+	if value.startswith(NOEXPAND_OPERATOR):
+		return value[len(NOEXPAND_OPERATOR):], True
+	return value, False
+
+def _parse_wildcard(value):
+	if value.endswith(WILDCARD):
+		return value[:-len(WILDCARD)], True
+	return value, False
+
+def _assert_no_negation(field, value):
+	if value.startswith(NEGATION_OPERATOR):
+		raise ValueError("Field '%s' doesn't support negation" % field)
+
+def _assert_no_wildcard(field, value):
+	if value.endswith(WILDCARD):
+		raise ValueError("Field '%s' doesn't support prefix search" % field)
+
+# Column each grouping result type returns one event for, whether it sorts
+# by the number of events (ascendingly or not) and the aggregation used to
+# pick the timestamp of each group
+_GROUPED_RESULT_TYPES = {}
+for _field, _types in (
+		("origin", (ResultType.MostRecentEventOrigin,
+			ResultType.LeastRecentEventOrigin,
+			ResultType.MostPopularEventOrigin,
+			ResultType.LeastPopularEventOrigin)),
+		("subj_id", (ResultType.MostRecentSubjects,
+			ResultType.LeastRecentSubjects,
+			ResultType.MostPopularSubjects,
+			ResultType.LeastPopularSubjects)),
+		("subj_id_current", (ResultType.MostRecentCurrentUri,
+			ResultType.LeastRecentCurrentUri,
+			ResultType.MostPopularCurrentUri,
+			ResultType.LeastPopularCurrentUri)),
+		("actor", (ResultType.MostRecentActor,
+			ResultType.LeastRecentActor,
+			ResultType.MostPopularActor,
+			ResultType.LeastPopularActor)),
+		("subj_origin", (ResultType.MostRecentOrigin,
+			ResultType.LeastRecentOrigin,
+			ResultType.MostPopularOrigin,
+			ResultType.LeastPopularOrigin)),
+		("subj_origin_current", (ResultType.MostRecentCurrentOrigin,
+			ResultType.LeastRecentCurrentOrigin,
+			ResultType.MostPopularCurrentOrigin,
+			ResultType.LeastPopularCurrentOrigin)),
+		("subj_interpretation", (ResultType.MostRecentSubjectInterpretation,
+			ResultType.LeastRecentSubjectInterpretation,
+			ResultType.MostPopularSubjectInterpretation,
+			ResultType.LeastPopularSubjectInterpretation)),
+		("subj_mimetype", (ResultType.MostRecentMimeType,
+			ResultType.LeastRecentMimeType,
+			ResultType.MostPopularMimeType,
+			ResultType.LeastPopularMimeType))):
+	_most_recent, _least_recent, _most_popular, _least_popular = _types
+	_GROUPED_RESULT_TYPES[_most_recent] = (_field, None, "max")
+	_GROUPED_RESULT_TYPES[_least_recent] = (_field, None, "max")
+	_GROUPED_RESULT_TYPES[_most_popular] = (_field, False, "max")
+	_GROUPED_RESULT_TYPES[_least_popular] = (_field, True, "max")
+_GROUPED_RESULT_TYPES[ResultType.OldestActor] = ("actor", None, "min")
+
+# Result types sorting by timestamp ascendingly, see
+# ResultType.is_sort_order_asc in libzeitgeist/enumerations.vala
+_ASCENDING_RESULT_TYPES = frozenset((
+	ResultType.LeastRecentEvents,
+	ResultType.LeastRecentEventOrigin,
+	ResultType.LeastPopularEventOrigin,
+	ResultType.LeastRecentSubjects,
+	ResultType.LeastPopularSubjects,
+	ResultType.LeastRecentCurrentUri,
+	ResultType.LeastPopularCurrentUri,
+	ResultType.LeastRecentActor,
+	ResultType.LeastPopularActor,
+	ResultType.OldestActor,
+	ResultType.LeastRecentOrigin,
+	ResultType.LeastPopularOrigin,
+	ResultType.LeastRecentCurrentOrigin,
+	ResultType.LeastPopularCurrentOrigin,
+	ResultType.LeastRecentSubjectInterpretation,
+	ResultType.LeastPopularSubjectInterpretation,
+	ResultType.LeastRecentMimeType,
+	ResultType.LeastPopularMimeType))
+
+_EVENT_RETRIEVAL_SQL = """
+	SELECT id, timestamp, interpretation, manifestation, actor,
+		(SELECT value FROM payload WHERE payload.id=event.payload),
+		(SELECT value FROM uri WHERE uri.id=event.origin),
+		(SELECT value FROM uri WHERE uri.id=event.subj_id),
+		subj_interpretation, subj_manifestation,
+		(SELECT value FROM uri WHERE uri.id=event.subj_origin),
+		subj_mimetype,
+		(SELECT value FROM text WHERE text.id=event.subj_text),
+		(SELECT value FROM storage WHERE storage.id=event.subj_storage),
+		(SELECT value FROM uri WHERE uri.id=event.subj_id_current),
+		(SELECT value FROM uri WHERE uri.id=event.subj_origin_current)
+	FROM event
+	WHERE id IN (%s)
+	"""
+
+class DbReader(object):
+	"""
+	Runs the engine's read-only queries directly on the activity database.
+
+	Raises :class:`SchemaVersionError` if the database doesn't have the
+	schema this module was written for, and any other
+	:exc:`sqlite3.Error` if it can't be read. Arguments the engine would
+	reject raise :exc:`ValueError`.
+	"""
+
+	def __init__(self, path=None):
+		if path is None:
+			path = get_database_path()
+		if path != ":memory:" and not os.path.isfile(path):
+			# sqlite3 would create it
+			raise sqlite3.OperationalError(
+				"Unable to open database: %s doesn't exist" % path)
+
+		# Transactions are only started explicitly, in _read_transaction
+		self._connection = sqlite3.connect(path, isolation_level=None,
+			check_same_thread=False)
+		self._connection.execute("PRAGMA query_only = 1")
+		self._check_schema_version()
+
+		self._interpretations = _TableLookup(self._connection,
+			"interpretation")
+		self._manifestations = _TableLookup(self._connection,
+			"manifestation")
+		self._mimetypes = _TableLookup(self._connection, "mimetype")
+		self._actors = _TableLookup(self._connection, "actor")
+
+	def close(self):
+		self._connection.close()
+
+	def _check_schema_version(self):
+		try:
+			row = self._connection.execute("SELECT version FROM schema_version "
+				"WHERE schema='core'").fetchone()
+		except sqlite3.OperationalError:
+			row = None
+		version = row[0] if row else 0
+		if version != CORE_SCHEMA_VERSION:
+			raise SchemaVersionError("Unable to open database: schema "
+				"version %d, expected %d" % (version, CORE_SCHEMA_VERSION))
+
+	def _read_transaction(self, func, *args):
+		"""
+		Runs func within a read transaction, so that all its queries see
+		the same snapshot of the database.
+		"""
+		self._connection.execute("BEGIN")
+		try:
+			# The engine may have upgraded the database since we opened it
+			self._check_schema_version()
+			return func(*args)
+		finally:
+			self._connection.execute("COMMIT")
+
+	def find_event_ids(self, time_range, event_templates,
+		storage_state=StorageState.Any, num_events=20,
+		result_type=ResultType.MostRecentEvents):
+		"""
+		Returns the IDs of the events matching the query, like the
+		engine's FindEventIds method.
+		"""
+		return self._read_transaction(self._find_event_ids, time_range,
+			event_templates, storage_state, num_events, result_type)
+
+	def get_events(self, event_ids):
+		"""
+		Returns the structs of the given events, in the same order, like
+		the engine's GetEvents method. Events which don't exist are
+		represented by :const:`NULL_EVENT`.
+		"""
+		return self._read_transaction(self._get_events, event_ids)
+
+	def find_events(self, time_range, event_templates,
+		storage_state=StorageState.Any, num_events=20,
+		result_type=ResultType.MostRecentEvents):
+		"""
+		Returns the structs of the events matching the query, like the
+		engine's FindEvents method.
+		"""
+		def find_events():
+			return self._get_events(self._find_event_ids(time_range,
+				event_templates, storage_state, num_events, result_type))
+		return self._read_transaction(find_events)
+
+	def _find_event_ids(self, time_range, event_templates, storage_state,
+		num_events, result_type):
+		where = self._get_where_clause_for_query(time_range, event_templates,
+			storage_state)
+
+		if result_type in (ResultType.MostRecentEvents,
+			ResultType.LeastRecentEvents):
+			sql = "SELECT id FROM event_view "
+			if where:
+				sql += "WHERE " + where.sql
+			sql += " ORDER BY "
+		elif result_type in _GROUPED_RESULT_TYPES:
+			sql = self._group_and_sort(where,
+				*_GROUPED_RESULT_TYPES[result_type])
+		else:
+			raise ValueError("Invalid ResultType.")
+
+		# complete the sort rule
+		if result_type in _ASCENDING_RESULT_TYPES:
+			sql += " timestamp ASC"
+		else:
+			sql += " timestamp DESC"
+
+		if where.is_simple:
+			sql = sql.replace("FROM event_view", "FROM event")
+
+		event_ids = []
+		for row in self._connection.execute(sql, where.arguments):
+			# Some grouping queries also select the timestamp
+			event_id = row[0]
+			# Events are supposed to be contiguous in the database
+			if not event_ids or event_ids[-1] != event_id:
+				event_ids.append(event_id)
+				if len(event_ids) == num_events:
+					break
+		return event_ids
+
+	def _get_events(self, event_ids):
+		event_ids = map(int, event_ids)
+		events = {}
+		unique_ids = list(set(event_ids))
+		for start in xrange(0, len(unique_ids), EVENT_ID_CHUNK_SIZE):
+			chunk = unique_ids[start:start + EVENT_ID_CHUNK_SIZE]
+			sql = _EVENT_RETRIEVAL_SQL % ", ".join("?" * len(chunk))
+			for row in self._connection.execute(sql, chunk):
+				event_id = row[0]
+				event = events.get(event_id)
+				if event is None:
+					event = events[event_id] = [
+						[unicode(event_id), unicode(row[1]),
+							self._interpretations.get_value(row[2]),
+							self._manifestations.get_value(row[3]),
+							self._actors.get_value(row[4]),
+							row[6] or u""],
+						[],
+						# Like in DBus replies, the payload is a list of
+						# bytes
+						map(ord, str(row[5] or ""))]
+				subject = [row[7] or u"",
+					self._interpretations.get_value(row[8]),
+					self._manifestations.get_value(row[9]),
+					row[10] or u"",
+					self._mimetypes.get_value(row[11]),
+					row[12] or u"",
+					row[13] or u"",
+					row[14] or u"",
+					row[15] or u""]
+				event[1].append(subject)
+		return [events.get(event_id, NULL_EVENT) for event_id in event_ids]
+
+	def _get_where_clause_for_query(self, time_range, event_templates,
+		storage_state):
+		where = WhereClause(WhereClause.AND)
+
+		start, end = time_range[0], time_range[1]
+		if start != 0:
+			where.add("timestamp >= ?", int(start))
+		if end != 0:
+			where.add("timestamp <= ?", int(end))
+
+		if storage_state in (StorageState.Available,
+			StorageState.NotAvailable):
+			where.add("(subj_storage_state=? OR subj_storage_state IS NULL)",
+				int(storage_state))
+			where.is_simple = False
+		elif storage_state != StorageState.Any:
+			raise ValueError("Unknown storage state '%s'" % storage_state)
+
+		templates_where = WhereClause(WhereClause.OR)
+		for template in event_templates:
+			templates_where.extend(
+				self._get_where_clause_for_template(template))
+		where.extend(templates_where)
+
+		return where
+
+	def _get_where_clause_for_symbol(self, column, symbol, table):
+		symbol, negated = _parse_negation(symbol)
+		symbol, noexpand = _parse_noexpand(symbol)
+		if noexpand:
+			symbols = [symbol]
+		else:
+			symbols = Symbol.find_child_uris_extended(symbol)
+
+		where = WhereClause(WhereClause.OR, negated)
+		if len(symbols) == 1:
+			where.add_match_condition(column, table.get_id(symbol))
+		else:
+			where.add("(%s)" % " OR ".join("%s = %d " % (column,
+				table.get_id(uri)) for uri in symbols))
+		return where
+
+	def _add_uri_condition(self, where, column, value):
+		value, like = _parse_wildcard(value)
+		value, negated = _parse_negation(value)
+		if like:
+			where.add_wildcard_condition(column, value, negated)
+		else:
+			where.add_text_condition_subquery(column, value, negated)
+
+	def _get_where_clause_for_template(self, template):
+		where = WhereClause(WhereClause.AND)
+
+		if template.id:
+			where.add("id=?", template.id)
+
+		if template.interpretation:
+			_assert_no_wildcard("interpretation", template.interpretation)
+			where.extend(self._get_where_clause_for_symbol("interpretation",
+				template.interpretation, self._interpretations))
+
+		if template.manifestation:
+			_assert_no_wildcard("manifestation", template.manifestation)
+			where.extend(self._get_where_clause_for_symbol("manifestation",
+				template.manifestation, self._manifestations))
+
+		if template.actor:
+			value, like = _parse_wildcard(template.actor)
+			value, negated = _parse_negation(value)
+			if like:
+				where.add_wildcard_condition("actor", value, negated)
+			else:
+				where.add_match_condition("actor",
+					self._actors.get_id(value), negated)
+
+		if template.origin:
+			self._add_uri_condition(where, "origin", template.origin)
+
+		# Subject templates within the same event template are AND'd
+		# See LP bug #592599.
+		for subject in template.subjects:
+			if subject.interpretation:
+				_assert_no_wildcard("subject interpretation",
+					subject.interpretation)
+				where.extend(self._get_where_clause_for_symbol(
+					"subj_interpretation", subject.interpretation,
+					self._interpretations))
+
+			if subject.manifestation:
+				_assert_no_wildcard("subject manifestation",
+					subject.manifestation)
+				where.extend(self._get_where_clause_for_symbol(
+					"subj_manifestation", subject.manifestation,
+					self._manifestations))
+
+			if subject.mimetype:
+				value, like = _parse_wildcard(subject.mimetype)
+				value, negated = _parse_negation(value)
+				if like:
+					where.add_wildcard_condition("subj_mimetype", value,
+						negated)
+				else:
+					where.add_match_condition("subj_mimetype",
+						self._mimetypes.get_id(value), negated)
+
+			if subject.uri:
+				self._add_uri_condition(where, "subj_id", subject.uri)
+
+			if subject.origin:
+				self._add_uri_condition(where, "subj_origin", subject.origin)
+
+			if subject.text:
+				# Negation, noexpand and prefix search aren't supported
+				# for subject texts, but "!", "+" and "*" are valid as
+				# plain text characters.
+				where.add_text_condition_subquery("subj_text_id",
+					subject.text)
+
+			if subject.current_uri:
+				self._add_uri_condition(where, "subj_id_current",
+					subject.current_uri)
+
+			if subject.current_origin:
+				self._add_uri_condition(where, "subj_origin_current",
+					subject.current_origin)
+
+			if subject.storage:
+				_assert_no_negation("subject storage", subject.storage)
+				_assert_no_wildcard("subject storage", subject.storage)
+				where.add_text_condition_subquery("subj_storage_id",
+					subject.storage)
+
+		return where
+
+	@staticmethod
+	def _group_and_sort(where, field, count_asc, aggregation):
+		aggregation_sql = ""
+		order_sql = ""
+		where_sql = where.sql if where else "1"
+		if count_asc is not None:
+			aggregation_sql = ", COUNT(%s) AS num_events" % field
+			order_sql = "num_events %s," % ("ASC" if count_asc else "DESC")
+		if count_asc is not None or not where.has_non_timestamp_condition():
+			return """
+				SELECT id FROM event
+				NATURAL JOIN (
+					SELECT %s,
+					%s(timestamp) AS timestamp
+					%s
+					FROM event_view WHERE %s
+					GROUP BY %s)
+				GROUP BY %s
+				ORDER BY %s
+				""" % (field, aggregation, aggregation_sql, where_sql,
+					field, field, order_sql)
+		return """
+			SELECT id, %s(timestamp) AS timestamp
+				FROM event_view WHERE %s AND %s IS NOT NULL
+			GROUP BY %s
+			ORDER BY
+			""" % (aggregation, where_sql, field, field)
+
+# vim:noexpandtab:ts=4:sw=4
@@ -0,0 +1,253 @@
+/* cursor-manager.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * Keeps track of the paged queries started with FindEventsPaged.
+     *
+     * A cursor only holds the IDs of the events matched by the query, the
+     * events themselves are fetched from the database one page at a time.
+     * Each page is returned together with a continuation token, which has
+     * to be passed back to get the next page; the token is empty once all
+     * events have been returned.
+     *
+     * Cursors which aren't used for CURSOR_TIMEOUT seconds are dropped.
+     */
+    public class CursorManager : Object
+    {
+        public const uint DEFAULT_PAGE_SIZE = 100;
+        public const uint MAX_PAGE_SIZE = 10000;
+
+        private const uint MAX_CURSORS = 64;
+        private const uint CURSOR_TIMEOUT = 300; // seconds
+
+        [Compact]
+        private class Cursor
+        {
+            public string id;
+            public string? owner;
+            public uint32[] event_ids;
+            public int64 last_used;
+        }
+
+        private unowned Engine engine;
+        private HashTable<string, Cursor> cursors;
+        private uint cursor_counter = 0;
+        private uint expiry_source_id = 0;
+
+        public CursorManager (Engine engine)
+        {
+            this.engine = engine;
+            cursors = new HashTable<string, Cursor> (str_hash, str_equal);
+        }
+
+        ~CursorManager ()
+        {
+            if (expiry_source_id != 0)
+                Source.remove (expiry_source_id);
+        }
+
+        /**
+         * Creates a cursor over the given events and returns the first page.
+         *
+         * @param continuation_token token for the next page, or an empty
+         *     string if all events fit into the first page
+         */
+        public Variant open (uint32[] event_ids, uint page_size,
+            string? owner, out string continuation_token) throws Error
+        {
+            var cursor = new Cursor ();
+            cursor.id = "%x%08x".printf (++cursor_counter, Random.next_int ());
+            cursor.owner = owner;
+            cursor.event_ids = event_ids;
+            cursor.last_used = get_monotonic_time ();
+
+            unowned Cursor unowned_cursor = cursor;
+            if (cursors.size () >= MAX_CURSORS)
+                remove_least_recently_used ();
+            cursors.insert (cursor.id, (owned) cursor);
+            schedule_expiry ();
+
+            return get_page_for_cursor (unowned_cursor, 0, page_size,
+                out continuation_token);
+        }
+
+        /**
+         * Returns the page identified by `continuation_token'.
+         *
+         * @param next_token token for the page after this one, or an empty
+         *     string if this was the last page
+         */
+        public Variant get_page (string continuation_token, uint page_size,
+            string? owner, out string next_token) throws Error
+        {
+            uint position;
+            unowned Cursor cursor = lookup_cursor (continuation_token, owner,
+                out position);
+            cursor.last_used = get_monotonic_time ();
+
+            return get_page_for_cursor (cursor, position, page_size,
+                out next_token);
+        }
+
+        /**
+         * Drops the cursor identified by `continuation_token' before all
+         * of its pages have been fetched.
+         */
+        public void close (string continuation_token, string? owner)
+            throws Error
+        {
+            uint position;
+            unowned Cursor cursor = lookup_cursor (continuation_token, owner,
+                out position);
+            cursors.remove (cursor.id);
+        }
+
+        private unowned Cursor lookup_cursor (string continuation_token,
+            string? owner, out uint position) throws EngineError
+        {
+            string[] parts = continuation_token.split (":");
+            unowned Cursor? cursor = null;
+            if (parts.length == 2)
+                cursor = cursors.lookup (parts[0]);
+
+            if (cursor == null || cursor.owner != owner)
+            {
+                throw new EngineError.INVALID_ARGUMENT (
+                    "Invalid or expired continuation token: %s".printf (
+                        continuation_token));
+            }
+
+            uint64 parsed_position;
+            if (!uint64.try_parse (parts[1], out parsed_position)
+                || parsed_position > cursor.event_ids.length)
+            {
+                throw new EngineError.INVALID_ARGUMENT (
+                    "Invalid continuation token: %s".printf (
+                        continuation_token));
+            }
+
+            position = (uint) parsed_position;
+            return cursor;
+        }
+
+        private Variant get_page_for_cursor (Cursor cursor, uint position,
+            uint page_size, out string next_token) throws Error
+        {
+            if (page_size == 0)
+                page_size = DEFAULT_PAGE_SIZE;
+            page_size = uint.min (page_size, MAX_PAGE_SIZE);
+
+            uint end = uint.min (position + page_size,
+                cursor.event_ids.length);
+            var events = engine.get_events (cursor.event_ids[position:end]);
+
+            // Pages are kept below the D-Bus size limit by handing out
+            // fewer events, instead of failing like FindEvents does
+            var vb = new VariantBuilder (new VariantType (
+                "a("+Utils.SIG_EVENT+")"));
+            size_t variant_size = 0;
+            uint num_added = 0;
+            uint i;
+            for (i = 0; i < events.length; ++i)
+            {
+                // Skip events which were deleted since the query was run
+                if (events[i] == null)
+                    continue;
+
+                var event_variant = events[i].to_variant ();
+                variant_size += event_variant.get_size ();
+                if (variant_size > Utils.MAX_DBUS_RESULT_SIZE)
+                {
+                    if (num_added == 0)
+                    {
+                        throw new DataModelError.TOO_MANY_RESULTS (
+                            "Event %u exceeds the size limit of %s".printf (
+                                events[i].id,
+                                format_size (Utils.MAX_DBUS_RESULT_SIZE)));
+                    }
+                    break;
+                }
+                vb.add_value (event_variant);
+                ++num_added;
+            }
+
+            position += i;
+            if (position < cursor.event_ids.length)
+            {
+                next_token = "%s:%u".printf (cursor.id, position);
+            }
+            else
+            {
+                next_token = "";
+                cursors.remove (cursor.id);
+            }
+
+            return vb.end ();
+        }
+
+        private void remove_least_recently_used ()
+        {
+            string? oldest = null;
+            int64 oldest_used = int64.MAX;
+
+            var iter = HashTableIter<string, Cursor> (cursors);
+            unowned string id;
+            unowned Cursor cursor;
+            while (iter.next (out id, out cursor))
+            {
+                if (cursor.last_used < oldest_used)
+                {
+                    oldest = id;
+                    oldest_used = cursor.last_used;
+                }
+            }
+
+            if (oldest != null)
+                cursors.remove (oldest);
+        }
+
+        private void schedule_expiry ()
+        {
+            if (expiry_source_id != 0)
+                return;
+
+            expiry_source_id = Timeout.add_seconds (CURSOR_TIMEOUT, () =>
+            {
+                int64 limit = get_monotonic_time ()
+                    - (int64) CURSOR_TIMEOUT * TimeSpan.SECOND;
+                cursors.foreach_remove ((id, cursor) =>
+                {
+                    return cursor.last_used < limit;
+                });
+
+                if (cursors.size () > 0)
+                    return true;
+                expiry_source_id = 0;
+                return false;
+            });
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -36,6 +36,11 @@ public class Engine : DbReader
 {
 
     public ExtensionStore extension_store;
+    public QueryCache query_cache;
+    public SearchIndex? search_index;
+    // Runs the read-only queries of the daemon, if it has started one
+    public unowned ReaderPool? reader_pool = null;
+    public bool importing { get; private set; default = false; }
     private ExtensionCollection extension_collection;
 
     private uint32 last_id;
@@ -47,6 +52,9 @@ public class Engine : DbReader
         // TODO: take care of this if we decide to subclass Engine
         // (we need to propagate the error, so it can't go to construct {})
         last_id = database.get_last_id ();
+        // restore the indices dropped by an import that was interrupted
+        DatabaseSchema.create_event_indices (db);
+        setup_search_index ();
         extension_collection = new ExtensionCollection (this, {});
     }
 
@@ -57,20 +65,81 @@ public class Engine : DbReader
         // TODO: take care of this if we decide to subclass Engine
         // (we need to propagate the error, so it can't go to construct {})
         last_id = database.get_last_id ();
+        DatabaseSchema.create_event_indices (db);
+        setup_search_index ();
         extension_collection = new ExtensionCollection (this, builtins);
     }
 
     construct
     {
         extension_store = new ExtensionStore (this);
+        query_cache = new QueryCache ();
         database.set_cache_size (24);
     }
 
+    /**
+     * Creates the search index if ZEITGEIST_FTS_BACKEND selects the SQLite
+     * backend, and removes it otherwise. Must run before the extensions
+     * are loaded, as the FTS extension only starts the Xapian indexer if
+     * there is no search index.
+     */
+    private void setup_search_index () throws EngineError
+    {
+        if (Environment.get_variable (SearchIndex.BACKEND_VARIABLE)
+            != SearchIndex.BACKEND_SQLITE)
+        {
+            SearchIndex.drop (database);
+            return;
+        }
+
+        try
+        {
+            search_index = new SearchIndex (this);
+        }
+        catch (EngineError err)
+        {
+            // Most likely SQLite was built without FTS5
+            warning ("Can't use the SQLite search backend: %s", err.message);
+        }
+    }
+
     public string[] get_extension_names ()
     {
         return extension_collection.get_extension_names ();
     }
 
+    /**
+     * Drops the secondary indices of the event table, so that inserting
+     * lots of events doesn't have to update them for every row. They are
+     * built again, in one go, by end_import(). Queries still work in the
+     * meantime, but they are a lot slower.
+     */
+    public void begin_import () throws EngineError
+    {
+        if (importing)
+        {
+            throw new EngineError.INVALID_ARGUMENT (
+                "An import is already in progress");
+        }
+
+        DatabaseSchema.drop_event_indices (db);
+        importing = true;
+        message ("Started bulk import, dropped the event indices");
+    }
+
+    public void end_import () throws EngineError
+    {
+        if (!importing)
+            return;
+
+        var timer = new Timer ();
+        DatabaseSchema.create_event_indices (db);
+        DatabaseSchema.exec_query (db, "ANALYZE");
+        importing = false;
+        message ("Finished bulk import, rebuilt the event indices in %f seconds",
+            timer.elapsed ());
+    }
+
     public uint32[] insert_events (GenericArray<Event> events,
         BusName? sender=null) throws EngineError
     {
@@ -84,14 +153,26 @@ public class Engine : DbReader
         extension_collection.call_pre_insert_events (events, sender);
         uint32[] event_ids = new uint32[events.length];
         EngineError? err = null;
+        uint32 previous_last_id = last_id;
         database.begin_transaction ();
         try
         {
             insert_event_data (events);
-            for (int i = 0; i < events.length; ++i)
+            insert_event_batches (events, event_ids);
+            if (search_index != null)
             {
-                if (events[i] != null)
-                    event_ids[i] = insert_event (events[i]);
+                // Duplicates get the ID of the existing event, which is
+                // indexed already. Duplicates of an event earlier in the
+                // same batch keep the ID they were tentatively given, which
+                // doesn't match theirs.
+                var inserted = new GenericArray<Event?> ();
+                for (int i = 0; i < events.length; ++i)
+                {
+                    if (event_ids[i] > previous_last_id &&
+                        events[i].id == event_ids[i])
+                        inserted.add (events[i]);
+                }
+                search_index.add_events (inserted);
             }
             database.end_transaction ();
         }
@@ -102,10 +183,51 @@ public class Engine : DbReader
         }
         if (err != null) throw err;
 
+        invalidate_query_cache_for_insertion (events, event_ids);
+
         extension_collection.call_post_insert_events (events, sender);
         return event_ids;
     }
 
+    private void invalidate_query_cache_for_insertion (
+        GenericArray<Event?> events, uint32[] event_ids)
+    {
+        int64 min_timestamp = int64.MAX;
+        int64 max_timestamp = int64.MIN;
+        var inserted = new GenericArray<Event?> ();
+        for (int i = 0; i < events.length; ++i)
+        {
+            if (events[i] == null || event_ids[i] == 0)
+                continue;
+            min_timestamp = int64.min (min_timestamp, events[i].timestamp);
+            max_timestamp = int64.max (max_timestamp, events[i].timestamp);
+            inserted.add (events[i]);
+        }
+
+        if (inserted.length > 0)
+        {
+            query_cache.invalidate_insertion (
+                new TimeRange (min_timestamp, max_timestamp), inserted);
+        }
+    }
+
+    public override uint32[] find_event_ids (TimeRange time_range,
+        GenericArray<Event> event_templates,
+        uint storage_state, uint max_events, uint result_type,
+        BusName? sender=null) throws EngineError
+    {
+        uint32[]? event_ids = query_cache.lookup (time_range, event_templates,
+            storage_state, max_events, result_type);
+        if (event_ids != null)
+            return event_ids;
+
+        event_ids = base.find_event_ids (time_range, event_templates,
+            storage_state, max_events, result_type, sender);
+        query_cache.store (time_range, event_templates, storage_state,
+            max_events, result_type, event_ids);
+        return event_ids;
+    }
+
     private void preprocess_event (Event event) throws EngineError
     {
         if (is_empty_string (event.interpretation)
@@ -279,6 +401,159 @@ public class Engine : DbReader
             stmt.bind_null (position);
     }
 
+    /**
+     * Binds the event table row for the given subject of `event' to the
+     * EVENT_INSERTION_COLUMNS parameters following position `offset'.
+     */
+    private void bind_event_row (Sqlite.Statement stmt, int offset,
+        Event event, int64 payload_id, Subject subject) throws EngineError
+    {
+        stmt.bind_int64 (offset + 1, event.id);
+        stmt.bind_int64 (offset + 2, event.timestamp);
+        bind_cached_reference (stmt, offset + 3, interpretations_table,
+            event.interpretation);
+        bind_cached_reference (stmt, offset + 4, manifestations_table,
+            event.manifestation);
+        bind_cached_reference (stmt, offset + 5, actors_table, event.actor);
+        stmt.bind_text (offset + 6, event.origin);
+        stmt.bind_int64 (offset + 7, payload_id);
+
+        stmt.bind_text (offset + 8, subject.uri);
+        stmt.bind_text (offset + 9, subject.current_uri);
+        bind_cached_reference (stmt, offset + 10, interpretations_table,
+            subject.interpretation);
+        bind_cached_reference (stmt, offset + 11, manifestations_table,
+            subject.manifestation);
+        stmt.bind_text (offset + 12, subject.origin);
+        stmt.bind_text (offset + 13, subject.current_origin);
+        bind_cached_reference (stmt, offset + 14, mimetypes_table,
+            subject.mimetype);
+        stmt.bind_text (offset + 15, subject.text);
+        // FIXME: Consider a storages_table table. Too dangerous?
+        stmt.bind_text (offset + 16, subject.storage);
+    }
+
+    /**
+     * Inserts all non-null events, storing their IDs in `event_ids'.
+     *
+     * Consecutive events are grouped and written with a single multi-row
+     * INSERT, instead of stepping event_insertion_stmt once per subject.
+     * Move events (which need to update older rows right after being
+     * inserted) and events with too many subjects to fit in one statement
+     * go through insert_event().
+     */
+    private void insert_event_batches (GenericArray<Event> events,
+        uint32[] event_ids) throws EngineError
+    {
+        int[] batch = {};
+        int batch_rows = 0;
+
+        for (int i = 0; i < events.length; ++i)
+        {
+            if (events[i] == null) continue;
+
+            Event event = events[i];
+            int num_rows = event.num_subjects ();
+            if (event.id != 0 || num_rows == 0
+                || num_rows > Database.EVENT_BATCH_MAX_ROWS
+                || event.interpretation == ZG.MOVE_EVENT)
+            {
+                insert_event_batch (events, batch, batch_rows, event_ids);
+                batch = {};
+                batch_rows = 0;
+
+                event_ids[i] = insert_event (event);
+                continue;
+            }
+
+            if (batch_rows + num_rows > Database.EVENT_BATCH_MAX_ROWS)
+            {
+                insert_event_batch (events, batch, batch_rows, event_ids);
+                batch = {};
+                batch_rows = 0;
+            }
+            batch += i;
+            batch_rows += num_rows;
+        }
+
+        insert_event_batch (events, batch, batch_rows, event_ids);
+    }
+
+    /**
+     * Inserts the events at the given indices of `events' with one
+     * statement.
+     *
+     * If the statement fails, for instance because one of the events is
+     * already in the database (or appears twice in the batch), everything
+     * is rolled back and the events are inserted one at a time using
+     * insert_event(), which takes care of duplicates and of keeping
+     * `last_id' in sync.
+     */
+    private void insert_event_batch (GenericArray<Event> events,
+        int[] batch, int num_rows, uint32[] event_ids) throws EngineError
+    {
+        if (batch.length == 0)
+            return;
+        if (batch.length == 1)
+        {
+            event_ids[batch[0]] = insert_event (events[batch[0]]);
+            return;
+        }
+
+        uint32 first_id = last_id;
+        database.set_savepoint ("event_batch");
+
+        unowned Sqlite.Statement insert_stmt =
+            database.get_event_batch_insertion_stmt (num_rows);
+        insert_stmt.reset ();
+
+        int offset = 0;
+        foreach (int index in batch)
+        {
+            Event event = events[index];
+            event.id = ++last_id;
+
+            var payload_id = store_payload (event);
+
+            for (int i = 0; i < event.num_subjects (); ++i)
+            {
+                bind_event_row (insert_stmt, offset, event, payload_id,
+                    event.subjects[i]);
+                offset += Database.EVENT_INSERTION_COLUMNS;
+            }
+        }
+
+        int rc = insert_stmt.step ();
+        insert_stmt.reset ();
+        if (rc == Sqlite.DONE)
+        {
+            database.release_savepoint ("event_batch");
+            foreach (int index in batch)
+                event_ids[index] = events[index].id;
+
+            // After every 1000 events we analyze the queries
+            if (first_id / 1000 != last_id / 1000)
+                Idle.add((SourceFunc)database.analyze);
+            return;
+        }
+
+        database.assert_not_corrupt (rc);
+        if (rc != Sqlite.CONSTRAINT)
+            warning ("SQL error: %d, %s\n", rc, db.errmsg ());
+
+        database.rollback_to_savepoint ("event_batch");
+        database.release_savepoint ("event_batch");
+        last_id = first_id;
+
+        debug ("Batch insertion failed, inserting %d events one by one",
+            batch.length);
+        foreach (int index in batch)
+        {
+            events[index].id = 0;
+            event_ids[index] = insert_event (events[index]);
+        }
+    }
+
     private uint32 insert_event (Event event) throws EngineError
         requires (event.id == 0)
         requires (event.num_subjects () > 0)
@@ -296,32 +571,8 @@ public class Engine : DbReader
         for (int i = 0; i < event.num_subjects (); ++i)
         {
             insert_stmt.reset ();
-
-            insert_stmt.bind_int64 (1, event.id);
-            insert_stmt.bind_int64 (2, event.timestamp);
-            bind_cached_reference (insert_stmt, 3, interpretations_table,
-                event.interpretation);
-            bind_cached_reference (insert_stmt, 4, manifestations_table,
-                event.manifestation);
-            bind_cached_reference (insert_stmt, 5, actors_table, event.actor);
-            insert_stmt.bind_text (6, event.origin);
-            insert_stmt.bind_int64 (7, payload_id);
-
-            unowned Subject subject = event.subjects[i];
-
-            insert_stmt.bind_text (8, subject.uri);
-            insert_stmt.bind_text (9, subject.current_uri);
-            bind_cached_reference (insert_stmt, 10, interpretations_table,
-                subject.interpretation);
-            bind_cached_reference (insert_stmt, 11, manifestations_table,
-                subject.manifestation);
-            insert_stmt.bind_text (12, subject.origin);
-            insert_stmt.bind_text (13, subject.current_origin);
-            bind_cached_reference (insert_stmt, 14, mimetypes_table,
-                subject.mimetype);
-            insert_stmt.bind_text (15, subject.text);
-            // FIXME: Consider a storages_table table. Too dangerous?
-            insert_stmt.bind_text (16, subject.storage);
+            bind_event_row (insert_stmt, 0, event, payload_id,
+                event.subjects[i]);
 
             if ((rc = insert_stmt.step ()) != Sqlite.DONE) {
                 if (rc != Sqlite.CONSTRAINT)
@@ -387,11 +638,29 @@ public class Engine : DbReader
             return null;
         }
 
-        int rc = db.exec ("DELETE FROM event WHERE id IN (%s)".printf(
-            sql_event_ids), null, null);
-        database.assert_query_success (rc, "SQL Error");
+        int num_deleted = 0;
+        EngineError? err = null;
+        database.begin_transaction ();
+        try
+        {
+            int rc = db.exec ("DELETE FROM event WHERE id IN (%s)".printf(
+                sql_event_ids), null, null);
+            database.assert_query_success (rc, "SQL Error");
+            num_deleted = db.changes ();
+            if (search_index != null)
+                search_index.delete_events (event_ids);
+            database.end_transaction ();
+        }
+        catch (EngineError e)
+        {
+            err = e;
+            database.abort_transaction ();
+        }
+        if (err != null) throw err;
         message ("Deleted %d (out of %d) events.".printf (
-            db.changes(), event_ids.length));
+            num_deleted, event_ids.length));
+
+        query_cache.invalidate_deletion (time_range);
 
         extension_collection.call_post_delete_events (event_ids, sender);
 
@@ -411,6 +680,16 @@ public class Engine : DbReader
         // all extensions and they get a chance to access the database
         // (including through ExtensionStore) before it's closed.
         extension_collection = null;
+        search_index = null;
+        try
+        {
+            end_import ();
+        }
+        catch (EngineError err)
+        {
+            warning ("Unable to rebuild the event indices: %s", err.message);
+        }
+        query_cache.clear ();
 
         base.close ();
     }
@@ -0,0 +1,158 @@
+/* import-manager.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * Keeps track of the bulk import started with BeginImport.
+     *
+     * Only one client can import at a time, and only that client may call
+     * ImportEvents and EndImport. Each ImportEvents call is inserted in a
+     * single transaction, while the event table has no secondary indices
+     * (see Engine.begin_import()); they are rebuilt by EndImport.
+     *
+     * If the importing client doesn't call ImportEvents for IMPORT_TIMEOUT
+     * seconds, the import is ended on its behalf, so that a crashed client
+     * doesn't leave the database without indices.
+     */
+    public class ImportManager : Object
+    {
+        public const uint MAX_BATCH_SIZE = 50000;
+
+        private const uint IMPORT_TIMEOUT = 300; // seconds
+
+        private unowned Engine engine;
+        private string? owner = null;
+        private uint num_imported = 0;
+        private int64 last_used = 0;
+        private Timer timer;
+        private uint expiry_source_id = 0;
+
+        public ImportManager (Engine engine)
+        {
+            this.engine = engine;
+            timer = new Timer ();
+        }
+
+        ~ImportManager ()
+        {
+            if (expiry_source_id != 0)
+                Source.remove (expiry_source_id);
+        }
+
+        public void begin (string? owner) throws EngineError
+        {
+            if (engine.importing)
+            {
+                throw new EngineError.INVALID_ARGUMENT (
+                    "Another client is already importing events");
+            }
+
+            engine.begin_import ();
+            this.owner = owner;
+            num_imported = 0;
+            last_used = get_monotonic_time ();
+            timer.start ();
+            schedule_expiry ();
+        }
+
+        public uint32[] import_events (GenericArray<Event?> events,
+            string? owner) throws EngineError
+        {
+            check_owner (owner);
+            if (events.length > MAX_BATCH_SIZE)
+            {
+                throw new EngineError.INVALID_ARGUMENT (
+                    "Can't import more than %u events at once".printf (
+                        MAX_BATCH_SIZE));
+            }
+
+            last_used = get_monotonic_time ();
+            uint32[] event_ids = engine.insert_events (events, owner);
+            num_imported += events.length;
+
+            message ("Imported %u events (%.0f events per second)",
+                num_imported, num_imported / timer.elapsed ());
+            return event_ids;
+        }
+
+        /**
+         * Rebuilds the indices and returns the number of imported events.
+         */
+        public uint end (string? owner) throws EngineError
+        {
+            check_owner (owner);
+            finish ();
+            return num_imported;
+        }
+
+        private void check_owner (string? owner) throws EngineError
+        {
+            if (!engine.importing || this.owner != owner)
+            {
+                throw new EngineError.INVALID_ARGUMENT (
+                    "No import was started by this client");
+            }
+        }
+
+        private void finish () throws EngineError
+        {
+            if (expiry_source_id != 0)
+            {
+                Source.remove (expiry_source_id);
+                expiry_source_id = 0;
+            }
+            owner = null;
+            engine.end_import ();
+        }
+
+        private void schedule_expiry ()
+        {
+            expiry_source_id = Timeout.add_seconds (IMPORT_TIMEOUT, () =>
+            {
+                int64 limit = get_monotonic_time ()
+                    - (int64) IMPORT_TIMEOUT * TimeSpan.SECOND;
+                if (engine.importing && last_used >= limit)
+                    return true;
+
+                expiry_source_id = 0;
+                if (engine.importing)
+                {
+                    warning ("Ending the import of %s, which is idle",
+                        owner ?? "unknown client");
+                    try
+                    {
+                        finish ();
+                    }
+                    catch (EngineError err)
+                    {
+                        warning ("Unable to end the import: %s",
+                            err.message);
+                    }
+                }
+                return false;
+            });
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
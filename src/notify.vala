@@ -26,11 +26,23 @@ namespace Zeitgeist
     public class MonitorManager : Object
     {
 
+        // Upper bound for the latency monitors may ask for, in milliseconds
+        public const uint MAX_NOTIFICATION_LATENCY = 10000;
+        // Coalesced insertions are sent early once this many are pending
+        private const uint MAX_COALESCED_EVENTS = 500;
+
         private static unowned MonitorManager? instance;
 
         private HashTable<string, Monitor> monitors;
         private HashTable<string, GenericArray<string>> connections;
 
+        // Monitors indexed by property values, one of which an event needs
+        // to have to possibly match the monitor's templates (see
+        // get_template_index_keys). Monitors whose templates can't be
+        // indexed are kept in unindexed_monitors and get all events.
+        private HashTable<string, GenericArray<Monitor>> monitor_index;
+        private GenericArray<Monitor> unindexed_monitors;
+
         // ref-counted singleton - it can get destroyed easily, but has
         // singleton semantics as long as some top-level instance keeps
         // a reference to it
@@ -55,6 +67,9 @@ namespace Zeitgeist
             monitors = new HashTable<string, Monitor> (str_hash, str_equal);
             connections = new HashTable<string, GenericArray<string>>
                 (str_hash, str_equal);
+            monitor_index = new HashTable<string, GenericArray<Monitor>>
+                (str_hash, str_equal);
+            unindexed_monitors = new GenericArray<Monitor> ();
 
             // FIXME: it'd be nice if this supported arg2
             try
@@ -100,6 +115,20 @@ namespace Zeitgeist
             private TimeRange time_range;
             private RemoteMonitor? proxy_object = null;
 
+            // Coalescing of notifications (if max_latency != 0): changes
+            // are collected for up to max_latency milliseconds and then
+            // sent together, with the merged time range.
+            private uint max_latency;
+            private uint flush_source_id = 0;
+            private GenericArray<Event> pending_events;
+            private TimeRange? pending_events_time_range = null;
+            private uint32[] pending_event_ids;
+            private TimeRange? pending_event_ids_time_range = null;
+
+            // Keys under which the monitor is found in monitor_index,
+            // or null if it is in unindexed_monitors
+            public string[]? index_keys;
+
             private enum NotificationType
             {
                 INSERTION,
@@ -138,9 +167,13 @@ namespace Zeitgeist
             private SList<QueuedNotification> queued_notifications;
 
             public Monitor (BusName peer, string object_path,
-                TimeRange tr, GenericArray<Event> templates)
+                TimeRange tr, GenericArray<Event> templates,
+                uint max_latency=0)
             {
                 queued_notifications = new SList<QueuedNotification> ();
+                this.max_latency = uint.min (max_latency,
+                    MAX_NOTIFICATION_LATENCY);
+                pending_events = new GenericArray<Event> ();
                 Bus.get_proxy.begin<RemoteMonitor> (BusType.SESSION, peer,
                     object_path,
                     DBusProxyFlags.DO_NOT_LOAD_PROPERTIES
@@ -214,36 +247,29 @@ namespace Zeitgeist
                             matching_events.add (events[i]);
                         }
                     }
-                    if (matching_events.length > 0)
+                    if (matching_events.length == 0)
+                        return;
+
+                    if (max_latency == 0)
                     {
-                        Variant time_v = intersect_tr.to_variant ();
-                        // FIXME: do we want to "cache" this for sharing
-                        // between monitors?
-                        Variant events_v = Events.to_variant (matching_events);
+                        send_insert (intersect_tr, matching_events);
+                        return;
+                    }
 
-                        string? name_owner = null;
-                        if (proxy_object != null)
-                        {
-                            DBusProxy p = proxy_object as DBusProxy;
-                            if (p != null) name_owner = p.g_name_owner;
-                        }
+                    // Send what was collected so far first, to keep
+                    // insertions and deletions in order
+                    if (pending_event_ids.length > 0)
+                        flush_pending ();
 
-                        if (proxy_object != null && name_owner != null)
-                        {
-                            DBusProxy p = (DBusProxy) proxy_object;
-                            debug ("Notifying %s about %d insertions",
-                                p.get_name (), matching_events.length);
+                    for (int i = 0; i < matching_events.length; i++)
+                        pending_events.add (matching_events[i]);
+                    pending_events_time_range = merge_time_ranges (
+                        pending_events_time_range, intersect_tr);
 
-                            proxy_object.notify_insert.begin (time_v, events_v);
-                        }
-                        else
-                        {
-                            debug ("Queueing notification about %d insertions",
-                                matching_events.length);
-                            queued_notifications.prepend (
-                                new QueuedNotification.insertion (time_v, events_v));
-                        }
-                    }
+                    if (pending_events.length >= MAX_COALESCED_EVENTS)
+                        flush_pending ();
+                    else
+                        schedule_flush ();
                 }
             }
 
@@ -252,37 +278,154 @@ namespace Zeitgeist
                 var intersect_tr = time_range.intersect (this.time_range);
                 if (intersect_tr != null)
                 {
-                    Variant time_v = intersect_tr.to_variant ();
-
-                    string? name_owner = null;
-                    if (proxy_object != null)
+                    if (max_latency == 0)
                     {
-                        DBusProxy p = proxy_object as DBusProxy;
-                        if (p != null) name_owner = p.g_name_owner;
+                        send_delete (intersect_tr, event_ids);
+                        return;
                     }
 
-                    if (proxy_object != null && name_owner != null)
-                    {
-                        proxy_object.notify_delete.begin (time_v, event_ids);
-                    }
-                    else
-                    {
-                        queued_notifications.prepend (
-                            new QueuedNotification.deletion (time_v, event_ids));
-                    }
+                    if (pending_events.length > 0)
+                        flush_pending ();
+
+                    foreach (uint32 event_id in event_ids)
+                        pending_event_ids += event_id;
+                    pending_event_ids_time_range = merge_time_ranges (
+                        pending_event_ids_time_range, intersect_tr);
+                    schedule_flush ();
+                }
+            }
+
+            /**
+             * Drops any coalesced notifications which weren't sent yet.
+             */
+            public void cancel_pending ()
+            {
+                if (flush_source_id != 0)
+                {
+                    Source.remove (flush_source_id);
+                    flush_source_id = 0;
+                }
+                pending_events = new GenericArray<Event> ();
+                pending_events_time_range = null;
+                pending_event_ids = {};
+                pending_event_ids_time_range = null;
+            }
+
+            private void schedule_flush ()
+            {
+                if (flush_source_id != 0)
+                    return;
+                flush_source_id = Timeout.add (max_latency, () =>
+                {
+                    flush_source_id = 0;
+                    flush_pending ();
+                    return false;
+                });
+            }
+
+            private void flush_pending ()
+            {
+                if (pending_events.length > 0)
+                {
+                    var events = (owned) pending_events;
+                    pending_events = new GenericArray<Event> ();
+                    send_insert (pending_events_time_range, events);
+                    pending_events_time_range = null;
+                }
+
+                if (pending_event_ids.length > 0)
+                {
+                    var event_ids = (owned) pending_event_ids;
+                    pending_event_ids = {};
+                    send_delete (pending_event_ids_time_range, event_ids);
+                    pending_event_ids_time_range = null;
+                }
+
+                if (flush_source_id != 0)
+                {
+                    Source.remove (flush_source_id);
+                    flush_source_id = 0;
+                }
+            }
+
+            private static TimeRange merge_time_ranges (TimeRange? a,
+                TimeRange b)
+            {
+                if (a == null)
+                    return b;
+                return new TimeRange (int64.min (a.start, b.start),
+                    int64.max (a.end, b.end));
+            }
+
+            private bool is_proxy_connected ()
+            {
+                string? name_owner = null;
+                if (proxy_object != null)
+                {
+                    DBusProxy p = proxy_object as DBusProxy;
+                    if (p != null) name_owner = p.g_name_owner;
+                }
+                return proxy_object != null && name_owner != null;
+            }
+
+            private void send_insert (TimeRange time_range,
+                GenericArray<Event> events)
+            {
+                Variant time_v = time_range.to_variant ();
+                Variant events_v = Events.to_variant (events);
+
+                if (is_proxy_connected ())
+                {
+                    DBusProxy p = (DBusProxy) proxy_object;
+                    debug ("Notifying %s about %d insertions",
+                        p.get_name (), events.length);
+
+                    proxy_object.notify_insert.begin (time_v, events_v);
+                }
+                else
+                {
+                    debug ("Queueing notification about %d insertions",
+                        events.length);
+                    queued_notifications.prepend (
+                        new QueuedNotification.insertion (time_v, events_v));
+                }
+            }
+
+            private void send_delete (TimeRange time_range,
+                uint32[] event_ids)
+            {
+                Variant time_v = time_range.to_variant ();
+
+                if (is_proxy_connected ())
+                {
+                    proxy_object.notify_delete.begin (time_v, event_ids);
+                }
+                else
+                {
+                    queued_notifications.prepend (
+                        new QueuedNotification.deletion (time_v, event_ids));
                 }
             }
         }
 
+        /**
+         * Installs a monitor for the given peer.
+         *
+         * If `max_latency' isn't 0, notifications for the monitor are
+         * collected for up to that many milliseconds and sent together,
+         * merging their time ranges.
+         */
         public void install_monitor (BusName peer, string object_path,
-            TimeRange time_range, GenericArray<Event> templates)
+            TimeRange time_range, GenericArray<Event> templates,
+            uint max_latency=0)
         {
             var hash = "%s#%s".printf (peer, object_path);
             if (monitors.lookup (hash) == null)
             {
                 var monitor = new Monitor (peer, object_path, time_range,
-                    templates);
+                    templates, max_latency);
                 monitors.insert (hash, monitor);
+                add_to_index (monitor, templates);
                 if (connections.lookup (peer) == null)
                     connections.insert (peer, new GenericArray<string> ());
                 connections.lookup (peer).add (object_path);
@@ -300,8 +443,13 @@ namespace Zeitgeist
             debug ("Removing monitor %s%s", peer, object_path);
             var hash = "%s#%s".printf (peer, object_path);
 
-            if (monitors.lookup (hash) != null)
+            unowned Monitor? monitor = monitors.lookup (hash);
+            if (monitor != null)
+            {
+                monitor.cancel_pending ();
+                remove_from_index (monitor);
                 monitors.remove (hash);
+            }
             else
                 warning ("There's no monitor installed for %s", hash);
 
@@ -323,8 +471,30 @@ namespace Zeitgeist
         public void notify_insert (TimeRange time_range,
             GenericArray<Event> events)
         {
-            foreach (unowned Monitor mon in monitors.get_values ())
-                mon.notify_insert (time_range, events);
+            // Only hand each monitor the events which may match it
+            var candidates = new HashTable<Monitor, GenericArray<Event>> (
+                direct_hash, direct_equal);
+            for (int i = 0; i < events.length; i++)
+            {
+                if (events[i] == null)
+                    continue;
+
+                foreach (unowned string key in get_event_index_keys (events[i]))
+                {
+                    var indexed = monitor_index.lookup (key);
+                    if (indexed == null)
+                        continue;
+                    for (int j = 0; j < indexed.length; j++)
+                        add_candidate (candidates, indexed[j], events[i]);
+                }
+                for (int j = 0; j < unindexed_monitors.length; j++)
+                    add_candidate (candidates, unindexed_monitors[j], events[i]);
+            }
+
+            candidates.foreach ((mon, mon_events) =>
+            {
+                mon.notify_insert (time_range, mon_events);
+            });
         }
 
         public void notify_delete (TimeRange time_range, uint32[] event_ids)
@@ -332,6 +502,213 @@ namespace Zeitgeist
             foreach (unowned Monitor mon in monitors.get_values ())
                 mon.notify_delete (time_range, event_ids);
         }
+
+        private static void add_candidate (
+            HashTable<Monitor, GenericArray<Event>> candidates,
+            Monitor monitor, Event event)
+        {
+            unowned GenericArray<Event>? mon_events = candidates.lookup (
+                monitor);
+            if (mon_events == null)
+            {
+                var new_events = new GenericArray<Event> ();
+                new_events.add (event);
+                candidates.insert (monitor, new_events);
+            }
+            // An event may be found through several keys
+            else if (mon_events[mon_events.length - 1] != event)
+            {
+                mon_events.add (event);
+            }
+        }
+
+        private void add_to_index (Monitor monitor,
+            GenericArray<Event> templates)
+        {
+            string[] keys = {};
+            for (int i = 0; i < templates.length; i++)
+            {
+                string[]? template_keys = get_template_index_keys (
+                    templates[i]);
+                if (template_keys == null)
+                {
+                    unindexed_monitors.add (monitor);
+                    return;
+                }
+                foreach (unowned string key in template_keys)
+                {
+                    if (!(key in keys))
+                        keys += key;
+                }
+            }
+
+            // Monitors without templates match everything
+            if (keys.length == 0)
+            {
+                unindexed_monitors.add (monitor);
+                return;
+            }
+
+            monitor.index_keys = keys;
+            foreach (unowned string key in keys)
+            {
+                unowned GenericArray<Monitor>? indexed = monitor_index.lookup (
+                    key);
+                if (indexed == null)
+                {
+                    var new_indexed = new GenericArray<Monitor> ();
+                    new_indexed.add (monitor);
+                    monitor_index.insert (key, new_indexed);
+                }
+                else
+                {
+                    indexed.add (monitor);
+                }
+            }
+        }
+
+        private void remove_from_index (Monitor monitor)
+        {
+            if (monitor.index_keys == null)
+            {
+                unindexed_monitors.remove_fast (monitor);
+                return;
+            }
+
+            foreach (unowned string key in monitor.index_keys)
+            {
+                unowned GenericArray<Monitor>? indexed = monitor_index.lookup (
+                    key);
+                if (indexed == null)
+                    continue;
+                indexed.remove_fast (monitor);
+                if (indexed.length == 0)
+                    monitor_index.remove (key);
+            }
+        }
+
+        /*
+         * Returns the keys of the property values an event needs to have
+         * one of in order to match the template (as in Event.matches_template),
+         * or null if the template doesn't restrict any indexed property.
+         *
+         * The actor is preferred, as it is the most selective, then the
+         * subject URIs (indexed by the prefix up to their last slash),
+         * and then the interpretation and manifestation.
+         */
+        private static string[]? get_template_index_keys (Event template)
+        {
+            string? actor = get_indexable_value (template.actor);
+            if (actor != null)
+            {
+                string prefix = actor;
+                if (Utils.parse_wildcard (ref prefix))
+                    return { "uri-prefix:actor:" + get_uri_directory (prefix) };
+                return { "actor:" + actor };
+            }
+
+            if (template.subjects.length > 0)
+            {
+                // Any of the subject templates may match, so all of them
+                // need to be indexable
+                string[] keys = {};
+                bool indexable = true;
+                for (int i = 0; i < template.subjects.length && indexable; i++)
+                {
+                    string? uri = get_indexable_value (
+                        template.subjects[i].uri);
+                    if (uri != null)
+                    {
+                        Utils.parse_wildcard (ref uri);
+                        keys += "uri-prefix:subject:" + get_uri_directory (uri);
+                    }
+                    else
+                    {
+                        indexable = false;
+                    }
+                }
+                if (indexable)
+                    return keys;
+            }
+
+            string? interpretation = get_indexable_value (
+                template.interpretation);
+            if (interpretation != null)
+                return { "interpretation:" + interpretation };
+
+            string? manifestation = get_indexable_value (
+                template.manifestation);
+            if (manifestation != null)
+                return { "manifestation:" + manifestation };
+
+            return null;
+        }
+
+        /*
+         * Returns all keys under which monitors which may match the event
+         * are indexed. See get_template_index_keys.
+         */
+        private static string[] get_event_index_keys (Event event)
+        {
+            string[] keys = {};
+            if (event.actor != null)
+            {
+                keys += "actor:" + event.actor;
+                add_uri_prefix_keys (ref keys, "uri-prefix:actor:",
+                    event.actor);
+            }
+            for (int i = 0; i < event.subjects.length; i++)
+            {
+                if (event.subjects[i].uri != null)
+                {
+                    add_uri_prefix_keys (ref keys, "uri-prefix:subject:",
+                        event.subjects[i].uri);
+                }
+            }
+            add_symbol_keys (ref keys, "interpretation:", event.interpretation);
+            add_symbol_keys (ref keys, "manifestation:", event.manifestation);
+            return keys;
+        }
+
+        // Returns null for values which match any event, or match events
+        // by what they are not
+        private static string? get_indexable_value (string? val)
+        {
+            if (Utils.is_empty_string (val) || val.has_prefix ("!"))
+                return null;
+            return val;
+        }
+
+        private static string get_uri_directory (string uri)
+        {
+            int slash = uri.last_index_of_char ('/');
+            return (slash < 0) ? "" : uri.substring (0, slash + 1);
+        }
+
+        // Adds a key for every prefix of the URI ending with a slash
+        // (and for the empty prefix), so URIs are found by any prefix
+        // returned from get_uri_directory
+        private static void add_uri_prefix_keys (ref string[] keys,
+            string key_prefix, string uri)
+        {
+            keys += key_prefix;
+            int slash = 0;
+            while ((slash = uri.index_of_char ('/', slash)) >= 0)
+            {
+                slash++;
+                keys += key_prefix + uri.substring (0, slash);
+            }
+        }
+
+        private static void add_symbol_keys (ref string[] keys,
+            string key_prefix, string? symbol)
+        {
+            if (symbol == null)
+                return;
+            keys += key_prefix + symbol;
+            foreach (unowned string parent in Symbol.get_all_parents (symbol))
+                keys += key_prefix + parent;
+        }
     }
 
 }
@@ -0,0 +1,272 @@
+/* query-cache.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * Cache for the results of find_event_ids queries.
+     *
+     * Results are kept until an insertion or deletion could have changed
+     * them: inserted events are checked against the time range and the
+     * templates of each query (like MonitorManager does for monitors),
+     * while deletions drop all queries overlapping the deleted time range.
+     *
+     * The memory used by the cached results is bounded; once the limit is
+     * reached the least recently used results are dropped.
+     */
+    public class QueryCache : Object
+    {
+        // Maximum memory used by the cached results, in bytes
+        public const size_t DEFAULT_MAX_SIZE = 2 * 1024 * 1024;
+
+        [Compact]
+        private class CachedResult
+        {
+            public TimeRange time_range;
+            public GenericArray<Event> templates;
+            public uint storage_state;
+            public uint32[] event_ids;
+            public size_t size;
+            public uint64 last_used;
+        }
+
+        private HashTable<string, CachedResult> results;
+        private size_t max_size;
+        private size_t size = 0;
+        private uint64 clock = 0;
+
+        public uint hits { get; private set; default = 0; }
+        public uint misses { get; private set; default = 0; }
+        public uint invalidations { get; private set; default = 0; }
+
+        // Increased by every invalidation, so that a query which was run
+        // concurrently with an insertion or deletion can tell its result
+        // may be out of date, and not store it (see ReaderPool)
+        public uint64 generation { get; private set; default = 0; }
+
+        public QueryCache (size_t max_size=DEFAULT_MAX_SIZE)
+        {
+            this.max_size = max_size;
+            results = new HashTable<string, CachedResult> (str_hash,
+                str_equal);
+        }
+
+        private static string get_key (TimeRange time_range,
+            GenericArray<Event> templates, uint storage_state,
+            uint max_events, uint result_type)
+        {
+            return ("%" + int64.FORMAT + ":%" + int64.FORMAT + ":%u:%u:%u:%s")
+                .printf (time_range.start, time_range.end, storage_state,
+                    max_events, result_type,
+                    Events.to_variant (templates).print (false));
+        }
+
+        /**
+         * Returns the cached result for the given query, or null if there
+         * is none.
+         */
+        public uint32[]? lookup (TimeRange time_range,
+            GenericArray<Event> templates, uint storage_state,
+            uint max_events, uint result_type)
+        {
+            var key = get_key (time_range, templates, storage_state,
+                max_events, result_type);
+            unowned CachedResult? cached = results.lookup (key);
+            if (cached == null)
+            {
+                misses++;
+                return null;
+            }
+
+            hits++;
+            cached.last_used = ++clock;
+            return cached.event_ids;
+        }
+
+        public void store (TimeRange time_range,
+            GenericArray<Event> templates, uint storage_state,
+            uint max_events, uint result_type, uint32[] event_ids)
+        {
+            var key = get_key (time_range, templates, storage_state,
+                max_events, result_type);
+
+            var entry = new CachedResult ();
+            entry.time_range = time_range;
+            entry.templates = templates;
+            entry.storage_state = storage_state;
+            entry.event_ids = event_ids;
+            entry.size = key.length + event_ids.length * sizeof (uint32);
+            entry.last_used = ++clock;
+
+            // Don't let a single huge result flush everything else
+            if (entry.size > max_size / 4)
+                return;
+
+            remove (key);
+            while (size + entry.size > max_size)
+                remove_least_recently_used ();
+
+            size += entry.size;
+            results.insert (key, (owned) entry);
+        }
+
+        /**
+         * Drops the cached results which may be affected by the insertion
+         * of `events', whose timestamps are all within `time_range'.
+         */
+        public void invalidate_insertion (TimeRange time_range,
+            GenericArray<Event?> events)
+        {
+            generation++;
+            if (results.size () == 0)
+                return;
+
+            // Move events update the current URI of older events
+            for (int i = 0; i < events.length; ++i)
+            {
+                if (events[i] != null
+                    && events[i].interpretation == ZG.MOVE_EVENT)
+                {
+                    clear ();
+                    return;
+                }
+            }
+
+            remove_matching ((entry) =>
+            {
+                var intersect_tr = time_range.intersect (entry.time_range);
+                if (intersect_tr == null)
+                    return false;
+                for (int i = 0; i < events.length; ++i)
+                {
+                    if (events[i] != null
+                        && events[i].timestamp >= intersect_tr.start
+                        && events[i].timestamp <= intersect_tr.end
+                        && matches_templates (events[i], entry.templates))
+                    {
+                        return true;
+                    }
+                }
+                return false;
+            });
+        }
+
+        /**
+         * Drops the cached results which may include events deleted from
+         * within `time_range'.
+         */
+        public void invalidate_deletion (TimeRange time_range)
+        {
+            generation++;
+            remove_matching ((entry) =>
+            {
+                return time_range.intersect (entry.time_range) != null;
+            });
+        }
+
+        /**
+         * Drops the cached results which depend on the availability of
+         * storage mediums. Call this when the state of a medium changes.
+         */
+        public void invalidate_storage_state ()
+        {
+            generation++;
+            remove_matching ((entry) =>
+            {
+                return entry.storage_state != StorageState.ANY;
+            });
+        }
+
+        public void clear ()
+        {
+            generation++;
+            invalidations += results.size ();
+            results.remove_all ();
+            size = 0;
+        }
+
+        private static bool matches_templates (Event event,
+            GenericArray<Event> templates)
+        {
+            if (templates.length == 0)
+                return true;
+            for (int i = 0; i < templates.length; ++i)
+            {
+                if (event.matches_template (templates[i]))
+                    return true;
+            }
+            return false;
+        }
+
+        private delegate bool CachedResultPredicate (CachedResult entry);
+
+        private void remove_matching (CachedResultPredicate predicate)
+        {
+            string[] keys = {};
+            var iter = HashTableIter<string, CachedResult> (results);
+            unowned string key;
+            unowned CachedResult entry;
+            while (iter.next (out key, out entry))
+            {
+                if (predicate (entry))
+                    keys += key;
+            }
+
+            foreach (unowned string k in keys)
+                remove (k);
+            invalidations += keys.length;
+        }
+
+        private void remove (string key)
+        {
+            unowned CachedResult? entry = results.lookup (key);
+            if (entry != null)
+            {
+                size -= entry.size;
+                results.remove (key);
+            }
+        }
+
+        private void remove_least_recently_used ()
+        {
+            string? oldest = null;
+            uint64 oldest_used = uint64.MAX;
+
+            var iter = HashTableIter<string, CachedResult> (results);
+            unowned string key;
+            unowned CachedResult entry;
+            while (iter.next (out key, out entry))
+            {
+                if (entry.last_used < oldest_used)
+                {
+                    oldest = key;
+                    oldest_used = entry.last_used;
+                }
+            }
+
+            if (oldest != null)
+                remove (oldest);
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
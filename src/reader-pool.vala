@@ -0,0 +1,261 @@
+/* reader-pool.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * Runs the read-only queries of the daemon on worker threads.
+     *
+     * Each worker thread uses its own read-only DbReader connection, so
+     * with the database in WAL mode queries don't wait for each other,
+     * nor for the insertions and deletions done by the Engine on the main
+     * loop. Every query sees the events committed before it started.
+     *
+     * The Engine's QueryCache is only accessed from the main loop; the
+     * results of a query are only stored if the cache wasn't invalidated
+     * while it was running.
+     *
+     * Databases which only live in memory can't be shared between
+     * connections, so for them (and if the readers can't be created) all
+     * queries are run synchronously by the Engine, as before.
+     */
+    public class ReaderPool : Object
+    {
+        public const uint MAX_READERS = 4;
+
+        public delegate void ReadFunc (DbReader reader) throws EngineError;
+
+        class Job
+        {
+            public ReadFunc func;
+            public SourceFunc callback;
+            public EngineError? error = null;
+
+            public Job (owned ReadFunc func, owned SourceFunc callback)
+            {
+                this.func = (owned) func;
+                this.callback = (owned) callback;
+            }
+        }
+
+        private unowned Engine engine;
+        private GenericArray<DbReader> readers = new GenericArray<DbReader> ();
+        private AsyncQueue<DbReader>? idle_readers = null;
+        private ThreadPool<Job>? threads = null;
+
+        public uint size { get; private set; default = 0; }
+
+        public ReaderPool (Engine engine)
+        {
+            this.engine = engine;
+
+            if (Utils.get_database_file_path () == ":memory:")
+                return;
+
+            uint num_readers = uint.min (get_num_processors (), MAX_READERS);
+            var queue = new AsyncQueue<DbReader> ();
+            try
+            {
+                for (uint i = 0; i < num_readers; ++i)
+                {
+                    var reader = new DbReader ();
+                    readers.add (reader);
+                    queue.push (reader);
+                }
+                threads = new ThreadPool<Job>.with_owned_data ((job) =>
+                {
+                    // There are as many readers as threads, so this
+                    // never blocks
+                    DbReader reader = idle_readers.pop ();
+                    try
+                    {
+                        job.func (reader);
+                    }
+                    catch (EngineError err)
+                    {
+                        job.error = err;
+                    }
+                    idle_readers.push (reader);
+                    Idle.add ((owned) job.callback);
+                }, (int) num_readers, false);
+            }
+            catch (Error err)
+            {
+                warning ("Unable to create the database readers, queries " +
+                    "will block the main loop: %s", err.message);
+                readers = new GenericArray<DbReader> ();
+                return;
+            }
+
+            // The ontology is loaded lazily, make sure it doesn't happen
+            // concurrently on the worker threads
+            Symbol.get_all_children (ZG.EVENT_INTERPRETATION);
+
+            idle_readers = queue;
+            size = num_readers;
+            engine.reader_pool = this;
+        }
+
+        /**
+         * Statement cache hits of all the readers. The counters of the
+         * readers running a query may be a little behind.
+         */
+        public uint statement_cache_hits
+        {
+            get
+            {
+                uint hits = 0;
+                for (int i = 0; i < readers.length; ++i)
+                    hits += readers[i].statement_cache.hits;
+                return hits;
+            }
+        }
+
+        /**
+         * Statement cache misses of all the readers, see
+         * statement_cache_hits.
+         */
+        public uint statement_cache_misses
+        {
+            get
+            {
+                uint misses = 0;
+                for (int i = 0; i < readers.length; ++i)
+                    misses += readers[i].statement_cache.misses;
+                return misses;
+            }
+        }
+
+        /**
+         * Stops the worker threads, once the queued queries are done,
+         * and closes the readers.
+         */
+        public void close ()
+        {
+            // Freeing a ThreadPool waits for its threads
+            threads = null;
+            if (idle_readers != null)
+            {
+                DbReader? reader;
+                while ((reader = idle_readers.try_pop ()) != null)
+                    reader.close ();
+                idle_readers = null;
+            }
+            readers = new GenericArray<DbReader> ();
+            if (engine.reader_pool == this)
+                engine.reader_pool = null;
+            size = 0;
+        }
+
+        private async void run (owned ReadFunc func) throws EngineError
+        {
+            var job = new Job ((owned) func, run.callback);
+            threads.add (job);
+            yield;
+
+            if (job.error != null)
+                throw job.error;
+        }
+
+        public async uint32[] find_event_ids (TimeRange time_range,
+            GenericArray<Event> event_templates,
+            uint storage_state, uint max_events, uint result_type,
+            BusName? sender=null) throws EngineError
+        {
+            if (threads == null)
+            {
+                return engine.find_event_ids (time_range, event_templates,
+                    storage_state, max_events, result_type, sender);
+            }
+
+            uint32[]? event_ids = engine.query_cache.lookup (time_range,
+                event_templates, storage_state, max_events, result_type);
+            if (event_ids != null)
+                return event_ids;
+
+            uint64 generation = engine.query_cache.generation;
+            yield run ((reader) =>
+            {
+                event_ids = reader.find_event_ids (time_range,
+                    event_templates, storage_state, max_events,
+                    result_type, sender);
+            });
+
+            if (engine.query_cache.generation == generation)
+            {
+                engine.query_cache.store (time_range, event_templates,
+                    storage_state, max_events, result_type, event_ids);
+            }
+            return event_ids;
+        }
+
+        public async GenericArray<Event?> get_events (uint32[] event_ids,
+            BusName? sender=null) throws EngineError
+        {
+            if (threads == null)
+                return engine.get_events (event_ids, sender);
+
+            GenericArray<Event?> events = null;
+            yield run ((reader) =>
+            {
+                events = reader.get_events (event_ids, sender);
+            });
+            return events;
+        }
+
+        public async GenericArray<Event?> find_events (TimeRange time_range,
+            GenericArray<Event> event_templates,
+            uint storage_state, uint max_events, uint result_type,
+            BusName? sender=null) throws EngineError
+        {
+            uint32[] event_ids = yield find_event_ids (time_range,
+                event_templates, storage_state, max_events, result_type,
+                sender);
+            return yield get_events (event_ids, sender);
+        }
+
+        public async string[] find_related_uris (TimeRange time_range,
+            GenericArray<Event> event_templates,
+            GenericArray<Event> result_event_templates,
+            uint storage_state, uint max_results, uint result_type,
+            BusName? sender=null) throws EngineError
+        {
+            if (threads == null)
+            {
+                return engine.find_related_uris (time_range, event_templates,
+                    result_event_templates, storage_state, max_results,
+                    result_type, sender);
+            }
+
+            string[] uris = null;
+            yield run ((reader) =>
+            {
+                uris = reader.find_related_uris (time_range, event_templates,
+                    result_event_templates, storage_state, max_results,
+                    result_type, sender);
+            });
+            return uris;
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
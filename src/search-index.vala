@@ -0,0 +1,590 @@
+/* search-index.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+namespace Zeitgeist
+{
+
+    /**
+     * Full text search over the events, using an FTS5 table in the
+     * activity database.
+     *
+     * This is an in-process alternative to the Xapian index kept by the
+     * zeitgeist-fts daemon, used when ZEITGEIST_FTS_BACKEND is set to
+     * "sqlite" (see Engine). The table is written in the same transactions
+     * as the event table, so it never lags behind it.
+     *
+     * Each event has one row, whose rowid is the event ID, holding the
+     * text of its subjects, the words of their URIs and the names of its
+     * actor. Queries use the syntax understood by the Xapian index, see
+     * get_match_expression().
+     */
+    public class SearchIndex : Object
+    {
+        public const string BACKEND_VARIABLE = "ZEITGEIST_FTS_BACKEND";
+        public const string BACKEND_SQLITE = "sqlite";
+
+        // Sorts the events by relevancy alone, like in the Xapian index
+        public const uint RELEVANCY_RESULT_TYPE = 100;
+
+        private const string TABLE_NAME = "fts_event";
+        private const int REBUILD_BATCH_SIZE = 500;
+
+        [Compact]
+        private class Hit
+        {
+            public uint32 event_id;
+            public double relevancy;
+            public int position;
+        }
+
+        private unowned DbReader reader;
+        private unowned Zeitgeist.SQLite.Database database;
+        private AppInfoCache app_info_cache;
+        private Sqlite.Statement insertion_stmt;
+        private uint save_source_id = 0;
+
+        public SearchIndex (DbReader reader) throws EngineError
+        {
+            this.reader = reader;
+            database = reader.database;
+
+            string? cache_path = null;
+            if (!Utils.using_in_memory_database ())
+            {
+                cache_path = Path.build_filename (Utils.get_data_path (),
+                    AppInfoCache.BASENAME);
+            }
+            app_info_cache = new AppInfoCache (cache_path);
+
+            bool exists = table_exists ();
+            if (!exists)
+            {
+                int rc = database.database.exec ("""
+                    CREATE VIRTUAL TABLE %s USING fts5 (
+                        subject_text, subject_uri, actor,
+                        tokenize = 'unicode61 remove_diacritics 2')
+                    """.printf (TABLE_NAME));
+                database.assert_query_success (rc,
+                    "Can't create the search index");
+            }
+
+            int rc = database.database.prepare_v2 ("""
+                INSERT INTO %s (rowid, subject_text, subject_uri, actor)
+                VALUES (?, ?, ?, ?)
+                """.printf (TABLE_NAME), -1, out insertion_stmt);
+            database.assert_query_success (rc,
+                "Error creating insertion_stmt");
+
+            if (!exists)
+                rebuild ();
+        }
+
+        ~SearchIndex ()
+        {
+            if (save_source_id != 0)
+            {
+                Source.remove (save_source_id);
+                save_app_info_cache ();
+            }
+        }
+
+        /**
+         * Removes the search index from the database, if there is one.
+         *
+         * Nothing updates the index while a different backend is used, so
+         * it has to be dropped and rebuilt from scratch if the SQLite
+         * backend is selected again.
+         */
+        public static void drop (Zeitgeist.SQLite.Database database)
+            throws EngineError
+        {
+            int rc = database.database.exec (
+                "DROP TABLE IF EXISTS " + TABLE_NAME);
+            database.assert_query_success (rc,
+                "Can't drop the search index");
+        }
+
+        private bool table_exists () throws EngineError
+        {
+            bool exists = false;
+            int rc = database.database.exec (
+                "SELECT 1 FROM sqlite_master WHERE name='%s'".printf (
+                    TABLE_NAME),
+                (n_columns, values, column_names) =>
+                {
+                    exists = true;
+                    return 0;
+                }, null);
+            database.assert_query_success (rc,
+                "Can't look up the search index");
+            return exists;
+        }
+
+        /**
+         * Adds all events already in the database to the index.
+         */
+        private void rebuild () throws EngineError
+        {
+            var timer = new Timer ();
+            uint32 last_id = 0;
+            uint num_events = 0;
+
+            Sqlite.Statement stmt;
+            int rc = database.database.prepare_v2 (
+                "SELECT DISTINCT id FROM event WHERE id > ? ORDER BY id LIMIT ?",
+                -1, out stmt);
+            database.assert_query_success (rc, "Error creating rebuild stmt");
+
+            database.begin_transaction ();
+            try
+            {
+                while (true)
+                {
+                    uint32[] event_ids = {};
+                    stmt.reset ();
+                    stmt.bind_int64 (1, last_id);
+                    stmt.bind_int (2, REBUILD_BATCH_SIZE);
+                    while ((rc = stmt.step ()) == Sqlite.ROW)
+                        event_ids += (uint32) stmt.column_int64 (0);
+                    database.assert_query_success (rc,
+                        "Error reading event ids", Sqlite.DONE);
+
+                    if (event_ids.length == 0)
+                        break;
+
+                    add_events (reader.get_events (event_ids));
+                    last_id = event_ids[event_ids.length - 1];
+                    num_events += event_ids.length;
+                }
+                database.end_transaction ();
+            }
+            catch (EngineError err)
+            {
+                database.abort_transaction ();
+                throw err;
+            }
+
+            message ("Built the search index for %u events in %f seconds",
+                num_events, timer.elapsed ());
+        }
+
+        /**
+         * Adds the given events, which have to be in the database already,
+         * to the index. Null events are skipped.
+         */
+        public void add_events (GenericArray<Event?> events)
+            throws EngineError
+        {
+            for (int i = 0; i < events.length; ++i)
+            {
+                if (events[i] == null || events[i].id == 0)
+                    continue;
+
+                var text = new StringBuilder ();
+                var uris = new StringBuilder ();
+                for (int j = 0; j < events[i].num_subjects (); ++j)
+                {
+                    unowned Subject subject = events[i].subjects[j];
+                    append_word (text, subject.text);
+                    append_word (uris, get_uri_words (subject.uri));
+                    if (subject.current_uri != subject.uri)
+                        append_word (uris, get_uri_words (subject.current_uri));
+                    append_word (uris, get_uri_words (subject.origin));
+                }
+
+                insertion_stmt.reset ();
+                insertion_stmt.bind_int64 (1, events[i].id);
+                insertion_stmt.bind_text (2, text.str);
+                insertion_stmt.bind_text (3, uris.str);
+                insertion_stmt.bind_text (4, get_actor_words (events[i].actor));
+                int rc = insertion_stmt.step ();
+                database.assert_query_success (rc,
+                    "Can't add event to the search index", Sqlite.DONE);
+            }
+
+            // The events are added within the transaction inserting them,
+            // so the desktop file cache is written once that is over
+            if (save_source_id == 0)
+            {
+                save_source_id = Idle.add (() =>
+                {
+                    save_source_id = 0;
+                    save_app_info_cache ();
+                    return false;
+                });
+            }
+        }
+
+        private void save_app_info_cache ()
+        {
+            try
+            {
+                app_info_cache.save ();
+            }
+            catch (Error err)
+            {
+                warning ("Unable to save desktop file cache: %s", err.message);
+            }
+        }
+
+        public void delete_events (uint32[] event_ids) throws EngineError
+        {
+            int rc = database.database.exec (
+                "DELETE FROM %s WHERE rowid IN (%s)".printf (TABLE_NAME,
+                    database.get_sql_string_from_event_ids (event_ids)));
+            database.assert_query_success (rc,
+                "Can't delete events from the search index");
+        }
+
+        private static void append_word (StringBuilder builder, string? word)
+        {
+            if (Utils.is_empty_string (word))
+                return;
+            if (builder.len > 0)
+                builder.append_c (' ');
+            builder.append (word);
+        }
+
+        private static string? get_uri_words (string? uri)
+        {
+            if (uri == null)
+                return null;
+            // the tokenizer splits the rest at the punctuation
+            return Uri.unescape_string (uri) ?? uri;
+        }
+
+        private string get_actor_words (string? actor)
+        {
+            if (Utils.is_empty_string (actor))
+                return "";
+
+            var words = new StringBuilder ();
+            string name = actor;
+            if (name.has_prefix ("application://"))
+                name = name.substring (14);
+            if (name.has_suffix (".desktop"))
+                name = name.substring (0, name.length - 8);
+            append_word (words, name);
+
+            var info = app_info_cache.lookup (actor);
+            if (info != null)
+            {
+                append_word (words, info.display_name);
+                append_word (words, info.generic_name);
+            }
+
+            return words.str;
+        }
+
+        /**
+         * Translates a query for the Xapian index into an FTS5 match
+         * expression.
+         *
+         * Words are quoted, so punctuation in them doesn't break the
+         * expression; a trailing `*' still turns them into prefixes. The
+         * "name:", "title:", "site:" and "app:" prefixes restrict words to
+         * a column, and the AND, OR and NOT operators, phrases and
+         * parentheses are kept. NEAR and ADJ are replaced by AND.
+         * Operators without a left operand are dropped, as are those
+         * without a right one, and an operator following another one
+         * replaces it.
+         *
+         * Like in Xapian, "-word" excludes a word from the whole query,
+         * so excluded words are appended as "NOT (a OR b)". Queries made
+         * only of excluded words can't be expressed in FTS5.
+         */
+        public static string get_match_expression (string query)
+            throws EngineError
+        {
+            string[] parts = {};
+            string[] excluded = {};
+            int depth = 0;
+            int i = 0;
+
+            while (i < query.length)
+            {
+                char c = query[i];
+                if (c.isspace ())
+                {
+                    i++;
+                    continue;
+                }
+                if (c == '(')
+                {
+                    parts += "(";
+                    depth++;
+                    i++;
+                    continue;
+                }
+                if (c == ')')
+                {
+                    if (depth > 0)
+                    {
+                        close_parenthesis (ref parts);
+                        depth--;
+                    }
+                    i++;
+                    continue;
+                }
+
+                bool negated = false;
+                if (c == '+' || c == '-')
+                {
+                    negated = c == '-';
+                    i++;
+                }
+
+                // read up to the end of the word, or of the phrase
+                int start = i;
+                bool quoted = false;
+                while (i < query.length)
+                {
+                    c = query[i];
+                    if (c == '"')
+                        quoted = !quoted;
+                    else if (!quoted && (c.isspace () || c == '(' || c == ')'))
+                        break;
+                    i++;
+                }
+                string word = query.substring (start, i - start);
+                if (word == "")
+                    continue;
+
+                if (word == "AND" || word == "OR" || word == "NOT"
+                    || word == "NEAR" || word == "ADJ")
+                {
+                    if (word == "NEAR" || word == "ADJ")
+                        word = "AND";
+                    // FTS5 only knows NOT as a binary operator, which
+                    // already implies AND
+                    drop_trailing_operator (ref parts);
+                    if (parts.length > 0 && parts[parts.length - 1] != "(")
+                        parts += word;
+                    continue;
+                }
+
+                if (negated)
+                    excluded += get_match_term (word);
+                else
+                    parts += get_match_term (word);
+            }
+
+            for (; depth > 0; depth--)
+                close_parenthesis (ref parts);
+            drop_trailing_operator (ref parts);
+
+            if (parts.length == 0)
+            {
+                if (excluded.length > 0)
+                {
+                    throw new EngineError.INVALID_ARGUMENT (
+                        "Queries need at least one word which isn't " +
+                        "excluded: %s".printf (query));
+                }
+                return "";
+            }
+
+            string expression = string.joinv (" ", parts);
+            if (excluded.length == 0)
+                return expression;
+            if (parts.length > 1)
+                expression = "( %s )".printf (expression);
+            return "%s NOT ( %s )".printf (expression,
+                string.joinv (" OR ", excluded));
+        }
+
+        private static void drop_trailing_operator (ref string[] parts)
+        {
+            if (parts.length == 0)
+                return;
+            unowned string last = parts[parts.length - 1];
+            if (last == "AND" || last == "OR" || last == "NOT")
+                parts.resize (parts.length - 1);
+        }
+
+        private static void close_parenthesis (ref string[] parts)
+        {
+            // empty parentheses are dropped
+            drop_trailing_operator (ref parts);
+            if (parts[parts.length - 1] == "(")
+                parts.resize (parts.length - 1);
+            else
+                parts += ")";
+        }
+
+        private static string get_match_term (string word)
+        {
+            string? column = null;
+            string term = word;
+            int colon = word.index_of_char (':');
+            if (colon > 0 && word[0] != '"')
+            {
+                switch (word.substring (0, colon))
+                {
+                    case "name":
+                    case "title":
+                        column = "subject_text";
+                        break;
+                    case "site":
+                        column = "subject_uri";
+                        break;
+                    case "app":
+                        column = "actor";
+                        break;
+                }
+                if (column != null)
+                    term = word.substring (colon + 1);
+            }
+
+            bool prefix = term.has_suffix ("*");
+            if (prefix)
+                term = term.substring (0, term.length - 1);
+            if (term.has_prefix ("\"") && term.has_suffix ("\"")
+                && term.length > 1)
+                term = term.substring (1, term.length - 2);
+
+            string result = "\"%s\"".printf (term.replace ("\"", "\"\""));
+            if (prefix)
+                result += "*";
+            if (column != null)
+                result = column + " : " + result;
+            return result;
+        }
+
+        /**
+         * Searches the index, with the same semantics as the Search and
+         * SearchWithRelevancies methods of the Xapian index.
+         *
+         * For RELEVANCY_RESULT_TYPE the events are sorted by relevancy
+         * alone; if `relevance_first' is set, the same is done for the
+         * result types returning single events, with ties sorted by time.
+         */
+        public GenericArray<Event?> search (string query_string,
+            TimeRange time_range, GenericArray<Event> templates,
+            uint storage_state, uint offset, uint count, uint result_type,
+            bool relevance_first, out double[] relevancies,
+            out uint matches) throws EngineError
+        {
+            relevancies = new double[0];
+            matches = 0;
+
+            string match = get_match_expression (query_string);
+            if (match == "")
+                return new GenericArray<Event?> ();
+
+            var where = reader.get_where_clause_for_query (time_range,
+                templates, storage_state);
+            where.add ("id IN (SELECT rowid FROM %s WHERE %s MATCH ?)".printf (
+                TABLE_NAME, TABLE_NAME), match);
+
+            bool by_relevancy = result_type == RELEVANCY_RESULT_TYPE;
+            uint32[] event_ids = reader.find_event_ids_for_clause (where, 0,
+                by_relevancy ? ResultType.MOST_RECENT_EVENTS : result_type);
+            matches = event_ids.length;
+
+            var hits = new GenericArray<Hit> ();
+            var relevancy_for_id = get_relevancies (match, event_ids);
+            double max_relevancy = 0.0;
+            for (int i = 0; i < event_ids.length; ++i)
+            {
+                var hit = new Hit ();
+                hit.event_id = event_ids[i];
+                double? relevancy = relevancy_for_id.lookup (event_ids[i]);
+                hit.relevancy = relevancy ?? 0.0;
+                hit.position = i;
+                max_relevancy = double.max (max_relevancy, hit.relevancy);
+                hits.add ((owned) hit);
+            }
+
+            // scale the relevancies to (0, 1], like the percentages
+            // returned by Xapian
+            if (max_relevancy > 0.0)
+            {
+                for (int i = 0; i < hits.length; ++i)
+                    hits[i].relevancy /= max_relevancy;
+            }
+
+            if (by_relevancy || (relevance_first && (
+                result_type == ResultType.MOST_RECENT_EVENTS
+                || result_type == ResultType.LEAST_RECENT_EVENTS)))
+            {
+                hits.sort ((a, b) =>
+                {
+                    if (a.relevancy != b.relevancy)
+                        return a.relevancy > b.relevancy ? -1 : 1;
+                    return a.position - b.position;
+                });
+            }
+
+            uint32[] page = {};
+            double[] page_relevancies = {};
+            for (uint i = offset; i < hits.length && i < offset + count; ++i)
+            {
+                page += hits[i].event_id;
+                page_relevancies += hits[i].relevancy;
+            }
+
+            relevancies = page_relevancies;
+            return reader.get_events (page);
+        }
+
+        /**
+         * Returns the relevancy of each of `event_ids' matching `match',
+         * higher being better. Only those events are scored, not all
+         * the events matching `match'.
+         */
+        private HashTable<uint32, double?> get_relevancies (string match,
+            uint32[] event_ids) throws EngineError
+        {
+            var relevancies = new HashTable<uint32, double?> (direct_hash,
+                direct_equal);
+
+            unowned Sqlite.Statement stmt = reader.statement_cache.get_statement (
+                "SELECT rowid, bm25(%s) FROM %s WHERE rowid IN (%s) AND %s MATCH ?".printf (
+                    TABLE_NAME, TABLE_NAME,
+                    Zeitgeist.SQLite.Database.get_event_id_placeholders (),
+                    TABLE_NAME));
+
+            for (int start = 0; start < event_ids.length;
+                start += Zeitgeist.SQLite.Database.EVENT_ID_CHUNK_SIZE)
+            {
+                database.bind_event_ids_chunk (stmt, event_ids, start);
+                stmt.bind_text (
+                    Zeitgeist.SQLite.Database.EVENT_ID_CHUNK_SIZE + 1, match);
+
+                int rc;
+                while ((rc = stmt.step ()) == Sqlite.ROW)
+                {
+                    // bm25 () returns lower values for better matches
+                    relevancies.insert ((uint32) stmt.column_int64 (0),
+                        -stmt.column_double (1));
+                }
+                database.assert_query_success (rc, "Error in search",
+                    Sqlite.DONE);
+            }
+            stmt.reset ();
+
+            return relevancies;
+        }
+
+    }
+
+}
+
+// vim:expandtab:ts=4:sw=4
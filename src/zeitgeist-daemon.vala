@@ -42,6 +42,7 @@ namespace Zeitgeist
         private static bool quit_daemon = false;
         private static string log_level = "";
         private static string? log_file = null;
+        private static string? fts_backend = null;
 
         // load the builtin extensions first
         RegisterExtensionFunc[] builtins = {};
@@ -82,6 +83,11 @@ namespace Zeitgeist
                 "log-file", 0, 0, OptionArg.STRING, out log_file,
                 "File to which the log output will be appended", null
             },
+            {
+                "fts-backend", 0, 0, OptionArg.STRING, out fts_backend,
+                "Full text search backend; possible values: " +
+                "xapian (default), sqlite", "BACKEND"
+            },
             {
                 "shell-completion", 0, OptionFlags.HIDDEN, OptionArg.NONE,
                 out show_options, null, null
@@ -97,6 +103,9 @@ namespace Zeitgeist
 
         private Engine engine;
         private MonitorManager notifications;
+        private CursorManager cursors;
+        private ImportManager imports;
+        private ReaderPool readers;
 
         private uint log_register_id;
         private unowned DBusConnection connection;
@@ -155,13 +164,16 @@ namespace Zeitgeist
 #endif
             engine = new Engine.with_builtins (builtins);
             notifications = MonitorManager.get_default ();
+            cursors = new CursorManager (engine);
+            imports = new ImportManager (engine);
+            readers = new ReaderPool (engine);
         }
 
         public async Variant get_events (uint32[] event_ids, Cancellable? cancellable,
             BusName? sender=null) throws Error
         {
             var timer = new Timer ();
-            GenericArray<Event> events = engine.get_events (event_ids);
+            GenericArray<Event> events = yield readers.get_events (event_ids);
             debug ("%s executed in %f seconds: got %i events",
                 GLib.Log.METHOD, timer.elapsed (), events.length);
             return Events.to_variant_with_limit (events);
@@ -173,7 +185,7 @@ namespace Zeitgeist
                 uint storage_state, uint num_events, uint result_type,
                 Cancellable? cancellable, BusName? sender=null) throws Error
         {
-            return engine.find_related_uris (
+            return yield readers.find_related_uris (
                 new TimeRange.from_variant (time_range),
                 Events.from_variant (event_templates),
                 Events.from_variant (result_event_templates),
@@ -187,7 +199,7 @@ namespace Zeitgeist
                 BusName? sender=null) throws Error
         {
             var timer = new Timer ();
-            var ids = engine.find_event_ids (
+            var ids = yield readers.find_event_ids (
                 new TimeRange.from_variant (time_range),
                 Events.from_variant(event_templates),
                 storage_state, num_events, result_type, sender);
@@ -203,7 +215,7 @@ namespace Zeitgeist
                 BusName? sender=null) throws Error
         {
             var timer = new Timer ();
-            var events = engine.find_events (
+            var events = yield readers.find_events (
                 new TimeRange.from_variant (time_range),
                 Events.from_variant (event_templates),
                 storage_state, num_events, result_type, sender);
@@ -212,6 +224,43 @@ namespace Zeitgeist
             return Events.to_variant_with_limit (events);
         }
 
+        public async Variant find_events_paged (Variant time_range,
+                Variant event_templates,
+                uint storage_state, uint num_events, uint result_type,
+                uint page_size, out string continuation_token,
+                out uint num_matches,
+                Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            var timer = new Timer ();
+            var ids = yield readers.find_event_ids (
+                new TimeRange.from_variant (time_range),
+                Events.from_variant (event_templates),
+                storage_state, num_events, result_type, sender);
+            num_matches = ids.length;
+            var page = cursors.open (ids, page_size, sender,
+                out continuation_token);
+            debug ("%s executed in %f seconds: found %i events",
+                GLib.Log.METHOD, timer.elapsed (), ids.length);
+            return page;
+        }
+
+        public async Variant get_events_page (string continuation_token,
+                uint page_size, out string next_token,
+                Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            return cursors.get_page (continuation_token, page_size, sender,
+                out next_token);
+        }
+
+        public async void close_events_page (string continuation_token,
+                Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            cursors.close (continuation_token, sender);
+        }
+
         public async uint32[] insert_events (
                 Variant vevents,
                 Cancellable? cancellable=null,
@@ -219,6 +268,62 @@ namespace Zeitgeist
         {
             var events = Events.from_variant (vevents);
             uint32[] event_ids = engine.insert_events (events, sender);
+            notify_insert (events);
+            return event_ids;
+        }
+
+        public async void begin_import (Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            yield check_import_caller (sender);
+            imports.begin (sender);
+        }
+
+        /**
+         * Imports make the queries of all clients slower until they end,
+         * so only processes of the user running the daemon may start one.
+         * Buses can be shared with other users, or be reachable over TCP.
+         */
+        private async void check_import_caller (BusName? sender)
+            throws Error
+        {
+            if (sender == null || connection == null)
+                return;
+
+            Variant reply = yield connection.call ("org.freedesktop.DBus",
+                "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                "GetConnectionUnixUser", new Variant ("(s)", sender),
+                new VariantType ("(u)"), DBusCallFlags.NONE, -1, null);
+            uint32 uid;
+            reply.get ("(u)", out uid);
+            if (uid != Posix.getuid ())
+            {
+                warning ("Refusing the import of %s, which runs as " +
+                    "user %u", sender, uid);
+                throw new DBusError.ACCESS_DENIED (
+                    "Only the user running Zeitgeist can import events");
+            }
+        }
+
+        public async uint32[] import_events (
+                Variant vevents,
+                Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            var events = Events.from_variant (vevents);
+            uint32[] event_ids = imports.import_events (events, sender);
+            notify_insert (events);
+            return event_ids;
+        }
+
+        public async uint end_import (Cancellable? cancellable=null,
+                BusName? sender=null) throws Error
+        {
+            return imports.end (sender);
+        }
+
+        private void notify_insert (GenericArray<Event?> events)
+        {
             var min_timestamp = int64.MAX;
             var max_timestamp = int64.MIN;
             for (int i = 0; i < events.length; i++)
@@ -234,8 +339,6 @@ namespace Zeitgeist
                     new TimeRange (min_timestamp, max_timestamp), events);
             }
             /* else { there's not even one valid event } */
-
-            return event_ids;
         }
 
         public async Variant delete_events (uint32[] event_ids,
@@ -262,6 +365,7 @@ namespace Zeitgeist
 
         private void do_quit ()
         {
+            readers.close ();
             engine.close ();
             mainloop.quit ();
         }
@@ -277,6 +381,19 @@ namespace Zeitgeist
                 Events.from_variant (event_templates));
         }
 
+        public async void install_monitor_with_latency (
+                ObjectPath monitor_path,
+                Variant time_range,
+                Variant event_templates,
+                uint max_latency,
+                BusName? owner=null) throws Error
+        {
+            assert (owner != null);
+            notifications.install_monitor (owner, monitor_path,
+                new TimeRange.from_variant (time_range),
+                Events.from_variant (event_templates), max_latency);
+        }
+
         public async void remove_monitor (ObjectPath monitor_path, BusName? owner=null)
             throws Error
         {
@@ -533,6 +650,19 @@ namespace Zeitgeist
 
                 Logging.setup_logging (log_level, log_file);
 
+                if (fts_backend != null)
+                {
+                    if (fts_backend != "xapian" &&
+                        fts_backend != SearchIndex.BACKEND_SQLITE)
+                    {
+                        throw new EngineError.INVALID_ARGUMENT (
+                            "Unknown full text search backend: %s".printf (
+                                fts_backend));
+                    }
+                    Environment.set_variable (SearchIndex.BACKEND_VARIABLE,
+                        fts_backend, true);
+                }
+
                 run ();
             }
             catch (Error err)
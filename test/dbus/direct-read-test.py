@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -.- coding: utf-8 -.-
+
+# direct-read-test.py
+#
+# Copyright © 2026 Zeitgeist contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sqlite3
+import tempfile
+
+from zeitgeist.client import ZeitgeistClient
+from zeitgeist.datamodel import Event, TimeRange, StorageState, ResultType
+from zeitgeist.dbreader import DbReader, SchemaVersionError
+
+import testutils
+from testutils import import_events
+
+class DirectReadTest(testutils.RemoteTestCase):
+
+	def setUp(self):
+		# The database is read by both the engine and the client, so it
+		# can't be kept in memory
+		self._db_file = tempfile.mktemp(".sqlite",
+			prefix="zeitgeist.direct-read.")
+		super(DirectReadTest, self).setUp(self._db_file)
+		import_events("test/data/twenty_events.js", self)
+		self.direct_client = ZeitgeistClient(direct_read=True)
+
+	def tearDown(self):
+		super(DirectReadTest, self).tearDown()
+		for suffix in ("", "-wal", "-shm"):
+			if os.path.exists(self._db_file + suffix):
+				os.remove(self._db_file + suffix)
+
+	def readDirectly(self, method, argument, **kwargs):
+		"""
+		Calls the given method of the direct reading client, which
+		replies before returning, and returns the result.
+		"""
+		result = []
+		getattr(self.direct_client, method)(argument, result.extend, **kwargs)
+		return result
+
+	def assertSameResults(self, templates, **kwargs):
+		ids = self.findEventIdsAndWait(templates, **kwargs)
+		self.assertEquals(ids, self.readDirectly(
+			"find_event_ids_for_templates", templates, **kwargs))
+		events = self.findEventsForTemplatesAndWait(templates, **kwargs)
+		self.assertEquals(events, self.readDirectly(
+			"find_events_for_templates", templates, **kwargs))
+		return ids
+
+	def testDirectReadIsUsed(self):
+		self.assertNotEquals(self.direct_client._reader, None)
+
+	def testResultTypes(self):
+		# Queries with a non-timestamp condition are grouped differently
+		template = Event.new_for_values(interpretation="stfu:OpenEvent")
+		for name, result_type in ResultType.iteritems():
+			self.assertSameResults([], num_events=0, result_type=result_type)
+			self.assertSameResults([template], num_events=0,
+				result_type=result_type)
+
+	def testTemplates(self):
+		templates = [
+			Event.new_for_values(actor="firefox"),
+			Event.new_for_values(actor="!firefox"),
+			Event.new_for_values(actor="ice*"),
+			Event.new_for_values(interpretation="stfu:OpenEvent",
+				subject_mimetype="!text/plain"),
+			Event.new_for_values(subject_uri="file:///tmp/foo*",
+				subject_interpretation="stfu:Video"),
+			Event.new_for_values(
+				subject_text="this item has not text... rly!"),
+			Event.new_for_values(origin="origin1"),
+		]
+		for template in templates:
+			self.assertTrue(self.assertSameResults([template], num_events=0))
+		self.assertSameResults(templates[:2], num_events=0)
+		self.assertSameResults(templates[3:5],
+			timerange=TimeRange(100, 105), num_events=3,
+			result_type=ResultType.MostPopularActor)
+		self.assertSameResults([templates[0]],
+			storage_state=StorageState.Available, num_events=0)
+
+	def testGetEvents(self):
+		events = self.findEventsForTemplatesAndWait([], num_events=5)
+		ids = [int(event.id) for event in events] + [12345]
+		self.assertEquals(self.readDirectly("get_events", ids),
+			events + [None])
+
+	def testInvalidArgument(self):
+		errors = []
+		template = Event.new_for_values(subject_storage="!foo")
+		self.direct_client.find_event_ids_for_templates([template],
+			lambda ids: self.fail("Unexpected reply"),
+			error_handler=errors.append)
+		self.assertEquals(len(errors), 1)
+
+	def testSchemaMismatch(self):
+		con = sqlite3.connect(self._db_file)
+		con.execute("UPDATE schema_version SET version=version+1 "
+			"WHERE schema='core'")
+		con.commit()
+		con.close()
+		self.assertRaises(SchemaVersionError, DbReader, self._db_file)
+		self.assertEquals(ZeitgeistClient(direct_read=True)._reader, None)
+
+		# Clients which were already reading the database directly fall
+		# back to D-Bus from then on
+		self.client = self.direct_client
+		self.assertEquals(len(self.findEventIdsAndWait([], num_events=0)), 20)
+		self.assertEquals(self.direct_client._reader, None)
+
+if __name__ == "__main__":
+	testutils.run()
+
+# vim:noexpandtab:ts=4:sw=4
@@ -85,6 +85,25 @@ class ZeitgeistEngineTest(testutils.RemoteTestCase):
 		self.assertEquals(1, len(result))
 		self.assertEquals(1, result[0]) # The single event must have id 1
 
+	def testDuplicateEventInsertionInBatch(self):
+		events = [new_event(timestamp=i, subject_uri="file:///tmp/%d" % i)
+			for i in range(1, 101)]
+		ids = self.insertEventsAndWait(events[:50])
+		self.assertEquals(range(1, 51), ids)
+
+		# A batch containing an already inserted event must still
+		# get IDs assigned without gaps, and reuse the existing one
+		ids = self.insertEventsAndWait(events[45:])
+		self.assertEquals(range(46, 101), ids)
+
+		# A batch with the same event twice
+		event = new_event(timestamp=500, subject_uri="file:///tmp/500")
+		ids = self.insertEventsAndWait([event, events[0], event])
+		self.assertEquals([101, 1, 101], ids)
+
+		result = self.findEventIdsAndWait([])
+		self.assertEquals(101, len(result))
+
 	def testDeleteSingle(self):
 		self.testSingleInsertGet()
 		self.deleteEventsAndWait([1])
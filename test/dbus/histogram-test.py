@@ -103,6 +103,70 @@ class HistogramTest(RemoteTestCase):
 		start_day = datetime.date.fromtimestamp(h_day_timestamp)
 		self.assertEquals(day_ev.day , start_day.day)
 
+	def testHistogramFollowsDeletions(self):
+		ev, ev_timestamp = self._createEventOne();
+		ev2, ev2_timestamp = self._createEventOne();
+		ev2.subjects[0].uri = "file://nonononono"
+
+		inserted_ids = self.insertEventsAndWait([ev, ev2])
+		self.assertEquals(2, len(inserted_ids))
+
+		# Inserting the same event again doesn't change the counts
+		self.insertEventsAndWait([ev])
+
+		h_data = self.histogram.GetHistogramData()
+		self.assertEquals(1, len(h_data))
+		self.assertEquals(2, h_data[0][1])
+
+		hourly_data = self.histogram.GetHourlyHistogramData()
+		self.assertEquals(1, len(hourly_data))
+		self.assertEquals(h_data[0][0], hourly_data[0][0] - hourly_data[0][0] % 86400)
+
+		interpretation_data = self.histogram.GetInterpretationHistogramData()
+		self.assertEquals(1, len(interpretation_data))
+		self.assertEquals(Interpretation.ACCESS_EVENT, interpretation_data[0][1])
+
+		self.deleteEventsAndWait([inserted_ids[0]])
+		h_data = self.histogram.GetHistogramData()
+		self.assertEquals(1, h_data[0][1])
+
+		self.deleteEventsAndWait([inserted_ids[1]])
+		self.assertEquals(0, len(self.histogram.GetHistogramData()))
+	def testGetHistogramDataForRange(self):
+		ev, ev_timestamp = self._createEventOne();
+		ev2, ev2_timestamp = self._createEventOne();
+		ev2.subjects[0].uri = "file://nonononono"
+		ev2.interpretation = Interpretation.MODIFY_EVENT
+		ev2.timestamp = ev.timestamp - 8 * 24 * 3600 * 1000
+		self.insertEventsAndWait([ev, ev2])
+
+		# Only the buckets within the time range are returned
+		time_range = (ev.timestamp - 24 * 3600 * 1000, ev.timestamp + 1000)
+		for bucket_size in (0, 1, 2, 3):
+			h_data = self.histogram.GetHistogramDataForRange(time_range,
+				bucket_size, [])
+			self.assertEquals(1, len(h_data))
+			self.assertEquals(1, h_data[0][1])
+			self.assertTrue(h_data[0][0] <= ev_timestamp + 24 * 3600)
+
+		# Filtering on the interpretation uses the precomputed counts
+		h_data = self.histogram.GetHistogramDataForRange((0, 2**63 - 1),
+			1, [Event.new_for_values(interpretation=Interpretation.MODIFY_EVENT)])
+		self.assertEquals(1, len(h_data))
+		self.assertEquals(1, h_data[0][1])
+
+		# Other templates are matched against the events
+		template = Event.new_for_values(subject_uri="file://sisisisisisi")
+		h_data = self.histogram.GetHistogramDataForRange((0, 2**63 - 1),
+			1, [template])
+		self.assertEquals(1, len(h_data))
+		self.assertEquals(1, h_data[0][1])
+
+		# Unknown bucket sizes are rejected
+		import dbus
+		self.assertRaises(dbus.exceptions.DBusException,
+			self.histogram.GetHistogramDataForRange, time_range, 4, [])
+
 if __name__ == "__main__":
 	unittest.main()
 
@@ -259,6 +259,73 @@ class ZeitgeistMonitorTest(testutils.RemoteTestCase):
 		self.assertEquals(2, len(result1))
 		self.assertEquals(2, len(result2))
 
+	def testMultipleIndexedMonitors(self):
+		results = [[], [], [], [], []]
+		expected = [3, 1, 3, 3, 5]
+		mainloop = self.create_mainloop()
+		events = parse_events("test/data/five_events.js")
+		templates = [
+			[Event.new_for_values(actor="firefox")],
+			[Event.new_for_values(actor="ged*")],
+			[Event.new_for_values(
+				subjects=[Subject.new_for_values(uri="file:///tmp/*")])],
+			[Event.new_for_values(actor="firefox"),
+				Event.new_for_values(subjects=[
+					Subject.new_for_values(uri="file:///home/foo.txt")])],
+			[Event.new_for_values(actor="!nothing")],
+		]
+
+		@asyncTestMethod(mainloop)
+		def notify_delete_handler(time_range, event_ids):
+			mainloop.quit()
+			self.fail("Unexpected delete notification")
+
+		def make_insert_handler(result):
+			@asyncTestMethod(mainloop)
+			def notify_insert_handler(time_range, events):
+				result.extend(events)
+				if map(len, results) == expected:
+					mainloop.quit()
+			return notify_insert_handler
+
+		for tmpl, result in zip(templates, results):
+			self.client.install_monitor(TimeRange.always(), tmpl,
+				make_insert_handler(result), notify_delete_handler)
+		self.client.insert_events(events)
+		mainloop.run()
+
+		self.assertEquals(expected, map(len, results))
+		self.assertEquals(["gedit"], [ev.actor for ev in results[1]])
+
+	def testMonitorCoalescesInsertions(self):
+		calls = []
+		mainloop = self.create_mainloop()
+		events = parse_events("test/data/five_events.js")
+
+		@asyncTestMethod(mainloop)
+		def notify_insert_handler(time_range, events):
+			calls.append((time_range, events))
+			if sum(len(evs) for tr, evs in calls) == 5:
+				mainloop.quit()
+
+		@asyncTestMethod(mainloop)
+		def notify_delete_handler(time_range, event_ids):
+			mainloop.quit()
+			self.fail("Unexpected delete notification")
+
+		self.client.install_monitor(TimeRange.always(), [],
+			notify_insert_handler, notify_delete_handler, max_latency=1000)
+		for event in events:
+			self.client.insert_events([event])
+		mainloop.run()
+
+		# All insertions within the latency window arrive together
+		self.assertEquals(1, len(calls))
+		time_range, result = calls[0]
+		self.assertEquals(5, len(result))
+		self.assertEquals(123, time_range.begin)
+		self.assertEquals(163, time_range.end)
+
 	def testMonitorInstallRemoval(self):
 		result = []
 		mainloop = self.create_mainloop()
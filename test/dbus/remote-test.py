@@ -24,10 +24,11 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import dbus
 import signal
 
 from zeitgeist.datamodel import (Event, Subject, Interpretation, Manifestation,
-	TimeRange, StorageState, DataSource, NULL_EVENT, ResultType)
+	TimeRange, StorageState, DataSource, NULL_EVENT, ResultType, CompactEvent)
 
 import testutils
 from testutils import parse_events, import_events
@@ -59,6 +60,26 @@ class ZeitgeistRemoteAPITest(testutils.RemoteTestCase):
 		self.assertEquals(len(filter(None, result)), len(events))
 		self.assertEquals(len(filter(lambda event: event is None, result)), 2)
 
+	def testFindCompactEvents(self):
+		events = parse_events("test/data/five_events.js")
+		self.insertEventsAndWait(events)
+		expected = self.findEventsForTemplatesAndWait([], num_events=0)
+
+		self.client.register_event_subclass(CompactEvent)
+		result = self.findEventsForTemplatesAndWait([], num_events=0)
+		self.assertEquals(len(result), len(expected))
+		for compact, event in zip(result, expected):
+			self.assertTrue(isinstance(compact, CompactEvent))
+			self.assertEquals(compact.id, event.id)
+			self.assertEquals(compact.get_actor(), event.actor)
+			self.assertEquals(compact.to_event(), event)
+			self.assertEquals(compact.subjects[0].uri, event.subjects[0].uri)
+
+		# Values shared by several events are only kept once
+		actors = dict((event.actor, event.actor) for event in result)
+		for event in result:
+			self.assertTrue(event.actor is actors[event.actor])
+
 	def testInsertAndDeleteEvent(self):
 		# Insert an event
 		events = parse_events("test/data/single_event.js")
@@ -208,6 +229,51 @@ class ZeitgeistRemoteAPITestAdvanced(testutils.RemoteTestCase):
 		results = self.findEventsForTemplatesAndWait([], num_events=3)
 		self.assertEquals(3, len(results))
 
+	def testFindEventsPaged(self):
+		events = parse_events("test/data/five_events.js")
+		ids = self.insertEventsAndWait(events)
+
+		iface = self.client._iface
+		result, token, num_matches = iface.FindEventsPaged(
+			TimeRange.always(), [], StorageState.Any, 0,
+			ResultType.MostRecentEvents, 2)
+		self.assertEquals(len(ids), num_matches)
+
+		results = list(result)
+		while token:
+			self.assertEquals(2, len(result))
+			result, token = iface.GetEventsPage(token, 2)
+			results.extend(result)
+
+		expected = self.findEventIdsAndWait([], num_events=0)
+		self.assertEquals(expected,
+			[int(Event.new_for_struct(ev).id) for ev in results])
+
+	def testCloseEventsPage(self):
+		events = parse_events("test/data/five_events.js")
+		self.insertEventsAndWait(events)
+
+		iface = self.client._iface
+		result, token, num_matches = iface.FindEventsPaged(
+			TimeRange.always(), [], StorageState.Any, 0,
+			ResultType.MostRecentEvents, 2)
+		iface.CloseEventsPage(token)
+		self.assertRaises(dbus.DBusException, iface.GetEventsPage, token, 2)
+
+	def testImportEvents(self):
+		events = parse_events("test/data/five_events.js")
+
+		iface = self.client._iface
+		iface.BeginImport()
+		self.assertRaises(dbus.DBusException, iface.BeginImport)
+		ids = iface.ImportEvents(events[:3])
+		ids.extend(iface.ImportEvents(events[3:]))
+		self.assertEquals(5, iface.EndImport())
+		self.assertRaises(dbus.DBusException, iface.ImportEvents, events)
+
+		expected = self.findEventIdsAndWait([], num_events=0)
+		self.assertEquals(sorted(expected), sorted(int(id) for id in ids))
+
 	def testInsertWithEmptySubjectInterpretationManifestation(self):
 		events = parse_events("test/data/incomplete_events.js")
 		ids = self.insertEventsAndWait(events[:3])
@@ -0,0 +1,154 @@
+/* app-info-cache-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Assertions;
+
+const string TEST_PATH = "/tmp/zeitgeist-tests";
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    DirUtils.create_with_parents (TEST_PATH, 0755);
+
+    Test.add_func ("/AppInfoCache/lookup", lookup_test);
+    Test.add_func ("/AppInfoCache/missing", missing_test);
+    Test.add_func ("/AppInfoCache/persistence", persistence_test);
+
+    return Test.run ();
+}
+
+private void write_desktop_file (string path, string name)
+{
+    var contents = ("[Desktop Entry]\nName=%s\nType=Application\n" +
+        "Exec=true\nCategories=Utility;TextEditor;\n" +
+        "Keywords=Text;Plaintext;\n").printf (name);
+    try
+    {
+        FileUtils.set_contents (path, contents);
+    }
+    catch (FileError err)
+    {
+        error ("%s", err.message);
+    }
+}
+
+private void set_mtime (string path, uint64 mtime)
+{
+    try
+    {
+        var file = File.new_for_path (path);
+        file.set_attribute_uint64 (FileAttribute.TIME_MODIFIED, mtime,
+            FileQueryInfoFlags.NONE);
+        file.set_attribute_uint32 (FileAttribute.TIME_MODIFIED_USEC, 0,
+            FileQueryInfoFlags.NONE);
+    }
+    catch (Error err)
+    {
+        error ("%s", err.message);
+    }
+}
+
+public void lookup_test ()
+{
+    var cache = new AppInfoCache (null);
+    var entry = cache.lookup (Zeitgeist.Tests.DIR + "/test.desktop");
+
+    assert (entry != null);
+    assert_cmpstr (entry.display_name, OperatorType.EQUAL, "test");
+    assert_cmpstr (entry.generic_name, OperatorType.EQUAL,
+        "Test Desktop File");
+    assert_cmpstr (entry.description, OperatorType.EQUAL,
+        "This is just a test file");
+    assert_cmpint (entry.categories.length, OperatorType.EQUAL, 0);
+    assert_cmpint (entry.keywords.length, OperatorType.EQUAL, 0);
+
+    // Caches without a path are never written
+    try
+    {
+        cache.save ();
+    }
+    catch (Error err)
+    {
+        assert_not_reached ();
+    }
+}
+
+public void missing_test ()
+{
+    var cache = new AppInfoCache (null);
+    assert (cache.lookup ("application://zeitgeist-no-such-app.desktop")
+        == null);
+    assert (cache.lookup ("/tmp/zeitgeist-tests/missing.desktop") == null);
+    assert (cache.lookup ("http://example.com") == null);
+}
+
+public void persistence_test ()
+{
+    var cache_path = Path.build_filename (TEST_PATH, "app-info.cache");
+    var desktop_path = Path.build_filename (TEST_PATH, "cached.desktop");
+    FileUtils.unlink (cache_path);
+    write_desktop_file (desktop_path, "Old Name");
+    set_mtime (desktop_path, 1000000);
+
+    var cache = new AppInfoCache (cache_path);
+    var entry = cache.lookup (desktop_path);
+    assert_cmpstr (entry.display_name, OperatorType.EQUAL, "Old Name");
+    assert_cmpint (entry.categories.length, OperatorType.EQUAL, 2);
+    assert_cmpstr (entry.categories[0], OperatorType.EQUAL, "Utility");
+    assert_cmpstr (entry.categories[1], OperatorType.EQUAL, "TextEditor");
+    assert_cmpint (entry.keywords.length, OperatorType.EQUAL, 2);
+    assert_cmpstr (entry.keywords[0], OperatorType.EQUAL, "Text");
+    try
+    {
+        cache.save ();
+    }
+    catch (Error err)
+    {
+        error ("%s", err.message);
+    }
+
+    // The desktop file isn't read again as long as its mtime doesn't
+    // change
+    write_desktop_file (desktop_path, "New Name");
+    set_mtime (desktop_path, 1000000);
+    cache = new AppInfoCache (cache_path);
+    entry = cache.lookup (desktop_path);
+    assert_cmpstr (entry.display_name, OperatorType.EQUAL, "Old Name");
+    assert_cmpint (entry.categories.length, OperatorType.EQUAL, 2);
+    assert_cmpint (entry.keywords.length, OperatorType.EQUAL, 2);
+
+    set_mtime (desktop_path, 2000000);
+    cache = new AppInfoCache (cache_path);
+    entry = cache.lookup (desktop_path);
+    assert_cmpstr (entry.display_name, OperatorType.EQUAL, "New Name");
+
+    // Removed desktop files are dropped from the cache
+    FileUtils.unlink (desktop_path);
+    cache = new AppInfoCache (cache_path);
+    assert (cache.lookup (desktop_path) == null);
+
+    FileUtils.unlink (cache_path);
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -0,0 +1,130 @@
+/* db-reader-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Zeitgeist.SQLite;
+using Assertions;
+
+// More events than are looked up by a single chunk
+const int NUM_EVENTS = Database.EVENT_ID_CHUNK_SIZE + 44;
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // This test will use the database, make sure it won't mess up
+    // the system.
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", "/tmp/zeitgeist-tests", true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", ":memory:", true));
+
+    Test.add_func ("/DbReader/get_events_chunks", get_events_chunks_test);
+    Test.add_func ("/DbReader/find_related_uris_chunks",
+        find_related_uris_chunks_test);
+
+    return Test.run ();
+}
+
+private Event create_event (string actor, string uri, int64 timestamp)
+{
+    var event = new Event.full (ZG.ACCESS_EVENT, ZG.USER_ACTIVITY, actor,
+        null, new Subject.full (uri, NFO.DOCUMENT, NFO.FILE_DATA_OBJECT,
+            "text/plain", "file:///tmp"));
+    event.timestamp = timestamp;
+    return event;
+}
+
+public void get_events_chunks_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    var events = new GenericArray<Event> ();
+    for (int i = 1; i <= NUM_EVENTS; ++i)
+    {
+        events.add (create_event ("application://gedit.desktop",
+            "file:///tmp/foo%d.txt".printf (i), i));
+    }
+    uint32[] inserted_ids = engine.insert_events (events);
+
+    // Ask for the events in reverse order, with an unknown ID and one
+    // of them twice, in a different chunk
+    uint32[] event_ids = {};
+    for (int i = NUM_EVENTS - 1; i >= 0; --i)
+        event_ids += inserted_ids[i];
+    event_ids += 100000;
+    event_ids += inserted_ids[NUM_EVENTS - 1];
+
+    var results = engine.get_events (event_ids);
+    assert_cmpint (results.length, OperatorType.EQUAL, NUM_EVENTS + 2);
+    for (int i = 0; i < NUM_EVENTS; ++i)
+    {
+        assert_cmpuint (results[i].id, OperatorType.EQUAL, event_ids[i]);
+        assert_cmpint (results[i].subjects.length, OperatorType.EQUAL, 1);
+        assert_cmpstr (results[i].subjects[0].uri, OperatorType.EQUAL,
+            "file:///tmp/foo%d.txt".printf (NUM_EVENTS - i));
+    }
+    assert (results[NUM_EVENTS] == null);
+    assert (results[NUM_EVENTS + 1] == results[0]);
+
+    engine.close ();
+}
+
+public void find_related_uris_chunks_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+
+    // The event used with the URIs around it is inserted first, so it
+    // comes first in the rows fetched by the first chunk
+    var events = new GenericArray<Event> ();
+    events.add (create_event ("application://gedit.desktop",
+        "file:///tmp/foo.txt", NUM_EVENTS + 1));
+    for (int i = 1; i <= NUM_EVENTS; ++i)
+    {
+        events.add (create_event ("application://firefox.desktop",
+            "http://example.com/%d".printf (i), 2 * i));
+    }
+    engine.insert_events (events);
+
+    var templates = new GenericArray<Event> ();
+    templates.add (new Event.full (null, null,
+        "application://gedit.desktop"));
+    var result_templates = new GenericArray<Event> ();
+    result_templates.add (new Event.full (null, null,
+        "application://firefox.desktop"));
+
+    // Only the URIs visited just before the text file are related to
+    // it, the most recent of them coming first
+    string[] uris = engine.find_related_uris (new TimeRange.anytime (),
+        templates, result_templates, StorageState.ANY, 3,
+        RelevantResultType.RECENT);
+    int middle = NUM_EVENTS / 2;
+    assert_cmpint (uris.length, OperatorType.EQUAL, 3);
+    for (int i = 0; i < uris.length; ++i)
+    {
+        assert_cmpstr (uris[i], OperatorType.EQUAL,
+            "http://example.com/%d".printf (middle - i));
+    }
+
+    engine.close ();
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -36,6 +36,7 @@ int main (string[] argv)
     Test.add_func ("/Event/WithOneSubjectToFromVariant", with_one_subject_to_from_variant_test);
     Test.add_func ("/Event/3EventsToFromVariant", three_events_to_from_variant_test);
     Test.add_func ("/Event/0EventsToFromVariant", zero_events_to_from_variant_test);
+    Test.add_func ("/Event/CachedVariant", cached_variant_test);
 
     return Test.run ();
 }
@@ -327,4 +328,39 @@ void zero_events_to_from_variant_test ()
     assert_cmpint (events.length, OperatorType.EQUAL, 0);
 }
 
+void cached_variant_test ()
+{
+    var ev = new Event.full (
+        ZG.ACCESS_EVENT, ZG.USER_ACTIVITY, "application://firefox.desktop",
+        null, new Subject.full ("http://example.com"));
+
+    Variant vevent = ev.to_variant ();
+    assert (ev.to_variant () == vevent);
+
+    // Modifying the event or its subjects drops the cached variant
+    ev.id = 42;
+    assert (ev.to_variant () != vevent);
+    assert_cmpstr (new Event.from_variant (ev.to_variant ()).id.to_string (),
+        OperatorType.EQUAL, "42");
+
+    vevent = ev.to_variant ();
+    ev.subjects[0].text = "Example";
+    assert (ev.to_variant () != vevent);
+    assert_cmpstr (new Event.from_variant (ev.to_variant ()).subjects[0].text,
+        OperatorType.EQUAL, "Example");
+
+    vevent = ev.to_variant ();
+    ev.add_subject (new Subject.full ("http://example.org"));
+    assert (ev.to_variant () != vevent);
+    assert_cmpint (new Event.from_variant (ev.to_variant ()).num_subjects (),
+        OperatorType.EQUAL, 2);
+
+    vevent = ev.to_variant ();
+    ev.payload = new ByteArray ();
+    uint8[] byte = { 255 };
+    ev.payload.append (byte);
+    assert (ev.to_variant () != vevent);
+    assert (new Event.from_variant (ev.to_variant ()).payload.len == 1);
+}
+
 // vim:expandtab:ts=4:sw=4
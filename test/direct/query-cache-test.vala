@@ -0,0 +1,191 @@
+/* query-cache-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Assertions;
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // This test will use the database, make sure it won't mess up
+    // the system.
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", "/tmp/zeitgeist-tests", true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", ":memory:", true));
+
+    Test.add_func ("/QueryCache/hits", hits_test);
+    Test.add_func ("/QueryCache/insertion", insertion_test);
+    Test.add_func ("/QueryCache/deletion", deletion_test);
+    Test.add_func ("/QueryCache/memory_limit", memory_limit_test);
+    Test.add_func ("/QueryCache/generation", generation_test);
+
+    return Test.run ();
+}
+
+private Event create_event (int64 timestamp, string actor)
+{
+    var event = new Event.full (ZG.ACCESS_EVENT, ZG.USER_ACTIVITY, actor,
+        null, new Subject.full ("file:///tmp/foo.txt", NFO.DOCUMENT,
+            NFO.FILE_DATA_OBJECT, "text/plain", "file:///tmp"));
+    event.timestamp = timestamp;
+    return event;
+}
+
+private GenericArray<Event> create_templates (string actor)
+{
+    var templates = new GenericArray<Event> ();
+    templates.add (new Event.full (null, null, actor));
+    return templates;
+}
+
+private uint32[] find_ids (Engine engine, TimeRange time_range,
+    GenericArray<Event> templates) throws EngineError
+{
+    return engine.find_event_ids (time_range, templates, StorageState.ANY,
+        10, ResultType.MOST_RECENT_EVENTS);
+}
+
+public void hits_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    var events = new GenericArray<Event> ();
+    events.add (create_event (1500, "application://a.desktop"));
+    engine.insert_events (events);
+
+    var ids = find_ids (engine, new TimeRange (1000, 2000),
+        create_templates ("application://a.desktop"));
+    assert_cmpint (ids.length, OperatorType.EQUAL, 1);
+    ids = find_ids (engine, new TimeRange (1000, 2000),
+        create_templates ("application://a.desktop"));
+    assert_cmpint (ids.length, OperatorType.EQUAL, 1);
+
+    assert_cmpuint (engine.query_cache.misses, OperatorType.EQUAL, 1);
+    assert_cmpuint (engine.query_cache.hits, OperatorType.EQUAL, 1);
+}
+
+public void insertion_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    var time_range = new TimeRange (1000, 2000);
+    var templates = create_templates ("application://a.desktop");
+
+    assert_cmpint (find_ids (engine, time_range, templates).length,
+        OperatorType.EQUAL, 0);
+
+    // Events outside of the time range, or not matching the templates,
+    // don't invalidate the cached result
+    var events = new GenericArray<Event> ();
+    events.add (create_event (2500, "application://a.desktop"));
+    events.add (create_event (1500, "application://b.desktop"));
+    engine.insert_events (events);
+    assert_cmpint (find_ids (engine, time_range, templates).length,
+        OperatorType.EQUAL, 0);
+    assert_cmpuint (engine.query_cache.hits, OperatorType.EQUAL, 1);
+
+    events = new GenericArray<Event> ();
+    events.add (create_event (1500, "application://a.desktop"));
+    engine.insert_events (events);
+    assert_cmpint (find_ids (engine, time_range, templates).length,
+        OperatorType.EQUAL, 1);
+    assert_cmpuint (engine.query_cache.hits, OperatorType.EQUAL, 1);
+    assert_cmpuint (engine.query_cache.misses, OperatorType.EQUAL, 2);
+}
+
+public void deletion_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    var templates = create_templates ("application://a.desktop");
+
+    var events = new GenericArray<Event> ();
+    events.add (create_event (1500, "application://a.desktop"));
+    events.add (create_event (5500, "application://a.desktop"));
+    var inserted_ids = engine.insert_events (events);
+
+    assert_cmpint (find_ids (engine, new TimeRange (1000, 2000),
+        templates).length, OperatorType.EQUAL, 1);
+    assert_cmpint (find_ids (engine, new TimeRange (3000, 4000),
+        templates).length, OperatorType.EQUAL, 0);
+
+    engine.delete_events ({ inserted_ids[0] }, null);
+
+    // Only the result overlapping the deleted events is dropped
+    assert_cmpint (find_ids (engine, new TimeRange (1000, 2000),
+        templates).length, OperatorType.EQUAL, 0);
+    assert_cmpint (find_ids (engine, new TimeRange (3000, 4000),
+        templates).length, OperatorType.EQUAL, 0);
+    assert_cmpuint (engine.query_cache.invalidations, OperatorType.EQUAL, 1);
+    assert_cmpuint (engine.query_cache.hits, OperatorType.EQUAL, 1);
+}
+
+public void memory_limit_test ()
+{
+    var cache = new QueryCache (1024);
+    var templates = new GenericArray<Event> ();
+    var ids = new uint32[64];
+
+    // Each result takes up more than a quarter of the limit
+    cache.store (new TimeRange (0, 1), templates, StorageState.ANY, 64,
+        ResultType.MOST_RECENT_EVENTS, ids);
+    assert (cache.lookup (new TimeRange (0, 1), templates, StorageState.ANY,
+        64, ResultType.MOST_RECENT_EVENTS) == null);
+
+    // Smaller results evict the least recently used ones
+    ids = new uint32[32];
+    for (int i = 0; i < 16; ++i)
+    {
+        cache.store (new TimeRange (0, i), templates, StorageState.ANY, 32,
+            ResultType.MOST_RECENT_EVENTS, ids);
+    }
+    assert (cache.lookup (new TimeRange (0, 0), templates, StorageState.ANY,
+        32, ResultType.MOST_RECENT_EVENTS) == null);
+    assert (cache.lookup (new TimeRange (0, 15), templates, StorageState.ANY,
+        32, ResultType.MOST_RECENT_EVENTS) != null);
+}
+
+public void generation_test ()
+{
+    var cache = new QueryCache ();
+    uint64 generation = cache.generation;
+
+    // Every insertion or deletion counts, even if nothing was cached
+    cache.invalidate_insertion (new TimeRange (0, 1),
+        new GenericArray<Event?> ());
+    assert (cache.generation > generation);
+    generation = cache.generation;
+    cache.invalidate_deletion (new TimeRange (0, 1));
+    assert (cache.generation > generation);
+    generation = cache.generation;
+    cache.invalidate_storage_state ();
+    assert (cache.generation > generation);
+
+    // Lookups and stores don't change it
+    generation = cache.generation;
+    cache.store (new TimeRange (0, 1), new GenericArray<Event> (),
+        StorageState.ANY, 10, ResultType.MOST_RECENT_EVENTS, { 1 });
+    cache.lookup (new TimeRange (0, 1), new GenericArray<Event> (),
+        StorageState.ANY, 10, ResultType.MOST_RECENT_EVENTS);
+    assert (cache.generation == generation);
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -0,0 +1,215 @@
+/* reader-pool-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Zeitgeist.SQLite;
+using Assertions;
+
+const string TEST_PATH = "/tmp/zeitgeist-tests";
+const string DATABASE_PATH = TEST_PATH + "/reader-pool.sqlite";
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // The readers can't share a database in memory, so this test uses
+    // a file
+    DirUtils.create_with_parents (TEST_PATH, 0755);
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", TEST_PATH, true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", DATABASE_PATH, true));
+
+    Test.add_func ("/ReaderPool/find_events", find_events_test);
+    Test.add_func ("/ReaderPool/concurrent_insertion",
+        concurrent_insertion_test);
+    Test.add_func ("/ReaderPool/new_actor", new_actor_test);
+    Test.add_func ("/ReaderPool/schema_mismatch", schema_mismatch_test);
+
+    return Test.run ();
+}
+
+private Engine create_engine ()
+{
+    foreach (var suffix in new string[] { "", "-wal", "-shm" })
+        FileUtils.unlink (DATABASE_PATH + suffix);
+
+    var engine = new Zeitgeist.Engine ();
+    var events = new GenericArray<Event> ();
+    for (int i = 1; i <= 3; ++i)
+        events.add (create_event (i * 1000));
+    engine.insert_events (events);
+    return engine;
+}
+
+private Event create_event (int64 timestamp)
+{
+    var uri = "file:///tmp/foo%s.txt".printf (timestamp.to_string ());
+    var event = new Event.full (ZG.ACCESS_EVENT, ZG.USER_ACTIVITY,
+        "application://gedit.desktop", null,
+        new Subject.full (uri, NFO.DOCUMENT, NFO.FILE_DATA_OBJECT,
+            "text/plain", "file:///tmp"));
+    event.timestamp = timestamp;
+    return event;
+}
+
+public void find_events_test ()
+{
+    var engine = create_engine ();
+    var pool = new ReaderPool (engine);
+    assert_cmpuint (pool.size, OperatorType.GREATER_THAN, 0);
+
+    var loop = new MainLoop ();
+    GenericArray<Event?> events = null;
+    pool.find_events.begin (new TimeRange.anytime (),
+        new GenericArray<Event> (), StorageState.ANY, 10,
+        ResultType.MOST_RECENT_EVENTS, null, (obj, res) =>
+        {
+            try
+            {
+                events = pool.find_events.end (res);
+            }
+            catch (EngineError err)
+            {
+                error ("%s", err.message);
+            }
+            loop.quit ();
+        });
+    loop.run ();
+
+    assert_cmpint (events.length, OperatorType.EQUAL, 3);
+    assert_cmpstr (events[0].subjects[0].uri, OperatorType.EQUAL,
+        "file:///tmp/foo3000.txt");
+
+    // The IDs were stored in the Engine's query cache
+    assert (engine.query_cache.lookup (new TimeRange.anytime (),
+        new GenericArray<Event> (), StorageState.ANY, 10,
+        ResultType.MOST_RECENT_EVENTS) != null);
+
+    pool.close ();
+    engine.close ();
+}
+
+public void concurrent_insertion_test ()
+{
+    var engine = create_engine ();
+    var pool = new ReaderPool (engine);
+
+    // The query completes after an event was inserted, so its result
+    // isn't cached, as it may or may not include the new event
+    var loop = new MainLoop ();
+    uint32[] event_ids = null;
+    pool.find_event_ids.begin (new TimeRange.anytime (),
+        new GenericArray<Event> (), StorageState.ANY, 10,
+        ResultType.MOST_RECENT_EVENTS, null, (obj, res) =>
+        {
+            try
+            {
+                event_ids = pool.find_event_ids.end (res);
+            }
+            catch (EngineError err)
+            {
+                error ("%s", err.message);
+            }
+            loop.quit ();
+        });
+    var events = new GenericArray<Event> ();
+    events.add (create_event (4000));
+    engine.insert_events (events);
+    loop.run ();
+
+    assert (event_ids.length >= 3);
+    assert (engine.query_cache.lookup (new TimeRange.anytime (),
+        new GenericArray<Event> (), StorageState.ANY, 10,
+        ResultType.MOST_RECENT_EVENTS) == null);
+
+    pool.close ();
+    engine.close ();
+}
+
+public void new_actor_test ()
+{
+    var engine = create_engine ();
+    var pool = new ReaderPool (engine);
+    assert_cmpuint (pool.size, OperatorType.GREATER_THAN, 0);
+
+    // The actor is only inserted after the readers loaded their tables
+    var events = new GenericArray<Event> ();
+    events.add (create_event (4000));
+    events[0].actor = "application://new-app.desktop";
+    engine.insert_events (events);
+
+    var templates = new GenericArray<Event> ();
+    templates.add (new Event.full (null, null,
+        "application://new-app.desktop"));
+
+    var loop = new MainLoop ();
+    uint32[] event_ids = null;
+    pool.find_event_ids.begin (new TimeRange.anytime (), templates,
+        StorageState.ANY, 10, ResultType.MOST_RECENT_EVENTS, null,
+        (obj, res) =>
+        {
+            try
+            {
+                event_ids = pool.find_event_ids.end (res);
+            }
+            catch (EngineError err)
+            {
+                error ("%s", err.message);
+            }
+            loop.quit ();
+        });
+    loop.run ();
+
+    assert_cmpint (event_ids.length, OperatorType.EQUAL, 1);
+    assert_cmpuint (event_ids[0], OperatorType.EQUAL, events[0].id);
+
+    pool.close ();
+    engine.close ();
+}
+
+public void schema_mismatch_test ()
+{
+    var engine = create_engine ();
+    DatabaseSchema.exec_query (engine.database.database,
+        "UPDATE schema_version SET version=%d WHERE schema='core'".printf (
+            DatabaseSchema.CORE_SCHEMA_VERSION + 1));
+
+    // Readers refuse databases with a schema they don't know, like Log
+    // does when it falls back to D-Bus
+    try
+    {
+        new DbReader ();
+        assert_not_reached ();
+    }
+    catch (EngineError err)
+    {
+        assert (err is EngineError.DATABASE_CANTOPEN);
+    }
+
+    var pool = new ReaderPool (engine);
+    assert_cmpuint (pool.size, OperatorType.EQUAL, 0);
+
+    engine.close ();
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -0,0 +1,254 @@
+/* search-index-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Assertions;
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // This test will use the database, make sure it won't mess up
+    // the system.
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", "/tmp/zeitgeist-tests", true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", ":memory:", true));
+    assert (Environment.set_variable(
+        SearchIndex.BACKEND_VARIABLE, SearchIndex.BACKEND_SQLITE, true));
+
+    Test.add_func ("/SearchIndex/match_expression", match_expression_test);
+    Test.add_func ("/SearchIndex/search", search_test);
+    Test.add_func ("/SearchIndex/relevancy", relevancy_test);
+    Test.add_func ("/SearchIndex/deletion", deletion_test);
+    Test.add_func ("/SearchIndex/duplicates", duplicates_test);
+
+    return Test.run ();
+}
+
+private Event create_event (int64 timestamp, string uri, string text)
+{
+    var subject = new Subject.full (uri, NFO.DOCUMENT, NFO.FILE_DATA_OBJECT,
+        "text/plain", "file:///tmp");
+    subject.text = text;
+    var event = new Event.full (ZG.ACCESS_EVENT, ZG.USER_ACTIVITY,
+        "application://gedit.desktop", null, subject);
+    event.timestamp = timestamp;
+    return event;
+}
+
+private Engine? create_engine ()
+{
+    var engine = new Zeitgeist.Engine ();
+    if (engine.search_index == null)
+    {
+        Test.message ("SQLite was built without FTS5, skipping");
+        return null;
+    }
+
+    var events = new GenericArray<Event> ();
+    events.add (create_event (1000, "file:///tmp/report.txt",
+        "Quarterly report"));
+    events.add (create_event (2000, "file:///tmp/notes.txt",
+        "Meeting notes about the report"));
+    events.add (create_event (3000, "file:///home/user/Café.txt",
+        "Menu"));
+    engine.insert_events (events);
+    return engine;
+}
+
+private GenericArray<Event?> search (Engine engine, string query,
+    uint result_type, out double[] relevancies, out uint matches)
+    throws EngineError
+{
+    return engine.search_index.search (query, new TimeRange.anytime (),
+        new GenericArray<Event> (), StorageState.ANY, 0, 10, result_type,
+        true, out relevancies, out matches);
+}
+
+public void match_expression_test ()
+{
+    assert_cmpstr (SearchIndex.get_match_expression ("foo bar*"),
+        OperatorType.EQUAL, "\"foo\" \"bar\"*");
+    assert_cmpstr (SearchIndex.get_match_expression ("foo -bar"),
+        OperatorType.EQUAL, "\"foo\" NOT ( \"bar\" )");
+    assert_cmpstr (SearchIndex.get_match_expression ("foo AND NOT bar"),
+        OperatorType.EQUAL, "\"foo\" NOT \"bar\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("(a OR b) NEAR c"),
+        OperatorType.EQUAL, "( \"a\" OR \"b\" ) AND \"c\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("name:\"x y\" app:gedit"),
+        OperatorType.EQUAL, "subject_text : \"x y\" actor : \"gedit\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("a\"b"),
+        OperatorType.EQUAL, "\"a\"\"b\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("  "),
+        OperatorType.EQUAL, "");
+
+    // Excluded words apply to the whole query, wherever they are
+    assert_cmpstr (SearchIndex.get_match_expression ("-draft report"),
+        OperatorType.EQUAL, "\"report\" NOT ( \"draft\" )");
+    assert_cmpstr (SearchIndex.get_match_expression ("foo OR -bar"),
+        OperatorType.EQUAL, "\"foo\" NOT ( \"bar\" )");
+    assert_cmpstr (SearchIndex.get_match_expression ("foo AND -bar"),
+        OperatorType.EQUAL, "\"foo\" NOT ( \"bar\" )");
+    assert_cmpstr (SearchIndex.get_match_expression ("a -b -c d"),
+        OperatorType.EQUAL, "( \"a\" \"d\" ) NOT ( \"b\" OR \"c\" )");
+
+    // Operators missing an operand are dropped
+    assert_cmpstr (SearchIndex.get_match_expression ("NOT foo"),
+        OperatorType.EQUAL, "\"foo\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("OR foo AND"),
+        OperatorType.EQUAL, "\"foo\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("(foo OR) bar"),
+        OperatorType.EQUAL, "( \"foo\" ) \"bar\"");
+    assert_cmpstr (SearchIndex.get_match_expression ("(a OR b"),
+        OperatorType.EQUAL, "( \"a\" OR \"b\" )");
+
+    try
+    {
+        SearchIndex.get_match_expression ("-foo");
+        assert_not_reached ();
+    }
+    catch (EngineError err)
+    {
+        assert (err is EngineError.INVALID_ARGUMENT);
+    }
+}
+
+public void search_test ()
+{
+    var engine = create_engine ();
+    if (engine == null)
+        return;
+
+    double[] relevancies;
+    uint matches;
+    var results = search (engine, "report", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpuint (matches, OperatorType.EQUAL, 2);
+    assert_cmpint (results.length, OperatorType.EQUAL, 2);
+    assert_cmpint (relevancies.length, OperatorType.EQUAL, 2);
+
+    // Diacritics are ignored, and the words of the URIs are indexed
+    results = search (engine, "cafe", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    assert_cmpstr (results[0].subjects[0].text, OperatorType.EQUAL, "Menu");
+
+    results = search (engine, "app:gedit not*", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    assert_cmpint (results[0].timestamp, OperatorType.EQUAL, 2000);
+
+    results = search (engine, "report -notes", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    assert_cmpint (results[0].timestamp, OperatorType.EQUAL, 1000);
+
+    // Results are grouped like in FindEvents
+    results = search (engine, "gedit", ResultType.MOST_RECENT_ACTOR,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+}
+
+public void relevancy_test ()
+{
+    var engine = create_engine ();
+    if (engine == null)
+        return;
+
+    double[] relevancies;
+    uint matches;
+    var results = search (engine, "report",
+        SearchIndex.RELEVANCY_RESULT_TYPE, out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 2);
+
+    // The shorter text matches better, even if it's older
+    assert_cmpint (results[0].timestamp, OperatorType.EQUAL, 1000);
+    assert (relevancies[0] == 1.0);
+    assert (relevancies[1] > 0.0 && relevancies[1] < 1.0);
+
+    // Only the events within the time range are scored
+    results = engine.search_index.search ("report", new TimeRange (1500, 2500),
+        new GenericArray<Event> (), StorageState.ANY, 0, 10,
+        SearchIndex.RELEVANCY_RESULT_TYPE, true, out relevancies,
+        out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    assert_cmpint (results[0].timestamp, OperatorType.EQUAL, 2000);
+    assert (relevancies[0] == 1.0);
+}
+
+public void deletion_test ()
+{
+    var engine = create_engine ();
+    if (engine == null)
+        return;
+
+    double[] relevancies;
+    uint matches;
+    var results = search (engine, "menu", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+
+    engine.delete_events ({ results[0].id }, null);
+    results = search (engine, "menu", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 0);
+    assert_cmpuint (matches, OperatorType.EQUAL, 0);
+}
+
+public void duplicates_test ()
+{
+    var engine = create_engine ();
+    if (engine == null)
+        return;
+
+    // The first event appears twice in the batch, and the second one is
+    // already in the database
+    var events = new GenericArray<Event> ();
+    events.add (create_event (4000, "file:///tmp/slides.odp", "Slides"));
+    events.add (create_event (1000, "file:///tmp/report.txt",
+        "Quarterly report"));
+    events.add (create_event (4000, "file:///tmp/slides.odp", "Slides"));
+    uint32[] event_ids = engine.insert_events (events);
+    assert_cmpuint (event_ids[0], OperatorType.GREATER_THAN, 3);
+    assert_cmpuint (event_ids[1], OperatorType.EQUAL, 1);
+    assert_cmpuint (event_ids[2], OperatorType.EQUAL, event_ids[0]);
+
+    // Only the events in the database are indexed, so the next ID
+    // is still free
+    events = new GenericArray<Event> ();
+    events.add (create_event (5000, "file:///tmp/budget.ods", "Budget"));
+    event_ids = engine.insert_events (events);
+    assert_cmpuint (event_ids[0], OperatorType.GREATER_THAN, 0);
+
+    double[] relevancies;
+    uint matches;
+    var results = search (engine, "slides", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    results = search (engine, "budget", ResultType.MOST_RECENT_EVENTS,
+        out relevancies, out matches);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    assert_cmpuint (results[0].id, OperatorType.EQUAL, event_ids[0]);
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -0,0 +1,99 @@
+/* statement-cache-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Zeitgeist.SQLite;
+using Assertions;
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // This test will use the database, make sure it won't mess up
+    // the system.
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", "/tmp/zeitgeist-tests", true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", ":memory:", true));
+
+    Test.add_func ("/StatementCache/hits", hits_test);
+    Test.add_func ("/StatementCache/eviction", eviction_test);
+    Test.add_func ("/StatementCache/find_event_ids", find_event_ids_test);
+
+    return Test.run ();
+}
+
+public void hits_test ()
+{
+    Database database = new Zeitgeist.SQLite.Database ();
+    StatementCache cache = new StatementCache (database, 4);
+
+    unowned Sqlite.Statement stmt = cache.get_statement (
+        "SELECT value FROM actor WHERE id=?");
+    stmt.bind_int64 (1, 1);
+    assert_cmpint (stmt.step (), OperatorType.EQUAL, Sqlite.DONE);
+
+    // The same statement is returned, reset and without bindings
+    unowned Sqlite.Statement stmt2 = cache.get_statement (
+        "SELECT value FROM actor WHERE id=?");
+    assert (stmt == stmt2);
+    assert_cmpint (stmt2.step (), OperatorType.EQUAL, Sqlite.DONE);
+
+    assert_cmpuint (cache.hits, OperatorType.EQUAL, 1);
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 1);
+}
+
+public void eviction_test ()
+{
+    Database database = new Zeitgeist.SQLite.Database ();
+    StatementCache cache = new StatementCache (database, 2);
+
+    cache.get_statement ("SELECT 1");
+    cache.get_statement ("SELECT 2");
+    cache.get_statement ("SELECT 1");
+
+    // "SELECT 2" is now the least recently used statement
+    cache.get_statement ("SELECT 3");
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 3);
+
+    cache.get_statement ("SELECT 1");
+    assert_cmpuint (cache.hits, OperatorType.EQUAL, 2);
+    cache.get_statement ("SELECT 2");
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 4);
+}
+
+public void find_event_ids_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    var templates = new GenericArray<Event> ();
+
+    // Queries which only differ in their time range share a statement
+    engine.find_event_ids (new TimeRange (1000, 2000), templates,
+        StorageState.ANY, 10, ResultType.MOST_RECENT_EVENTS);
+    engine.find_event_ids (new TimeRange (3000, 4000), templates,
+        StorageState.ANY, 10, ResultType.MOST_RECENT_EVENTS);
+
+    assert_cmpuint (engine.statement_cache.misses, OperatorType.EQUAL, 1);
+    assert_cmpuint (engine.statement_cache.hits, OperatorType.EQUAL, 1);
+}
+
+// vim:expandtab:ts=4:sw=4
@@ -39,6 +39,8 @@ int main (string[] args)
     Test.add_func ("/WhereClause/basic", basic_test);
     Test.add_func ("/WhereClause/delete_hook", engine_test);
     Test.add_func ("/WhereClause/get_value_query", get_value_with_query_test);
+    Test.add_func ("/WhereClause/id_try_string_query",
+        id_try_string_with_query_test);
 
     return Test.run ();
 }
@@ -81,6 +83,20 @@ public void get_value_with_query_test ()
     assert_cmpstr (table_lookup.get_value (100), OperatorType.EQUAL, "new-actor");
 }
 
+public void id_try_string_with_query_test ()
+{
+    Database database = new Zeitgeist.SQLite.Database ();
+    unowned Sqlite.Database db = database.database;
+    TableLookup table_lookup = new TableLookup (database, "actor");
+
+    assert_cmpint (table_lookup.id_try_string ("new-actor"), OperatorType.EQUAL, -1);
+
+    int rc = db.exec ("INSERT INTO actor (id, value) VALUES (100, 'new-actor')");
+    assert (rc == Sqlite.OK);
+
+    assert_cmpint (table_lookup.id_try_string ("new-actor"), OperatorType.EQUAL, 100);
+}
+
 public void engine_test ()
 {
     PublicEngine engine = new PublicEngine ();
@@ -0,0 +1,155 @@
+/* value-cache-test.vala
+ *
+ * Copyright © 2026 Zeitgeist contributors
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 2.1 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ */
+
+using Zeitgeist;
+using Zeitgeist.SQLite;
+using Assertions;
+
+int main (string[] args)
+{
+    Test.init (ref args);
+
+    // Do not abort on warning()s.
+    GLib.Log.set_always_fatal (LogLevelFlags.LEVEL_CRITICAL);
+
+    // This test will use the database, make sure it won't mess up
+    // the system.
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATA_PATH", "/tmp/zeitgeist-tests", true));
+    assert (Environment.set_variable(
+        "ZEITGEIST_DATABASE_PATH", ":memory:", true));
+
+    Test.add_func ("/ValueCache/prefetch", prefetch_test);
+    Test.add_func ("/ValueCache/eviction", eviction_test);
+    Test.add_func ("/ValueCache/get_events", get_events_test);
+    Test.add_func ("/ValueCache/deletion", deletion_test);
+
+    return Test.run ();
+}
+
+private Database create_database ()
+{
+    Database database = new Zeitgeist.SQLite.Database ();
+    DatabaseSchema.exec_query (database.database, """
+        INSERT INTO uri (id, value) VALUES
+            (1, 'file:///a'), (2, 'file:///b'), (3, 'file:///c')
+        """);
+    return database;
+}
+
+public void prefetch_test ()
+{
+    Database database = create_database ();
+    ValueCache cache = new ValueCache (database, "uri", 10);
+
+    // IDs of NULL columns and repeated IDs are only looked at once
+    cache.prefetch ({ 1, 0, 2, 1 });
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 2);
+    assert_cmpuint (cache.size, OperatorType.EQUAL, 2);
+
+    cache.prefetch ({ 1, 2, 3 });
+    assert_cmpuint (cache.hits, OperatorType.EQUAL, 2);
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 3);
+
+    assert_cmpstr (cache.get_value (1), OperatorType.EQUAL, "file:///a");
+    assert_cmpstr (cache.get_value (3), OperatorType.EQUAL, "file:///c");
+    assert (cache.get_value (0) == null);
+}
+
+public void eviction_test ()
+{
+    Database database = create_database ();
+    ValueCache cache = new ValueCache (database, "uri", 2);
+
+    cache.prefetch ({ 1, 2 });
+    cache.get_value (1);
+
+    // 2 is now the least recently used value
+    cache.prefetch ({ 3 });
+    assert_cmpuint (cache.size, OperatorType.EQUAL, 2);
+    cache.prefetch ({ 1, 3 });
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 3);
+
+    // Values which were evicted are read again
+    assert_cmpstr (cache.get_value (2), OperatorType.EQUAL, "file:///b");
+    assert_cmpuint (cache.misses, OperatorType.EQUAL, 4);
+    assert_cmpuint (cache.size, OperatorType.EQUAL, 2);
+}
+
+public void get_events_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+
+    var subject = new Subject.full ("file:///tmp/a.txt", NFO.DOCUMENT,
+        NFO.FILE_DATA_OBJECT, "text/plain", "file:///tmp");
+    subject.text = "a.txt";
+    var event = new Event.full (ZG.ACCESS_EVENT, ZG.USER_ACTIVITY,
+        "application://gedit.desktop", null, subject);
+    event.origin = "http://example.com";
+    event.timestamp = 1000;
+    var subject2 = new Subject.full ("file:///tmp/b.txt", NFO.DOCUMENT,
+        NFO.FILE_DATA_OBJECT, "text/plain", "file:///tmp");
+    event.add_subject (subject2);
+
+    var events = new GenericArray<Event> ();
+    events.add (event);
+    uint32[] event_ids = engine.insert_events (events);
+
+    var results = engine.get_events (event_ids);
+    assert_cmpint (results.length, OperatorType.EQUAL, 1);
+    Event result = results[0];
+    assert_cmpstr (result.origin, OperatorType.EQUAL, "http://example.com");
+    assert_cmpint (result.num_subjects (), OperatorType.EQUAL, 2);
+    Subject result_subject = result.subjects[0];
+    if (result_subject.uri != "file:///tmp/a.txt")
+        result_subject = result.subjects[1];
+    assert_cmpstr (result_subject.uri, OperatorType.EQUAL,
+        "file:///tmp/a.txt");
+    assert_cmpstr (result_subject.current_uri, OperatorType.EQUAL,
+        "file:///tmp/a.txt");
+    assert_cmpstr (result_subject.origin, OperatorType.EQUAL, "file:///tmp");
+    assert_cmpstr (result_subject.text, OperatorType.EQUAL, "a.txt");
+    assert_cmpstr (result_subject.interpretation, OperatorType.EQUAL,
+        NFO.DOCUMENT);
+
+    // Fetching the same events again doesn't read any value
+    uint uri_misses = engine.uris_cache.misses;
+    uint text_misses = engine.texts_cache.misses;
+    engine.get_events (event_ids);
+    assert_cmpuint (engine.uris_cache.misses, OperatorType.EQUAL, uri_misses);
+    assert_cmpuint (engine.texts_cache.misses, OperatorType.EQUAL,
+        text_misses);
+}
+
+public void deletion_test ()
+{
+    var engine = new Zeitgeist.Engine ();
+    DatabaseSchema.exec_query (engine.database.database,
+        "INSERT INTO uri (id, value) VALUES (1000, 'file:///deleted')");
+    engine.uris_cache.prefetch ({ 1000 });
+    assert_cmpuint (engine.uris_cache.size, OperatorType.EQUAL, 1);
+
+    // Deleted rows are dropped from the cache by the update hook, so
+    // their IDs can be reused
+    DatabaseSchema.exec_query (engine.database.database,
+        "DELETE FROM uri WHERE id=1000");
+    assert_cmpuint (engine.uris_cache.size, OperatorType.EQUAL, 0);
+}
+
+// vim:expandtab:ts=4:sw=4
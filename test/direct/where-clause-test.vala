@@ -33,6 +33,7 @@ int main (string[] args)
     Test.add_func ("/WhereClause/nested_negation", nested_negation_test);
     Test.add_func ("/WhereClause/match_condition", match_condition_test);
     Test.add_func ("/WhereClause/glob/right_boundary", right_boundary_test);
+    Test.add_func ("/WhereClause/extend_is_simple", extend_is_simple_test);
 
     return Test.run ();
 }
@@ -143,4 +144,20 @@ public void right_boundary_test ()
     assert_cmpstr (clause.get_right_boundary ("a b"), OperatorType.EQUAL, "a c");
 }
 
+public void extend_is_simple_test ()
+{
+    // Conditions needing event_view, like the storage state one, aren't
+    // forgotten when extending the clause with simple conditions
+    var where = new WhereClause (WhereClause.Type.AND);
+    where.add ("subj_storage_state = 1");
+    where.set_is_simple (false);
+
+    var subwhere = new WhereClause (WhereClause.Type.OR);
+    subwhere.add_match_condition ("actor", 1);
+    assert (subwhere.get_is_simple ());
+
+    where.extend (subwhere);
+    assert (!where.get_is_simple ());
+}
+
 // vim:expandtab:ts=4:sw=4
@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# -.- coding: utf-8 -.-
+
+# Zeitgeist - Replay a SQL workload and record query plans and timings
+#
+# Copyright © 2026 Zeitgeist contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# #############################################################################
+# query_timings.py measures whole D-Bus round trips. This script runs the
+# SQL generated by DbReader.find_event_ids_for_clause directly, so index
+# changes can be evaluated without rebuilding the daemon:
+#
+#  ./explain_workload.py --generate 200000 -d /tmp/activity.sqlite
+#  ./explain_workload.py -d /tmp/activity.sqlite \
+#       --queries query_sets/find_event_ids.sql -o before.txt
+#  ./explain_workload.py -d /tmp/activity.sqlite --indexes new-indexes.sql \
+#       --queries query_sets/find_event_ids.sql -o after.txt
+#
+# Workload files hold one statement per paragraph, preceded by a "-- name"
+# comment line. A name ending in "[N]" only fetches N rows, like queries
+# with num_events set. Placeholders like {interpretation:URI} are replaced
+# with the ID of URI in the given table, and {days_ago:N} with a timestamp,
+# so the statements work with any database. The database is never
+# modified: --indexes is applied to a temporary copy.
+# #############################################################################
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+
+from optparse import OptionParser
+
+SCHEMA_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '../../libzeitgeist/sql-schema.vala')
+
+NFO = 'http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#'
+NIE = 'http://www.semanticdesktop.org/ontologies/2007/01/19/nie#'
+ZG = 'http://www.zeitgeist-project.com/ontologies/2010/01/27/zg#'
+
+EVENT_INTERPRETATIONS = [ZG + 'AccessEvent', ZG + 'ModifyEvent',
+    ZG + 'LeaveEvent', ZG + 'CreateEvent', ZG + 'ReceiveEvent',
+    ZG + 'SendEvent', ZG + 'MoveEvent', ZG + 'DeleteEvent']
+EVENT_MANIFESTATIONS = [ZG + 'UserActivity', ZG + 'SystemNotification',
+    ZG + 'HeuristicActivity', ZG + 'ScheduledActivity']
+SUBJECT_INTERPRETATIONS = [NFO + 'Document', NFO + 'TextDocument',
+    NFO + 'PaginatedTextDocument', NFO + 'Spreadsheet',
+    NFO + 'Presentation', NFO + 'SourceCode', NFO + 'Audio', NFO + 'Video',
+    NFO + 'Image', NFO + 'Website', NFO + 'Software', NFO + 'Folder',
+    NFO + 'Archive', NIE + 'InformationElement']
+SUBJECT_MANIFESTATIONS = [NFO + 'FileDataObject',
+    NFO + 'RemoteDataObject', NFO + 'WebDataObject',
+    NFO + 'SoftwareService', NFO + 'Attachment']
+MIMETYPES = ['text/plain', 'text/html', 'text/x-python', 'text/x-csrc',
+    'application/pdf', 'application/vnd.oasis.opendocument.text',
+    'image/png', 'image/jpeg', 'audio/mpeg', 'audio/ogg', 'video/mp4',
+    'inode/directory', 'application/x-desktop', 'application/zip']
+
+def get_cmdline():
+    parser = OptionParser()
+    parser.add_option('-d', dest='database', metavar='FILE',
+        default=os.path.expanduser(
+            '~/.local/share/zeitgeist/activity.sqlite'),
+        help='database to run the queries on')
+    parser.add_option('--generate', dest='generate', metavar='N', type='int',
+        help='create the database, with N random events, and exit')
+    parser.add_option('--queries', dest='queries', metavar='FILE',
+        help='workload to replay')
+    parser.add_option('--indexes', dest='indexes', metavar='FILE',
+        help='SQL to run on a copy of the database before the queries')
+    parser.add_option('--count', dest='count', type='int', default=20,
+        help='number of executions of each query')
+    parser.add_option('-o', dest='output', metavar='FILE',
+        help='write the report to FILE')
+    (options, args) = parser.parse_args()
+    if args or not (options.generate or options.queries):
+        parser.error('either --generate or --queries is required')
+    return options
+
+def get_schema_statements():
+    # Reuse the statements of DatabaseSchema, instead of keeping a copy
+    source = open(SCHEMA_SOURCE).read()
+    sections = {}
+    for name in ('create_schema', 'create_basic_indices',
+                 'create_event_indices'):
+        start = source.index('public static void %s ' % name)
+        end = source.index('public static void', start + 1)
+        sections[name] = re.findall(r'"""(.*?)"""', source[start:end],
+            re.DOTALL)
+    return (sections['create_schema'] + sections['create_basic_indices'] +
+        sections['create_event_indices'])
+
+def generate_database(path, num_events):
+    if os.path.exists(path):
+        raise SystemExit('%s already exists' % path)
+    db = sqlite3.connect(path)
+    for sql in get_schema_statements():
+        db.execute(sql)
+    db.execute("INSERT INTO schema_version VALUES ('core', 0)")
+
+    rand = random.Random(42)
+    def pick(values, skew=1.2):
+        # Zipf-like: a few actors and files get most of the events
+        return values[min(int(rand.paretovariate(skew)) - 1,
+            len(values) - 1)]
+
+    def insert_values(table, values):
+        db.executemany('INSERT INTO %s (value) VALUES (?)' % table,
+            [(v,) for v in values])
+        return dict(db.execute('SELECT value, id FROM %s' % table))
+
+    interpretations = insert_values('interpretation',
+        EVENT_INTERPRETATIONS + SUBJECT_INTERPRETATIONS)
+    manifestations = insert_values('manifestation',
+        EVENT_MANIFESTATIONS + SUBJECT_MANIFESTATIONS)
+    mimetypes = insert_values('mimetype', MIMETYPES)
+    actors = insert_values('actor',
+        ['application://app%d.desktop' % i for i in range(200)])
+    folders = ['file:///home/user/folder%d' % i for i in range(500)]
+    # only a few events, like those of web browsers, have an origin
+    pages = ['http://example.com/page%d' % i for i in range(1000)]
+    uris = ['%s/file%d.txt' % (rand.choice(folders), i)
+        for i in range(num_events // 4)]
+    uri_ids = insert_values('uri', folders + pages + uris)
+    texts = insert_values('text', ['text %d' % i for i in range(1000)])
+    db.execute("INSERT INTO storage (value, state) VALUES ('local', 1)")
+
+    actor_list = sorted(actors.values())
+    uri_list = [uri_ids[u] for u in uris]
+    rand.shuffle(uri_list)
+    # two years of history, up to now
+    span = 2 * 365 * 24 * 3600 * 1000
+    timestamp = int(time.time() * 1000) - span
+    rows = []
+    for event_id in range(1, num_events + 1):
+        timestamp += rand.randint(1, 2 * span // num_events)
+        uri = pick(uri_list, 0.6)
+        subj_interpretation = pick(SUBJECT_INTERPRETATIONS, 0.8)
+        folder = uri_ids[rand.choice(folders)]
+        origin = None
+        if rand.random() < 0.05:
+            origin = uri_ids[pick(pages, 0.8)]
+        rows.append((event_id, timestamp,
+            interpretations[pick(EVENT_INTERPRETATIONS, 1.5)],
+            manifestations[pick(EVENT_MANIFESTATIONS, 2)],
+            pick(actor_list, 0.8), uri,
+            interpretations[subj_interpretation],
+            manifestations[pick(SUBJECT_MANIFESTATIONS, 2)],
+            folder, mimetypes[pick(MIMETYPES, 0.8)],
+            texts['text %d' % rand.randint(0, 999)], 1, origin, uri, folder))
+    db.executemany('''
+        INSERT OR IGNORE INTO event (id, timestamp, interpretation,
+            manifestation, actor, subj_id, subj_interpretation,
+            subj_manifestation, subj_origin, subj_mimetype, subj_text,
+            subj_storage, origin, subj_id_current, subj_origin_current)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    db.commit()
+    db.execute('ANALYZE')
+    db.close()
+    print('Created %s with %d events' % (path, num_events))
+
+def get_workload(path):
+    name = None
+    lines = []
+    for line in open(path):
+        line = line.rstrip()
+        if line.startswith('-- '):
+            name = line[3:]
+        elif line:
+            lines.append(line)
+        elif lines:
+            yield name, '\n'.join(lines)
+            lines = []
+    if lines:
+        yield name, '\n'.join(lines)
+
+def resolve_placeholders(db, sql):
+    def lookup(match):
+        if match.group(1) == 'days_ago':
+            return str(int((time.time() - int(match.group(2)) * 86400)
+                * 1000))
+        row = db.execute('SELECT id FROM %s WHERE value=?' % match.group(1),
+            (match.group(2),)).fetchone()
+        return str(row[0] if row else -1)
+    return re.sub(r'{(\w+):([^}]+)}', lookup, sql)
+
+def get_plan(db, sql):
+    return [row[-1] for row in db.execute('EXPLAIN QUERY PLAN ' + sql)]
+
+def get_median_time(db, sql, count, limit):
+    timings = []
+    for i in range(count):
+        start = time.time()
+        cursor = db.execute(sql)
+        rows = len(cursor.fetchmany(limit) if limit else cursor.fetchall())
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings[len(timings) // 2], rows
+
+def main():
+    options = get_cmdline()
+    if options.generate:
+        generate_database(options.database, options.generate)
+        return
+
+    path = options.database
+    tmpdir = None
+    if options.indexes:
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'activity.sqlite')
+        shutil.copy(options.database, path)
+
+    try:
+        db = sqlite3.connect(path)
+        if options.indexes:
+            db.executescript(open(options.indexes).read())
+            db.execute('ANALYZE')
+
+        output = open(options.output, 'w') if options.output else sys.stdout
+        num_events = db.execute('SELECT COUNT(DISTINCT id) FROM event')
+        print('# %d events, SQLite %s' % (num_events.fetchone()[0],
+            sqlite3.sqlite_version), file=output)
+        total = 0.0
+        for name, sql in get_workload(options.queries):
+            sql = resolve_placeholders(db, sql)
+            limit = re.search(r'\[(\d+)\]$', name)
+            median, rows = get_median_time(db, sql, options.count,
+                int(limit.group(1)) if limit else 0)
+            total += median
+            print('\n%s: %.2f ms, %d rows' % (name, median * 1000, rows),
+                file=output)
+            for step in get_plan(db, sql):
+                print('    ' + step, file=output)
+        print('\n# total: %.2f ms' % (total * 1000), file=output)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
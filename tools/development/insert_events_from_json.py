@@ -39,15 +39,23 @@ sys.path.append(path)
 from testutils import parse_events
 
 # Max. number of events to send in a D-Bus call
-LIMIT = 100
+LIMIT = 5000
 
 def insert_events(events):
+    # The event indices are dropped while importing, and rebuilt once
+    # all events have been inserted
     iface = ZeitgeistDBusInterface()
     print "Inserting %d events..." % len(events)
-    while len(events):
-        iface.InsertEvents(events[:LIMIT])
-        events = events[LIMIT:]
-        print "."
+    iface.BeginImport()
+    try:
+        total = len(events)
+        while len(events):
+            iface.ImportEvents(events[:LIMIT])
+            events = events[LIMIT:]
+            print "%d/%d" % (total - len(events), total)
+    finally:
+        print "Rebuilding indices..."
+        iface.EndImport()
     print 'OK.'
 
 def main():
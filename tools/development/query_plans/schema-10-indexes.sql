@@ -0,0 +1,5 @@
+-- Event indices changed in schema version 11, as they were in version 10
+DROP INDEX event_actor;
+CREATE INDEX event_actor ON event(actor, timestamp, id);
+DROP INDEX event_subj_mimetype;
+CREATE INDEX event_subj_mimetype ON event(subj_mimetype, timestamp, id);
@@ -0,0 +1,140 @@
+-- most_recent_events [100]
+SELECT id FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)  ORDER BY  timestamp DESC
+
+-- most_recent_events_for_actor [100]
+SELECT id FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND actor = {actor:application://app7.desktop})  ORDER BY  timestamp DESC
+
+-- most_recent_events_for_subject_interpretation [96]
+SELECT id FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Audio})  ORDER BY  timestamp DESC
+
+-- most_recent_events_for_interpretation [100]
+SELECT id FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND interpretation = {interpretation:http://www.zeitgeist-project.com/ontologies/2010/01/27/zg#ModifyEvent})  ORDER BY  timestamp DESC
+
+-- most_recent_subjects [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT subj_id,
+    max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY subj_id)
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- most_popular_subjects [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT subj_id,
+    max(timestamp) AS timestamp
+    , COUNT(subj_id) AS num_events
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY subj_id)
+GROUP BY subj_id
+ORDER BY num_events DESC, timestamp DESC
+
+-- most_recent_actor [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT actor,
+    max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY actor)
+GROUP BY actor
+ORDER BY  timestamp DESC
+
+-- most_popular_actor [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT actor,
+    max(timestamp) AS timestamp
+    , COUNT(actor) AS num_events
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY actor)
+GROUP BY actor
+ORDER BY num_events DESC, timestamp DESC
+
+-- most_popular_mimetype [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT subj_mimetype,
+    max(timestamp) AS timestamp
+    , COUNT(subj_mimetype) AS num_events
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY subj_mimetype)
+GROUP BY subj_mimetype
+ORDER BY num_events DESC, timestamp DESC
+
+-- jumplist_mimetype
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND subj_mimetype = {mimetype:text/plain}) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- jumplist_actor
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND actor = {actor:application://app3.desktop}) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- jumplist_subject_manifestation
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND subj_manifestation = {manifestation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#FileDataObject}) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- synapse_not_software_or_folder [96]
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= {days_ago:168} AND timestamp <= 9223372036854775807 AND (NOT subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Software} AND NOT subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Folder})) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- synapse_audio [96]
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= {days_ago:168} AND timestamp <= 9223372036854775807 AND subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Audio}) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- synapse_document [96]
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= {days_ago:168} AND timestamp <= 9223372036854775807 AND (subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Document} OR subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#TextDocument} OR subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#PaginatedTextDocument} OR subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Spreadsheet} OR subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Presentation} )) AND subj_id IS NOT NULL
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- synapse_origin_not_website [96]
+SELECT id, max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= {days_ago:168} AND timestamp <= 9223372036854775807 AND NOT subj_interpretation = {interpretation:http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#Website}) AND subj_origin IS NOT NULL
+GROUP BY subj_origin
+ORDER BY  timestamp DESC
+
+-- interval_most_recent_subjects [6]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT subj_id,
+    max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= {days_ago:31} AND timestamp <= {days_ago:30})
+    GROUP BY subj_id)
+GROUP BY subj_id
+ORDER BY  timestamp DESC
+
+-- interval_most_popular_actor [6]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT actor,
+    max(timestamp) AS timestamp
+    , COUNT(actor) AS num_events
+    FROM event WHERE (timestamp >= {days_ago:31} AND timestamp <= {days_ago:30})
+    GROUP BY actor)
+GROUP BY actor
+ORDER BY num_events DESC, timestamp DESC
+
+-- most_recent_event_origin [100]
+SELECT id FROM event
+NATURAL JOIN (
+    SELECT origin,
+    max(timestamp) AS timestamp
+    FROM event WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807)
+    GROUP BY origin)
+GROUP BY origin
+ORDER BY  timestamp DESC
+
+-- most_recent_events_for_origin [100]
+SELECT id FROM event_view WHERE (timestamp >= -9223372036854775807 AND timestamp <= 9223372036854775807 AND origin = (SELECT id FROM uri WHERE value = 'http://example.com/page3'))  ORDER BY  timestamp DESC
@@ -251,6 +251,7 @@ class EventInserter():
         self._log = ZeitgeistDBusInterface()
         self._buffer = []
         self._events_inserted = 0
+        self._log.BeginImport()
 
     def insert(self, event):
         buffer_full = len(self._buffer) >= self.BUFFER_SIZE
@@ -261,10 +262,14 @@ class EventInserter():
 
     def flush(self):
         if self._buffer:
-            self._log.InsertEvents(self._buffer)
+            self._log.ImportEvents(self._buffer)
             self._events_inserted += len(self._buffer)
             self._buffer = []
 
+    def close(self):
+        self.flush()
+        self._log.EndImport()
+
     def get_insertion_count(self):
         return self._events_inserted
 
@@ -285,7 +290,8 @@ def main():
                 print "Inserted %d events." % i
     except KeyboardInterrupt:
         pass
-    event_inserter.flush()
+    print "Rebuilding indices..."
+    event_inserter.close()
     print "Inserted %d events. Done." % event_inserter.get_insertion_count()
 
 if __name__ == '__main__':